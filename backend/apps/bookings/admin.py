@@ -9,6 +9,13 @@ class BookingMenuItemInline(admin.TabularInline):
     readonly_fields = ['total_price']
     fields = ['menu_item', 'variant', 'quantity', 'unit_price', 'total_price', 'notes']
 
+    def get_readonly_fields(self, request, obj=None):
+        # Booked items may point at menu rows deleted since, which would not
+        # validate as choices; they are only picked for new bookings
+        if obj is not None:
+            return ['menu_item', 'variant', *self.readonly_fields]
+        return self.readonly_fields
+
 
 class BookingStatusHistoryInline(admin.TabularInline):
     model = BookingStatusHistory
@@ -71,10 +78,17 @@ class BookingAdmin(admin.ModelAdmin):
 @admin.register(BookingMenuItem)
 class BookingMenuItemAdmin(admin.ModelAdmin):
     list_display = ['booking', 'menu_item', 'variant', 'quantity', 'unit_price', 'total_price']
+    # Not the menu rows: an inner join would hide items deleted since booking
+    list_select_related = ['booking__customer']
     list_filter = ['booking__status', 'menu_item__category']
     search_fields = ['booking__booking_id', 'menu_item__name']
     readonly_fields = ['total_price']
 
+    def get_readonly_fields(self, request, obj=None):
+        if obj is not None:
+            return ['menu_item', 'variant', *self.readonly_fields]
+        return self.readonly_fields
+
 
 @admin.register(BookingStatusHistory)
 class BookingStatusHistoryAdmin(admin.ModelAdmin):
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.7 on 2026-10-19 02:08
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("bookings", "0001_multi_tenant_bookings"),
+        ("menu", "0004_menu_version"),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name="bookingmenuitem",
+            options={"ordering": ["id"]},
+        ),
+        migrations.AddField(
+            model_name="booking",
+            name="menu_version",
+            field=models.ForeignKey(
+                blank=True,
+                help_text="Published menu the booked items and prices were taken from",
+                null=True,
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="bookings",
+                to="menu.menuversion",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="bookingmenuitem",
+            name="menu_item",
+            field=models.ForeignKey(
+                db_constraint=False,
+                on_delete=django.db.models.deletion.DO_NOTHING,
+                to="menu.menuitem",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="bookingmenuitem",
+            name="variant",
+            field=models.ForeignKey(
+                blank=True,
+                db_constraint=False,
+                null=True,
+                on_delete=django.db.models.deletion.DO_NOTHING,
+                to="menu.menuitemvariant",
+            ),
+        ),
+    ]
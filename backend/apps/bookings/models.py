@@ -6,6 +6,7 @@ from decimal import Decimal
 import uuid
 from apps.core.models import Hall, Organization
 from apps.menu.models import MenuItem, MenuItemVariant, MenuPackage
+from apps.pricing.money import Money
 
 
 class Booking(models.Model):
@@ -92,6 +93,14 @@ class Booking(models.Model):
         related_name="bookings",
     )
     has_custom_menu = models.BooleanField(default=False)
+    menu_version = models.ForeignKey(
+        "menu.MenuVersion",
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        related_name="bookings",
+        help_text="Published menu the booked items and prices were taken from",
+    )
 
     # Pricing breakdown
     hall_base_price = models.DecimalField(max_digits=12, decimal_places=2, default=0)
@@ -254,9 +263,17 @@ class BookingMenuItem(models.Model):
     booking = models.ForeignKey(
         Booking, on_delete=models.CASCADE, related_name="menu_items"
     )
-    menu_item = models.ForeignKey(MenuItem, on_delete=models.CASCADE)
+    # Menu rows may be edited or deleted after booking; the ids then resolve
+    # through the booking's menu_version, so deletions must leave these alone
+    menu_item = models.ForeignKey(
+        MenuItem, on_delete=models.DO_NOTHING, db_constraint=False
+    )
     variant = models.ForeignKey(
-        MenuItemVariant, on_delete=models.CASCADE, null=True, blank=True
+        MenuItemVariant,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        null=True,
+        blank=True,
     )
     quantity = models.DecimalField(
         max_digits=10,
@@ -282,17 +299,24 @@ class BookingMenuItem(models.Model):
 
     class Meta:
         unique_together = ["booking", "menu_item", "variant"]
-        ordering = ["menu_item__category__display_order", "menu_item__display_order"]
+        # Ordering through menu_item would inner-join away deleted items
+        ordering = ["id"]
 
     def __str__(self):
-        item_name = f"{self.menu_item.name}"
-        if self.variant:
-            item_name += f" ({self.variant.name})"
+        try:
+            item_name = f"{self.menu_item.name}"
+            if self.variant:
+                item_name += f" ({self.variant.name})"
+        except (MenuItem.DoesNotExist, MenuItemVariant.DoesNotExist):
+            item_name = f"menu item #{self.menu_item_id}"
         return f"{self.booking.booking_id} - {item_name} x{self.quantity}"
 
     def save(self, *args, **kwargs):
-        # Auto-calculate total price
-        self.total_price = self.quantity * self.unit_price
+        # Auto-calculate total price (fractional quantities round half up to
+        # the nearest minor unit)
+        self.total_price = (
+            Money.from_decimal(self.unit_price).times(self.quantity).to_decimal()
+        )
         super().save(*args, **kwargs)
 
     def clean(self):
@@ -0,0 +1,329 @@
+"""
+Kitchen production plans
+
+A production plan lists, per event day, how much of every menu item (and
+variant) an organization has to prepare for its confirmed bookings: the
+quantities ordered through BookingMenuItem plus, for package bookings without
+menu items of their own, each non-optional package item's
+``quantity_per_person * guest_count``.
+
+Both sources are grouped by day, item and variant in a single UNION ALL query
+per organization and date range (item and variant names come from correlated
+subqueries, so rows whose menu item was deleted since are still counted and
+are described from the booking's menu version), and the result is cached per
+(organization, day). Writes that can change a day's plan (bookings, booking
+menu items, package contents) drop the affected days once the transaction
+commits, so a cached day is only recomputed after it actually changed.
+"""
+
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db.models import DecimalField, ExpressionWrapper, F, OuterRef, Subquery, Sum
+from django.db.models.signals import post_delete, post_init, post_save
+from django.utils import timezone
+
+from apps.core.transactions import defer_until_commit
+from apps.menu.models import MenuItem, MenuItemVariant, MenuVersion, PackageMenuItem
+from .models import Booking, BookingMenuItem
+
+# Bookings whose food gets cooked
+PLAN_STATUSES = ("confirmed",)
+
+PLAN_KEY = "production_plan:{organization_id}:{day}"
+
+# Bounds staleness after writes that bypass signals (queryset.update())
+PLAN_TIMEOUT = 60 * 60
+
+# Longest date range served in one request
+MAX_DAYS = 92
+
+# Booking fields a plan depends on
+PLAN_INPUTS = (
+    "organization_id",
+    "event_date",
+    "status",
+    "guest_count",
+    "selected_package_id",
+)
+SNAPSHOT_ATTR = "_production_snapshot"
+
+QUANTITY = DecimalField(max_digits=14, decimal_places=3)
+
+GROUP_COLUMNS = ("menu_item_id", "variant_id")
+
+
+def _describe():
+    # Subqueries rather than joins: BookingMenuItem keeps the ids of deleted
+    # menu rows, which an inner join would drop
+    item = MenuItem.objects.filter(pk=OuterRef("menu_item_id"))
+    return {
+        "name": Subquery(item.values("name")),
+        "category": Subquery(item.values("category__name")),
+        "serving_type": Subquery(item.values("serving_type")),
+        "variant_name": Subquery(
+            MenuItemVariant.objects.filter(pk=OuterRef("variant_id")).values("name")
+        ),
+    }
+
+
+def _plan_key(organization_id, day):
+    return PLAN_KEY.format(organization_id=organization_id, day=str(day))
+
+
+def _days(start, end):
+    return [start + timedelta(days=offset) for offset in range((end - start).days + 1)]
+
+
+def compute_plans(organization_id, start, end):
+    """
+    ``{day: [entry, ...]}`` for every day in ``start``..``end``, from one
+    grouped query over booking menu items and package contents
+    """
+    description = _describe()
+    ordered = (
+        BookingMenuItem.objects.filter(
+            booking__organization_id=organization_id,
+            booking__status__in=PLAN_STATUSES,
+            booking__event_date__range=(start, end),
+            is_confirmed=True,
+        )
+        .annotate(**description)
+        .order_by()
+        .values(
+            "booking__event_date",
+            "booking__menu_version_id",
+            *GROUP_COLUMNS,
+            *description,
+        )
+        .annotate(total=Sum("quantity", output_field=QUANTITY))
+    )
+    packaged = (
+        PackageMenuItem.objects.filter(
+            package__bookings__organization_id=organization_id,
+            package__bookings__status__in=PLAN_STATUSES,
+            package__bookings__event_date__range=(start, end),
+            # Bookings created from a package normally carry the package's
+            # items as BookingMenuItem rows already
+            package__bookings__menu_items__isnull=True,
+            is_optional=False,
+        )
+        .annotate(**description)
+        .order_by()
+        .values(
+            "package__bookings__event_date",
+            "package__bookings__menu_version_id",
+            *GROUP_COLUMNS,
+            *description,
+        )
+        .annotate(
+            total=Sum(
+                ExpressionWrapper(
+                    F("quantity_per_person") * F("package__bookings__guest_count"),
+                    output_field=QUANTITY,
+                )
+            )
+        )
+    )
+
+    # An item can be both ordered and part of a package on the same day, and
+    # be booked from several menu versions
+    totals = {}
+    unresolved = {}
+    for row in ordered.union(packaged, all=True):
+        quantity = Decimal(row["total"])
+        key = (row["booking__event_date"], row["menu_item_id"], row["variant_id"])
+        if key in totals:
+            totals[key]["quantity"] += quantity
+        else:
+            totals[key] = {
+                "menu_item": row["menu_item_id"],
+                "name": row["name"],
+                "category": row["category"],
+                "variant": row["variant_id"],
+                "variant_name": row["variant_name"],
+                "serving_type": row["serving_type"],
+                "quantity": quantity,
+            }
+        entry = totals[key]
+        if entry["name"] is None or (entry["variant"] and entry["variant_name"] is None):
+            unresolved.setdefault(key, set()).add(row["booking__menu_version_id"])
+    if unresolved:
+        _describe_deleted(
+            [totals[key] for key in unresolved], set().union(*unresolved.values())
+        )
+
+    plans = {day: [] for day in _days(start, end)}
+    for (day, item_id, variant_id), entry in totals.items():
+        plans[day].append(entry)
+    for entries in plans.values():
+        entries.sort(
+            key=lambda entry: (
+                entry["category"],
+                entry["name"],
+                entry["variant_name"] or "",
+            )
+        )
+    return plans
+
+
+def _describe_deleted(entries, version_ids):
+    """Fill in names of deleted menu rows from the menu versions they were booked from"""
+    contents = list(
+        MenuVersion.objects.filter(id__in=version_ids - {None})
+        .order_by("-number")
+        .values_list("content", flat=True)
+    )
+    for entry in entries:
+        if entry["name"] is None:
+            item = next(
+                (
+                    content["items"][str(entry["menu_item"])]
+                    for content in contents
+                    if str(entry["menu_item"]) in content["items"]
+                ),
+                None,
+            )
+            if item is None:
+                entry.update(name=f"menu item #{entry['menu_item']}", category="")
+            else:
+                entry.update(
+                    name=item["name"],
+                    category=item["category"],
+                    serving_type=item["serving_type"],
+                )
+        if entry["variant"] and entry["variant_name"] is None:
+            entry["variant_name"] = next(
+                (
+                    content["variants"][str(entry["variant"])]["name"]
+                    for content in contents
+                    if str(entry["variant"]) in content["variants"]
+                ),
+                f"variant #{entry['variant']}",
+            )
+
+
+def get_plans(organization_id, start, end):
+    """Cached form of compute_plans(); only missing days hit the database"""
+    days = _days(start, end)
+    keys = {_plan_key(organization_id, day): day for day in days}
+    cached = cache.get_many(list(keys))
+    plans = {keys[key]: entries for key, entries in cached.items()}
+
+    missing = [day for day in days if day not in plans]
+    if missing:
+        computed = compute_plans(organization_id, missing[0], missing[-1])
+        cache.set_many(
+            {_plan_key(organization_id, day): computed[day] for day in missing},
+            PLAN_TIMEOUT,
+        )
+        plans.update((day, computed[day]) for day in missing)
+    return {day: plans[day] for day in days}
+
+
+# Invalidation
+
+
+def invalidate_days(changes):
+    """Drop cached plans for ``changes``: (kind, id[, day]) tuples"""
+    days = {(value, day) for kind, value, day in changes if kind == "organization"}
+    booking_ids = [value for kind, value, day in changes if kind == "booking"]
+    package_ids = [value for kind, value, day in changes if kind == "package"]
+    if booking_ids:
+        days.update(
+            Booking.objects.filter(id__in=booking_ids)
+            .order_by()
+            .values_list("organization_id", "event_date")
+        )
+    if package_ids:
+        # Package contents only matter to the days still to be cooked
+        days.update(
+            Booking.objects.filter(
+                selected_package_id__in=package_ids,
+                status__in=PLAN_STATUSES,
+                event_date__gte=timezone.now().date(),
+            )
+            .order_by()
+            .values_list("organization_id", "event_date")
+            .distinct()
+        )
+    if days:
+        cache.delete_many(
+            [_plan_key(organization_id, day) for organization_id, day in days]
+        )
+
+
+def _plan_inputs(instance):
+    values = instance.__dict__
+    return {name: values[name] for name in PLAN_INPUTS if name in values}
+
+
+def snapshot_booking(sender, instance, **kwargs):
+    setattr(instance, SNAPSHOT_ATTR, _plan_inputs(instance))
+
+
+def booking_saved(sender, instance, created, raw=False, **kwargs):
+    previous = getattr(instance, SNAPSHOT_ATTR, {})
+    current = _plan_inputs(instance)
+    setattr(instance, SNAPSHOT_ATTR, current)
+    if raw or (not created and previous == current):
+        return
+
+    changes = [("organization", instance.organization_id, instance.event_date)]
+    if previous.get("event_date") and previous.get("organization_id"):
+        changes.append(
+            ("organization", previous["organization_id"], previous["event_date"])
+        )
+    defer_until_commit("production_plan", changes, invalidate_days, unique=True)
+
+
+def booking_deleted(sender, instance, **kwargs):
+    defer_until_commit(
+        "production_plan",
+        [("organization", instance.organization_id, instance.event_date)],
+        invalidate_days,
+        unique=True,
+    )
+
+
+def booking_item_changed(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    # The booking's day is looked up in bulk when the batch is flushed
+    defer_until_commit(
+        "production_plan",
+        [("booking", instance.booking_id, None)],
+        invalidate_days,
+        unique=True,
+    )
+
+
+def package_item_changed(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    defer_until_commit(
+        "production_plan",
+        [("package", instance.package_id, None)],
+        invalidate_days,
+        unique=True,
+    )
+
+
+post_init.connect(
+    snapshot_booking, sender=Booking, dispatch_uid="production_booking_inputs"
+)
+post_save.connect(booking_saved, sender=Booking, dispatch_uid="production_booking_save")
+post_delete.connect(
+    booking_deleted, sender=Booking, dispatch_uid="production_booking_delete"
+)
+for model, receiver in (
+    (BookingMenuItem, booking_item_changed),
+    (PackageMenuItem, package_item_changed),
+):
+    post_save.connect(
+        receiver, sender=model, dispatch_uid=f"production_save_{model.__name__}"
+    )
+    post_delete.connect(
+        receiver, sender=model, dispatch_uid=f"production_delete_{model.__name__}"
+    )
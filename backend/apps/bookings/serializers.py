@@ -1,10 +1,13 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User
+from django.core.exceptions import ObjectDoesNotExist
+from django.db import transaction
 from django.utils import timezone
-from decimal import Decimal
 from .models import Booking, BookingMenuItem, BookingStatusHistory
 from apps.core.serializers import HallListSerializer, UserSerializer
+from apps.menu import versions
 from apps.menu.serializers import MenuItemListSerializer, MenuItemVariantSerializer
+from apps.pricing.money import Money
 
 
 class BookingMenuItemSerializer(serializers.ModelSerializer):
@@ -30,6 +33,32 @@ class BookingMenuItemSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("Unit price cannot be negative.")
         return value
 
+    def to_representation(self, instance):
+        booking = instance.booking
+        # Describe the item as published when it was booked, without touching
+        # the live menu tables. Bookings made before menu versions existed
+        # only have the live rows, which may have been deleted since.
+        snapshot = {}
+        if booking.menu_version_id is not None:
+            content = booking.menu_version.content
+            snapshot = {
+                'menu_item': versions.item_data(content, instance.menu_item_id),
+                'variant': versions.variant_data(content, instance.variant_id),
+            }
+        data = {}
+        for field in self._readable_fields:
+            if snapshot.get(field.field_name) is not None:
+                data[field.field_name] = snapshot[field.field_name]
+                continue
+            try:
+                attribute = field.get_attribute(instance)
+            except ObjectDoesNotExist:
+                attribute = None
+            data[field.field_name] = (
+                None if attribute is None else field.to_representation(attribute)
+            )
+        return data
+
 
 class BookingStatusHistorySerializer(serializers.ModelSerializer):
     """Serializer for BookingStatusHistory model"""
@@ -170,6 +199,7 @@ class BookingCreateSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("Guest count must be greater than zero.")
         return value
     
+    @transaction.atomic
     def create(self, validated_data):
         menu_items_data = validated_data.pop('menu_items_data', [])
         selected_package_id = validated_data.pop('selected_package_id', None)
@@ -205,17 +235,21 @@ class BookingCreateSerializer(serializers.ModelSerializer):
             except MenuPackage.DoesNotExist:
                 raise serializers.ValidationError("Selected package not found or not available for this organization.")
 
+        # Pin the booking to the menu as currently published
+        validated_data['menu_version'] = versions.current_version(validated_data['organization'].pk)
+
         # Create booking
         booking = Booking.objects.create(**validated_data)
 
         # Create menu items
-        total_cost = Decimal('0.00')
+        total_cost = Money()
         for item_data in menu_items_data:
             booking_item = BookingMenuItem.objects.create(
                 booking=booking,
                 **item_data
             )
-            total_cost += booking_item.total_price
+            total_cost += Money.from_decimal(booking_item.total_price)
+        total_cost = total_cost.to_decimal()
 
         # Update booking totals (basic calculation for now)
         booking.subtotal = total_cost
@@ -1,3 +1,268 @@
-from django.test import TestCase
+import datetime
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from apps.core.models import Hall
+from apps.core.tests import LOCMEM_CACHE, create_organization
+from apps.menu import versions
+from apps.menu.models import (
+    MenuCategory,
+    MenuItem,
+    MenuPackage,
+    MenuVersion,
+    PackageMenuItem,
+)
+from .models import Booking, BookingMenuItem
+
+EVENT_DAY = datetime.date(2030, 6, 1)
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class ProductionPlanTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.owner = User.objects.create_user(username="owner", password="pass")
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+        self.organization = create_organization(self.owner)
+        self.hall = Hall.objects.create(
+            organization=self.organization,
+            name="Main Hall",
+            capacity=500,
+            base_price=Decimal("50000.00"),
+        )
+        category = MenuCategory.objects.create(
+            organization=self.organization, name="Mains"
+        )
+        self.karahi, self.biryani = [
+            MenuItem.objects.create(
+                organization=self.organization,
+                category=category,
+                name=name,
+                base_price=Decimal("500.00"),
+                serving_type="per_kg",
+            )
+            for name in ("Chicken Karahi", "Chicken Biryani")
+        ]
+        self.package = MenuPackage.objects.create(
+            organization=self.organization,
+            name="Wedding",
+            description="Deal",
+            base_price_per_person=Decimal("900.00"),
+            min_guests=10,
+        )
+        # Run the on-commit cache invalidation the test transaction would defer
+        with self.captureOnCommitCallbacks(execute=True):
+            PackageMenuItem.objects.create(
+                package=self.package,
+                menu_item=self.biryani,
+                quantity_per_person=Decimal("0.250"),
+            )
+
+    def book(self, status="confirmed", guest_count=100, package=None, **items):
+        with self.captureOnCommitCallbacks(execute=True):
+            booking = Booking.objects.create(
+                organization=self.organization,
+                hall=self.hall,
+                customer=self.owner,
+                event_date=EVENT_DAY,
+                event_time=datetime.time(19, 0),
+                guest_count=guest_count,
+                contact_phone="0300",
+                contact_email="guest@example.com",
+                status=status,
+                selected_package=package,
+            )
+            for item, quantity in items.items():
+                BookingMenuItem.objects.create(
+                    booking=booking,
+                    menu_item=getattr(self, item),
+                    quantity=Decimal(quantity),
+                    unit_price=Decimal("500.00"),
+                )
+        return booking
+
+    def plan(self):
+        response = self.client.get(
+            "/api/v1/bookings/production_plan",
+            {"organization": self.organization.id, "start": EVENT_DAY.isoformat()},
+        )
+        self.assertEqual(response.status_code, 200)
+        return {
+            item["name"]: item["quantity"] for item in response.data["days"][0]["items"]
+        }
+
+    def test_plan_sums_orders_and_packages(self):
+        self.book(karahi="12.5", biryani="3")
+        self.book(package=self.package, guest_count=200)
+        # Package items already copied (or replaced) as booking menu items
+        self.book(package=self.package, guest_count=300, karahi="4")
+        self.book(status="pending", karahi="100")
+
+        # organization, then one query for the plan (the owner skips the
+        # membership check)
+        with self.assertNumQueries(2):
+            plan = self.plan()
+        self.assertEqual(
+            plan,
+            {"Chicken Karahi": Decimal("16.5"), "Chicken Biryani": Decimal("53")},
+        )
+
+        # Served from the cache until a booking on that day changes
+        with self.assertNumQueries(1):
+            self.plan()
+        booking = Booking.objects.get(status="pending")
+        booking.status = "confirmed"
+        with self.captureOnCommitCallbacks(execute=True):
+            booking.save()
+        self.assertEqual(self.plan()["Chicken Karahi"], Decimal("116.5"))
+
+    def test_plan_keeps_deleted_items(self):
+        booking = self.book(karahi="2")
+        booking.menu_version = versions.current_version(self.organization.id)
+        booking.save(update_fields=["menu_version"])
+        self.book(karahi="3")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.karahi.delete()
+        # Named from the menu version of the booking that has one
+        self.assertEqual(self.plan(), {"Chicken Karahi": Decimal("5")})
+
+    def test_package_changes_invalidate_plan(self):
+        self.book(package=self.package, guest_count=100)
+        self.assertEqual(self.plan(), {"Chicken Biryani": Decimal("25")})
+        with self.captureOnCommitCallbacks(execute=True):
+            PackageMenuItem.objects.create(
+                package=self.package,
+                menu_item=self.karahi,
+                quantity_per_person=Decimal("0.100"),
+            )
+        self.assertEqual(self.plan()["Chicken Karahi"], Decimal("10"))
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class MenuVersionTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(username="owner", password="pass")
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.organization = create_organization(self.owner)
+            category = MenuCategory.objects.create(
+                organization=self.organization, name="Mains"
+            )
+            self.karahi, self.biryani = [
+                MenuItem.objects.create(
+                    organization=self.organization,
+                    category=category,
+                    name=name,
+                    base_price=Decimal("500.00"),
+                    serving_type="per_kg",
+                )
+                for name in ("Chicken Karahi", "Chicken Biryani")
+            ]
+
+    def book(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                "/api/v1/bookings",
+                {
+                    "organization": self.organization.id,
+                    "event_date": EVENT_DAY.isoformat(),
+                    "event_time": "19:00",
+                    "event_type": "wedding",
+                    "guest_count": 100,
+                    "contact_phone": "0300",
+                    "contact_email": "guest@example.com",
+                    "menu_items_data": [
+                        {"menu_item_id": item.id, "quantity": "10", "unit_price": "500.00"}
+                        for item in (self.karahi, self.biryani)
+                    ],
+                },
+                format="json",
+            )
+        self.assertEqual(response.status_code, 201, response.data)
+        return Booking.objects.latest("id")
+
+    def test_bookings_keep_menu_as_booked(self):
+        first = self.book()
+        # Nothing changed in between, so both bookings share one version
+        second = self.book()
+        self.assertEqual(first.menu_version_id, second.menu_version_id)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.karahi.name = "Mutton Karahi"
+            self.karahi.base_price = Decimal("900.00")
+            self.karahi.save()
+            self.biryani.delete()
+        # The next booking takes a new version; the old one is untouched
+        self.assertEqual(versions.current_version(self.organization.id).number, 2)
+
+        # access scope, booking, its menu items, status history and customer;
+        # nothing from the live menu tables
+        with self.assertNumQueries(5):
+            response = self.client.get(f"/api/v1/bookings/{first.id}")
+        self.assertEqual(response.status_code, 200)
+        items = {
+            item["menu_item"]["name"]: item["menu_item"]["base_price"]
+            for item in response.data["menu_items"]
+        }
+        self.assertEqual(
+            items, {"Chicken Karahi": "500.00", "Chicken Biryani": "500.00"}
+        )
+
+    def test_versions_are_published_lazily_and_pruned(self):
+        def reprice(price):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.karahi.base_price = Decimal(price)
+                self.karahi.save()
+
+        # Menu writes only bump the organization's menu_version
+        reprice("600.00")
+        self.assertFalse(MenuVersion.objects.exists())
+
+        first = self.book()
+        with mock.patch.object(versions, "publish") as publish:
+            self.assertEqual(self.book().menu_version_id, first.menu_version_id)
+        publish.assert_not_called()
+
+        reprice("700.00")
+        second = self.book()
+        self.assertEqual(second.menu_version.number, 2)
+
+        # New versions replace the older ones no booking points to
+        for price in ("800.00", "900.00"):
+            reprice(price)
+            versions.publish(self.organization.id)
+        self.assertEqual(
+            list(MenuVersion.objects.order_by("number").values_list("number", flat=True)),
+            [1, 2, 4],
+        )
+
+    def test_legacy_booking_with_deleted_item(self):
+        booking = self.book()
+        Booking.objects.filter(pk=booking.pk).update(menu_version=None)
+        orphan = booking.menu_items.get(menu_item=self.biryani)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.biryani.delete()
+
+        response = self.client.get(f"/api/v1/bookings/{booking.id}")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            sorted(
+                (item["menu_item"] or {}).get("name", "") for item in response.data["menu_items"]
+            ),
+            ["", "Chicken Karahi"],
+        )
+
+        self.owner.is_staff = self.owner.is_superuser = True
+        self.owner.save()
+        self.client.force_login(self.owner)
+        response = self.client.get("/admin/bookings/bookingmenuitem/")
+        self.assertEqual(len(response.context["cl"].result_list), 2)
+        response = self.client.get(f"/admin/bookings/bookingmenuitem/{orphan.id}/change/")
+        self.assertContains(response, f"menu item #{orphan.menu_item_id}")
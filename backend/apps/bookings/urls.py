@@ -8,8 +8,8 @@ router.register('', BookingViewSet)
 app_name = 'bookings'
 urlpatterns = []
 for url in router.urls:
-    if 'pk' in str(url.pattern):
-        # Modify patterns with pk to match remaining path starting with /
+    if str(url.pattern) != '^$' and not str(url.pattern).startswith('^\\.'):
+        # Modify detail and action patterns to match remaining path starting with /
         pattern = url.pattern.regex.pattern.replace('^', '^/', 1)
         urlpatterns.append(re_path(pattern, url.callback, name=url.name))
     else:
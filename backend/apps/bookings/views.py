@@ -12,6 +12,8 @@ from .serializers import (
     BookingCreateSerializer, BookingUpdateSerializer, BookingMenuItemSerializer,
     BookingStatusHistorySerializer
 )
+from apps.pricing.money import Money
+from apps.organizations.scope import get_scope
 
 
 class BookingViewSet(viewsets.ModelViewSet):
@@ -44,42 +46,22 @@ class BookingViewSet(viewsets.ModelViewSet):
 
         user = self.request.user
 
-        # Platform staff can see all bookings
-        if user.is_staff:
-            pass  # No filtering needed
-        else:
-            # Check if user is platform admin
-            is_platform_admin = False
-            try:
-                if hasattr(user, 'userprofile') and user.userprofile.is_platform_admin:
-                    is_platform_admin = True
-            except:
-                pass
-
-            if is_platform_admin:
-                pass  # No filtering needed
-            else:
-                # Build filter for accessible bookings
-                accessible_filters = Q(customer=user)  # User's own bookings
-
-                # Check if user owns any organizations
-                from apps.core.models import Organization
-                owned_organizations = Organization.objects.filter(owner=user)
-                if owned_organizations.exists():
-                    accessible_filters |= Q(organization__in=owned_organizations)
-
-                # Check if user is a member of any organizations
-                from apps.core.models import OrganizationMember
-                member_organizations = OrganizationMember.objects.filter(
-                    user=user,
-                    is_active=True,
-                    role__in=['admin', 'manager', 'staff']
-                ).values_list('organization', flat=True)
-
-                if member_organizations:
-                    accessible_filters |= Q(organization__in=member_organizations)
-
-                queryset = queryset.filter(accessible_filters)
+        # Platform staff and platform admins can see all bookings
+        scope = get_scope(self.request)
+        if not (user.is_staff or scope.is_platform_admin):
+            # The user's own bookings, and those of organizations they own or
+            # staff (one query for the scope, then a single WHERE)
+            accessible_filters = Q(customer=user)
+            organization_ids = scope.organization_ids(
+                roles=['admin', 'manager', 'staff']
+            )
+            if organization_ids:
+                accessible_filters |= Q(organization_id__in=sorted(organization_ids))
+            queryset = queryset.filter(accessible_filters)
+
+        # Detail pages read booked items from the pinned menu version
+        if self.action == 'retrieve':
+            queryset = queryset.select_related('menu_version')
 
         # Filter by status
         status_filter = self.request.query_params.get('status')
@@ -144,6 +126,62 @@ class BookingViewSet(viewsets.ModelViewSet):
         serializer = BookingListSerializer(bookings, many=True)
         return Response(serializer.data)
     
+    @action(detail=False, methods=['get'])
+    def production_plan(self, request):
+        """
+        Quantities to prepare per day for an organization's confirmed
+        bookings (?organization=&start=&end=, dates as YYYY-MM-DD)
+        """
+        from datetime import date
+        from apps.core.models import Organization
+        from . import production
+
+        organization_id = request.query_params.get('organization', '')
+        if not organization_id.isdigit():
+            return Response(
+                {'error': 'organization parameter required'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            start = date.fromisoformat(request.query_params['start'])
+            end = date.fromisoformat(request.query_params.get('end', request.query_params['start']))
+        except (KeyError, ValueError):
+            return Response(
+                {'error': 'start (and optional end) must be dates in YYYY-MM-DD format'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if end < start or (end - start).days >= production.MAX_DAYS:
+            return Response(
+                {'error': f'end must be within {production.MAX_DAYS} days after start'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        # Owners, platform staff and the organization's members (kitchen staff)
+        user = request.user
+        try:
+            organization = Organization.objects.get(pk=organization_id)
+        except Organization.DoesNotExist:
+            return Response({'error': 'Organization not found'}, status=status.HTTP_404_NOT_FOUND)
+        scope = get_scope(request)
+        if not (
+            user.is_staff
+            or organization.owner_id == user.id
+            or scope.is_platform_admin
+            or scope.member_role(organization.id)
+        ):
+            return Response(
+                {'error': 'You do not have permission to view this production plan'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+
+        plans = production.get_plans(organization.id, start, end)
+        return Response({
+            'organization': organization.id,
+            'start': start,
+            'end': end,
+            'days': [{'date': day, 'items': items} for day, items in plans.items()],
+        })
+
     @action(detail=False, methods=['get'])
     def pending(self, request):
         """Get pending bookings (admin only)"""
@@ -338,8 +376,10 @@ class StripeWebhookView(APIView):
                     )
 
                     # Calculate commission
-                    commission_amount = (booking.balance_due * booking.organization.commission_rate) / 100
-                    payment.commission_amount = commission_amount
+                    commission_amount = Money.from_decimal(booking.balance_due).percent(
+                        booking.organization.commission_rate
+                    )
+                    payment.commission_amount = commission_amount.to_decimal()
                     payment.save()
                 except Booking.DoesNotExist:
                     pass
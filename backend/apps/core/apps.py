@@ -4,3 +4,17 @@ from django.apps import AppConfig
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.core'
+
+    def ready(self):
+        # Register the DiscountTier index invalidation signals
+        import apps.core.tiers  # noqa: F401
+        # Create responsive variants of uploaded images after commit
+        import apps.core.media  # noqa: F401
+        # Keep OrganizationStats in step with bookings, halls and reviews
+        import apps.core.stats  # noqa: F401
+        # Rebuild marketplace search entries of changed halls and organizations
+        import apps.core.venue_search  # noqa: F401
+        # Retire marketplace cache validators when an organization owner changes
+        import apps.core.conditional  # noqa: F401
+        # Retire access token claims when memberships or accounts change
+        import apps.core.token_claims  # noqa: F401
@@ -1,10 +1,17 @@
-from rest_framework_simplejwt.views import TokenObtainPairView
-from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
+from rest_framework_simplejwt.serializers import (
+    TokenObtainPairSerializer,
+    TokenRefreshSerializer,
+)
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from django.contrib.auth import get_user_model
+from . import token_claims
 from .serializers import UserProfileSerializer
 from typing import Any, Dict
 
@@ -14,6 +21,9 @@ User = get_user_model()
 class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
     def validate(self, attrs):
         data = super().validate(attrs)
+        data["access"] = str(
+            token_claims.add_claims(AccessToken(data["access"]), self.user)
+        )
 
         # Add custom user data to the response
         user_serializer = UserProfileSerializer(self.user)
@@ -29,17 +39,35 @@ class CustomTokenObtainPairView(TokenObtainPairView):
     serializer_class = CustomTokenObtainPairSerializer
 
 
+class CustomTokenRefreshSerializer(TokenRefreshSerializer):
+    """Refresh that rebuilds the access token's claims from the database"""
+
+    def validate(self, attrs):
+        data = super().validate(attrs)
+        access = AccessToken(data["access"])
+        user = User.objects.filter(
+            pk=access[api_settings.USER_ID_CLAIM], is_active=True
+        ).first()
+        if user is None:
+            raise AuthenticationFailed("User not found", code="user_not_found")
+        data["access"] = str(token_claims.add_claims(access, user))
+        return data
+
+
+class CustomTokenRefreshView(TokenRefreshView):
+    serializer_class = CustomTokenRefreshSerializer
+
+
 @api_view(["GET", "PATCH"])
 @permission_classes([IsAuthenticated])
 def current_user(request):
     """Get or update current authenticated user's profile"""
+    user = token_claims.loaded_user(request.user)
     if request.method == "GET":
-        serializer = UserProfileSerializer(request.user)
+        serializer = UserProfileSerializer(user)
         return Response(serializer.data)
     elif request.method == "PATCH":
-        serializer = UserProfileSerializer(
-            request.user, data=request.data, partial=True
-        )
+        serializer = UserProfileSerializer(user, data=request.data, partial=True)
         if serializer.is_valid():
             serializer.save()
             return Response(serializer.data)
@@ -0,0 +1,26 @@
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+from . import token_claims
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    """
+    JWT authentication that trusts the role and tenant claims of current
+    tokens instead of loading the user (see apps/core/token_claims.py).
+    Tokens issued before the claims were added still load the user. The
+    token version is read from the cache, so a cache outage fails every
+    such request instead of skipping the check.
+    """
+
+    def get_user(self, validated_token):
+        if "ver" not in validated_token:
+            return super().get_user(validated_token)
+
+        user_id = validated_token[api_settings.USER_ID_CLAIM]
+        if validated_token["ver"] != token_claims.current_version(user_id):
+            raise InvalidToken("Token claims are out of date; refresh the token")
+        if not validated_token["is_active"]:
+            raise AuthenticationFailed("User is inactive", code="user_inactive")
+        return token_claims.claims_user(validated_token.payload)
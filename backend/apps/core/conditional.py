@@ -0,0 +1,125 @@
+"""
+Conditional GET for public read endpoints
+
+A viewset using ConditionalGetMixin defines ``<action>_version()`` for each
+action to cache, returning a cheap stamp of everything the response is built
+from, ``(last_modified, token)``; typically one aggregate over updated_at
+columns plus a row count (so deletions show), or a version counter. After
+the authentication, permission and throttle checks of a GET or HEAD, the
+mixin turns the stamp and the full request path (filters and pages each get
+their own) into an ETag and Last-Modified pair, and a request whose
+If-None-Match / If-Modified-Since still match is answered with 304 before the
+queryset or serializer run. A stamp of None (e.g. unknown object) skips this.
+
+Cached responses say ``Cache-Control: public, max-age=0, s-maxage=...``:
+browsers revalidate on every use (a 304 is cheap), while a CDN or reverse
+proxy may serve its copy for CDN_MAX_AGE seconds. They must not depend on
+the requesting user.
+"""
+
+import hashlib
+
+from django.contrib.auth.models import User
+from django.db.models.signals import post_save
+from django.utils import timezone
+from django.utils.cache import (
+    get_conditional_response,
+    patch_cache_control,
+    patch_vary_headers,
+)
+from django.utils.http import http_date, quote_etag
+
+from .models import Organization
+
+# Seconds shared caches may serve a response without revalidating
+CDN_MAX_AGE = 60
+
+
+class NotModified(Exception):
+    """Raised from initial() to answer with the prepared 304 response"""
+
+    def __init__(self, response):
+        self.response = response
+
+
+def latest(*moments):
+    """The latest of some optional datetimes"""
+    return max(filter(None, moments), default=None)
+
+
+def patch_public_cache(response, s_maxage=CDN_MAX_AGE):
+    """Cache headers of a public response that clients must revalidate"""
+    patch_cache_control(response, public=True, max_age=0, s_maxage=s_maxage)
+    patch_vary_headers(response, ("Accept",))
+
+
+def validators(action, path, version):
+    """The ``(etag, last_modified)`` pair of an action's ``version`` stamp"""
+    last_modified, token = version
+    digest = hashlib.md5(
+        f"{action}|{path}|{token}|{last_modified}".encode()
+    ).hexdigest()
+    return quote_etag(digest), int(last_modified.timestamp()) if last_modified else None
+
+
+def not_modified(request, validators):
+    """A 304 response if the request's conditional headers still match"""
+    etag, last_modified = validators
+    return get_conditional_response(request, etag=etag, last_modified=last_modified)
+
+
+def set_validators(response, validators, s_maxage=CDN_MAX_AGE):
+    """Add the validators and public cache headers to a 200 or 304 response"""
+    if validators and response.status_code in (200, 304):
+        etag, last_modified = validators
+        response["ETag"] = etag
+        if last_modified is not None:
+            response["Last-Modified"] = http_date(last_modified)
+        patch_public_cache(response, s_maxage)
+    return response
+
+
+class ConditionalGetMixin:
+    """ETag / Last-Modified validation for actions with a ``<action>_version``"""
+
+    cdn_max_age = CDN_MAX_AGE
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        self.response_validators = None
+        if request.method not in ("GET", "HEAD"):
+            return
+        get_version = getattr(self, f"{self.action}_version", None)
+        version = get_version() if get_version else None
+        if version is None:
+            return
+
+        self.response_validators = validators(
+            self.action, request.get_full_path(), version
+        )
+        response = not_modified(request._request, self.response_validators)
+        if response is not None:
+            raise NotModified(response)
+
+    def handle_exception(self, exc):
+        if isinstance(exc, NotModified):
+            return exc.response
+        return super().handle_exception(exc)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        return set_validators(
+            response, getattr(self, "response_validators", None), self.cdn_max_age
+        )
+
+
+def owner_saved(
+    sender, instance, created=False, raw=False, update_fields=None, **kwargs
+):
+    """Owners are shown in organization listings: retire their stamps"""
+    if created or raw or (update_fields and set(update_fields) <= {"last_login"}):
+        return
+    Organization.objects.filter(owner=instance).update(updated_at=timezone.now())
+
+
+post_save.connect(owner_saved, sender=User, dispatch_uid="conditional_owner_saved")
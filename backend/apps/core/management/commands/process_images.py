@@ -0,0 +1,29 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand
+
+from apps.core import media
+
+
+class Command(BaseCommand):
+    help = (
+        "Create the responsive WebP/JPEG variants of stored images that do not "
+        "have them yet (e.g. uploaded before variants existed)"
+    )
+
+    def handle(self, *args, **options):
+        names = set()
+        for label, fields in media.IMAGE_FIELDS.items():
+            model = apps.get_model(label)
+            for field in fields:
+                names.update(
+                    model.objects.exclude(**{field: ""})
+                    .exclude(**{f"{field}__isnull": True})
+                    .order_by()
+                    .values_list(field, flat=True)
+                    .distinct()
+                )
+
+        count = media.process_images(names, wait=True)
+        self.stdout.write(
+            self.style.SUCCESS(f"Created variants for {count} of {len(names)} images")
+        )
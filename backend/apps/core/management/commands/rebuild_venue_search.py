@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from apps.core.venue_search import rebuild
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the marketplace venue search entries from halls and "
+        "organizations, e.g. after queryset.update() or raw imports"
+    )
+
+    def handle(self, *args, **options):
+        count = rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Indexed {count} halls"))
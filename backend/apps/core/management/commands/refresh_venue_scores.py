@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from apps.core.ranking import refresh
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the marketplace ranking scores of halls and organizations; "
+        "schedule it (e.g. hourly from cron)"
+    )
+
+    def handle(self, *args, **options):
+        count = refresh()
+        self.stdout.write(self.style.SUCCESS(f"Scored {count} halls"))
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from apps.core.models import Hall, Organization
+from apps.core.stats import repair, repair_hall_ratings
+
+
+class Command(BaseCommand):
+    help = (
+        "Recount every organization's listing stats (bookings, halls, ratings) "
+        "and every hall's rating, and fix rows that drifted, e.g. after "
+        "queryset.update() or raw imports"
+    )
+
+    def handle(self, *args, **options):
+        total = Organization.objects.count()
+        fixed = repair()
+        self.stdout.write(
+            self.style.SUCCESS(f"Repaired {fixed} of {total} organization stats rows")
+        )
+        total = Hall.objects.count()
+        fixed = repair_hall_ratings()
+        self.stdout.write(
+            self.style.SUCCESS(f"Repaired {fixed} of {total} hall rating rows")
+        )
@@ -0,0 +1,322 @@
+"""
+Uploaded image storage and responsive variants
+
+Uploads are stored under the SHA-256 of their content
+(``<upload_to>/<2 hex digits>/<sha256><ext>``), so the same picture uploaded
+for many items, halls or organizations is kept on disk once.
+
+Once a write to one of the IMAGE_FIELDS commits, every new image is resized to
+each of VARIANT_WIDTHS (never upscaled) and encoded as WebP plus a JPEG (or,
+for formats that may be transparent, PNG) fallback, next to the original:
+
+    menu_items/3f/3f9c...e1.jpg
+    menu_items/3f/3f9c...e1.160w.webp    menu_items/3f/3f9c...e1.160w.jpg
+    menu_items/3f/3f9c...e1.480w.webp    ...
+
+Resizing runs in a process pool of IMAGE_PROCESSING_WORKERS processes
+(0 renders inline), so requests never wait for it. Variant names derive from
+the original's name alone; serializers only expose them once the variants are
+stored (checked once per image and process), and return None until then so
+clients show the original. ``variants_stored`` is sent once an image's
+variants are in place; the rows using it then get their ``updated_at``
+touched, so conditional GETs of responses built without the variants
+revalidate. ``manage.py process_images`` renders variants for images stored
+before this pipeline existed.
+"""
+
+import hashlib
+import io
+import logging
+import multiprocessing
+import os
+import posixpath
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files import File
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.db import connections
+from django.db.models.signals import post_save
+from django.dispatch import Signal
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from .transactions import defer_until_commit
+
+logger = logging.getLogger(__name__)
+
+# Image fields whose uploads get variants
+IMAGE_FIELDS = {
+    "core.Organization": ("logo", "cover_image"),
+    "core.Hall": ("featured_image",),
+    "core.HallImage": ("image",),
+    "core.UserProfile": ("avatar",),
+    "menu.MenuCategory": ("image",),
+    "menu.MenuItem": ("image",),
+    "menu.MenuPackage": ("image",),
+}
+
+# Variant widths in pixels, smallest first
+VARIANT_WIDTHS = (160, 480, 960)
+
+VARIANT_QUALITY = 80
+
+# Originals that may carry transparency fall back to PNG instead of JPEG
+TRANSPARENT_EXTENSIONS = (".png", ".gif", ".webp")
+
+FORMAT_EXTENSIONS = {"webp": "webp", "jpeg": "jpg", "png": "png"}
+
+# Sent with ``names`` once the variants of those stored images all exist
+variants_stored = Signal()
+
+
+def content_hash(content):
+    digest = hashlib.sha256()
+    for chunk in content.chunks():
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+class HashedFileSystemStorage(FileSystemStorage):
+    """
+    FileSystemStorage naming every upload after its content hash; saving
+    content that is already stored returns the existing name. Model deletes
+    never remove files, so shared files stay valid.
+    """
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, "chunks"):
+            content = File(content, name)
+        digest = content_hash(content)
+        extension = os.path.splitext(name)[1].lower()
+        name = posixpath.join(posixpath.dirname(name), digest[:2], digest + extension)
+        if self.exists(name):
+            return name
+        return super().save(name, content, max_length=max_length)
+
+    def save_exact(self, name, content):
+        """Store ``content`` under ``name`` itself (derived files)"""
+        return super().save(name, content)
+
+
+# Variant names
+
+
+def fallback_format(name):
+    extension = os.path.splitext(name)[1].lower()
+    return "png" if extension in TRANSPARENT_EXTENSIONS else "jpeg"
+
+
+def variant_name(name, width, image_format):
+    stem = os.path.splitext(name)[0]
+    return f"{stem}.{width}w.{FORMAT_EXTENSIONS[image_format]}"
+
+
+# Names whose variants are known to be stored; stored files are never removed
+_rendered = set()
+
+
+def variant_urls(name, storage=None):
+    """
+    ``{"160w": {"webp": url, "jpeg": url}, ...}`` for a stored image, or None
+    while its variants have not been created yet
+    """
+    storage = storage or default_storage
+    if name not in _rendered:
+        if not storage.exists(_completion_marker(name)):
+            return None
+        _rendered.add(name)
+    formats = ("webp", fallback_format(name))
+    return {
+        f"{width}w": {
+            image_format: storage.url(variant_name(name, width, image_format))
+            for image_format in formats
+        }
+        for width in VARIANT_WIDTHS
+    }
+
+
+def _completion_marker(name):
+    # Written last, so its presence means every variant is in place
+    return variant_name(name, VARIANT_WIDTHS[-1], "webp")
+
+
+# Rendering
+
+
+def render_variants(data, widths, fallback):
+    """
+    Encode ``data`` at each of ``widths`` as WebP and ``fallback``; returns
+    ``{(width, format): bytes}``. Runs in worker processes, so it must not
+    touch Django.
+    """
+    with Image.open(io.BytesIO(data)) as original:
+        image = ImageOps.exif_transpose(original)
+        image = image.convert("RGBA" if fallback == "png" else "RGB")
+
+    rendered = {}
+    for width in widths:
+        resized = image
+        if image.width > width:
+            height = max(1, round(image.height * width / image.width))
+            resized = image.resize((width, height), Image.Resampling.LANCZOS)
+        for image_format in ("webp", fallback):
+            output = io.BytesIO()
+            if image_format == "png":
+                resized.save(output, "PNG", optimize=True)
+            else:
+                resized.save(output, image_format.upper(), quality=VARIANT_QUALITY)
+            rendered[width, image_format] = output.getvalue()
+    return rendered
+
+
+def store_variants(storage, name, rendered):
+    save = getattr(storage, "save_exact", storage.save)
+    marker = _completion_marker(name)
+    names = {
+        variant_name(name, width, image_format): data
+        for (width, image_format), data in rendered.items()
+    }
+    for target in sorted(names, key=lambda target: target == marker):
+        if not storage.exists(target):
+            save(target, ContentFile(names[target]))
+    variants_stored.send(sender=None, names=[name])
+
+
+def _variants_rendered(storage, name, future):
+    try:
+        store_variants(storage, name, future.result())
+    except Exception:
+        logger.exception("Could not create variants of %s", name)
+
+
+def _variants_rendered_async(storage, name, future):
+    # Runs on the pool's result thread; receivers of variants_stored may have
+    # opened database connections there
+    try:
+        _variants_rendered(storage, name, future)
+    finally:
+        connections.close_all()
+
+
+_executor = None
+
+START_METHOD = (
+    "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+)
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        # Workers only run render_variants() on bytes; they are started from a
+        # clean process rather than forked from this threaded server process
+        _executor = ProcessPoolExecutor(
+            max_workers=settings.IMAGE_PROCESSING_WORKERS,
+            mp_context=multiprocessing.get_context(START_METHOD),
+        )
+    return _executor
+
+
+def _submit(data, fallback):
+    global _executor
+    try:
+        return _get_executor().submit(render_variants, data, VARIANT_WIDTHS, fallback)
+    except BrokenProcessPool:
+        # A worker died (e.g. killed while decoding a huge image); start over
+        _executor = None
+        return _get_executor().submit(render_variants, data, VARIANT_WIDTHS, fallback)
+
+
+def pending_images(names, storage=None):
+    """Names among ``names`` whose variants have not been created yet"""
+    storage = storage or default_storage
+    return [name for name in names if not storage.exists(_completion_marker(name))]
+
+
+def process_images(names, storage=None, wait=False):
+    """
+    Create the missing variants of the images stored under ``names``;
+    returns how many images were submitted. With ``wait`` the call returns
+    once every variant is stored.
+    """
+    storage = storage or default_storage
+    inline = settings.IMAGE_PROCESSING_WORKERS <= 0
+    submitted = []
+    for name in pending_images(sorted(set(names)), storage):
+        try:
+            with storage.open(name, "rb") as source:
+                data = source.read()
+        except FileNotFoundError:
+            logger.warning("Image %s is missing from storage", name)
+            continue
+
+        fallback = fallback_format(name)
+        if inline:
+            try:
+                store_variants(
+                    storage, name, render_variants(data, VARIANT_WIDTHS, fallback)
+                )
+            except Exception:
+                logger.exception("Could not create variants of %s", name)
+            submitted.append((name, None))
+            continue
+
+        future = _submit(data, fallback)
+        if not wait:
+            future.add_done_callback(partial(_variants_rendered_async, storage, name))
+        submitted.append((name, future))
+
+    if wait:
+        for name, future in submitted:
+            if future is not None:
+                _variants_rendered(storage, name, future)
+    return len(submitted)
+
+
+# Processing uploads
+
+
+def image_saved(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw:
+        return
+    names = [
+        getattr(instance, field).name
+        for field in IMAGE_FIELDS[sender._meta.label]
+        if (update_fields is None or field in update_fields)
+        and getattr(instance, field)
+    ]
+    if names:
+        # Stored files already have variants; process_images() skips them
+        defer_until_commit("image_variants", names, process_images, unique=True)
+
+
+def touch_owners(sender, names, **kwargs):
+    """
+    Touch ``updated_at`` of the rows using ``names``, whose version stamps
+    (and ETags) would otherwise still match responses without the variants
+    """
+    now = timezone.now()
+    for label, fields in IMAGE_FIELDS.items():
+        model = apps.get_model(label)
+        if not any(field.name == "updated_at" for field in model._meta.concrete_fields):
+            continue
+        for field in fields:
+            prefix = model._meta.get_field(field).upload_to
+            matching = [name for name in names if name.startswith(prefix)]
+            if matching:
+                model.objects.filter(**{f"{field}__in": matching}).update(
+                    updated_at=now
+                )
+
+
+for label in IMAGE_FIELDS:
+    post_save.connect(image_saved, sender=label, dispatch_uid=f"image_variants_{label}")
+
+variants_stored.connect(touch_owners, dispatch_uid="image_variants_touch_owners")
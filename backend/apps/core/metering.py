@@ -0,0 +1,302 @@
+"""
+API usage metering and rate limiting
+
+ApiMeteringMiddleware records every API request (user, organization and
+endpoint) by appending a tuple to an in-process deque: an atomic append, no
+lock, no cache or database round trip. A background thread flushes the
+buffer every API_METERING_FLUSH_INTERVAL seconds (started by the first metered
+request, so management commands never start it), adding the aggregated
+counts to per-day counters in the cache with one incr per counter, so all
+workers share the totals. rollup() copies those counters into ApiUsageDaily;
+it runs with every platform metrics refresh (apps/organizations/metrics.py),
+which also reads api_calls_today from the cache.
+
+ApiRateThrottle (apps/core/throttling.py) enforces
+PlatformSettings.api_rate_limit requests per hour with an in-process token
+bucket per user (or IP address). Bucket updates are not synchronized either,
+so concurrent requests of one client may now and then spend the same token.
+On each flush a user's bucket is also debited by the requests other workers
+served them, learned from the shared counters, so the limit holds across
+processes to within one flush interval.
+
+Anonymous clients (the marketplace) are limited per IP address as DRF's
+get_ident() reports it. Behind a reverse proxy set NUM_PROXIES to the number
+of proxies: left unset, the whole X-Forwarded-For header is the client's
+identity, which clients can vary to dodge the limit; 0 would put every visitor
+in the proxy's single bucket.
+"""
+
+import atexit
+import logging
+import threading
+import time
+from collections import Counter, deque
+from datetime import datetime, timedelta
+from datetime import timezone as dt_timezone
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.utils import timezone
+from django.utils.functional import SimpleLazyObject, empty
+
+from .models import ApiUsageDaily, PlatformSettings
+
+logger = logging.getLogger(__name__)
+
+API_PREFIX = "/api/"
+
+# Counters outlive their day so the last rollup of a day still finds them
+COUNTER_TIMEOUT = 60 * 60 * 48
+COUNTER_KEY = "api_usage:{date}:{scope}:{key}"
+# (scope, key) pairs counted on a day, for rollup()
+INDEX_KEY = "api_usage:{date}:index"
+
+# Requests buffered between flushes; the oldest are dropped beyond this
+MAX_PENDING = 100_000
+
+# api_rate_limit is a number of requests per this many seconds
+RATE_WINDOW = 60 * 60
+# Seconds between reloads of PlatformSettings.api_rate_limit
+RATE_LIMIT_REFRESH = 60
+
+# URL names whose pk is an organization
+ORGANIZATION_ROUTES = ("organizations-", "organization-", "marketplace-")
+
+_pending = deque(maxlen=MAX_PENDING)
+
+
+def _organization_id(request, match):
+    organization_id = request.GET.get("organization", "")
+    if organization_id.isdigit():
+        return int(organization_id)
+    if match and match.url_name and match.url_name.startswith(ORGANIZATION_ROUTES):
+        return match.kwargs.get("pk")
+    return None
+
+
+def record_request(request):
+    """Count one API request; called by ApiMeteringMiddleware"""
+    start()
+    user = getattr(request, "user", None)
+    # Don't load a session user only to meter a request nobody authenticated
+    if type(user) is SimpleLazyObject and user._wrapped is empty:
+        user_id = None
+    else:
+        user_id = user.pk if user is not None and user.is_authenticated else None
+    match = request.resolver_match
+    _pending.append(
+        (
+            time.time(),
+            user_id,
+            _organization_id(request, match),
+            match.view_name if match else "unresolved",
+        )
+    )
+
+
+def drain():
+    """``{(date, scope, key): count}`` of the requests recorded so far"""
+    counts = Counter()
+    # Local dates by minute; converting each timestamp is the slow part
+    days = {}
+    while True:
+        try:
+            timestamp, user_id, organization_id, endpoint = _pending.popleft()
+        except IndexError:
+            return counts
+        minute = int(timestamp // 60)
+        day = days.get(minute)
+        if day is None:
+            day = days[minute] = timezone.localdate(
+                datetime.fromtimestamp(minute * 60, tz=dt_timezone.utc)
+            )
+        counts[day, "total", ""] += 1
+        counts[day, "endpoint", endpoint] += 1
+        if user_id is not None:
+            counts[day, "user", str(user_id)] += 1
+        if organization_id is not None:
+            counts[day, "organization", str(organization_id)] += 1
+
+
+def _add(cache_key, delta):
+    """Add ``delta`` to a shared counter and return its new value"""
+    cache.add(cache_key, 0, COUNTER_TIMEOUT)
+    try:
+        return cache.incr(cache_key, delta)
+    except ValueError:
+        # Evicted between add() and incr()
+        cache.set(cache_key, delta, COUNTER_TIMEOUT)
+        return delta
+
+
+def flush():
+    """Add the recorded requests to the shared cache counters; returns how many"""
+    counts = drain()
+    indexed = {}
+    for (day, scope, key), delta in counts.items():
+        total = _add(COUNTER_KEY.format(date=day, scope=scope, key=key), delta)
+        if scope == "user":
+            limiter.observe(day, key, total, delta)
+        indexed.setdefault(day, set()).add((scope, key))
+    for day, keys in indexed.items():
+        index_key = INDEX_KEY.format(date=day)
+        index = cache.get(index_key, set())
+        if not keys <= index:
+            cache.set(index_key, index | keys, COUNTER_TIMEOUT)
+    limiter.prune()
+    return sum(delta for (day, scope, key), delta in counts.items() if scope == "total")
+
+
+def rollup(days=2):
+    """Copy the cache counters of the last ``days`` days into ApiUsageDaily"""
+    today = timezone.localdate()
+    rows = []
+    for day in (today - timedelta(days=offset) for offset in range(days)):
+        index = cache.get(INDEX_KEY.format(date=day))
+        if not index:
+            continue
+        keys = {
+            COUNTER_KEY.format(date=day, scope=scope, key=key): (scope, key)
+            for scope, key in index
+        }
+        for cache_key, count in cache.get_many(keys).items():
+            scope, key = keys[cache_key]
+            rows.append(ApiUsageDaily(date=day, scope=scope, key=key, count=count))
+    if rows:
+        ApiUsageDaily.objects.bulk_create(
+            rows,
+            update_conflicts=True,
+            unique_fields=["date", "scope", "key"],
+            update_fields=["count", "updated_at"],
+        )
+    return len(rows)
+
+
+def calls_today():
+    """API requests served today (as of the last flush of each worker)"""
+    today = timezone.localdate()
+    count = cache.get(COUNTER_KEY.format(date=today, scope="total", key=""))
+    if count is None:
+        # Cache cleared since the last rollup
+        count = (
+            ApiUsageDaily.objects.filter(date=today, scope="total", key="")
+            .values_list("count", flat=True)
+            .first()
+        )
+    return count or 0
+
+
+class TokenBuckets:
+    """
+    Per-client token buckets holding up to ``rate_limit`` tokens, refilled
+    at ``rate_limit`` tokens per RATE_WINDOW
+    """
+
+    def __init__(self, rate_limit):
+        self.rate_limit = rate_limit
+        # client -> [tokens, monotonic time of the last update]
+        self._buckets = {}
+        # (date, user id) -> the shared counter as of this worker's last flush
+        self._seen = {}
+
+    def _refill(self, client, now):
+        bucket = self._buckets.get(client)
+        if bucket is None:
+            bucket = self._buckets.setdefault(client, [float(self.rate_limit), now])
+        refill = (now - bucket[1]) * self.rate_limit / RATE_WINDOW
+        bucket[0] = min(self.rate_limit, bucket[0] + refill)
+        bucket[1] = now
+        return bucket
+
+    def take(self, client):
+        """Spend a token; 0 if there was one, else seconds until there is"""
+        bucket = self._refill(client, time.monotonic())
+        if bucket[0] >= 1:
+            bucket[0] -= 1
+            return 0
+        return (1 - bucket[0]) * RATE_WINDOW / self.rate_limit
+
+    def observe(self, day, user_id, total, own):
+        """
+        Debit the user's bucket by the requests other workers served them
+        since the last flush: the counter grew by ``total - seen``, ``own``
+        of which were ours
+        """
+        seen = self._seen.get((day, user_id))
+        self._seen[day, user_id] = total
+        if seen is not None and total - seen > own:
+            bucket = self._refill(f"user:{user_id}", time.monotonic())
+            bucket[0] -= total - seen - own
+
+    def prune(self):
+        """Forget full buckets (a new bucket starts full) and past days"""
+        now, today = time.monotonic(), timezone.localdate()
+        for client, (tokens, updated) in list(self._buckets.items()):
+            if (
+                tokens + (now - updated) * self.rate_limit / RATE_WINDOW
+                >= self.rate_limit
+            ):
+                self._buckets.pop(client, None)
+        for day, user_id in list(self._seen):
+            if day != today:
+                self._seen.pop((day, user_id), None)
+
+
+limiter = TokenBuckets(PlatformSettings._meta.get_field("api_rate_limit").default)
+
+
+def load_rate_limit():
+    rate_limit = PlatformSettings.objects.values_list(
+        "api_rate_limit", flat=True
+    ).first()
+    if rate_limit and rate_limit > 0:
+        limiter.rate_limit = rate_limit
+
+
+def _flush_at_exit():
+    pending = len(_pending)
+    if not pending:
+        return
+    try:
+        flush()
+    except Exception as e:
+        # The cache may be gone by now; not worth a traceback on shutdown
+        logger.warning("Could not flush %d API usage records at exit: %s", pending, e)
+
+
+def _flush_periodically():
+    next_load = 0
+    while True:
+        interval = settings.API_METERING_FLUSH_INTERVAL
+        time.sleep(interval if interval > 0 else 1)
+        if interval <= 0:
+            continue
+        try:
+            flush()
+            if time.monotonic() >= next_load:
+                next_load = time.monotonic() + RATE_LIMIT_REFRESH
+                load_rate_limit()
+        except Exception:
+            logger.exception("Could not flush API usage counters")
+        finally:
+            # Don't hold a database connection between loads
+            connections.close_all()
+
+
+_flusher = None
+_flusher_lock = threading.Lock()
+
+
+def start():
+    """Start this process's flush thread, once"""
+    global _flusher
+    if _flusher is not None:
+        return
+    with _flusher_lock:
+        if _flusher is None:
+            _flusher = threading.Thread(
+                target=_flush_periodically, name="api-metering", daemon=True
+            )
+            _flusher.start()
+            atexit.register(_flush_at_exit)
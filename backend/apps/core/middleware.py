@@ -0,0 +1,39 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from . import metering
+
+
+class ApiMeteringMiddleware:
+    """
+    Count API requests per user, organization and endpoint for usage
+    metrics and rate limiting (see apps/core/metering.py).
+
+    Requests are recorded after the response so that the user DRF resolved
+    from the token is known; recording only appends to an in-process buffer.
+    Async-capable, so ASGI requests (apps/organizations/async_views.py) pass
+    through without a thread switch.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        response = self.get_response(request)
+        self.record(request)
+        return response
+
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        self.record(request)
+        return response
+
+    def record(self, request):
+        if request.path.startswith(metering.API_PREFIX):
+            metering.record_request(request)
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-19 01:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0001_multi_tenant_architecture"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="organization",
+            name="menu_version",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
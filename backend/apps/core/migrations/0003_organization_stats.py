@@ -0,0 +1,103 @@
+# Generated by Django 5.2.7 on 2026-10-19 02:15
+
+from decimal import ROUND_HALF_UP, Decimal
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Max, Min, Sum
+
+
+def backfill_stats(apps, schema_editor):
+    Organization = apps.get_model("core", "Organization")
+    OrganizationStats = apps.get_model("core", "OrganizationStats")
+    Hall = apps.get_model("core", "Hall")
+    HallReview = apps.get_model("core", "HallReview")
+    Booking = apps.get_model("bookings", "Booking")
+
+    stats = {
+        organization_id: OrganizationStats(organization_id=organization_id)
+        for organization_id in Organization.objects.values_list("id", flat=True)
+    }
+    for organization_id, count in (
+        Booking.objects.order_by()
+        .values("organization_id")
+        .annotate(count=Count("id"))
+        .values_list("organization_id", "count")
+    ):
+        stats[organization_id].total_bookings = count
+    for organization_id, count, min_price, max_capacity in (
+        Hall.objects.filter(is_active=True)
+        .order_by()
+        .values("organization_id")
+        .annotate(
+            count=Count("id"), min_price=Min("base_price"), max_capacity=Max("capacity")
+        )
+        .values_list("organization_id", "count", "min_price", "max_capacity")
+    ):
+        row = stats[organization_id]
+        row.active_halls, row.min_price, row.max_capacity = (
+            count,
+            min_price,
+            max_capacity,
+        )
+    for organization_id, count, rating_total in (
+        HallReview.objects.filter(is_approved=True)
+        .order_by()
+        .values("hall__organization_id")
+        .annotate(count=Count("id"), rating_total=Sum("rating"))
+        .values_list("hall__organization_id", "count", "rating_total")
+    ):
+        row = stats[organization_id]
+        row.review_count, row.rating_total = count, rating_total
+        row.avg_rating = (Decimal(rating_total) / count).quantize(
+            Decimal("0.01"), rounding=ROUND_HALF_UP
+        )
+    OrganizationStats.objects.bulk_create(stats.values(), batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0002_organization_menu_version"),
+        ("bookings", "0001_multi_tenant_bookings"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="OrganizationStats",
+            fields=[
+                (
+                    "organization",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="stats",
+                        serialize=False,
+                        to="core.organization",
+                    ),
+                ),
+                ("total_bookings", models.PositiveIntegerField(default=0)),
+                ("active_halls", models.PositiveIntegerField(default=0)),
+                ("review_count", models.PositiveIntegerField(default=0)),
+                ("rating_total", models.PositiveIntegerField(default=0)),
+                (
+                    "avg_rating",
+                    models.DecimalField(
+                        blank=True, decimal_places=2, max_digits=3, null=True
+                    ),
+                ),
+                (
+                    "min_price",
+                    models.DecimalField(
+                        blank=True, decimal_places=2, max_digits=10, null=True
+                    ),
+                ),
+                ("max_capacity", models.PositiveIntegerField(blank=True, null=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "verbose_name_plural": "Organization Stats",
+            },
+        ),
+        migrations.RunPython(backfill_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,82 @@
+# Generated by Django 5.2.7 on 2026-10-19 02:19
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_entries(apps, schema_editor):
+    # entry_values() is a pure function of a HALL_COLUMNS row
+    from apps.core.venue_search import HALL_COLUMNS, entry_values
+
+    Hall = apps.get_model("core", "Hall")
+    VenueSearchEntry = apps.get_model("core", "VenueSearchEntry")
+    rows = (
+        Hall.objects.filter(is_active=True, organization__status="active")
+        .order_by()
+        .values(*HALL_COLUMNS)
+    )
+    VenueSearchEntry.objects.bulk_create(
+        [VenueSearchEntry(**entry_values(row)) for row in rows], batch_size=500
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0003_organization_stats"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="VenueSearchEntry",
+            fields=[
+                (
+                    "hall",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="search_entry",
+                        serialize=False,
+                        to="core.hall",
+                    ),
+                ),
+                ("city", models.CharField(max_length=100)),
+                ("state", models.CharField(max_length=100)),
+                ("country", models.CharField(max_length=100)),
+                ("subscription_plan", models.CharField(max_length=20)),
+                ("hall_type", models.CharField(max_length=20)),
+                ("capacity", models.PositiveIntegerField()),
+                ("base_price", models.DecimalField(decimal_places=2, max_digits=10)),
+                ("price_bucket", models.PositiveSmallIntegerField()),
+                ("amenity_flags", models.PositiveIntegerField(default=0)),
+                ("search_text", models.TextField()),
+                (
+                    "organization",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="search_entries",
+                        to="core.organization",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name_plural": "Venue Search Entries",
+                "indexes": [
+                    models.Index(
+                        fields=["city", "capacity"], name="core_venues_city_a2da9d_idx"
+                    ),
+                    models.Index(
+                        fields=["capacity", "base_price"],
+                        name="core_venues_capacit_fc95d4_idx",
+                    ),
+                    models.Index(
+                        fields=["base_price"], name="core_venues_base_pr_b9be64_idx"
+                    ),
+                    models.Index(
+                        fields=["amenity_flags"], name="core_venues_amenity_66bdde_idx"
+                    ),
+                ],
+            },
+        ),
+        migrations.RunPython(backfill_entries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,142 @@
+# Generated by Django 5.2.7 on 2026-10-19 02:24
+
+from collections import Counter
+from decimal import ROUND_HALF_UP, Decimal
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count
+
+# (app, model, rating field, organization path, hall path)
+REVIEW_SOURCES = (
+    ("core", "HallReview", "rating", "hall__organization_id", "hall_id"),
+    (
+        "bookings",
+        "BookingReview",
+        "overall_rating",
+        "booking__organization_id",
+        "booking__hall_id",
+    ),
+    ("menu", "MenuReview", "rating", "menu_item__organization_id", None),
+)
+
+
+def backfill_ratings(apps, schema_editor):
+    OrganizationStats = apps.get_model("core", "OrganizationStats")
+    HallRating = apps.get_model("core", "HallRating")
+    Hall = apps.get_model("core", "Hall")
+
+    # {(organization or hall, id): Counter(stars -> reviews)}
+    histograms = {}
+    for app_label, model_name, rating, organization, hall in REVIEW_SOURCES:
+        model = apps.get_model(app_label, model_name)
+        for kind, path in (("organization", organization), ("hall", hall)):
+            if path is None:
+                continue
+            for key, stars, count in (
+                model.objects.filter(is_approved=True, **{f"{path}__isnull": False})
+                .order_by()
+                .values(path, rating)
+                .annotate(count=Count("pk"))
+                .values_list(path, rating, "count")
+            ):
+                histograms.setdefault((kind, key), Counter())[stars] += count
+
+    def apply(row, histogram):
+        row.review_count = sum(histogram.values())
+        row.rating_total = sum(stars * count for stars, count in histogram.items())
+        for stars in range(1, 6):
+            setattr(row, f"stars_{stars}", histogram[stars])
+        row.avg_rating = None
+        if row.review_count:
+            row.avg_rating = (Decimal(row.rating_total) / row.review_count).quantize(
+                Decimal("0.01"), rounding=ROUND_HALF_UP
+            )
+
+    fields = [
+        "review_count",
+        "rating_total",
+        "avg_rating",
+        *(f"stars_{stars}" for stars in range(1, 6)),
+    ]
+    rows = list(OrganizationStats.objects.all())
+    for row in rows:
+        apply(row, histograms.get(("organization", row.organization_id), Counter()))
+    OrganizationStats.objects.bulk_update(rows, fields, batch_size=500)
+
+    ratings = []
+    for hall_id in Hall.objects.values_list("id", flat=True):
+        rating = HallRating(hall_id=hall_id)
+        apply(rating, histograms.get(("hall", hall_id), Counter()))
+        ratings.append(rating)
+    HallRating.objects.bulk_create(ratings, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0004_venue_search"),
+        ("bookings", "0001_multi_tenant_bookings"),
+        ("menu", "0001_multi_tenant_menu"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="HallRating",
+            fields=[
+                ("review_count", models.PositiveIntegerField(default=0)),
+                ("rating_total", models.PositiveIntegerField(default=0)),
+                (
+                    "avg_rating",
+                    models.DecimalField(
+                        blank=True, decimal_places=2, max_digits=3, null=True
+                    ),
+                ),
+                ("stars_1", models.PositiveIntegerField(default=0)),
+                ("stars_2", models.PositiveIntegerField(default=0)),
+                ("stars_3", models.PositiveIntegerField(default=0)),
+                ("stars_4", models.PositiveIntegerField(default=0)),
+                ("stars_5", models.PositiveIntegerField(default=0)),
+                (
+                    "hall",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="rating_summary",
+                        serialize=False,
+                        to="core.hall",
+                    ),
+                ),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "abstract": False,
+            },
+        ),
+        migrations.AddField(
+            model_name="organizationstats",
+            name="stars_1",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="organizationstats",
+            name="stars_2",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="organizationstats",
+            name="stars_3",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="organizationstats",
+            name="stars_4",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="organizationstats",
+            name="stars_5",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_ratings, migrations.RunPython.noop),
+    ]
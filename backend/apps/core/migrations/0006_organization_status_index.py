@@ -0,0 +1,19 @@
+# Generated by Django 5.2.7 on 2026-10-19 02:28
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0005_ratings"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="organization",
+            index=models.Index(fields=["status"], name="core_organi_status_65d0dc_idx"),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.7 on 2026-10-19 02:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0006_organization_status_index"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PlatformDailyMetrics",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("date", models.DateField(unique=True)),
+                ("total_users", models.PositiveIntegerField(default=0)),
+                ("active_users", models.PositiveIntegerField(default=0)),
+                ("new_users", models.PositiveIntegerField(default=0)),
+                ("total_organizations", models.PositiveIntegerField(default=0)),
+                ("active_organizations", models.PositiveIntegerField(default=0)),
+                ("pending_organizations", models.PositiveIntegerField(default=0)),
+                ("new_organizations", models.PositiveIntegerField(default=0)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "verbose_name_plural": "Platform Daily Metrics",
+                "ordering": ["-date"],
+            },
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 5.2.7 on 2026-10-19 02:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0007_platform_daily_metrics"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="platformsettings",
+            name="api_rate_limit",
+            field=models.IntegerField(
+                default=1000,
+                help_text="Requests per hour allowed per user (per IP address when anonymous)",
+            ),
+        ),
+        migrations.CreateModel(
+            name="ApiUsageDaily",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("date", models.DateField()),
+                (
+                    "scope",
+                    models.CharField(
+                        choices=[
+                            ("total", "Total"),
+                            ("user", "User"),
+                            ("organization", "Organization"),
+                            ("endpoint", "Endpoint"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                ("key", models.CharField(blank=True, max_length=200)),
+                ("count", models.PositiveBigIntegerField(default=0)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "verbose_name_plural": "API Usage Daily",
+                "ordering": ["-date", "scope", "-count"],
+                "unique_together": {("date", "scope", "key")},
+            },
+        ),
+    ]
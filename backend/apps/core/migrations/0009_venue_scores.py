@@ -0,0 +1,53 @@
+# Generated by Django 5.2.7 on 2026-10-19 02:41
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0008_api_usage_daily"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="organizationstats",
+            name="ranking_score",
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name="VenueScore",
+            fields=[
+                (
+                    "hall",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="score",
+                        serialize=False,
+                        to="core.hall",
+                    ),
+                ),
+                ("score", models.FloatField()),
+                ("velocity", models.FloatField()),
+                ("conversion", models.FloatField()),
+                ("rating", models.FloatField()),
+                ("price", models.FloatField()),
+                ("computed_at", models.DateTimeField()),
+                (
+                    "organization",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="venue_scores",
+                        to="core.organization",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(fields=["-score"], name="core_venues_score_29cb96_idx")
+                ],
+            },
+        ),
+    ]
@@ -55,6 +55,10 @@ class Organization(models.Model):
         help_text="Platform commission percentage",
     )
 
+    # Bumped on every change to the public menu; keys the marketplace menu
+    # snapshots (see apps/menu/snapshots.py)
+    menu_version = models.PositiveIntegerField(default=0, editable=False)
+
     # Media
     logo = models.ImageField(upload_to="organizations/logos/", blank=True, null=True)
     cover_image = models.ImageField(
@@ -68,6 +72,8 @@ class Organization(models.Model):
 
     class Meta:
         ordering = ["name"]
+        # Tenant visibility: status = 'active' OR id IN (...)
+        indexes = [models.Index(fields=["status"])]
 
     def __str__(self):
         return self.name
@@ -85,6 +91,56 @@ class Organization(models.Model):
     # to avoid conflicts with the annotated fields
 
 
+class RatingSummary(models.Model):
+    """Approved review counters and a 1-5 star histogram"""
+
+    review_count = models.PositiveIntegerField(default=0)
+    rating_total = models.PositiveIntegerField(default=0)
+    avg_rating = models.DecimalField(
+        max_digits=3, decimal_places=2, null=True, blank=True
+    )
+    stars_1 = models.PositiveIntegerField(default=0)
+    stars_2 = models.PositiveIntegerField(default=0)
+    stars_3 = models.PositiveIntegerField(default=0)
+    stars_4 = models.PositiveIntegerField(default=0)
+    stars_5 = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        abstract = True
+
+    @property
+    def histogram(self):
+        return {stars: getattr(self, f"stars_{stars}") for stars in range(1, 6)}
+
+
+class OrganizationStats(RatingSummary):
+    """
+    Denormalized listing figures for an organization, kept up to date by
+    apps/core/stats.py as bookings, halls and reviews change. The rating
+    fields cover approved hall, booking and menu reviews.
+    """
+
+    organization = models.OneToOneField(
+        Organization, on_delete=models.CASCADE, primary_key=True, related_name="stats"
+    )
+    total_bookings = models.PositiveIntegerField(default=0)
+    active_halls = models.PositiveIntegerField(default=0)
+    # Over active halls
+    min_price = models.DecimalField(
+        max_digits=10, decimal_places=2, null=True, blank=True
+    )
+    max_capacity = models.PositiveIntegerField(null=True, blank=True)
+    # Best VenueScore of its halls, set by apps/core/ranking.py
+    ranking_score = models.FloatField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = "Organization Stats"
+
+    def __str__(self):
+        return f"{self.organization.name} - stats"
+
+
 class OrganizationMember(models.Model):
     """Staff members of an organization"""
 
@@ -245,6 +301,85 @@ class HallReview(models.Model):
         return f"{self.hall.name} - {self.customer.get_full_name()} ({self.rating}★)"
 
 
+class HallRating(RatingSummary):
+    """
+    Rating of a hall from its approved hall reviews and the reviews of
+    bookings held in it; kept up to date by apps/core/stats.py
+    """
+
+    hall = models.OneToOneField(
+        Hall, on_delete=models.CASCADE, primary_key=True, related_name="rating_summary"
+    )
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.hall.name} - rating"
+
+
+class VenueSearchEntry(models.Model):
+    """
+    Denormalized marketplace search row for an active hall of an active
+    organization; maintained by apps/core/venue_search.py
+    """
+
+    hall = models.OneToOneField(
+        Hall, on_delete=models.CASCADE, primary_key=True, related_name="search_entry"
+    )
+    organization = models.ForeignKey(
+        Organization, on_delete=models.CASCADE, related_name="search_entries"
+    )
+    # Lower-cased for case-insensitive equality filters and facets
+    city = models.CharField(max_length=100)
+    state = models.CharField(max_length=100)
+    country = models.CharField(max_length=100)
+    subscription_plan = models.CharField(max_length=20)
+    hall_type = models.CharField(max_length=20)
+    capacity = models.PositiveIntegerField()
+    base_price = models.DecimalField(max_digits=10, decimal_places=2)
+    price_bucket = models.PositiveSmallIntegerField()
+    amenity_flags = models.PositiveIntegerField(default=0)
+    # Lower-cased organization and hall names, descriptions and amenities
+    search_text = models.TextField()
+
+    class Meta:
+        verbose_name_plural = "Venue Search Entries"
+        indexes = [
+            models.Index(fields=["city", "capacity"]),
+            models.Index(fields=["capacity", "base_price"]),
+            models.Index(fields=["base_price"]),
+            models.Index(fields=["amenity_flags"]),
+        ]
+
+    def __str__(self):
+        return f"Search entry for hall {self.hall_id}"
+
+
+class VenueScore(models.Model):
+    """
+    Marketplace ranking score of a hall and its 0-1 components, recomputed
+    periodically by apps/core/ranking.py
+    """
+
+    hall = models.OneToOneField(
+        Hall, on_delete=models.CASCADE, primary_key=True, related_name="score"
+    )
+    organization = models.ForeignKey(
+        Organization, on_delete=models.CASCADE, related_name="venue_scores"
+    )
+    score = models.FloatField()
+    velocity = models.FloatField()
+    conversion = models.FloatField()
+    rating = models.FloatField()
+    price = models.FloatField()
+    computed_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [models.Index(fields=["-score"])]
+
+    def __str__(self):
+        return f"Score of hall {self.hall_id}: {self.score:.3f}"
+
+
 class DiscountTier(models.Model):
     """Guest-based discount tiers for an organization"""
 
@@ -279,6 +414,23 @@ class DiscountTier(models.Model):
         if self.max_guests <= self.min_guests:
             raise ValidationError("Max guests must be greater than min guests")
 
+        if self.is_active and self.organization_id:
+            overlapping = (
+                DiscountTier.objects.filter(
+                    organization_id=self.organization_id,
+                    is_active=True,
+                    min_guests__lte=self.max_guests,
+                    max_guests__gte=self.min_guests,
+                )
+                .exclude(pk=self.pk)
+                .first()
+            )
+            if overlapping:
+                raise ValidationError(
+                    f"Guest range overlaps the active tier '{overlapping.name}' "
+                    f"({overlapping.min_guests}-{overlapping.max_guests} guests)"
+                )
+
     def __str__(self):
         return f"{self.organization.name} - {self.name} ({self.min_guests}-{self.max_guests} guests, {self.discount_percentage}% off)"
 
@@ -358,7 +510,10 @@ class PlatformSettings(models.Model):
     maintenance_message = models.TextField(blank=True)
 
     # API Settings
-    api_rate_limit = models.IntegerField(default=1000)
+    api_rate_limit = models.IntegerField(
+        default=1000,
+        help_text="Requests per hour allowed per user (per IP address when anonymous)",
+    )
 
     # User Management
     allow_user_registration = models.BooleanField(default=True)
@@ -381,6 +536,59 @@ class PlatformSettings(models.Model):
         super().save(*args, **kwargs)
 
 
+class PlatformDailyMetrics(models.Model):
+    """
+    Platform counters as of the last refresh of a day, for admin trend
+    charts; written by apps/organizations/metrics.py
+    """
+
+    date = models.DateField(unique=True)
+    total_users = models.PositiveIntegerField(default=0)
+    active_users = models.PositiveIntegerField(default=0)
+    new_users = models.PositiveIntegerField(default=0)
+    total_organizations = models.PositiveIntegerField(default=0)
+    active_organizations = models.PositiveIntegerField(default=0)
+    pending_organizations = models.PositiveIntegerField(default=0)
+    new_organizations = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ["-date"]
+        verbose_name_plural = "Platform Daily Metrics"
+
+    def __str__(self):
+        return f"Platform metrics {self.date}"
+
+
+class ApiUsageDaily(models.Model):
+    """
+    API requests of a day per user, organization and endpoint (and in total),
+    rolled up from the cache counters of apps/core/metering.py
+    """
+
+    SCOPE_CHOICES = [
+        ("total", "Total"),
+        ("user", "User"),
+        ("organization", "Organization"),
+        ("endpoint", "Endpoint"),
+    ]
+
+    date = models.DateField()
+    scope = models.CharField(max_length=20, choices=SCOPE_CHOICES)
+    # User or organization id, or view name; empty for the total
+    key = models.CharField(max_length=200, blank=True)
+    count = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ["-date", "scope", "-count"]
+        unique_together = ["date", "scope", "key"]
+        verbose_name_plural = "API Usage Daily"
+
+    def __str__(self):
+        return f"{self.date} {self.scope} {self.key}: {self.count}"
+
+
 # Signal to create UserProfile automatically
 from django.db.models.signals import post_save
 from django.dispatch import receiver
@@ -0,0 +1,272 @@
+"""
+Marketplace venue ranking and recommendations
+
+refresh() scores every active hall from four signals, each scaled to 0-1,
+and stores the weighted sum with its components in VenueScore (one narrow
+row per hall); each organization's best hall score goes to
+OrganizationStats.ranking_score for ``?ordering=-ranking_score`` listings.
+Run ``manage.py refresh_venue_scores`` periodically (e.g. hourly from cron):
+
+- velocity: bookings created in the last VELOCITY_DAYS, on a log scale
+  relative to the busiest hall
+- conversion: share of decided bookings that were confirmed or completed,
+  smoothed so a hall with one booking isn't scored 0 or 1
+- rating: HallRating average, shrunk towards RATING_PRIOR while reviews are
+  few
+- price: how cheap the hall is per seat among the halls of its city
+
+recommend() reads candidates from the marketplace search table
+(apps/core/venue_search.py) joined one-to-one to their scores, narrowed by
+the request's filters and ordered by the score plus boosts for the user's
+profile preferences (event types, budget, city), all in one query. When the
+request has a date window, one more query over the candidates' bookings
+drops fully booked halls and weighs the rest by the share of free days.
+"""
+
+import math
+from bisect import bisect_left
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Case, Count, F, FloatField, Q, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from apps.bookings.models import Booking
+from . import venue_search
+from .models import HallRating, OrganizationStats, VenueScore
+from .stats import _grouped
+
+WEIGHTS = {"velocity": 0.25, "conversion": 0.2, "rating": 0.35, "price": 0.2}
+
+VELOCITY_DAYS = 30
+# (mean, weight in reviews) a hall's average is shrunk towards
+RATING_PRIOR = (3.5, 5)
+
+WON = ("confirmed", "completed")
+DECIDED = ("confirmed", "completed", "cancelled", "no_show")
+# Bookings holding a hall's date
+HOLDING = ("pending", "confirmed")
+
+# Added to the score of halls matching the user's profile preferences
+PREFERENCE_BOOSTS = {"event_type": 0.1, "budget": 0.15, "city": 0.05}
+
+MAX_RECOMMENDATIONS = 50
+# Candidates read per recommendation, to refill the page after dropping
+# halls booked out in the date window
+CANDIDATE_FACTOR = 3
+MAX_WINDOW_DAYS = 31
+
+
+# Scoring
+
+
+def _velocity(recent, busiest):
+    return math.log1p(recent) / math.log1p(busiest) if busiest else 0.0
+
+
+def _conversion(won, decided):
+    return (won + 1) / (decided + 2)
+
+
+def _rating(rating_total, review_count):
+    mean, weight = RATING_PRIOR
+    average = (rating_total + mean * weight) / (review_count + weight)
+    return (average - 1) / 4
+
+
+def _price_scores(halls):
+    """{hall id: 1 for the cheapest per seat in its city .. 0 for the dearest}"""
+    by_city = {}
+    for hall in halls:
+        per_seat = hall["base_price"] / hall["capacity"]
+        by_city.setdefault(hall["organization__city"].strip().lower(), []).append(
+            (per_seat, hall["id"])
+        )
+    scores = {}
+    for entries in by_city.values():
+        prices = sorted(per_seat for per_seat, hall_id in entries)
+        for per_seat, hall_id in entries:
+            if len(prices) == 1:
+                scores[hall_id] = 0.5
+            else:
+                scores[hall_id] = 1 - bisect_left(prices, per_seat) / (len(prices) - 1)
+    return scores
+
+
+def compute_scores(now=None):
+    """Unsaved VenueScore rows of every marketplace hall"""
+    now = now or timezone.now()
+    halls = list(
+        venue_search.indexed_halls()
+        .order_by()
+        .values("id", "organization_id", "base_price", "capacity", "organization__city")
+    )
+    bookings = {
+        hall_id: (recent, won, decided)
+        for hall_id, recent, won, decided in _grouped(
+            Booking.objects.filter(hall__in=venue_search.indexed_halls()),
+            "hall_id",
+            recent=Count(
+                "id",
+                filter=Q(created_at__gte=now - timedelta(days=VELOCITY_DAYS))
+                & ~Q(status="cancelled"),
+            ),
+            won=Count("id", filter=Q(status__in=WON)),
+            decided=Count("id", filter=Q(status__in=DECIDED)),
+        )
+    }
+    ratings = {
+        hall_id: (rating_total, review_count)
+        for hall_id, rating_total, review_count in HallRating.objects.values_list(
+            "hall_id", "rating_total", "review_count"
+        )
+    }
+    busiest = max((recent for recent, _, _ in bookings.values()), default=0)
+    prices = _price_scores(halls)
+
+    scores = []
+    for hall in halls:
+        recent, won, decided = bookings.get(hall["id"], (0, 0, 0))
+        components = {
+            "velocity": _velocity(recent, busiest),
+            "conversion": _conversion(won, decided),
+            "rating": _rating(*ratings.get(hall["id"], (0, 0))),
+            "price": prices[hall["id"]],
+        }
+        components = {name: round(value, 4) for name, value in components.items()}
+        scores.append(
+            VenueScore(
+                hall_id=hall["id"],
+                organization_id=hall["organization_id"],
+                score=round(
+                    sum(WEIGHTS[name] * components[name] for name in WEIGHTS), 4
+                ),
+                computed_at=now,
+                **components,
+            )
+        )
+    return scores
+
+
+def refresh():
+    """Recompute every VenueScore and organization ranking score"""
+    scores = compute_scores()
+    best = {}
+    for row in scores:
+        best[row.organization_id] = max(row.score, best.get(row.organization_id, 0))
+    with transaction.atomic():
+        VenueScore.objects.all().delete()
+        VenueScore.objects.bulk_create(scores, batch_size=500)
+        # Only changed rows, so unchanged listings keep their cache validators
+        stats = [
+            row
+            for row in OrganizationStats.objects.filter(pk__in=best)
+            if row.ranking_score != best[row.pk]
+        ]
+        now = timezone.now()
+        for row in stats:
+            row.ranking_score, row.updated_at = best[row.pk], now
+        OrganizationStats.objects.bulk_update(
+            stats, ["ranking_score", "updated_at"], batch_size=500
+        )
+        OrganizationStats.objects.exclude(pk__in=best).exclude(
+            ranking_score=None
+        ).update(ranking_score=None, updated_at=now)
+    return len(scores)
+
+
+# Recommendations
+
+
+def preferences(user):
+    """The recommendation-relevant preferences of ``user``'s profile"""
+    profile = getattr(user, "userprofile", None) if user else None
+    if profile is None:
+        return {}
+    hall_types = set()
+    for event_type in profile.preferred_event_types.split(","):
+        hall_types.update(venue_search.EVENT_HALL_TYPES.get(event_type.strip(), ()))
+    return {
+        "hall_types": sorted(hall_types),
+        "budget_min": profile.budget_range_min,
+        "budget_max": profile.budget_range_max,
+        "city": profile.city.strip().lower(),
+    }
+
+
+def _boosts(wanted, params):
+    """Score boost expression over VenueSearchEntry for ``wanted`` preferences"""
+    boosts = []
+    if wanted.get("hall_types") and not params.get("event_type"):
+        boosts.append((Q(hall_type__in=wanted["hall_types"]), "event_type"))
+    budget = Q()
+    if wanted.get("budget_min") is not None:
+        budget &= Q(base_price__gte=wanted["budget_min"])
+    if wanted.get("budget_max") is not None:
+        budget &= Q(base_price__lte=wanted["budget_max"])
+    if budget:
+        boosts.append((budget, "budget"))
+    if wanted.get("city") and not params.get("city"):
+        boosts.append((Q(city=wanted["city"]), "city"))
+
+    expression = Value(0.0)
+    for condition, name in boosts:
+        expression += Case(
+            When(condition, then=Value(PREFERENCE_BOOSTS[name])),
+            default=Value(0.0),
+            output_field=FloatField(),
+        )
+    return expression
+
+
+def _free_share(hall_ids, date_from, date_to):
+    """{hall id: share of the window's days it has no pending/confirmed booking}"""
+    days = (date_to - date_from).days + 1
+    booked = dict(
+        _grouped(
+            Booking.objects.filter(
+                hall_id__in=hall_ids,
+                event_date__range=(date_from, date_to),
+                status__in=HOLDING,
+            ),
+            "hall_id",
+            days=Count("event_date", distinct=True),
+        )
+    )
+    return {hall_id: 1 - booked.get(hall_id, 0) / days for hall_id in hall_ids}
+
+
+def recommend(params, user=None, date_from=None, date_to=None, limit=10):
+    """
+    Up to ``limit`` halls matching validated search ``params``, best first,
+    each with its ``score``; raises ValueError for unknown amenities
+    """
+    entries = venue_search.filter_entries(params).alias(
+        base_score=Coalesce(F("hall__score__score"), Value(0.0)),
+    )
+    ranked = entries.annotate(
+        rank=F("base_score") + _boosts(preferences(user), params)
+    ).order_by("-rank", "base_price", "hall_id")
+    candidates = dict(ranked.values_list("hall_id", "rank")[: limit * CANDIDATE_FACTOR])
+    if date_from is not None:
+        free = _free_share(list(candidates), date_from, date_to)
+        candidates = {
+            hall_id: rank * free[hall_id]
+            for hall_id, rank in candidates.items()
+            if free[hall_id] > 0
+        }
+    chosen = sorted(candidates, key=lambda hall_id: -candidates[hall_id])[:limit]
+    if not chosen:
+        return []
+
+    results = {
+        result["id"]: result
+        for result in venue_search.result_page(
+            entries.filter(hall_id__in=chosen), limit=limit
+        )
+    }
+    return [
+        dict(results[hall_id], score=round(candidates[hall_id], 4))
+        for hall_id in chosen
+    ]
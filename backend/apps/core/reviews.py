@@ -0,0 +1,174 @@
+"""
+Merged review feed for marketplace pages
+
+Approved hall, booking and menu reviews live in three tables. A page of an
+organization's (or a hall's) reviews, newest first, is read with one query
+per table, each limited to the page size and starting after the cursor, and
+the sorted results are merged with heapq.merge; no query counts or skips over
+older reviews.
+
+Reviews are ordered by (created_at, source, id), descending, and the cursor
+is that key of the last review on the page, so pages stay stable while new
+reviews arrive. The rating summary next to the feed is read from the
+OrganizationStats / HallRating row (apps/core/stats.py).
+"""
+
+import base64
+import heapq
+from itertools import islice
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+from apps.bookings.models import BookingReview
+from apps.menu.models import MenuReview
+from .models import HallReview
+
+# Feed sources, in tie-break order: (type, model, rating field, extra columns)
+SOURCES = (
+    ("hall", HallReview, "rating", ("hall_id", "hall__name")),
+    (
+        "booking",
+        BookingReview,
+        "overall_rating",
+        ("booking__hall_id", "booking__hall__name", "venue_response"),
+    ),
+    ("menu_item", MenuReview, "rating", ("menu_item_id", "menu_item__name")),
+)
+
+# Per source: path to the organization and to the reviewed hall
+SOURCE_PATHS = {
+    "hall": ("hall__organization_id", "hall_id"),
+    "booking": ("booking__organization_id", "booking__hall_id"),
+    "menu_item": ("menu_item__organization_id", None),
+}
+
+MAX_PAGE_SIZE = 50
+
+
+def encode_cursor(key):
+    created_at, source, review_id = key
+    raw = f"{created_at.isoformat()}|{source}|{review_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor):
+    """The (created_at, source, id) key of a cursor; raises ValueError"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        created_at, source, review_id = raw.split("|")
+        key = (parse_datetime(created_at), int(source), int(review_id))
+    except (TypeError, UnicodeDecodeError, ValueError):
+        raise ValueError("Invalid cursor")
+    if key[0] is None or not 0 <= key[1] < len(SOURCES):
+        raise ValueError("Invalid cursor")
+    return key
+
+
+def _after(source, cursor):
+    """Reviews of ``source`` whose key sorts below ``cursor``"""
+    created_at, cursor_source, review_id = cursor
+    older = Q(created_at__lt=created_at)
+    if source < cursor_source:
+        return older | Q(created_at=created_at)
+    if source == cursor_source:
+        return older | Q(created_at=created_at, id__lt=review_id)
+    return older
+
+
+def _customer_name(row):
+    name = f"{row['customer__first_name']} {row['customer__last_name']}".strip()
+    return name or row["customer__username"]
+
+
+def _serialize(review_type, rating_field, row):
+    data = {
+        "id": row["id"],
+        "type": review_type,
+        "rating": row[rating_field],
+        "title": row["title"],
+        "review": row["review"],
+        "customer_name": _customer_name(row),
+        "created_at": row["created_at"],
+        "hall": None,
+        "menu_item": None,
+    }
+    if review_type == "menu_item":
+        data["menu_item"] = {"id": row["menu_item_id"], "name": row["menu_item__name"]}
+    elif review_type == "hall":
+        data["hall"] = {"id": row["hall_id"], "name": row["hall__name"]}
+    else:
+        if row["booking__hall_id"] is not None:
+            data["hall"] = {
+                "id": row["booking__hall_id"],
+                "name": row["booking__hall__name"],
+            }
+        data["venue_response"] = row["venue_response"] or None
+    return data
+
+
+def _source_rows(index, organization_id, hall_id, cursor, limit):
+    review_type, model, rating_field, columns = SOURCES[index]
+    organization_path, hall_path = SOURCE_PATHS[review_type]
+    reviews = model.objects.filter(
+        is_approved=True, **{organization_path: organization_id}
+    )
+    if hall_id is not None:
+        reviews = reviews.filter(**{hall_path: hall_id})
+    if cursor is not None:
+        reviews = reviews.filter(_after(index, cursor))
+    rows = reviews.order_by("-created_at", "-id").values(
+        "id",
+        "created_at",
+        "title",
+        "review",
+        rating_field,
+        "customer__first_name",
+        "customer__last_name",
+        "customer__username",
+        *columns,
+    )[:limit]
+    for row in rows:
+        yield (row["created_at"], index, row["id"]), row
+
+
+def review_page(organization_id, hall_id=None, cursor=None, limit=20):
+    """
+    ``(reviews, next_cursor)``: up to ``limit`` approved reviews of the
+    organization (or of one of its halls), newest first, after ``cursor``
+    """
+    key = decode_cursor(cursor) if cursor else None
+    streams = [
+        _source_rows(index, organization_id, hall_id, key, limit + 1)
+        for index, (review_type, *_) in enumerate(SOURCES)
+        # Menu reviews are about the catering, not a hall
+        if hall_id is None or SOURCE_PATHS[review_type][1] is not None
+    ]
+    merged = list(
+        islice(
+            heapq.merge(*streams, key=lambda entry: entry[0], reverse=True),
+            limit + 1,
+        )
+    )
+    page = merged[:limit]
+    reviews = [
+        _serialize(SOURCES[index][0], SOURCES[index][2], row)
+        for (created_at, index, review_id), row in page
+    ]
+    next_cursor = encode_cursor(page[-1][0]) if len(merged) > limit else None
+    return reviews, next_cursor
+
+
+def rating_summary(row):
+    """Rating figures of an OrganizationStats or HallRating row (or None)"""
+    if row is None:
+        return {
+            "count": 0,
+            "average": None,
+            "histogram": dict.fromkeys(map(str, range(1, 6)), 0),
+        }
+    return {
+        "count": row.review_count,
+        "average": None if row.avg_rating is None else str(row.avg_rating),
+        "histogram": {str(stars): count for stars, count in row.histogram.items()},
+    }
@@ -1,8 +1,29 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User
+from .media import variant_urls
 from .models import Hall, DiscountTier, UserProfile
 
 
+class ImageVariantsField(serializers.ReadOnlyField):
+    """Responsive variant URLs of an image field (see apps/core/media.py)"""
+
+    def to_representation(self, value):
+        if not value:
+            return None
+        variants = variant_urls(value.name)
+        if variants is None:
+            # Not rendered yet; clients fall back to the original image
+            return None
+        request = self.context.get("request")
+        return {
+            width: {
+                image_format: request.build_absolute_uri(url) if request else url
+                for image_format, url in urls.items()
+            }
+            for width, urls in variants.items()
+        }
+
+
 class UserSerializer(serializers.ModelSerializer):
     """Serializer for User model"""
 
@@ -120,6 +141,8 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
 class HallSerializer(serializers.ModelSerializer):
     """Serializer for Hall model"""
 
+    featured_image_variants = ImageVariantsField(source="featured_image")
+
     class Meta:
         model = Hall
         fields = [
@@ -131,6 +154,7 @@ class HallSerializer(serializers.ModelSerializer):
             "base_price",
             "is_active",
             "featured_image",
+            "featured_image_variants",
             "created_at",
             "updated_at",
         ]
@@ -147,6 +171,24 @@ class HallSerializer(serializers.ModelSerializer):
         return value
 
 
+class MarketplaceHallSerializer(HallSerializer):
+    """Hall with its rating badge; select_related("rating_summary")"""
+
+    avg_rating = serializers.DecimalField(
+        source="rating_summary.avg_rating",
+        max_digits=3,
+        decimal_places=2,
+        read_only=True,
+        default=None,
+    )
+    review_count = serializers.IntegerField(
+        source="rating_summary.review_count", read_only=True, default=0
+    )
+
+    class Meta(HallSerializer.Meta):
+        fields = HallSerializer.Meta.fields + ["avg_rating", "review_count"]
+
+
 class HallListSerializer(serializers.ModelSerializer):
     """Simplified serializer for listing halls"""
 
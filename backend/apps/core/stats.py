@@ -0,0 +1,447 @@
+"""
+Denormalized organization stats and ratings for listings
+
+Organization lists used to annotate ``Count("bookings")``, ``Count("halls")``
+and ``Avg("halls__reviews__rating")`` in one query; the joins multiplied rows
+(bookings x halls x reviews), inflating the counts and making every listing
+scan the whole booking history. Each organization now has an
+OrganizationStats row that listings reach through a single join (with_stats),
+and each hall a HallRating row, so rating badges never average reviews.
+
+Ratings count approved reviews of every REVIEW_SOURCES model: hall and
+booking reviews rate the organization and the hall, menu reviews the
+organization only. Both keep review_count, rating_total (avg_rating follows)
+and a 1-5 star histogram.
+
+Rows are maintained from model signals, applied once per transaction after
+commit:
+
+- Bookings and reviews change the counters incrementally, including when a
+  review is approved or withdrawn.
+- Hall writes, and deletes that take reviews with them (halls, bookings,
+  menu items), recount the organization's hall figures (active_halls,
+  min_price, max_capacity), its ratings and those of its halls, which is cheap
+  per organization.
+
+Writes that bypass signals (queryset.update(), raw fixtures) are not tracked;
+``manage.py repair_organization_stats`` recomputes every row from scratch.
+"""
+
+from collections import Counter, defaultdict, namedtuple
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.db import transaction
+from django.db.models import Count, F, Max, Min, Value
+from django.db.models.functions import Coalesce
+from django.db.models.signals import post_delete, post_init, post_save
+from django.utils import timezone
+
+from apps.bookings.models import Booking, BookingReview
+from apps.menu.models import MenuItem, MenuReview
+from .models import (
+    Hall,
+    HallRating,
+    HallReview,
+    Organization,
+    OrganizationStats,
+)
+from .transactions import defer_until_commit
+
+STAR_FIELDS = tuple(f"stars_{stars}" for stars in range(1, 6))
+REVIEW_FIELDS = ("review_count", "rating_total", *STAR_FIELDS)
+RATING_FIELDS = (*REVIEW_FIELDS, "avg_rating")
+COUNTER_FIELDS = ("total_bookings", *REVIEW_FIELDS)
+HALL_FIELDS = ("active_halls", "min_price", "max_capacity")
+STAT_FIELDS = (*COUNTER_FIELDS, *HALL_FIELDS, "avg_rating")
+
+SNAPSHOT_ATTR = "_stats_snapshot"
+
+# Reviews counted in the ratings, by model: the kind of object a review is
+# about, the field pointing at it, the rating field, and the paths to the
+# organization and (for venue reviews) the hall it rates
+ReviewSource = namedtuple("ReviewSource", "kind target rating organization hall")
+REVIEW_SOURCES = {
+    HallReview: ReviewSource(
+        "hall", "hall_id", "rating", "hall__organization_id", "hall_id"
+    ),
+    BookingReview: ReviewSource(
+        "booking",
+        "booking_id",
+        "overall_rating",
+        "booking__organization_id",
+        "booking__hall_id",
+    ),
+    MenuReview: ReviewSource(
+        "menu_item", "menu_item_id", "rating", "menu_item__organization_id", None
+    ),
+}
+
+# Review target kind -> (model, field holding the hall it rates)
+REVIEW_TARGETS = {
+    "hall": (Hall, "id"),
+    "booking": (Booking, "hall_id"),
+    "menu_item": (MenuItem, None),
+}
+
+
+def average_rating(rating_total, review_count):
+    if not review_count:
+        return None
+    return (Decimal(rating_total) / review_count).quantize(
+        Decimal("0.01"), rounding=ROUND_HALF_UP
+    )
+
+
+def with_stats(queryset):
+    """Annotate an Organization queryset with its listing figures (one join)"""
+    return queryset.annotate(
+        total_bookings=Coalesce(F("stats__total_bookings"), Value(0)),
+        total_halls=Coalesce(F("stats__active_halls"), Value(0)),
+        review_count=Coalesce(F("stats__review_count"), Value(0)),
+        avg_rating=F("stats__avg_rating"),
+        min_price=F("stats__min_price"),
+        max_capacity=F("stats__max_capacity"),
+        ranking_score=F("stats__ranking_score"),
+    )
+
+
+# Recounting
+
+
+def _grouped(queryset, *keys, **aggregates):
+    return (
+        queryset.order_by()
+        .values(*keys)
+        .annotate(**aggregates)
+        .values_list(*keys, *aggregates)
+    )
+
+
+def count_reviews(ids, by):
+    """
+    ``{id: rating figures}`` of the approved reviews of organizations or halls
+    (``by`` "organization" or "hall"), one grouped query per review model
+    """
+    ids = list(ids)
+    ratings = {key: dict.fromkeys(REVIEW_FIELDS, 0) for key in ids}
+    for model, source in REVIEW_SOURCES.items():
+        path = getattr(source, by)
+        if path is None or not ids:
+            continue
+        for key, rating, count in _grouped(
+            model.objects.filter(is_approved=True, **{f"{path}__in": ids}),
+            path,
+            source.rating,
+            count=Count("pk"),
+        ):
+            values = ratings[key]
+            values["review_count"] += count
+            values["rating_total"] += rating * count
+            values[f"stars_{rating}"] += count
+    for values in ratings.values():
+        values["avg_rating"] = average_rating(
+            values["rating_total"], values["review_count"]
+        )
+    return ratings
+
+
+def compute_stats(organization_ids, sources=("bookings", "halls", "reviews")):
+    """
+    ``{organization_id: {field: value}}`` recounted from the source tables,
+    one grouped query per source table
+    """
+    organization_ids = list(organization_ids)
+    stats = {
+        organization_id: {
+            "total_bookings": 0,
+            "active_halls": 0,
+            "min_price": None,
+            "max_capacity": None,
+        }
+        for organization_id in organization_ids
+    }
+    if "bookings" in sources:
+        for organization_id, count in _grouped(
+            Booking.objects.filter(organization_id__in=organization_ids),
+            "organization_id",
+            count=Count("id"),
+        ):
+            stats[organization_id]["total_bookings"] = count
+    if "halls" in sources:
+        for organization_id, count, min_price, max_capacity in _grouped(
+            Hall.objects.filter(organization_id__in=organization_ids, is_active=True),
+            "organization_id",
+            count=Count("id"),
+            min_price=Min("base_price"),
+            max_capacity=Max("capacity"),
+        ):
+            stats[organization_id].update(
+                active_halls=count, min_price=min_price, max_capacity=max_capacity
+            )
+    if "reviews" in sources:
+        for organization_id, values in count_reviews(
+            organization_ids, "organization"
+        ).items():
+            stats[organization_id].update(values)
+    return stats
+
+
+def _sync(model, computed, fields):
+    """
+    Write the rows of ``computed`` (``{pk: {field: value}}``) that are missing
+    or drifted; returns the number of rows written
+    """
+    with transaction.atomic():
+        existing = model.objects.select_for_update().in_bulk(list(computed))
+        created, updated = [], []
+        for pk, values in computed.items():
+            row = existing.get(pk)
+            if row is None:
+                created.append(model(pk=pk, **values))
+            elif any(getattr(row, field) != value for field, value in values.items()):
+                for field, value in values.items():
+                    setattr(row, field, value)
+                row.updated_at = timezone.now()
+                updated.append(row)
+        model.objects.bulk_create(created)
+        model.objects.bulk_update(updated, [*fields, "updated_at"])
+    return len(created) + len(updated)
+
+
+def repair(organization_ids=None):
+    """
+    Recount the stats of ``organization_ids`` (default: all) and fix rows
+    that drifted; returns the number of rows written
+    """
+    if organization_ids is None:
+        organization_ids = Organization.objects.order_by().values_list("id", flat=True)
+    return _sync(OrganizationStats, compute_stats(organization_ids), STAT_FIELDS)
+
+
+def repair_hall_ratings(hall_ids=None):
+    """
+    Recount the ratings of ``hall_ids`` (default: all halls) and fix rows
+    that drifted; returns the number of rows written
+    """
+    halls = Hall.objects.order_by()
+    if hall_ids is not None:
+        halls = halls.filter(id__in=list(hall_ids))
+    computed = count_reviews(halls.values_list("id", flat=True), "hall")
+    return _sync(HallRating, computed, RATING_FIELDS)
+
+
+# Applying changes
+
+
+def _review_targets(changes):
+    """``{(kind, id): (organization_id, hall_id)}`` of the reviewed objects"""
+    targets = {}
+    for kind, (model, hall_field) in REVIEW_TARGETS.items():
+        ids = {key for change_kind, key, field, delta in changes if change_kind == kind}
+        if not ids:
+            continue
+        columns = ("id", "organization_id", hall_field or "organization_id")
+        for key, organization_id, hall_id in model.objects.filter(
+            id__in=ids
+        ).values_list(*columns):
+            targets[kind, key] = (organization_id, hall_id if hall_field else None)
+    return targets
+
+
+def _add(row, deltas):
+    for field, delta in deltas.items():
+        setattr(row, field, max(getattr(row, field) + delta, 0))
+    row.avg_rating = average_rating(row.rating_total, row.review_count)
+
+
+def apply_changes(changes):
+    """
+    Apply ``changes``: (kind, id, field, delta) tuples where kind is
+    "organization" (a counter delta), "recount" (recount the organization's
+    halls and reviews) or a review target kind of REVIEW_TARGETS (a rating
+    delta by reviewed object; no field recounts its organization)
+    """
+    targets = _review_targets(changes)
+    recount = {key for kind, key, field, delta in changes if kind == "recount"}
+    recount.update(
+        targets[kind, key][0]
+        for kind, key, field, delta in changes
+        if field is None and (kind, key) in targets
+    )
+
+    deltas, hall_deltas = defaultdict(Counter), defaultdict(Counter)
+    for kind, key, field, delta in changes:
+        if kind == "organization":
+            deltas[key][field] += delta
+        elif field is not None and (kind, key) in targets:
+            organization_id, hall_id = targets[kind, key]
+            # Reviews of deleted objects, or of a recounted organization, are
+            # reflected in the recount
+            if organization_id not in recount:
+                deltas[organization_id][field] += delta
+                if hall_id is not None:
+                    hall_deltas[hall_id][field] += delta
+
+    organization_ids = set(deltas) | recount
+    if not organization_ids:
+        return
+    with transaction.atomic():
+        rows = OrganizationStats.objects.select_for_update().in_bulk(organization_ids)
+        recounted = compute_stats(recount & set(rows), sources=("halls", "reviews"))
+        for organization_id, stats in rows.items():
+            for field, value in recounted.get(organization_id, {}).items():
+                if field in HALL_FIELDS or field in RATING_FIELDS:
+                    setattr(stats, field, value)
+            _add(stats, deltas[organization_id])
+            stats.save()
+
+        hall_rows = HallRating.objects.select_for_update().in_bulk(hall_deltas)
+        for hall_id, rating in hall_rows.items():
+            _add(rating, hall_deltas[hall_id])
+            rating.save()
+
+    # Organizations without a row yet start from a full recount
+    missing = Organization.objects.filter(
+        id__in=organization_ids - set(rows)
+    ).values_list("id", flat=True)
+    if missing:
+        repair(missing)
+    # Likewise halls without a rating row, and every hall of a recount
+    hall_ids = set(hall_deltas) - set(hall_rows)
+    if recount:
+        hall_ids.update(
+            Hall.objects.filter(organization_id__in=recount).values_list(
+                "id", flat=True
+            )
+        )
+    if hall_ids:
+        repair_hall_ratings(hall_ids)
+
+
+# Signal receivers
+
+
+def _review_inputs(sender):
+    # Review fields its contribution to the ratings depends on
+    source = REVIEW_SOURCES[sender]
+    return (source.target, source.rating, "is_approved")
+
+
+def snapshot(sender, instance, **kwargs):
+    # Read __dict__ so deferred fields are not loaded; unknown values are None
+    values = instance.__dict__
+    if sender in REVIEW_SOURCES:
+        setattr(
+            instance,
+            SNAPSHOT_ATTR,
+            tuple(values.get(name) for name in _review_inputs(sender)),
+        )
+    else:
+        setattr(instance, SNAPSHOT_ATTR, values.get("organization_id"))
+
+
+def _defer(changes):
+    if changes:
+        defer_until_commit("organization_stats", changes, apply_changes)
+
+
+def organization_saved(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        OrganizationStats.objects.create(organization=instance)
+
+
+def booking_saved(sender, instance, created, raw=False, **kwargs):
+    previous = getattr(instance, SNAPSHOT_ATTR, None)
+    setattr(instance, SNAPSHOT_ATTR, instance.organization_id)
+    if raw:
+        return
+    if created:
+        _defer([("organization", instance.organization_id, "total_bookings", 1)])
+    elif previous is not None and previous != instance.organization_id:
+        _defer(
+            [
+                ("organization", previous, "total_bookings", -1),
+                ("organization", instance.organization_id, "total_bookings", 1),
+            ]
+        )
+
+
+def booking_deleted(sender, instance, **kwargs):
+    _defer(
+        [
+            ("organization", instance.organization_id, "total_bookings", -1),
+            # Its review went with it and can no longer be traced back here
+            ("recount", instance.organization_id, None, 0),
+        ]
+    )
+
+
+def hall_saved(sender, instance, created, raw=False, **kwargs):
+    previous = getattr(instance, SNAPSHOT_ATTR, None)
+    setattr(instance, SNAPSHOT_ATTR, instance.organization_id)
+    if raw:
+        return
+    if created:
+        HallRating.objects.create(hall=instance)
+    changes = [("recount", instance.organization_id, None, 0)]
+    if previous is not None and previous != instance.organization_id:
+        changes.append(("recount", previous, None, 0))
+    _defer(changes)
+
+
+def organization_child_deleted(sender, instance, **kwargs):
+    # Halls and menu items take their reviews with them
+    _defer([("recount", instance.organization_id, None, 0)])
+
+
+def _review_changes(kind, values, sign):
+    target, rating, is_approved = values
+    if not is_approved:
+        return []
+    return [
+        (kind, target, "review_count", sign),
+        (kind, target, "rating_total", sign * rating),
+        (kind, target, f"stars_{rating}", sign),
+    ]
+
+
+def review_saved(sender, instance, created, raw=False, **kwargs):
+    kind = REVIEW_SOURCES[sender].kind
+    previous = getattr(instance, SNAPSHOT_ATTR, None)
+    current = tuple(getattr(instance, name) for name in _review_inputs(sender))
+    setattr(instance, SNAPSHOT_ATTR, current)
+    if raw or (previous == current and not created):
+        return
+    if not created and None in previous:
+        # Saved from a partially loaded review; recount its organization
+        _defer([(kind, current[0], None, 0)])
+        return
+    changes = _review_changes(kind, current, 1)
+    if not created:
+        changes += _review_changes(kind, previous, -1)
+    _defer(changes)
+
+
+def review_deleted(sender, instance, **kwargs):
+    values = tuple(getattr(instance, name) for name in _review_inputs(sender))
+    _defer(_review_changes(REVIEW_SOURCES[sender].kind, values, -1))
+
+
+post_save.connect(
+    organization_saved, sender=Organization, dispatch_uid="stats_organization_save"
+)
+for model, saved, deleted in (
+    (Booking, booking_saved, booking_deleted),
+    (Hall, hall_saved, organization_child_deleted),
+    *((review_model, review_saved, review_deleted) for review_model in REVIEW_SOURCES),
+):
+    post_init.connect(
+        snapshot, sender=model, dispatch_uid=f"stats_init_{model.__name__}"
+    )
+    post_save.connect(saved, sender=model, dispatch_uid=f"stats_save_{model.__name__}")
+    post_delete.connect(
+        deleted, sender=model, dispatch_uid=f"stats_delete_{model.__name__}"
+    )
+post_delete.connect(
+    organization_child_deleted, sender=MenuItem, dispatch_uid="stats_delete_MenuItem"
+)
@@ -1,3 +1,1085 @@
-from django.test import TestCase
+import datetime
+import io
+import shutil
+import tempfile
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from PIL import Image
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from apps.bookings.models import Booking, BookingReview
+from apps.menu.models import MenuCategory, MenuItem, MenuReview
+from apps.organizations.serializers import MarketplaceOrganizationSerializer
+from . import media, metering, ranking, stats, tiers, venue_search
+from .authentication import ClaimsJWTAuthentication
+from .models import (
+    ApiUsageDaily,
+    DiscountTier,
+    Hall,
+    HallRating,
+    HallReview,
+    Organization,
+    OrganizationMember,
+    OrganizationStats,
+    PlatformDailyMetrics,
+    PlatformSettings,
+    VenueScore,
+    VenueSearchEntry,
+)
+from .stats import repair_hall_ratings
+from .token_claims import loaded_user
+
+LOCMEM_CACHE = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+
+
+def create_organization(owner, name="Venue", **fields):
+    """An active Lahore organization; ``fields`` override the defaults"""
+    values = {
+        "name": name,
+        "email": f"{name.lower().replace(' ', '')}@example.com",
+        "phone": "0300",
+        "address": "Street 1",
+        "city": "Lahore",
+        "state": "Punjab",
+        "postal_code": "54000",
+        "owner": owner,
+        "status": "active",
+    }
+    values.update(fields)
+    return Organization.objects.create(**values)
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class DiscountTierIndexTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        tiers._indexes.clear()
+        self.addCleanup(tiers._indexes.clear)
+        self.owner = User.objects.create_user(username="owner", password="pass")
+        self.organization = create_organization(self.owner)
+        other = create_organization(self.owner, name="Other")
+        self.small, self.large = [
+            DiscountTier.objects.create(
+                organization=self.organization,
+                name=name,
+                min_guests=low,
+                max_guests=high,
+                discount_percentage=Decimal(percentage),
+            )
+            for name, low, high, percentage in (
+                ("Small", 50, 99, "5"),
+                ("Large", 100, 199, "10"),
+            )
+        ]
+        DiscountTier.objects.create(
+            organization=other,
+            name="Any",
+            min_guests=1,
+            max_guests=1000,
+            discount_percentage=Decimal("50"),
+        )
+
+    def test_lookup_bisects_tier_boundaries(self):
+        index = tiers.get_index(self.organization.id)
+        self.assertEqual(
+            index.lookup_many([1, 49, 50, 99, 100, 199, 200]),
+            [None, None, self.small, self.small, self.large, self.large, None],
+        )
+        # Served from memory until the version is due for a check
+        with self.assertNumQueries(0):
+            self.assertEqual(tiers.find_tier(self.organization.id, 120), self.large)
+
+    def test_overlaps_are_rejected_and_shadowed(self):
+        overlapping = DiscountTier(
+            organization=self.organization,
+            name="Medium",
+            min_guests=150,
+            max_guests=250,
+            discount_percentage=Decimal("15"),
+        )
+        with self.assertRaisesMessage(ValidationError, "Large"):
+            overlapping.full_clean()
+
+        with self.assertLogs("apps.core.tiers", "WARNING"):
+            index = tiers.TierIndex(
+                self.organization.id, [overlapping, self.small, self.large]
+            )
+        self.assertEqual(index.overlaps, [(self.large, overlapping)])
+        self.assertEqual(index.lookup_many([199, 200, 250]), [self.large, None, None])
+
+    def test_writes_invalidate_indexes(self):
+        stale = tiers.get_index(self.organization.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.large.discount_percentage = Decimal("12")
+            self.large.save()
+        # This process dropped its index; another one notices the version moved
+        # at its next check
+        self.assertIsNot(tiers.get_index(self.organization.id), stale)
+        stale.checked_at -= tiers.VERSION_CHECK_INTERVAL
+        tiers._indexes[self.organization.id] = stale
+        tier = tiers.find_tier(self.organization.id, 120)
+        self.assertEqual(tier.discount_percentage, Decimal("12"))
+
+    def test_quotes_and_lookups_use_the_index(self):
+        hall = Hall.objects.create(
+            organization=self.organization,
+            name="Main",
+            capacity=500,
+            base_price=Decimal("1000.00"),
+        )
+        client = APIClient()
+        client.force_authenticate(self.owner)
+        response = client.post(
+            "/api/v1/pricing/calculate/",
+            {"hall_id": hall.id, "guest_count": 120},
+            format="json",
+        )
+        self.assertEqual(response.data["discount_tier"]["name"], "Large")
+        self.assertEqual(response.data["estimated_total"], Decimal("900.00"))
+        self.assertEqual(response.data["price_per_person"], Decimal("7.50"))
+
+        url = "/api/v1/core/discount-tiers/for_guest_count/"
+        response = client.get(
+            url, {"guest_count": 60, "organization": self.organization.id}
+        )
+        self.assertEqual(response.data["applicable_tier"]["name"], "Small")
+        # Another organization's tier is never returned
+        response = client.get(
+            url, {"guest_count": 20, "organization": self.organization.id}
+        )
+        self.assertIsNone(response.data["applicable_tier"])
+        for params in ({"guest_count": 60}, {"guest_count": 60, "organization": "x"}):
+            with self.subTest(params=params):
+                self.assertEqual(client.get(url, params).status_code, 400)
+
+
+def jpeg_upload(name="photo.jpg", size=(1200, 800)):
+    output = io.BytesIO()
+    Image.new("RGB", size, (200, 80, 40)).save(output, "JPEG")
+    return SimpleUploadedFile(name, output.getvalue(), content_type="image/jpeg")
+
+
+class ImageVariantTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings = override_settings(
+            MEDIA_ROOT=self.media_root, IMAGE_PROCESSING_WORKERS=0, CACHES=LOCMEM_CACHE
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.addCleanup(media._rendered.clear)
+        self.owner = User.objects.create_user(username="owner", password="pass")
+
+    def create_with_logo(self, name, logo):
+        # Run the on-commit variant rendering the test transaction would defer
+        with self.captureOnCommitCallbacks(execute=True):
+            return create_organization(self.owner, name=name, logo=logo)
+
+    def test_uploads_are_deduplicated_and_resized(self):
+        first = self.create_with_logo("Sultanat", jpeg_upload("sultanat.jpg"))
+        second = self.create_with_logo("Royal", jpeg_upload("royal.JPG"))
+
+        # Same bytes, same file
+        self.assertEqual(first.logo.name, second.logo.name)
+        self.assertRegex(
+            first.logo.name, r"^organizations/logos/[0-9a-f]{2}/[0-9a-f]{64}\.jpg$"
+        )
+        directory = first.logo.name.rsplit("/", 1)[0]
+        self.assertEqual(len(default_storage.listdir(directory)[1]), 1 + 2 * 3)
+
+        for width in media.VARIANT_WIDTHS:
+            for image_format in ("webp", "jpeg"):
+                name = media.variant_name(first.logo.name, width, image_format)
+                with default_storage.open(name) as variant, Image.open(
+                    variant
+                ) as image:
+                    self.assertEqual(image.format, image_format.upper())
+                    self.assertEqual(image.size, (width, round(width * 800 / 1200)))
+
+        # Already processed content is not rendered again
+        self.assertEqual(media.process_images([first.logo.name]), 0)
+
+        data = MarketplaceOrganizationSerializer(first).data
+        self.assertEqual(
+            data["logo_variants"]["160w"]["webp"],
+            default_storage.url(media.variant_name(first.logo.name, 160, "webp")),
+        )
+        self.assertIsNone(data["cover_image_variants"])
+
+    def test_variants_are_only_served_once_stored(self):
+        # Stored without running the deferred rendering, like a legacy image
+        organization = create_organization(
+            self.owner, name="Sultanat", logo=jpeg_upload("sultanat.jpg")
+        )
+        data = MarketplaceOrganizationSerializer(organization).data
+        self.assertIsNone(data["logo_variants"])
+
+        # Rendered in a worker process started from a clean interpreter
+        self.assertNotEqual(media.START_METHOD, "fork")
+        with override_settings(IMAGE_PROCESSING_WORKERS=1):
+            self.addCleanup(setattr, media, "_executor", None)
+            media._executor = None
+            self.assertEqual(media.process_images([organization.logo.name], wait=True), 1)
+            media._executor.shutdown()
+        self.assertIn(
+            "480w", MarketplaceOrganizationSerializer(organization).data["logo_variants"]
+        )
+
+    def test_rendered_variants_change_the_version_stamps(self):
+        organization = create_organization(
+            self.owner, name="Sultanat", logo=jpeg_upload("sultanat.jpg")
+        )
+        Hall.objects.create(
+            organization=organization,
+            name="Main",
+            capacity=300,
+            base_price=Decimal("60000.00"),
+            featured_image=jpeg_upload("main.jpg"),
+        )
+        client = APIClient()
+        urls = [
+            "/api/v1/marketplace/",
+            f"/api/v1/marketplace/{organization.pk}/",
+            f"/api/v1/marketplace/{organization.pk}/halls/",
+        ]
+        tags = [client.get(url)["ETag"] for url in urls]
+
+        names = [organization.logo.name, organization.halls.get().featured_image.name]
+        self.assertEqual(media.process_images(names), 2)
+        for url, tag in zip(urls, tags):
+            response = client.get(url, HTTP_IF_NONE_MATCH=tag)
+            self.assertEqual(response.status_code, 200, url)
+        self.assertIn("160w", response.data[0]["featured_image_variants"])
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class OrganizationStatsTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(username="owner", password="pass")
+        self.organization = create_organization(self.owner, name="Sultanat")
+        # Run the on-commit stats updates the test transaction would defer
+        with self.captureOnCommitCallbacks(execute=True):
+            self.halls = [
+                Hall.objects.create(
+                    organization=self.organization,
+                    name=name,
+                    capacity=capacity,
+                    base_price=Decimal(price),
+                )
+                for name, capacity, price in (
+                    ("Main", 500, "90000.00"),
+                    ("Garden", 300, "60000.00"),
+                    ("Terrace", 150, "40000.00"),
+                )
+            ]
+            for day in range(4):
+                Booking.objects.create(
+                    organization=self.organization,
+                    hall=self.halls[0],
+                    customer=self.owner,
+                    event_date=datetime.date(2030, 6, 1 + day),
+                    event_time=datetime.time(19, 0),
+                    guest_count=100,
+                    contact_phone="0300",
+                    contact_email="guest@example.com",
+                )
+            for index, (hall, rating) in enumerate(((0, 5), (0, 4), (1, 3), (2, 1))):
+                HallReview.objects.create(
+                    hall=self.halls[hall],
+                    customer=User.objects.create_user(username=f"guest{index}"),
+                    rating=rating,
+                    title="Review",
+                    review="Text",
+                    is_approved=hall != 2,
+                )
+
+    def assertStats(self, **expected):
+        row = OrganizationStats.objects.get(organization=self.organization)
+        self.assertEqual({field: getattr(row, field) for field in expected}, expected)
+
+    def test_stats_follow_writes(self):
+        self.assertStats(
+            total_bookings=4,
+            active_halls=3,
+            review_count=3,
+            avg_rating=Decimal("4.00"),
+            min_price=Decimal("40000.00"),
+            max_capacity=500,
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            review = HallReview.objects.get(rating=1)
+            review.is_approved = True
+            review.save()
+            Booking.objects.first().delete()
+            self.halls[2].is_active = False
+            self.halls[2].save()
+        self.assertStats(
+            total_bookings=3,
+            active_halls=2,
+            review_count=4,
+            avg_rating=Decimal("3.25"),
+            min_price=Decimal("60000.00"),
+        )
+
+        # Deleting a hall takes its reviews out of the rating
+        with self.captureOnCommitCallbacks(execute=True):
+            self.halls[0].delete()
+        self.assertStats(
+            total_bookings=0, active_halls=1, review_count=2, avg_rating=Decimal("2.00")
+        )
+
+    def test_marketplace_lists_from_stats(self):
+        client = APIClient()
+        # version stamp, count, then organizations joined to their stats and
+        # owners
+        with self.assertNumQueries(3):
+            response = client.get("/api/v1/marketplace/")
+        organization = response.data["results"][0]
+        self.assertEqual(organization["total_bookings"], 4)
+        self.assertEqual(organization["total_halls"], 3)
+        self.assertEqual(organization["avg_rating"], "4.00")
+        self.assertEqual(organization["min_price"], "40000.00")
+
+    def test_repair_fixes_untracked_writes(self):
+        Booking.objects.filter(organization=self.organization).delete()
+        HallReview.objects.update(is_approved=True)
+        self.assertEqual(stats.repair(), 1)
+        self.assertStats(total_bookings=0, review_count=4, avg_rating=Decimal("3.25"))
+        self.assertEqual(stats.repair(), 0)
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class VenueSearchTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(username="owner", password="pass")
+        # Run the on-commit index updates the test transaction would defer
+        with self.captureOnCommitCallbacks(execute=True):
+            for name, city, halls in (
+                (
+                    "Sultanat",
+                    "Lahore",
+                    [("Main", 500, "90000", True), ("Lawn", 300, "40000", False)],
+                ),
+                ("Royal", "Karachi", [("Grand", 800, "250000", True)]),
+            ):
+                organization = create_organization(self.owner, name=name, city=city)
+                for hall_name, capacity, price, parking in halls:
+                    Hall.objects.create(
+                        organization=organization,
+                        name=hall_name,
+                        capacity=capacity,
+                        base_price=Decimal(price),
+                        has_parking=parking,
+                        amenities="Wi-Fi, Bridal Suite" if parking else "",
+                    )
+
+    def search(self, query):
+        return APIClient().get(f"/api/v1/marketplace/search/?{query}")
+
+    def test_filters_and_facets(self):
+        # facet counts, then the result page
+        with self.assertNumQueries(2):
+            response = self.search("amenities=parking,wifi&min_capacity=400")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["count"], 2)
+        self.assertEqual(
+            [hall["name"] for hall in response.data["results"]], ["Main", "Grand"]
+        )
+        self.assertEqual(
+            response.data["results"][0]["amenities"],
+            ["parking", "wifi", "bridal_room"],
+        )
+        facets = response.data["facets"]
+        self.assertEqual(
+            [(city["city"], city["count"]) for city in facets["cities"]],
+            [("karachi", 1), ("lahore", 1)],
+        )
+        self.assertEqual(
+            facets["price_buckets"],
+            [
+                {"min": 50000, "max": 100000, "count": 1},
+                {"min": 200000, "max": 500000, "count": 1},
+            ],
+        )
+
+        response = self.search("q=sultanat&ordering=-price&city=LAHORE")
+        self.assertEqual(
+            [hall["name"] for hall in response.data["results"]], ["Main", "Lawn"]
+        )
+        self.assertEqual(self.search("amenities=jacuzzi").status_code, 400)
+
+    def test_entries_follow_writes(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Hall.objects.filter(name="Lawn").get().delete()
+            organization = Organization.objects.get(name="Royal")
+            organization.status = "suspended"
+            organization.save()
+        self.assertEqual(self.search("").data["count"], 1)
+
+        VenueSearchEntry.objects.all().delete()
+        Organization.objects.filter(pk=organization.pk).update(status="active")
+        self.assertEqual(venue_search.rebuild(), 2)
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class RatingTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(username="owner", password="pass")
+        self.organization = create_organization(self.owner, name="Sultanat")
+        # Run the on-commit rating updates the test transaction would defer
+        with self.captureOnCommitCallbacks(execute=True):
+            self.hall = Hall.objects.create(
+                organization=self.organization,
+                name="Main",
+                capacity=500,
+                base_price=Decimal("90000.00"),
+            )
+            category = MenuCategory.objects.create(
+                organization=self.organization, name="Rice"
+            )
+            item = MenuItem.objects.create(
+                organization=self.organization,
+                category=category,
+                name="Biryani",
+                base_price=Decimal("100.00"),
+            )
+            self.reviews = []
+            for day in range(6):
+                customer = User.objects.create_user(username=f"guest{day}")
+                booking = Booking.objects.create(
+                    organization=self.organization,
+                    hall=self.hall,
+                    customer=customer,
+                    event_date=datetime.date(2030, 6, 1 + day),
+                    event_time=datetime.time(19, 0),
+                    guest_count=100,
+                    contact_phone="0300",
+                    contact_email="guest@example.com",
+                )
+                review_model, fields = [
+                    (HallReview, {"hall": self.hall, "rating": 5, "title": "Hall"}),
+                    (BookingReview, {"booking": booking, "overall_rating": 4}),
+                    (MenuReview, {"menu_item": item, "rating": 2}),
+                ][day % 3]
+                self.reviews.append(
+                    review_model.objects.create(
+                        customer=customer, review="Text", is_approved=True, **fields
+                    )
+                )
+        # Newest first: guest5, guest4, ...
+        for day, review in enumerate(self.reviews):
+            type(review).objects.filter(pk=review.pk).update(
+                created_at=timezone.now() - datetime.timedelta(days=10 - day)
+            )
+
+    def test_ratings_follow_approval(self):
+        summary = OrganizationStats.objects.get(organization=self.organization)
+        self.assertEqual((summary.review_count, summary.avg_rating), (6, Decimal("3.67")))
+        self.assertEqual(summary.histogram, {1: 0, 2: 2, 3: 0, 4: 2, 5: 2})
+        # Menu reviews rate the organization, not the hall
+        rating = HallRating.objects.get(hall=self.hall)
+        self.assertEqual((rating.review_count, rating.avg_rating), (4, Decimal("4.50")))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            for review in self.reviews[:2]:
+                review.is_approved = False
+                review.save()
+        rating.refresh_from_db()
+        self.assertEqual(rating.histogram, {1: 0, 2: 0, 3: 0, 4: 1, 5: 1})
+        summary.refresh_from_db()
+        self.assertEqual((summary.review_count, summary.avg_rating), (4, Decimal("3.25")))
+
+        # Deleting a booking takes its review out of both ratings
+        with self.captureOnCommitCallbacks(execute=True):
+            self.reviews[4].booking.delete()
+        rating.refresh_from_db()
+        self.assertEqual(rating.histogram, {1: 0, 2: 0, 3: 0, 4: 0, 5: 1})
+        self.assertEqual(stats.repair() + repair_hall_ratings(), 0)
+
+    def test_reviews_feed_pages_by_cursor(self):
+        client = APIClient()
+        url = f"/api/v1/marketplace/{self.organization.pk}/reviews/"
+        # organization with stats, then one query per review table
+        with self.assertNumQueries(4):
+            response = client.get(url, {"page_size": 4})
+        self.assertEqual(response.data["rating"]["count"], 6)
+        self.assertEqual(response.data["rating"]["histogram"]["2"], 2)
+        self.assertEqual(
+            [review["customer_name"] for review in response.data["results"]],
+            ["guest5", "guest4", "guest3", "guest2"],
+        )
+        self.assertEqual(response.data["results"][1]["type"], "booking")
+
+        response = client.get(url, {"page_size": 4, "cursor": response.data["next"]})
+        self.assertEqual(
+            [review["customer_name"] for review in response.data["results"]],
+            ["guest1", "guest0"],
+        )
+        self.assertIsNone(response.data["next"])
+
+        response = client.get(url, {"hall": self.hall.pk})
+        self.assertEqual(response.data["rating"]["average"], "4.50")
+        self.assertEqual(len(response.data["results"]), 4)
+        self.assertEqual(client.get(url, {"cursor": "nope"}).status_code, 400)
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class OrganizationPrefetchTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(username="owner", password="pass")
+
+    def add_organizations(self, count):
+        start = Organization.objects.count()
+        with self.captureOnCommitCallbacks(execute=True):
+            for number in range(start, start + count):
+                organization = create_organization(self.owner, name=f"Venue {number}")
+                for position in range(5):
+                    hall = Hall.objects.create(
+                        organization=organization,
+                        name=f"Hall {position}",
+                        capacity=100,
+                        base_price=Decimal("50000.00"),
+                    )
+                    Booking.objects.create(
+                        organization=organization,
+                        hall=hall,
+                        customer=self.owner,
+                        event_date=datetime.date(2030, 6, 1 + position),
+                        event_time=datetime.time(19, 0),
+                        guest_count=50,
+                        contact_phone="0300",
+                        contact_email="guest@example.com",
+                    )
+
+    def test_marketplace_serializer_queries_are_constant(self):
+        for count in (2, 6):
+            self.add_organizations(count)
+            organizations = MarketplaceOrganizationSerializer.setup_eager_loading(
+                Organization.objects.order_by("id")
+            )
+            # organizations, then the featured halls of all of them
+            with self.assertNumQueries(2):
+                data = MarketplaceOrganizationSerializer(organizations, many=True).data
+        self.assertEqual(len(data), 8)
+        self.assertEqual(
+            [hall["name"] for hall in data[0]["featured_halls"]],
+            ["Hall 4", "Hall 3", "Hall 2"],
+        )
+        self.assertEqual(data[0]["total_halls"], 5)
+
+    def test_detail_prefetches_recent_bookings(self):
+        self.add_organizations(1)
+        organization = Organization.objects.get()
+        client = APIClient()
+        # organization with stats and member count, then recent bookings
+        # joined to their customers
+        with self.assertNumQueries(2):
+            response = client.get(f"/api/v1/organizations/{organization.pk}/")
+        self.assertEqual(response.data["member_count"], 0)
+        self.assertEqual(len(response.data["recent_bookings"]), 5)
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class OrganizationVisibilityTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(username="owner", password="pass")
+        self.staff = User.objects.create_user(username="staff", password="pass")
+        self.organizations = {}
+        for name, status in (
+            ("Active", "active"),
+            ("Pending", "pending"),
+            ("Staffed", "suspended"),
+            ("Hidden", "pending"),
+        ):
+            self.organizations[name] = create_organization(
+                self.owner if name != "Hidden" else self.staff, name=name, status=status
+            )
+        OrganizationMember.objects.create(
+            organization=self.organizations["Staffed"], user=self.staff, role="manager"
+        )
+        self.organizations["Staffed"].owner = User.objects.create_user("other")
+        self.organizations["Staffed"].save()
+
+    def names(self, user=None, query=""):
+        client = APIClient()
+        if user is not None:
+            client.force_authenticate(user)
+        response = client.get(f"/api/v1/organizations/?ordering=name{query}")
+        return [organization["name"] for organization in response.data["results"]]
+
+    def test_visible_organizations(self):
+        self.assertEqual(self.names(), ["Active"])
+        self.assertEqual(self.names(self.owner), ["Active", "Pending"])
+        self.assertEqual(self.names(self.staff), ["Active", "Hidden", "Staffed"])
+        self.assertEqual(self.names(self.staff, "&search=staff"), ["Staffed"])
+
+        client = APIClient()
+        client.force_authenticate(User.objects.get(pk=self.staff.pk))
+        # profile, memberships, count, page
+        with self.assertNumQueries(4):
+            client.get("/api/v1/organizations/")
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class PlatformMetricsTests(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+
+        cache.clear()
+        self.admin = User.objects.create_user("admin")
+        self.admin.userprofile.user_type = "platform_admin"
+        self.admin.userprofile.save()
+        for name, status in (("Active", "active"), ("Pending", "pending")):
+            create_organization(self.admin, name=name, status=status)
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.get(pk=self.admin.pk))
+
+    def test_dashboard_is_served_from_snapshot(self):
+        from apps.organizations import metrics
+
+        # profile, users, organizations, API calls (no cached counter), top,
+        # recent users and organizations, day row (select and insert in two
+        # savepoints), history
+        with self.assertNumQueries(14):
+            response = self.client.get("/api/v1/organizations/admin/")
+        self.assertEqual(response.data["users"]["platform_admins"], 1)
+        self.assertEqual(
+            response.data["organizations"],
+            {"total": 2, "active": 1, "pending": 1, "suspended": 0},
+        )
+        self.assertEqual(
+            response.data["recent_activities"]["users"][0]["user_type"],
+            "platform_admin",
+        )
+        self.assertEqual(len(response.data["history"]), 1)
+        self.assertEqual(PlatformDailyMetrics.objects.get().total_organizations, 2)
+
+        Organization.objects.filter(name="Pending").update(status="active")
+        # The profile is already loaded on the authenticated user
+        with self.assertNumQueries(0):
+            response = self.client.get("/api/v1/organizations/admin/")
+        self.assertEqual(response.data["organizations"]["pending"], 1)
+
+        metrics.refresh()
+        response = self.client.get("/api/v1/organizations/admin/")
+        self.assertEqual(response.data["organizations"]["pending"], 0)
+        self.assertEqual(PlatformDailyMetrics.objects.count(), 1)
+
+
+@override_settings(CACHES=LOCMEM_CACHE, API_METERING_FLUSH_INTERVAL=0)
+class ApiMeteringTests(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+
+        cache.clear()
+        metering.drain()
+        self.addCleanup(setattr, metering, "limiter", metering.limiter)
+        metering.limiter = metering.TokenBuckets(3)
+        self.owner = User.objects.create_user("owner")
+        self.organization = create_organization(self.owner)
+        self.client = APIClient()
+        self.client.force_authenticate(self.owner)
+
+    def test_usage_is_counted_and_rolled_up(self):
+        self.client.get(f"/api/v1/organizations/{self.organization.pk}/")
+        self.client.get(f"/api/v1/marketplace/{self.organization.pk}/reviews/")
+        APIClient().get("/api/v1/marketplace/search/")
+
+        self.assertEqual(metering.flush(), 3)
+        self.assertEqual(metering.calls_today(), 3)
+        metering.rollup()
+        usage = {
+            (row.scope, row.key): row.count for row in ApiUsageDaily.objects.all()
+        }
+        self.assertEqual(usage["total", ""], 3)
+        self.assertEqual(usage["user", str(self.owner.pk)], 2)
+        self.assertEqual(usage["organization", str(self.organization.pk)], 2)
+        self.assertEqual(usage["endpoint", "marketplace-reviews"], 1)
+
+        self.client.get("/api/v1/marketplace/search/")
+        metering.flush()
+        metering.rollup()
+        self.assertEqual(ApiUsageDaily.objects.get(scope="total").count, 4)
+
+    def test_rate_limit(self):
+        PlatformSettings.objects.create(api_rate_limit=2)
+        metering.load_rate_limit()
+        url = f"/api/v1/organizations/{self.organization.pk}/"
+        self.assertEqual(self.client.get(url).status_code, 200)
+        self.assertEqual(self.client.get(url).status_code, 200)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 429)
+        self.assertIn("Retry-After", response)
+        # Anonymous requests have their own bucket
+        self.assertEqual(APIClient().get("/api/v1/marketplace/").status_code, 200)
+
+    def test_flush_thread_starts_with_the_first_request(self):
+        with mock.patch.object(metering, "_flusher", None), mock.patch.object(
+            metering.threading, "Thread"
+        ) as thread, mock.patch.object(metering.atexit, "register") as register:
+            APIClient()
+            thread.assert_not_called()
+            APIClient().get("/api/v1/marketplace/")
+            APIClient().get("/api/v1/marketplace/")
+        thread.assert_called_once()
+        thread.return_value.start.assert_called_once_with()
+        register.assert_called_once_with(metering._flush_at_exit)
+
+    def test_exit_flush_skipped_when_nothing_is_pending(self):
+        with mock.patch.object(metering, "flush") as flush:
+            metering._flush_at_exit()
+            flush.assert_not_called()
+            self.client.get("/api/v1/marketplace/")
+            flush.side_effect = ConnectionError("no cache")
+            with self.assertLogs(metering.logger, "WARNING") as logs:
+                metering._flush_at_exit()
+        flush.assert_called_once_with()
+        self.assertIn("Could not flush 1 API usage records", logs.output[0])
+        metering.drain()
+
+    def test_requests_served_by_other_workers_are_debited(self):
+        url = f"/api/v1/organizations/{self.organization.pk}/"
+        self.client.get(url)
+        metering.flush()
+        # Another worker serves the user once
+        day = timezone.localdate()
+        metering._add(
+            metering.COUNTER_KEY.format(date=day, scope="user", key=self.owner.pk), 1
+        )
+        self.client.get(url)
+        metering.flush()
+        self.assertEqual(self.client.get(url).status_code, 429)
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class RankingTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user("owner")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.organization = create_organization(self.owner)
+            self.banquet = Hall.objects.create(
+                organization=self.organization,
+                name="Banquet",
+                hall_type="banquet",
+                capacity=500,
+                base_price=Decimal("100000.00"),
+            )
+            self.conference = Hall.objects.create(
+                organization=self.organization,
+                name="Conference",
+                hall_type="conference",
+                capacity=100,
+                base_price=Decimal("80000.00"),
+            )
+            for day in range(3):
+                Booking.objects.create(
+                    organization=self.organization,
+                    hall=self.conference,
+                    customer=self.owner,
+                    event_date=datetime.date(2030, 6, 1 + day),
+                    event_time=datetime.time(19, 0),
+                    guest_count=80,
+                    contact_phone="0300",
+                    contact_email="guest@example.com",
+                    status="confirmed",
+                )
+        ranking.refresh()
+
+    def names(self, response):
+        return [result["name"] for result in response.data["results"]]
+
+    def test_scores(self):
+        scores = {row.hall_id: row for row in VenueScore.objects.all()}
+        # Busier and better converting, but dearer per seat
+        self.assertEqual(scores[self.conference.pk].velocity, 1)
+        self.assertEqual(scores[self.conference.pk].price, 0)
+        self.assertEqual(scores[self.banquet.pk].price, 1)
+        self.assertGreater(
+            scores[self.conference.pk].score, scores[self.banquet.pk].score
+        )
+        self.assertEqual(
+            OrganizationStats.objects.get().ranking_score,
+            scores[self.conference.pk].score,
+        )
+        response = APIClient().get("/api/v1/marketplace/search/?ordering=score")
+        self.assertEqual(self.names(response), ["Conference", "Banquet"])
+
+    def test_recommended(self):
+        client = APIClient()
+        # candidates, result page
+        with self.assertNumQueries(2):
+            response = client.get("/api/v1/marketplace/recommended/")
+        self.assertEqual(self.names(response), ["Conference", "Banquet"])
+
+        # Booked on the day
+        with self.assertNumQueries(3):
+            response = client.get(
+                "/api/v1/marketplace/recommended/?date_from=2030-06-02"
+            )
+        self.assertEqual(self.names(response), ["Banquet"])
+        response = client.get(
+            "/api/v1/marketplace/recommended/?date_from=2030-06-02&date_to=2030-06-01"
+        )
+        self.assertEqual(response.status_code, 400)
+
+        customer = User.objects.create_user("customer")
+        customer.userprofile.preferred_event_types = "wedding"
+        customer.userprofile.budget_range_min = Decimal("90000")
+        customer.userprofile.save()
+        client.force_authenticate(User.objects.get(pk=customer.pk))
+        # profile, candidates, result page
+        with self.assertNumQueries(3):
+            response = client.get("/api/v1/marketplace/recommended/")
+        self.assertEqual(self.names(response), ["Banquet", "Conference"])
+        # An explicit filter wins over the profile
+        response = client.get("/api/v1/marketplace/recommended/?event_type=workshop")
+        self.assertEqual(self.names(response), ["Conference"])
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user("owner")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.organization = create_organization(self.owner)
+            self.hall = Hall.objects.create(
+                organization=self.organization,
+                name="Main",
+                capacity=300,
+                base_price=Decimal("60000.00"),
+            )
+        self.client = APIClient()
+
+    def assert_revalidates(self, url):
+        first = self.client.get(url)
+        self.assertEqual(first.status_code, 200)
+        self.assertIn("s-maxage=", first["Cache-Control"])
+        self.assertIn("Accept", first["Vary"])
+        # Only the version stamp is read
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], first["ETag"])
+        response = self.client.get(
+            url, HTTP_IF_MODIFIED_SINCE=first["Last-Modified"]
+        )
+        self.assertEqual(response.status_code, 304)
+        return first["ETag"]
+
+    def test_validators_follow_changes(self):
+        pk = self.organization.pk
+        urls = [
+            "/api/v1/marketplace/",
+            "/api/v1/marketplace/?search=venue",
+            f"/api/v1/marketplace/{pk}/",
+            f"/api/v1/marketplace/{pk}/halls/",
+        ]
+        tags = [self.assert_revalidates(url) for url in urls]
+        self.assertEqual(len(set(tags)), len(tags))
+
+        # A hall change reaches the stats, hence every listing
+        self.hall.base_price = Decimal("50000.00")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.hall.save()
+        for url, tag in zip(urls, tags):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=tag)
+            self.assertEqual(response.status_code, 200, url)
+
+        # So does renaming the owner shown on them
+        tag = self.client.get(f"/api/v1/marketplace/{pk}/")["ETag"]
+        self.owner.first_name = "Owner"
+        self.owner.save()
+        response = self.client.get(
+            f"/api/v1/marketplace/{pk}/", HTTP_IF_NONE_MATCH=tag
+        )
+        self.assertEqual(response.data["owner"]["first_name"], "Owner")
+
+        self.assertEqual(self.client.get("/api/v1/marketplace/0/").status_code, 404)
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class AsyncMarketplaceTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user("owner")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.organization = create_organization(self.owner)
+            self.hall = Hall.objects.create(
+                organization=self.organization,
+                name="Main",
+                capacity=300,
+                base_price=Decimal("60000.00"),
+            )
+            Booking.objects.create(
+                organization=self.organization,
+                hall=self.hall,
+                customer=self.owner,
+                event_date=datetime.date(2030, 6, 2),
+                event_time=datetime.time(19, 0),
+                guest_count=80,
+                contact_phone="0300",
+                contact_email="guest@example.com",
+                status="confirmed",
+            )
+
+    async def test_matches_sync_endpoints(self):
+        pk = self.organization.pk
+        paths = [
+            "",
+            "?search=venue&ordering=-min_price",
+            "?page=2",
+            "?subscription_plan=unknown",
+            f"{pk}/",
+            f"{pk}/halls/",
+            f"{pk}/menu/",
+            f"{pk}/packages/",
+            f"{pk}/availability/?date_from=2030-06-01&date_to=2030-06-03",
+            f"{pk}/availability/?date_from=2030-06-03&date_to=2030-06-01",
+            "0/",
+            "0/halls/",
+        ]
+        for path in paths:
+            expected = await self.async_client.get(f"/api/v1/marketplace/{path}")
+            response = await self.async_client.get(f"/api/v1/async/marketplace/{path}")
+            self.assertEqual(response.status_code, expected.status_code, path)
+            self.assertEqual(response.json(), expected.json(), path)
+            # ETags differ, as they cover the path
+            self.assertEqual(response.has_header("ETag"), expected.has_header("ETag"))
+
+        response = await self.async_client.get(
+            f"/api/v1/async/marketplace/{pk}/availability/?date_from=2030-06-01"
+            "&date_to=2030-06-03"
+        )
+        self.assertEqual(
+            response.json()["halls"],
+            [
+                {
+                    "id": self.hall.pk,
+                    "name": "Main",
+                    "booked_dates": ["2030-06-02"],
+                    "available_dates": ["2030-06-01", "2030-06-03"],
+                }
+            ],
+        )
+        url = f"/api/v1/async/marketplace/{pk}/"
+        tag = (await self.async_client.get(url))["ETag"]
+        response = await self.async_client.get(url, headers={"If-None-Match": tag})
+        self.assertEqual(response.status_code, 304)
+
+    async def test_throttled(self):
+        self.addCleanup(setattr, metering, "limiter", metering.limiter)
+        metering.limiter = metering.TokenBuckets(1)
+        self.assertEqual(
+            (await self.async_client.get("/api/v1/async/marketplace/")).status_code,
+            200,
+        )
+        response = await self.async_client.get("/api/v1/async/marketplace/")
+        self.assertEqual(response.status_code, 429)
+        self.assertIn("Retry-After", response)
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class TokenClaimsTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user("owner", password="pass")
+        self.member = User.objects.create_user("member", password="pass")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.organization = create_organization(self.owner, status="pending")
+            self.membership = OrganizationMember.objects.create(
+                organization=self.organization, user=self.member, role="staff"
+            )
+        self.client = APIClient()
+
+    def login(self, username):
+        response = self.client.post(
+            "/api/v1/auth/login", {"username": username, "password": "pass"}
+        )
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_claims_replace_user_queries(self):
+        tokens = self.login("member")
+        claims = AccessToken(tokens["access"])
+        self.assertEqual(claims["user_type"], "customer")
+        self.assertEqual(claims["owned"], [])
+        self.assertEqual(claims["roles"], {str(self.organization.pk): "staff"})
+
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {tokens['access']}")
+        # count, page: no user, profile or membership queries
+        with self.assertNumQueries(2):
+            response = self.client.get("/api/v1/organizations/")
+        self.assertEqual(
+            [row["id"] for row in response.data["results"]], [self.organization.pk]
+        )
+
+        # The pending organization is visible to members only
+        with self.captureOnCommitCallbacks(execute=True):
+            self.membership.delete()
+        response = self.client.get("/api/v1/organizations/")
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.data["code"], "token_not_valid")
+
+        self.client.credentials()
+        response = self.client.post(
+            "/api/v1/auth/token/refresh", {"refresh": tokens["refresh"]}
+        )
+        self.assertEqual(AccessToken(response.data["access"])["roles"], {})
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['access']}")
+        response = self.client.get("/api/v1/organizations/")
+        self.assertEqual(response.data["results"], [])
+
+    def test_account_changes_retire_tokens(self):
+        access = self.login("owner")["access"]
+        self.assertEqual(AccessToken(access)["owned"], [self.organization.pk])
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {access}")
+        self.assertEqual(self.client.get("/api/v1/auth/user").status_code, 200)
+
+        # Logging in again (last_login) keeps the token
+        self.login("owner")
+        self.assertEqual(self.client.get("/api/v1/auth/user").status_code, 200)
+
+        self.owner.set_password("new")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.owner.save()
+        self.assertEqual(self.client.get("/api/v1/auth/user").status_code, 401)
+
+    def test_claims_user_is_a_user(self):
+        access = AccessToken(self.login("member")["access"])
+        with self.assertNumQueries(0):
+            user = ClaimsJWTAuthentication().get_user(access)
+            self.assertIs(type(user), User)
+            self.assertFalse(user._state.adding)
+            self.assertEqual(user, self.member)
+            self.assertEqual(user.username, "member")
+            # Assigned as a foreign key without loading the row
+            membership = OrganizationMember(organization=self.organization, user=user)
+            self.assertEqual(membership.user_id, self.member.pk)
+
+        # Other fields are loaded when read, and views showing the account
+        # load them all at once
+        with self.assertNumQueries(1):
+            self.assertEqual(user.email, "")
+        with self.assertNumQueries(1):
+            self.assertEqual(loaded_user(user).date_joined, self.member.date_joined)
+
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {access}")
+        response = self.client.get("/api/v1/auth/user")
+        self.assertEqual(response.data["username"], "member")
+
+    def test_cache_outage_fails_closed(self):
+        access = self.login("member")["access"]
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {access}")
+        self.client.raise_request_exception = False
+        with mock.patch.object(cache, "get", side_effect=ConnectionError):
+            response = self.client.get("/api/v1/organizations/")
+        self.assertEqual(response.status_code, 500)
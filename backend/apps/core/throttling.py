@@ -0,0 +1,25 @@
+from rest_framework.throttling import BaseThrottle
+
+from . import metering
+
+
+class ApiRateThrottle(BaseThrottle):
+    """
+    PlatformSettings.api_rate_limit requests per hour per user, or per IP
+    address for anonymous requests, as an in-process token bucket kept in
+    step with other workers by apps/core/metering.py
+
+    The IP address comes from get_ident(), so deployments behind a reverse
+    proxy must set NUM_PROXIES (see settings.py).
+    """
+
+    def allow_request(self, request, view):
+        if request.user and request.user.is_authenticated:
+            client = f"user:{request.user.pk}"
+        else:
+            client = f"ip:{self.get_ident(request)}"
+        self.retry_after = metering.limiter.take(client)
+        return not self.retry_after
+
+    def wait(self):
+        return self.retry_after
@@ -0,0 +1,194 @@
+"""
+Per-organization discount tier index
+
+Guest-count tier resolution runs on every quote, so each process keeps a
+sorted index of every organization's active tiers in memory and resolves a
+guest count with a bisect over the tiers' ``min_guests`` boundaries.
+
+Indexes are versioned: once a DiscountTier write commits, the writing process
+drops its local copy and bumps a shared per-organization version in the
+cache. Other processes re-check the shared version at most every
+VERSION_CHECK_INTERVAL seconds and rebuild when it moved; INDEX_MAX_AGE bounds
+staleness for writes that bypass signals (queryset.update(), raw SQL).
+
+Tier instances held by an index are shared between requests and must be
+treated as read-only.
+"""
+
+import logging
+import time
+from bisect import bisect_right
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+
+from .models import DiscountTier
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = "discount_tiers:version:{organization_id}"
+
+# Seconds a process trusts its local index before re-checking the shared version
+VERSION_CHECK_INTERVAL = 5
+# Seconds after which a local index is rebuilt regardless of its version
+INDEX_MAX_AGE = 300
+
+# organization_id -> TierIndex
+_indexes = {}
+
+
+class TierIndex:
+    """Sorted, non-overlapping active tiers of one organization"""
+
+    __slots__ = (
+        "organization_id",
+        "version",
+        "starts",
+        "ends",
+        "tiers",
+        "overlaps",
+        "built_at",
+        "checked_at",
+    )
+
+    def __init__(self, organization_id, tiers, version=0):
+        self.organization_id = organization_id
+        self.version = version
+        self.starts = []
+        self.ends = []
+        self.tiers = []
+        # (kept tier, shadowed tier) pairs found while building
+        self.overlaps = []
+
+        for tier in sorted(tiers, key=lambda tier: (tier.min_guests, tier.pk)):
+            if self.tiers and tier.min_guests <= self.ends[-1]:
+                # The lower tier wins, as it did with the previous
+                # ``order_by("min_guests").first()`` lookup
+                self.overlaps.append((self.tiers[-1], tier))
+                continue
+            self.starts.append(tier.min_guests)
+            self.ends.append(tier.max_guests)
+            self.tiers.append(tier)
+
+        if self.overlaps:
+            logger.warning(
+                "Organization %s has overlapping discount tiers: %s",
+                organization_id,
+                ", ".join(
+                    f"{kept.name!r} shadows {shadowed.name!r}"
+                    for kept, shadowed in self.overlaps
+                ),
+            )
+
+        self.built_at = self.checked_at = time.monotonic()
+
+    def lookup(self, guest_count):
+        """Return the tier covering ``guest_count``, or ``None``"""
+        position = bisect_right(self.starts, guest_count) - 1
+        if position >= 0 and guest_count <= self.ends[position]:
+            return self.tiers[position]
+        return None
+
+    def lookup_many(self, guest_counts):
+        """Resolve many guest counts at once; results follow the input order"""
+        return [self.lookup(guest_count) for guest_count in guest_counts]
+
+
+def _version_key(organization_id):
+    return VERSION_KEY.format(organization_id=organization_id)
+
+
+def _shared_versions(organization_ids):
+    keys = {
+        _version_key(organization_id): organization_id
+        for organization_id in organization_ids
+    }
+    found = cache.get_many(list(keys))
+    return {organization_id: found.get(key, 0) for key, organization_id in keys.items()}
+
+
+def get_indexes(organization_ids):
+    """
+    Return ``{organization_id: TierIndex}``, building any missing or stale
+    indexes with a single query.
+    """
+    now = time.monotonic()
+    indexes, to_check = {}, []
+    for organization_id in set(organization_ids):
+        index = _indexes.get(organization_id)
+        if index is not None and now - index.built_at < INDEX_MAX_AGE:
+            if now - index.checked_at < VERSION_CHECK_INTERVAL:
+                indexes[organization_id] = index
+                continue
+        to_check.append(organization_id)
+
+    if not to_check:
+        return indexes
+
+    versions = _shared_versions(to_check)
+    to_build = []
+    for organization_id in to_check:
+        index = _indexes.get(organization_id)
+        if (
+            index is not None
+            and index.version == versions[organization_id]
+            and now - index.built_at < INDEX_MAX_AGE
+        ):
+            index.checked_at = now
+            indexes[organization_id] = index
+        else:
+            to_build.append(organization_id)
+
+    if to_build:
+        tiers_by_organization = {organization_id: [] for organization_id in to_build}
+        for tier in DiscountTier.objects.filter(
+            organization_id__in=to_build, is_active=True
+        ):
+            tiers_by_organization[tier.organization_id].append(tier)
+        for organization_id, tiers in tiers_by_organization.items():
+            index = TierIndex(organization_id, tiers, version=versions[organization_id])
+            _indexes[organization_id] = indexes[organization_id] = index
+
+    return indexes
+
+
+def get_index(organization_id):
+    return get_indexes([organization_id])[organization_id]
+
+
+def find_tier(organization_id, guest_count):
+    """The active tier of ``organization_id`` covering ``guest_count``"""
+    return get_index(organization_id).lookup(guest_count)
+
+
+def find_tiers(organization_id, guest_counts):
+    """Batch form of find_tier; results follow the order of ``guest_counts``"""
+    return get_index(organization_id).lookup_many(guest_counts)
+
+
+def invalidate(organization_id):
+    """Drop the local index and move the shared version for ``organization_id``"""
+    _indexes.pop(organization_id, None)
+    key = _version_key(organization_id)
+    cache.add(key, 0, timeout=None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Evicted between add() and incr()
+        cache.set(key, 1, timeout=None)
+
+
+def invalidate_tier_index(sender, instance, **kwargs):
+    organization_id = instance.organization_id
+    transaction.on_commit(lambda: invalidate(organization_id))
+
+
+post_save.connect(
+    invalidate_tier_index, sender=DiscountTier, dispatch_uid="discount_tier_index_save"
+)
+post_delete.connect(
+    invalidate_tier_index,
+    sender=DiscountTier,
+    dispatch_uid="discount_tier_index_delete",
+)
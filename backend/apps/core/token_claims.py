@@ -0,0 +1,204 @@
+"""
+Role and tenant claims in access tokens
+
+Login and refresh sign the user's type, owned organizations and member roles
+into the tokens (add_claims). ClaimsJWTAuthentication
+(apps/core/authentication.py) then authenticates a request without loading
+the user, profile or memberships: request.user is a User built from the
+claims (claims_user), with the id, username and flags loaded and every other
+field deferred, so FK assignment and comparisons need no query while reading
+another field loads it. request.auth keeps the token, whose claims
+AccessScope (apps/organizations/scope.py) reads through claims_of(request)
+to answer permission checks.
+
+Claims go stale when a membership, an organization owner, the user type or
+the account changes. The signals below then bump the user's token version,
+a counter held in the cache; a token records the version it was issued at,
+and one from an older version is refused with 401 token_not_valid, which
+the client answers by refreshing (refresh rebuilds the claims from the
+database). A request therefore costs one cache read instead of the user,
+profile and membership queries. A version missing from the cache starts
+over from the clock, so an evicted or flushed counter retires every token
+issued before rather than accepting them.
+
+Authentication fails closed: while the cache (Redis in production) is
+unreachable, reading the version raises, and every request carrying a
+current token fails with a 500 instead of being let through on unchecked
+claims. Cache outages are therefore authentication outages.
+"""
+
+import time
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import router
+from django.db.models.signals import post_delete, post_init, post_save
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import Token
+
+from .models import Organization, OrganizationMember, UserProfile
+from .transactions import defer_until_commit
+
+VERSION_KEY = "token_version:{user_id}"
+
+# User fields whose change retires the user's tokens; all but the password
+# are also claims
+ACCOUNT_FIELDS = ("username", "is_active", "is_staff", "is_superuser", "password")
+USER_CLAIMS = ACCOUNT_FIELDS[:-1]
+
+SNAPSHOT_ATTR = "_token_claims_snapshot"
+
+
+# Versions
+
+
+def current_version(user_id):
+    """The token version of ``user_id``, started from the clock if missing"""
+    key = VERSION_KEY.format(user_id=user_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns() // 1000, None)
+        version = cache.get(key)
+    return version
+
+
+def _bump(user_ids):
+    for user_id in user_ids:
+        try:
+            cache.incr(VERSION_KEY.format(user_id=user_id))
+        except ValueError:
+            # Not cached: the next read starts a new version anyway
+            pass
+
+
+def bump(user_ids):
+    """Retire the tokens of ``user_ids`` once the current transaction commits"""
+    user_ids = [user_id for user_id in user_ids if user_id is not None]
+    if user_ids:
+        defer_until_commit("token_version_bumps", user_ids, _bump, unique=True)
+
+
+# Claims
+
+
+def add_claims(token, user):
+    """Sign ``user``'s current roles and organizations into ``token``"""
+    from apps.organizations.scope import AccessScope
+
+    # Read the version first: a bump committed after it retires this token
+    token["ver"] = current_version(user.pk)
+    for name in USER_CLAIMS:
+        token[name] = getattr(user, name)
+    token["user_type"] = (
+        UserProfile.objects.filter(user=user)
+        .values_list("user_type", flat=True)
+        .first()
+    )
+    scope = AccessScope(user)
+    token["owned"] = sorted(scope.owned_ids)
+    token["roles"] = {
+        str(organization_id): role
+        for organization_id, role in sorted(scope.member_roles.items())
+    }
+    return token
+
+
+def claims_user(claims):
+    """
+    The User ``claims`` were signed for, built without a query: the id,
+    username and flags come from the claims, any other field is deferred and
+    loaded when read (one query per field; see loaded_user)
+    """
+    values = {"id": claims[api_settings.USER_ID_CLAIM]}
+    values.update((name, claims[name]) for name in USER_CLAIMS)
+    names = [
+        field.attname
+        for field in User._meta.concrete_fields
+        if field.attname in values
+    ]
+    return User.from_db(
+        router.db_for_read(User), names, [values[name] for name in names]
+    )
+
+
+def loaded_user(user):
+    """``user`` with every field loaded, for views showing the whole account"""
+    if user.get_deferred_fields():
+        return User.objects.get(pk=user.pk)
+    return user
+
+
+def claims_of(request):
+    """The token claims ``request`` was authenticated with, or None"""
+    token = getattr(request, "auth", None)
+    if isinstance(token, Token) and "ver" in token:
+        return token.payload
+    return None
+
+
+# Version bumps
+
+
+def snapshot(sender, instance, **kwargs):
+    # Read __dict__ so deferred fields are not loaded; unknown values are None
+    values = instance.__dict__
+    if sender is User:
+        state = tuple(values.get(name) for name in ACCOUNT_FIELDS)
+    elif sender is UserProfile:
+        state = values.get("user_type")
+    else:
+        state = values.get("owner_id")
+    setattr(instance, SNAPSHOT_ATTR, state)
+
+
+def account_saved(sender, instance, created=False, raw=False, **kwargs):
+    """User and profile changes that show in the user's claims"""
+    previous = getattr(instance, SNAPSHOT_ATTR, None)
+    snapshot(sender, instance)
+    if created or raw or previous == getattr(instance, SNAPSHOT_ATTR):
+        return
+    bump([instance.pk if sender is User else instance.user_id])
+
+
+def organization_saved(sender, instance, created=False, raw=False, **kwargs):
+    """New organizations and owner changes"""
+    previous = getattr(instance, SNAPSHOT_ATTR, None)
+    snapshot(sender, instance)
+    if raw or (previous == instance.owner_id and not created):
+        return
+    bump([previous, instance.owner_id])
+
+
+def organization_deleted(sender, instance, **kwargs):
+    bump([instance.owner_id])
+
+
+def membership_changed(sender, instance, raw=False, **kwargs):
+    if not raw:
+        bump([instance.user_id])
+
+
+for model in (User, UserProfile, Organization):
+    post_init.connect(
+        snapshot, sender=model, dispatch_uid=f"token_claims_init_{model.__name__}"
+    )
+post_save.connect(account_saved, sender=User, dispatch_uid="token_claims_user")
+post_save.connect(
+    account_saved, sender=UserProfile, dispatch_uid="token_claims_profile"
+)
+post_save.connect(
+    organization_saved, sender=Organization, dispatch_uid="token_claims_organization"
+)
+post_delete.connect(
+    organization_deleted,
+    sender=Organization,
+    dispatch_uid="token_claims_organization_delete",
+)
+post_save.connect(
+    membership_changed, sender=OrganizationMember, dispatch_uid="token_claims_member"
+)
+post_delete.connect(
+    membership_changed,
+    sender=OrganizationMember,
+    dispatch_uid="token_claims_member_delete",
+)
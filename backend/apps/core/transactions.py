@@ -0,0 +1,82 @@
+"""
+Helpers for deferring work until the surrounding transaction commits
+
+``defer_until_commit`` collects items under a key for the lifetime of the
+current transaction and hands them to a callback exactly once, after commit.
+Repeated saves inside one transaction are thereby coalesced into a single
+batch, and nothing is processed for a transaction that rolls back.
+
+A batch belongs to the savepoint it was started in: items queued inside a
+nested atomic block go to a batch of their own, whose on_commit callback
+Django discards if that block rolls back, while the outer batch keeps the
+items queued outside it.
+"""
+
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+
+class CommitBatch:
+    """Items collected for one callback during a single transaction"""
+
+    def __init__(self, callback, collection):
+        self.callback = callback
+        self.items = collection()
+        self.flushed = False
+
+    def add(self, items):
+        if isinstance(self.items, set):
+            self.items.update(items)
+        else:
+            self.items.extend(items)
+
+    def flush(self):
+        self.flushed = True
+        items, self.items = self.items, type(self.items)()
+        if items:
+            self.callback(items)
+
+
+def _pending_batch(batches, connection, key):
+    batch = batches.get(key)
+    if batch is None or batch.flushed:
+        return None
+    # A batch is only usable while its flush is still registered on the current
+    # transaction; once it has run (commit) or been dropped (rollback) a fresh
+    # one is needed.
+    for _savepoints, callback, _robust in connection.run_on_commit:
+        if callback == batch.flush:
+            return batch
+    return None
+
+
+def defer_until_commit(key, items, callback, using=DEFAULT_DB_ALIAS, unique=False):
+    """
+    Queue ``items`` for ``callback`` until the current transaction commits.
+
+    Outside of an atomic block the callback runs immediately. With
+    ``unique=True`` items are collected in a set, so the callback sees each
+    item once per savepoint however many times it was queued.
+    """
+    collection = set if unique else list
+    connection = transaction.get_connection(using)
+    if not connection.in_atomic_block:
+        callback(collection(items))
+        return
+
+    if not hasattr(connection, "_commit_batches"):
+        connection._commit_batches = {}
+    batches = connection._commit_batches
+    savepoints = tuple(connection.savepoint_ids)
+    key = (key, savepoints)
+    batch = _pending_batch(batches, connection, key)
+    if batch is None:
+        # Forget the batches of savepoints that have been left since
+        for stale in [
+            (name, entered)
+            for name, entered in batches
+            if entered != savepoints[: len(entered)]
+        ]:
+            del batches[stale]
+        batch = batches[key] = CommitBatch(callback, collection)
+        transaction.on_commit(batch.flush, using=using)
+    batch.add(items)
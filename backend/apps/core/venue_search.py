@@ -0,0 +1,405 @@
+"""
+Faceted marketplace venue search
+
+Every active hall of an active organization has a VenueSearchEntry row that
+copies what customers filter on (location, plan, hall type, capacity, price)
+next to an amenity bitmask and a lower-cased text column, so a search is a
+scan of one narrow, indexed table instead of joins across organizations and
+halls:
+
+- ``amenity_flags``: one bit per amenity code. The hall's boolean columns
+  (has_parking, has_ac, ...) and recognised spellings in its free-text
+  amenities both set bits, so "parking + AC" is a single bit test.
+- ``price_bucket``: index into PRICE_BUCKETS, stored so price facets are a
+  plain GROUP BY.
+
+Facet counts for cities, price buckets and amenities come from one grouped
+query over the filtered rows (grouped by city and price bucket, with one
+conditional count per amenity), folded in Python; the result page is a second
+query. Rows are rebuilt after commit whenever a hall or its organization is
+saved; ``manage.py rebuild_venue_search`` rebuilds the whole table.
+"""
+
+from bisect import bisect_right
+
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import Count, F, Q
+from django.db.models.signals import post_delete, post_save
+
+from .models import Hall, Organization, VenueSearchEntry
+from .transactions import defer_until_commit
+
+# Amenity codes (bit values are stored; never renumber)
+AMENITY_BITS = {
+    "parking": 1 << 0,
+    "ac": 1 << 1,
+    "kitchen": 1 << 2,
+    "sound_system": 1 << 3,
+    "stage": 1 << 4,
+    "external_catering": 1 << 5,
+    "wifi": 1 << 6,
+    "generator": 1 << 7,
+    "bridal_room": 1 << 8,
+    "valet_parking": 1 << 9,
+    "projector": 1 << 10,
+    "wheelchair_access": 1 << 11,
+}
+
+# Hall boolean columns -> amenity code
+AMENITY_COLUMNS = {
+    "has_parking": "parking",
+    "has_ac": "ac",
+    "has_kitchen": "kitchen",
+    "has_sound_system": "sound_system",
+    "has_stage": "stage",
+    "allow_external_catering": "external_catering",
+}
+
+# Spellings found in the free-text amenities field -> amenity code
+AMENITY_ALIASES = {
+    "air conditioning": "ac",
+    "air conditioned": "ac",
+    "a/c": "ac",
+    "car parking": "parking",
+    "free parking": "parking",
+    "wi-fi": "wifi",
+    "wireless internet": "wifi",
+    "backup generator": "generator",
+    "power backup": "generator",
+    "bridal suite": "bridal_room",
+    "valet": "valet_parking",
+    "sound system": "sound_system",
+    "catering kitchen": "kitchen",
+    "multimedia projector": "projector",
+    "wheelchair accessible": "wheelchair_access",
+}
+
+# Upper bounds of the price buckets; the last bucket is open-ended
+PRICE_BUCKETS = (50_000, 100_000, 200_000, 500_000)
+
+# Booking event type -> hall types suited to it (unlisted types match any hall)
+EVENT_HALL_TYPES = {
+    "wedding": ("indoor", "outdoor", "garden", "rooftop", "banquet"),
+    "birthday": ("indoor", "outdoor", "garden", "rooftop", "banquet"),
+    "anniversary": ("indoor", "outdoor", "garden", "rooftop", "banquet"),
+    "graduation": ("indoor", "outdoor", "garden", "banquet"),
+    "religious": ("indoor", "outdoor", "garden", "banquet"),
+    "corporate": ("indoor", "banquet", "conference"),
+    "conference": ("conference", "banquet"),
+    "workshop": ("conference", "indoor"),
+    "exhibition": ("indoor", "outdoor", "banquet"),
+}
+
+ORDERINGS = {
+    "price": ("base_price", "hall_id"),
+    "-price": ("-base_price", "hall_id"),
+    "capacity": ("capacity", "hall_id"),
+    "-capacity": ("-capacity", "hall_id"),
+    "rating": (
+        F("organization__stats__avg_rating").desc(nulls_last=True),
+        "base_price",
+        "hall_id",
+    ),
+    # VenueScore (apps/core/ranking.py)
+    "score": (F("hall__score__score").desc(nulls_last=True), "base_price", "hall_id"),
+}
+
+MAX_PAGE_SIZE = 50
+
+# Hall (and organization) columns an entry is built from
+HALL_COLUMNS = (
+    "id",
+    "organization_id",
+    "name",
+    "description",
+    "hall_type",
+    "capacity",
+    "base_price",
+    "amenities",
+    *AMENITY_COLUMNS,
+    "organization__name",
+    "organization__description",
+    "organization__city",
+    "organization__state",
+    "organization__country",
+    "organization__subscription_plan",
+)
+
+
+def amenity_code(name):
+    name = name.strip().lower()
+    if name in AMENITY_ALIASES:
+        return AMENITY_ALIASES[name]
+    code = name.replace(" ", "_").replace("-", "_")
+    return code if code in AMENITY_BITS else None
+
+
+def amenity_mask(codes):
+    """Combine amenity codes into one mask; raises ValueError naming an unknown code"""
+    value = 0
+    for code in codes:
+        try:
+            value |= AMENITY_BITS[code]
+        except KeyError:
+            raise ValueError(f"Unknown amenity: {code}")
+    return value
+
+
+def amenity_codes(flags):
+    return [code for code, bit in AMENITY_BITS.items() if flags & bit]
+
+
+def price_bucket(price):
+    return bisect_right(PRICE_BUCKETS, price)
+
+
+def bucket_range(bucket):
+    """(min, max) prices of a bucket; max is None for the last one"""
+    lower = PRICE_BUCKETS[bucket - 1] if bucket else 0
+    upper = PRICE_BUCKETS[bucket] if bucket < len(PRICE_BUCKETS) else None
+    return lower, upper
+
+
+def entry_values(row):
+    """VenueSearchEntry field values for a ``HALL_COLUMNS`` row"""
+    codes = {code for column, code in AMENITY_COLUMNS.items() if row[column]}
+    codes.update(filter(None, map(amenity_code, row["amenities"].split(","))))
+    text = " ".join(
+        [
+            row["organization__name"],
+            row["name"],
+            row["organization__description"],
+            row["description"],
+            row["amenities"],
+        ]
+    )
+    return {
+        "hall_id": row["id"],
+        "organization_id": row["organization_id"],
+        "city": row["organization__city"].strip().lower(),
+        "state": row["organization__state"].strip().lower(),
+        "country": row["organization__country"].strip().lower(),
+        "subscription_plan": row["organization__subscription_plan"],
+        "hall_type": row["hall_type"],
+        "capacity": row["capacity"],
+        "base_price": row["base_price"],
+        "price_bucket": price_bucket(row["base_price"]),
+        "amenity_flags": amenity_mask(codes),
+        "search_text": " ".join(text.lower().split()),
+    }
+
+
+# Maintenance
+
+
+def indexed_halls():
+    return Hall.objects.filter(is_active=True, organization__status="active")
+
+
+def rebuild(batch_size=500):
+    """Rebuild every entry; returns the number of indexed halls"""
+    with transaction.atomic():
+        VenueSearchEntry.objects.all().delete()
+        rows = indexed_halls().order_by().values(*HALL_COLUMNS)
+        entries = [VenueSearchEntry(**entry_values(row)) for row in rows]
+        VenueSearchEntry.objects.bulk_create(entries, batch_size=batch_size)
+    return len(entries)
+
+
+def reindex(changes):
+    """Rebuild the entries of ``changes``: ("hall" | "organization", id) pairs"""
+    hall_ids = [key for kind, key in changes if kind == "hall"]
+    organization_ids = [key for kind, key in changes if kind == "organization"]
+    with transaction.atomic():
+        VenueSearchEntry.objects.filter(
+            Q(hall_id__in=hall_ids) | Q(organization_id__in=organization_ids)
+        ).delete()
+        rows = (
+            indexed_halls()
+            .filter(Q(id__in=hall_ids) | Q(organization_id__in=organization_ids))
+            .order_by()
+            .values(*HALL_COLUMNS)
+        )
+        VenueSearchEntry.objects.bulk_create(
+            [VenueSearchEntry(**entry_values(row)) for row in rows]
+        )
+
+
+# Queries
+
+
+def filter_entries(params):
+    """
+    Entries matching validated OrganizationSearchSerializer ``params``;
+    raises ValueError for unknown amenities
+    """
+    entries = VenueSearchEntry.objects.all()
+    for term in (params.get("q") or "").lower().split():
+        entries = entries.filter(search_text__contains=term)
+    for field in ("city", "state", "country"):
+        if params.get(field):
+            entries = entries.filter(**{field: params[field].strip().lower()})
+    if params.get("subscription_plan"):
+        entries = entries.filter(subscription_plan=params["subscription_plan"])
+    if params.get("min_capacity") is not None:
+        entries = entries.filter(capacity__gte=params["min_capacity"])
+    if params.get("max_capacity") is not None:
+        entries = entries.filter(capacity__lte=params["max_capacity"])
+    if params.get("min_price") is not None:
+        entries = entries.filter(base_price__gte=params["min_price"])
+    if params.get("max_price") is not None:
+        entries = entries.filter(base_price__lte=params["max_price"])
+    if params.get("event_type") in EVENT_HALL_TYPES:
+        entries = entries.filter(hall_type__in=EVENT_HALL_TYPES[params["event_type"]])
+
+    codes = [amenity_code(name) or name for name in params.get("amenities", ())]
+    codes += [
+        code
+        for column, code in AMENITY_COLUMNS.items()
+        if column in ("has_parking", "has_ac", "has_kitchen") and params.get(column)
+    ]
+    required = amenity_mask(codes)
+    if required:
+        entries = entries.alias(
+            amenity_match=F("amenity_flags").bitand(required)
+        ).filter(amenity_match=required)
+    return entries
+
+
+def facet_counts(entries):
+    """
+    ``(total, facets)`` for ``entries`` from one query grouped by city and
+    price bucket with a conditional count per amenity
+    """
+    aliases = {
+        f"amenity_{code}": F("amenity_flags").bitand(bit)
+        for code, bit in AMENITY_BITS.items()
+    }
+    rows = (
+        entries.alias(**aliases)
+        .order_by()
+        .values("city", "price_bucket")
+        .annotate(
+            count=Count("pk"),
+            **{
+                f"with_{code}": Count("pk", filter=Q(**{f"amenity_{code}": bit}))
+                for code, bit in AMENITY_BITS.items()
+            },
+        )
+    )
+
+    cities, buckets, amenities = {}, {}, dict.fromkeys(AMENITY_BITS, 0)
+    total = 0
+    for row in rows:
+        total += row["count"]
+        cities[row["city"]] = cities.get(row["city"], 0) + row["count"]
+        buckets[row["price_bucket"]] = (
+            buckets.get(row["price_bucket"], 0) + row["count"]
+        )
+        for code in AMENITY_BITS:
+            amenities[code] += row[f"with_{code}"]
+
+    facets = {
+        "cities": [
+            {"city": city, "label": city.title(), "count": count}
+            for city, count in sorted(
+                cities.items(), key=lambda item: (-item[1], item[0])
+            )
+        ],
+        "price_buckets": [
+            dict(zip(("min", "max"), bucket_range(bucket)), count=buckets[bucket])
+            for bucket in sorted(buckets)
+        ],
+        "amenities": [
+            {"amenity": code, "count": count}
+            for code, count in sorted(amenities.items(), key=lambda item: -item[1])
+            if count
+        ],
+    }
+    return total, facets
+
+
+def _decimal(value):
+    # Serialized like DRF DecimalFields
+    return None if value is None else str(value)
+
+
+def _image_url(name):
+    return default_storage.url(name) if name else None
+
+
+def result_page(entries, ordering="price", offset=0, limit=20):
+    rows = entries.order_by(*ORDERINGS[ordering]).values(
+        "hall_id",
+        "hall__name",
+        "hall__slug",
+        "hall__featured_image",
+        "hall_type",
+        "capacity",
+        "base_price",
+        "amenity_flags",
+        "city",
+        "organization_id",
+        "organization__name",
+        "organization__slug",
+        "organization__logo",
+        "organization__stats__avg_rating",
+        "organization__stats__review_count",
+    )[offset : offset + limit]
+    return [
+        {
+            "id": row["hall_id"],
+            "name": row["hall__name"],
+            "slug": row["hall__slug"],
+            "hall_type": row["hall_type"],
+            "capacity": row["capacity"],
+            "base_price": str(row["base_price"]),
+            "amenities": amenity_codes(row["amenity_flags"]),
+            "featured_image": _image_url(row["hall__featured_image"]),
+            "organization": {
+                "id": row["organization_id"],
+                "name": row["organization__name"],
+                "slug": row["organization__slug"],
+                "city": row["city"].title(),
+                "logo": _image_url(row["organization__logo"]),
+                "avg_rating": _decimal(row["organization__stats__avg_rating"]),
+                "review_count": row["organization__stats__review_count"] or 0,
+            },
+        }
+        for row in rows
+    ]
+
+
+def search(params, ordering="price", page=1, page_size=20):
+    """Results page, total and facets for validated search ``params``"""
+    entries = filter_entries(params)
+    total, facets = facet_counts(entries)
+    results = []
+    if total:
+        results = result_page(entries, ordering, (page - 1) * page_size, page_size)
+    return {"count": total, "results": results, "facets": facets}
+
+
+# Signal receivers
+
+
+def hall_changed(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    defer_until_commit("venue_search", [("hall", instance.pk)], reindex, unique=True)
+
+
+def organization_saved(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    defer_until_commit(
+        "venue_search", [("organization", instance.pk)], reindex, unique=True
+    )
+
+
+post_save.connect(hall_changed, sender=Hall, dispatch_uid="venue_search_hall_save")
+post_delete.connect(hall_changed, sender=Hall, dispatch_uid="venue_search_hall_delete")
+post_save.connect(
+    organization_saved, sender=Organization, dispatch_uid="venue_search_org_save"
+)
@@ -4,6 +4,8 @@ from rest_framework.response import Response
 from django.db.models import Q
 from django.contrib.auth.models import User
 from .models import Hall, DiscountTier, UserProfile
+from .tiers import find_tier
+from .token_claims import loaded_user
 from .serializers import (
     HallSerializer, HallListSerializer, DiscountTierSerializer, 
     DiscountTierApplicableSerializer, UserSerializer, UserProfileSerializer
@@ -109,29 +111,27 @@ class DiscountTierViewSet(viewsets.ModelViewSet):
     
     @action(detail=False, methods=['get'])
     def for_guest_count(self, request):
-        """Get applicable discount tier for specific guest count"""
+        """Get applicable discount tier of an organization for specific guest count"""
         guest_count = request.query_params.get('guest_count')
+        organization_id = request.query_params.get('organization')
         
-        if not guest_count:
+        if not guest_count or not organization_id:
             return Response(
-                {'error': 'guest_count parameter required'}, 
+                {'error': 'guest_count and organization parameters required'}, 
                 status=status.HTTP_400_BAD_REQUEST
             )
         
         try:
             guest_count = int(guest_count)
+            organization_id = int(organization_id)
         except ValueError:
             return Response(
-                {'error': 'guest_count must be an integer'}, 
+                {'error': 'guest_count and organization must be integers'}, 
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Find applicable discount tier
-        applicable_tier = DiscountTier.objects.filter(
-            is_active=True,
-            min_guests__lte=guest_count,
-            max_guests__gte=guest_count
-        ).first()
+        # Find applicable discount tier (in-memory index, see apps/core/tiers.py)
+        applicable_tier = find_tier(organization_id, guest_count)
         
         if applicable_tier:
             serializer = DiscountTierSerializer(applicable_tier)
@@ -162,7 +162,7 @@ class UserViewSet(viewsets.ReadOnlyModelViewSet):
     @action(detail=False, methods=['get'])
     def me(self, request):
         """Get current user profile"""
-        serializer = UserSerializer(request.user)
+        serializer = UserSerializer(loaded_user(request.user))
         return Response(serializer.data)
 
 
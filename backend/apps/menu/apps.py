@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class MenuConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.menu'
+
+    def ready(self):
+        # Register the menu_version bump signals for the marketplace snapshots
+        import apps.menu.snapshots  # noqa: F401
+        # Keep the full-text search index in step with item writes
+        import apps.menu.search  # noqa: F401
@@ -0,0 +1,143 @@
+"""
+Dietary and allergen bitmasks for menu items
+
+MenuItem keeps two integer columns next to its human-readable
+``dietary_type`` and ``allergens`` fields:
+
+- ``dietary_flags``: one bit per dietary property the item satisfies (a vegan
+  item is also vegetarian, so both bits are set).
+- ``allergen_flags``: one bit per allergen the item contains. Free-text
+  allergens are normalized through ALLERGEN_ALIASES; anything unrecognised sets
+  the OTHER bit so "no X" filters stay conservative.
+
+Both are recomputed in MenuItem.save(), so filters such as "vegetarian, no
+nuts, no dairy" become two bit tests in SQL instead of Python loops. The
+columns are deliberately not indexed: a bit test cannot use a b-tree index, so
+the tests run on rows already narrowed by organization and availability.
+"""
+
+from django.db.models import F
+
+# Dietary properties (bit values are stored; never renumber)
+VEGETARIAN = 1 << 0
+VEGAN = 1 << 1
+HALAL = 1 << 2
+KOSHER = 1 << 3
+GLUTEN_FREE = 1 << 4
+
+DIETARY_BITS = {
+    "vegetarian": VEGETARIAN,
+    "vegan": VEGAN,
+    "halal": HALAL,
+    "kosher": KOSHER,
+    "gluten_free": GLUTEN_FREE,
+}
+
+# MenuItem.dietary_type -> flags it implies
+DIETARY_TYPE_FLAGS = {
+    "regular": 0,
+    "vegetarian": VEGETARIAN,
+    "vegan": VEGAN | VEGETARIAN,
+    "halal": HALAL,
+    "kosher": KOSHER,
+    "gluten_free": GLUTEN_FREE,
+}
+
+# Allergen codes (bit values are stored; never renumber)
+ALLERGEN_BITS = {
+    "dairy": 1 << 0,
+    "eggs": 1 << 1,
+    "nuts": 1 << 2,
+    "peanuts": 1 << 3,
+    "gluten": 1 << 4,
+    "soy": 1 << 5,
+    "fish": 1 << 6,
+    "shellfish": 1 << 7,
+    "sesame": 1 << 8,
+    "mustard": 1 << 9,
+    "other": 1 << 30,
+}
+
+# Spellings found in the free-text allergens field -> allergen code
+ALLERGEN_ALIASES = {
+    "milk": "dairy",
+    "lactose": "dairy",
+    "cheese": "dairy",
+    "cream": "dairy",
+    "butter": "dairy",
+    "ghee": "dairy",
+    "egg": "eggs",
+    "nut": "nuts",
+    "tree nuts": "nuts",
+    "almonds": "nuts",
+    "cashews": "nuts",
+    "pistachios": "nuts",
+    "peanut": "peanuts",
+    "wheat": "gluten",
+    "soya": "soy",
+    "prawns": "shellfish",
+    "shrimp": "shellfish",
+    "crustaceans": "shellfish",
+}
+
+
+def dietary_flags(dietary_type):
+    return DIETARY_TYPE_FLAGS.get(dietary_type, 0)
+
+
+def allergen_code(name):
+    name = name.strip().lower()
+    if name in ALLERGEN_BITS:
+        return name
+    return ALLERGEN_ALIASES.get(name, "other")
+
+
+def allergen_flags(allergens):
+    """Bitmask for a comma-separated allergens string"""
+    flags = 0
+    for name in allergens.split(","):
+        if name.strip():
+            flags |= ALLERGEN_BITS[allergen_code(name)]
+    return flags
+
+
+def mask(codes, bits):
+    """
+    Combine ``codes`` into one mask using the ``bits`` table; raises
+    ValueError naming the first unknown code.
+    """
+    value = 0
+    for code in codes:
+        try:
+            value |= bits[code]
+        except KeyError:
+            raise ValueError(f"Unknown code: {code}")
+    return value
+
+
+def parse_codes(value):
+    """Split a comma-separated query parameter into codes"""
+    return [code.strip().lower() for code in value.split(",") if code.strip()]
+
+
+def filter_items(queryset, dietary=(), exclude_allergens=()):
+    """
+    Restrict a MenuItem queryset to items satisfying every dietary code in
+    ``dietary`` and containing none of ``exclude_allergens``.
+
+    Unrecognised allergens on an item count as possibly containing any excluded
+    allergen.
+    """
+    required = mask(dietary, DIETARY_BITS)
+    if required:
+        queryset = queryset.alias(
+            dietary_match=F("dietary_flags").bitand(required)
+        ).filter(dietary_match=required)
+
+    excluded = mask(exclude_allergens, ALLERGEN_BITS)
+    if excluded:
+        excluded |= ALLERGEN_BITS["other"]
+        queryset = queryset.alias(
+            allergen_match=F("allergen_flags").bitand(excluded)
+        ).filter(allergen_match=0)
+    return queryset
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.core.models import Organization
+from apps.menu.transfer import FORMATS, export_menu
+
+
+class Command(BaseCommand):
+    help = (
+        "Export an organization's menu as CSV (items) or JSON Lines "
+        "(categories, items, packages) in the import_menu format"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("organization_id", type=int)
+        parser.add_argument(
+            "--format", dest="file_format", choices=FORMATS, default="jsonl"
+        )
+        parser.add_argument("--output", help="File to write (default: standard output)")
+
+    def handle(self, *args, **options):
+        try:
+            organization = Organization.objects.get(pk=options["organization_id"])
+        except Organization.DoesNotExist:
+            raise CommandError(f"Organization {options['organization_id']} not found")
+
+        chunks = export_menu(organization, options["file_format"])
+        if options["output"]:
+            with open(options["output"], "w", newline="", encoding="utf-8") as stream:
+                stream.writelines(chunks)
+        else:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending="")
@@ -0,0 +1,55 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.core.models import Organization
+from apps.menu.transfer import FORMATS, MenuImportError, import_menu
+
+
+class Command(BaseCommand):
+    help = (
+        "Import an organization's menu from a CSV (items) or JSON Lines "
+        "(categories, items, packages) file, updating existing rows in place"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("organization_id", type=int)
+        parser.add_argument("path", help="File to import")
+        parser.add_argument(
+            "--format",
+            dest="file_format",
+            choices=FORMATS,
+            help="File format (default: from the file extension)",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            organization = Organization.objects.get(pk=options["organization_id"])
+        except Organization.DoesNotExist:
+            raise CommandError(f"Organization {options['organization_id']} not found")
+
+        file_format = options["file_format"]
+        if file_format is None:
+            file_format = os.path.splitext(options["path"])[1].lstrip(".").lower()
+            if file_format not in FORMATS:
+                raise CommandError("Cannot tell the format; pass --format")
+
+        started = time.monotonic()
+        try:
+            with open(options["path"], newline="", encoding="utf-8-sig") as stream:
+                counts = import_menu(organization, stream, file_format)
+        except OSError as e:
+            raise CommandError(str(e))
+        except MenuImportError as e:
+            for line, message in e.errors:
+                self.stderr.write(f"line {line}: {message}")
+            raise CommandError("Import failed; nothing was written")
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Imported into {organization.name} in "
+                f"{time.monotonic() - started:.2f}s: "
+                + ", ".join(f"{count} {kind}" for kind, count in counts.items())
+            )
+        )
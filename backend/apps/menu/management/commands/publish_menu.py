@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.core.models import Organization
+from apps.menu.versions import prune, publish
+
+
+class Command(BaseCommand):
+    help = (
+        "Publish immutable menu versions for new bookings to point to; "
+        "unchanged menus keep their latest version. Older versions no booking "
+        "references are deleted."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("organization_id", type=int, nargs="?")
+        parser.add_argument(
+            "--all", action="store_true", help="Publish every organization's menu"
+        )
+
+    def handle(self, *args, **options):
+        if options["all"]:
+            organization_ids = Organization.objects.order_by("id").values_list(
+                "id", flat=True
+            )
+        elif options["organization_id"] is not None:
+            if not Organization.objects.filter(pk=options["organization_id"]).exists():
+                raise CommandError(
+                    f"Organization {options['organization_id']} not found"
+                )
+            organization_ids = [options["organization_id"]]
+        else:
+            raise CommandError("Pass an organization id or --all")
+
+        for organization_id in organization_ids:
+            version, created = publish(organization_id)
+            state = "published" if created else "unchanged"
+            pruned = prune(organization_id)
+            self.stdout.write(
+                f"Organization {organization_id}: menu v{version.number} ({state}, "
+                f"{pruned} unreferenced versions pruned)"
+            )
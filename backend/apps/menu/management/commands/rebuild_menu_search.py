@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from django.db import connections, transaction
+
+from apps.menu import search
+
+
+class Command(BaseCommand):
+    help = "Rebuild the full-text menu search index from the menu items"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--database",
+            default="default",
+            help="Database alias to rebuild (default: default)",
+        )
+
+    def handle(self, *args, **options):
+        connection = connections[options["database"]]
+        if not search.supported(connection):
+            self.stdout.write(
+                f"The {connection.vendor} backend has no search index; "
+                "menu search uses icontains matching"
+            )
+            return
+        with transaction.atomic(using=options["database"]):
+            search.create_index(connection)
+            count = search.rebuild(connection)
+        self.stdout.write(self.style.SUCCESS(f"Indexed {count} menu items"))
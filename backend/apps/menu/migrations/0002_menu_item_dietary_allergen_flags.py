@@ -0,0 +1,37 @@
+# Generated by Django 5.2.7 on 2026-10-19 01:55
+
+from django.db import migrations, models
+
+from apps.menu import dietary
+
+
+def backfill_flags(apps, schema_editor):
+    MenuItem = apps.get_model("menu", "MenuItem")
+    items = list(MenuItem.objects.only("id", "dietary_type", "allergens"))
+    for item in items:
+        item.dietary_flags = dietary.dietary_flags(item.dietary_type)
+        item.allergen_flags = dietary.allergen_flags(item.allergens)
+    MenuItem.objects.bulk_update(
+        items, ["dietary_flags", "allergen_flags"], batch_size=500
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("menu", "0001_multi_tenant_menu"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="menuitem",
+            name="allergen_flags",
+            field=models.PositiveIntegerField(db_index=True, default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="menuitem",
+            name="dietary_flags",
+            field=models.PositiveIntegerField(db_index=True, default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_flags, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.7 on 2026-10-19 03:26
+
+from django.db import migrations, models
+
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("menu", "0004_menu_version"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="menuitem",
+            name="allergen_flags",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AlterField(
+            model_name="menuitem",
+            name="dietary_flags",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
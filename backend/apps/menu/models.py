@@ -1,6 +1,7 @@
 from django.db import models
 from django.core.validators import MinValueValidator, MaxValueValidator
 from apps.core.models import Organization
+from . import dietary
 
 
 class MenuCategory(models.Model):
@@ -27,10 +28,6 @@ class MenuCategory(models.Model):
     def __str__(self):
         return f"{self.organization.name} - {self.name}"
 
-    @property
-    def items_count(self):
-        return self.items.filter(is_available=True).count()
-
 
 class MenuItem(models.Model):
     """Individual menu items with pricing within an organization"""
@@ -81,6 +78,11 @@ class MenuItem(models.Model):
     allergens = models.TextField(
         blank=True, help_text="Common allergens (comma-separated)"
     )
+
+    # Bitmasks of dietary_type and allergens, maintained in save() (see
+    # apps/menu/dietary.py). Not indexed: bit tests cannot use a b-tree index.
+    dietary_flags = models.PositiveIntegerField(default=0, editable=False)
+    allergen_flags = models.PositiveIntegerField(default=0, editable=False)
     preparation_time = models.IntegerField(
         default=30,
         validators=[MinValueValidator(0)],
@@ -115,6 +117,25 @@ class MenuItem(models.Model):
     def __str__(self):
         return f"{self.organization.name} - {self.name} ({self.category.name}) - ${self.base_price}/{self.get_serving_type_display()}"
 
+    def save(self, *args, **kwargs):
+        # Keep the filter bitmasks in step with the fields they index
+        deferred = self.get_deferred_fields()
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None:
+            update_fields = set(update_fields)
+        for source, target, compute in (
+            ("dietary_type", "dietary_flags", dietary.dietary_flags),
+            ("allergens", "allergen_flags", dietary.allergen_flags),
+        ):
+            if source in deferred:
+                continue
+            setattr(self, target, compute(getattr(self, source)))
+            if update_fields is not None and source in update_fields:
+                update_fields.add(target)
+        if update_fields is not None:
+            kwargs["update_fields"] = update_fields
+        super().save(*args, **kwargs)
+
     @property
     def is_vegetarian(self):
         return self.dietary_type in ["vegetarian", "vegan"]
@@ -362,6 +383,48 @@ class MenuReview(models.Model):
         )
 
 
+class MenuVersion(models.Model):
+    """
+    Immutable, published snapshot of an organization's menu (items, variants,
+    packages and their prices) that bookings point to. See
+    apps/menu/versions.py for the content layout.
+    """
+
+    organization = models.ForeignKey(
+        Organization, on_delete=models.CASCADE, related_name="menu_versions"
+    )
+    number = models.PositiveIntegerField()
+    source_version = models.PositiveIntegerField(
+        help_text="Organization.menu_version the snapshot was last confirmed against"
+    )
+    checksum = models.CharField(max_length=64)
+    content = models.JSONField()
+    published_by = models.ForeignKey(
+        "auth.User",
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="published_menu_versions",
+    )
+    published_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["organization", "-number"]
+        unique_together = ["organization", "number"]
+
+    def __str__(self):
+        return f"{self.organization.name} - menu v{self.number}"
+
+    def save(self, *args, **kwargs):
+        from django.core.exceptions import ValidationError
+
+        # Only the bookkeeping field may change once published
+        update_fields = kwargs.get("update_fields") or ["*"]
+        if not self._state.adding and set(update_fields) != {"source_version"}:
+            raise ValidationError("Published menu versions are immutable")
+        super().save(*args, **kwargs)
+
+
 # Signals to ensure organization consistency
 from django.db.models.signals import pre_save
 from django.dispatch import receiver
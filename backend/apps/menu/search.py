@@ -0,0 +1,281 @@
+"""
+Full-text menu search
+
+Menu items are indexed in a side table, ``menu_item_search``, that tokenizes
+name, ingredients, description and allergens:
+
+- SQLite: an FTS5 virtual table keyed by the item id (``rowid``) with prefix
+  indexes, ranked with bm25().
+- PostgreSQL: a table holding a weighted ``tsvector`` per item behind a GIN
+  index, ranked with ts_rank().
+
+Rows are replaced whenever a save changes an indexed field and removed when
+the item is deleted, inside the same transaction as the write. Writes that bypass signals
+(queryset.update(), bulk_create()) need ``manage.py rebuild_menu_search``.
+Other backends have no index and fall back to ``icontains`` matching.
+
+Every query term is treated as a prefix, so "biry" finds "Chicken Biryani" and
+"chick biry" finds items matching both terms.
+"""
+
+import re
+
+from django.db import connections
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from django.db.models.signals import post_delete, post_init, post_save
+
+from .models import MenuItem
+
+TABLE = "menu_item_search"
+
+# MenuItem's table, spelled out so the 0003 migration keeps working whatever
+# the model later becomes
+ITEM_TABLE = "menu_menuitem"
+
+# Indexed text fields, most significant first
+FIELDS = ("name", "ingredients", "description", "allergens")
+
+# Item attributes whose change requires re-indexing
+INDEXED_ATTRS = ("organization_id", *FIELDS)
+
+SNAPSHOT_ATTR = "_search_snapshot"
+
+# Most matches a ranked search returns (and computes facets over)
+SEARCH_LIMIT = 200
+
+TOKEN_RE = re.compile(r"\w+")
+
+
+def supported(connection):
+    return connection.vendor in ("sqlite", "postgresql")
+
+
+def tokenize(query):
+    return TOKEN_RE.findall(query.lower())
+
+
+# Index DDL (also run by the menu 0003 migration)
+
+
+def create_index(connection):
+    with connection.cursor() as cursor:
+        if connection.vendor == "sqlite":
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABLE} USING fts5("
+                "organization_id UNINDEXED, name, ingredients, description, "
+                "allergens, tokenize='unicode61 remove_diacritics 2', "
+                "prefix='2 3')"
+            )
+        elif connection.vendor == "postgresql":
+            cursor.execute(
+                f"CREATE TABLE IF NOT EXISTS {TABLE} ("
+                "item_id bigint PRIMARY KEY, "
+                "organization_id bigint NOT NULL, "
+                "document tsvector NOT NULL)"
+            )
+            cursor.execute(
+                f"CREATE INDEX IF NOT EXISTS {TABLE}_document "
+                f"ON {TABLE} USING gin (document)"
+            )
+            cursor.execute(
+                f"CREATE INDEX IF NOT EXISTS {TABLE}_organization "
+                f"ON {TABLE} (organization_id)"
+            )
+
+
+def drop_index(connection):
+    if supported(connection):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DROP TABLE IF EXISTS {TABLE}")
+
+
+# Rows are built from the columns of the item table so a full rebuild is a
+# single INSERT ... SELECT, and so the migration does not depend on the model.
+_SQLITE_COLUMNS = "id, organization_id, name, ingredients, description, allergens"
+
+_POSTGRES_DOCUMENT = (
+    "setweight(to_tsvector('simple', coalesce(name, '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce(ingredients, '')), 'B') || "
+    "setweight(to_tsvector('simple', coalesce(description, '')), 'C') || "
+    "setweight(to_tsvector('simple', coalesce(allergens, '')), 'D')"
+)
+
+
+def _insert_sql(connection, where=""):
+    items = ITEM_TABLE
+    if connection.vendor == "sqlite":
+        return (
+            f"INSERT INTO {TABLE} "
+            "(rowid, organization_id, name, ingredients, description, allergens) "
+            f"SELECT {_SQLITE_COLUMNS} FROM {items} {where}"
+        )
+    return (
+        f"INSERT INTO {TABLE} (item_id, organization_id, document) "
+        f"SELECT id, organization_id, {_POSTGRES_DOCUMENT} FROM {items} {where}"
+    )
+
+
+def _key(connection):
+    return "rowid" if connection.vendor == "sqlite" else "item_id"
+
+
+def rebuild(connection):
+    """Re-index every menu item; returns the number of indexed items"""
+    if not supported(connection):
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {TABLE}")
+        cursor.execute(_insert_sql(connection))
+        cursor.execute(f"SELECT count(*) FROM {TABLE}")
+        return cursor.fetchone()[0]
+
+
+def index_items(item_ids, using="default"):
+    """Replace the index rows of ``item_ids`` with their current content"""
+    connection = connections[using]
+    if not supported(connection) or not item_ids:
+        return
+    item_ids = list(item_ids)
+    placeholders = ", ".join(["%s"] * len(item_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {TABLE} WHERE {_key(connection)} IN ({placeholders})",
+            item_ids,
+        )
+        cursor.execute(
+            _insert_sql(connection, f"WHERE id IN ({placeholders})"), item_ids
+        )
+
+
+def remove_items(item_ids, using="default"):
+    connection = connections[using]
+    if not supported(connection) or not item_ids:
+        return
+    item_ids = list(item_ids)
+    placeholders = ", ".join(["%s"] * len(item_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {TABLE} WHERE {_key(connection)} IN ({placeholders})",
+            item_ids,
+        )
+
+
+# Queries
+
+
+def _match(connection, terms):
+    """WHERE clause and params matching every term as a prefix"""
+    if connection.vendor == "sqlite":
+        expression = " ".join(f'"{term}"*' for term in terms)
+        return f"{TABLE} MATCH %s", [expression]
+    expression = " & ".join(f"{term}:*" for term in terms)
+    return "document @@ to_tsquery('simple', %s)", [expression]
+
+
+def _rank(connection, terms):
+    if connection.vendor == "sqlite":
+        # Column weights follow FIELDS; organization_id is not searchable
+        return "bm25({}, 0, 10.0, 4.0, 2.0, 1.0)".format(TABLE), []
+    expression = " & ".join(f"{term}:*" for term in terms)
+    return "-ts_rank(document, to_tsquery('simple', %s))", [expression]
+
+
+def _fallback_filter(terms):
+    condition = Q()
+    for term in terms:
+        term_condition = Q()
+        for field in FIELDS:
+            term_condition |= Q(**{f"{field}__icontains": term})
+        condition &= term_condition
+    return condition
+
+
+def filter_queryset(queryset, query, using="default"):
+    """Restrict a MenuItem queryset to items matching ``query`` (unranked)"""
+    terms = tokenize(query)
+    if not terms:
+        return queryset.none()
+    connection = connections[using]
+    if not supported(connection):
+        return queryset.filter(_fallback_filter(terms))
+    where, params = _match(connection, terms)
+    return queryset.filter(
+        id__in=RawSQL(f"SELECT {_key(connection)} FROM {TABLE} WHERE {where}", params)
+    )
+
+
+def ranked_ids(
+    query, organization_id=None, limit=SEARCH_LIMIT, available_only=True, using="default"
+):
+    """
+    Ids of the best ``limit`` items matching ``query``, best first; with
+    ``available_only`` unavailable items are left out before the limit applies
+    """
+    terms = tokenize(query)
+    if not terms:
+        return []
+    connection = connections[using]
+    if not supported(connection):
+        items = MenuItem.objects.using(using).filter(_fallback_filter(terms))
+        if organization_id is not None:
+            items = items.filter(organization_id=organization_id)
+        if available_only:
+            items = items.filter(is_available=True)
+        return list(items.order_by("name").values_list("id", flat=True)[:limit])
+
+    where, params = _match(connection, terms)
+    rank, rank_params = _rank(connection, terms)
+    key = f"{TABLE}.{_key(connection)}"
+    source = TABLE
+    if organization_id is not None:
+        where += f" AND {TABLE}.organization_id = %s"
+        params.append(organization_id)
+    if available_only:
+        source += f" JOIN {ITEM_TABLE} ON {ITEM_TABLE}.id = {key}"
+        where += f" AND {ITEM_TABLE}.is_available"
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT {key} FROM {source} WHERE {where} ORDER BY {rank} LIMIT %s",
+            params + rank_params + [limit],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+# Index maintenance
+
+
+def _indexed_values(instance):
+    # Deferred fields are absent from __dict__ and are never loaded here
+    values = instance.__dict__
+    return {name: values[name] for name in INDEXED_ATTRS if name in values}
+
+
+def item_loaded(sender, instance, **kwargs):
+    setattr(instance, SNAPSHOT_ATTR, _indexed_values(instance))
+
+
+def item_saved(sender, instance, created, using="default", update_fields=None, **kwargs):
+    values = _indexed_values(instance)
+    if update_fields is not None:
+        values = {
+            name: value
+            for name, value in values.items()
+            if name in update_fields or name.removesuffix("_id") in update_fields
+        }
+    snapshot = instance.__dict__.setdefault(SNAPSHOT_ATTR, {})
+    changed = created or any(
+        name not in snapshot or snapshot[name] != value for name, value in values.items()
+    )
+    snapshot.update(values)
+    if changed:
+        index_items([instance.pk], using=using)
+
+
+def item_deleted(sender, instance, using="default", **kwargs):
+    remove_items([instance.pk], using=using)
+
+
+post_init.connect(item_loaded, sender=MenuItem, dispatch_uid="menu_search_init")
+post_save.connect(item_saved, sender=MenuItem, dispatch_uid="menu_search_save")
+post_delete.connect(item_deleted, sender=MenuItem, dispatch_uid="menu_search_delete")
@@ -1,4 +1,5 @@
 from rest_framework import serializers
+from apps.core.serializers import ImageVariantsField
 from .models import MenuCategory, MenuItem, MenuItemVariant, MenuPackage, PackageMenuItem
 
 
@@ -13,6 +14,9 @@ class MenuCategorySerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'created_at']
     
     def get_items_count(self, obj):
+        # List querysets annotate the count; single objects fall back to a query
+        if hasattr(obj, 'items_count'):
+            return obj.items_count
         return obj.items.filter(is_available=True).count()
 
 
@@ -41,13 +45,14 @@ class MenuItemSerializer(serializers.ModelSerializer):
     category_name = serializers.CharField(source='category.name', read_only=True)
     variants = MenuItemVariantSerializer(many=True, read_only=True)
     serving_type_display = serializers.CharField(source='get_serving_type_display', read_only=True)
+    image_variants = ImageVariantsField(source='image')
     
     class Meta:
         model = MenuItem
         fields = ['id', 'name', 'category', 'category_name', 'description', 
                  'base_price', 'serving_type', 'serving_type_display', 
-                 'is_vegetarian', 'is_available', 'image', 'ingredients', 
-                 'preparation_time', 'display_order', 'variants', 
+                 'is_vegetarian', 'is_available', 'image', 'image_variants',
+                 'ingredients', 'preparation_time', 'display_order', 'variants', 
                  'created_at', 'updated_at']
         read_only_fields = ['id', 'created_at', 'updated_at']
     
@@ -74,6 +79,9 @@ class MenuItemListSerializer(serializers.ModelSerializer):
                  'is_vegetarian', 'is_available', 'has_variants']
     
     def get_has_variants(self, obj):
+        # Annotated with Exists() where items are listed in bulk
+        if hasattr(obj, 'has_variants'):
+            return obj.has_variants
         return obj.variants.exists()
 
 
@@ -82,13 +90,15 @@ class MenuItemDetailSerializer(serializers.ModelSerializer):
     category = MenuCategorySerializer(read_only=True)
     variants = MenuItemVariantSerializer(many=True, read_only=True)
     serving_type_display = serializers.CharField(source='get_serving_type_display', read_only=True)
+    image_variants = ImageVariantsField(source='image')
     
     class Meta:
         model = MenuItem
         fields = ['id', 'name', 'category', 'description', 'base_price', 
                  'serving_type', 'serving_type_display', 'is_vegetarian', 
-                 'is_available', 'image', 'ingredients', 'preparation_time', 
-                 'display_order', 'variants', 'created_at', 'updated_at']
+                 'is_available', 'image', 'image_variants', 'ingredients',
+                 'preparation_time', 'display_order', 'variants', 'created_at',
+                 'updated_at']
 
 
 class MenuCategoryWithItemsSerializer(serializers.ModelSerializer):
@@ -157,12 +167,14 @@ class MenuPackageSerializer(serializers.ModelSerializer):
     package_type_display = serializers.CharField(source='get_package_type_display', read_only=True)
     total_items = serializers.ReadOnlyField()
     package_items = PackageMenuItemSerializer(many=True, read_only=True)
+    image_variants = ImageVariantsField(source='image')
 
     class Meta:
         model = MenuPackage
         fields = ['id', 'name', 'description', 'package_type', 'package_type_display',
                  'base_price_per_person', 'min_guests', 'max_guests', 'total_items',
-                 'is_active', 'is_featured', 'image', 'package_items', 'created_at', 'updated_at']
+                 'is_active', 'is_featured', 'image', 'image_variants', 'package_items',
+                 'created_at', 'updated_at']
         read_only_fields = ['id', 'created_at', 'updated_at']
 
 
@@ -170,12 +182,13 @@ class MenuPackageListSerializer(serializers.ModelSerializer):
     """Simplified serializer for listing menu packages"""
     package_type_display = serializers.CharField(source='get_package_type_display', read_only=True)
     total_items = serializers.ReadOnlyField()
+    image_variants = ImageVariantsField(source='image')
 
     class Meta:
         model = MenuPackage
         fields = ['id', 'name', 'description', 'package_type_display',
                  'base_price_per_person', 'min_guests', 'max_guests', 'total_items',
-                 'is_active', 'is_featured', 'image']
+                 'is_active', 'is_featured', 'image', 'image_variants']
 
 
 class MenuPackageCreateSerializer(serializers.ModelSerializer):
@@ -0,0 +1,152 @@
+"""
+Versioned public menu snapshots for the marketplace
+
+Each organization's public menu (categories) and packages are serialized once
+per menu version and kept in the cache as ready-to-send JSON bytes. Writes to
+any menu model bump ``Organization.menu_version`` (once per transaction, after
+commit), which retires the previous snapshots: readers look the version up,
+fetch the matching bytes and serve them with an ETag derived from it, so
+unchanged menus are answered with 304 Not Modified without touching the
+serializers at all. Image variants are rendered after the write that stored
+the image, so their arrival bumps the version again: snapshots rendered in
+between would otherwise keep ``image_variants: null``.
+"""
+
+from django.core.cache import cache
+from django.db.models import Count, F, Prefetch, Q
+from django.db.models.signals import post_delete, post_save
+from rest_framework.renderers import JSONRenderer
+
+from apps.core.media import variants_stored
+from apps.core.models import Organization
+from apps.core.transactions import defer_until_commit
+from .models import (
+    MenuCategory,
+    MenuItem,
+    MenuItemVariant,
+    MenuPackage,
+    PackageMenuItem,
+)
+from .serializers import MenuCategorySerializer, MenuPackageSerializer
+
+# Bump when the snapshot payloads change shape so stale bytes are never served
+SNAPSHOT_FORMAT = 1
+
+# Old versions are never read again; this only bounds how long they linger
+SNAPSHOT_TIMEOUT = 60 * 60 * 24
+
+SNAPSHOT_KEY = "menu_snapshot:{format}:{organization_id}:{version}:{kind}"
+
+
+def render_menu(organization_id):
+    categories = MenuCategory.objects.filter(
+        organization_id=organization_id, is_active=True
+    ).annotate(items_count=Count("items", filter=Q(items__is_available=True)))
+    return MenuCategorySerializer(categories, many=True).data
+
+
+def render_packages(organization_id):
+    packages = MenuPackage.objects.filter(
+        organization_id=organization_id, is_active=True
+    ).prefetch_related(
+        Prefetch(
+            "package_items",
+            queryset=PackageMenuItem.objects.select_related(
+                "menu_item__category", "variant"
+            ),
+        )
+    )
+    return MenuPackageSerializer(packages, many=True).data
+
+
+RENDERERS = {
+    "menu": render_menu,
+    "packages": render_packages,
+}
+
+
+def etag(organization_id, version, kind):
+    return f'"{kind}-{organization_id}-{version}-{SNAPSHOT_FORMAT}"'
+
+
+def get_snapshot(organization_id, version, kind):
+    """Return the JSON bytes of ``kind`` for this menu version, rendering on a miss"""
+    key = SNAPSHOT_KEY.format(
+        format=SNAPSHOT_FORMAT,
+        organization_id=organization_id,
+        version=version,
+        kind=kind,
+    )
+    content = cache.get(key)
+    if content is None:
+        content = JSONRenderer().render(RENDERERS[kind](organization_id))
+        cache.set(key, content, SNAPSHOT_TIMEOUT)
+    return content
+
+
+# Version bumps
+
+
+def bump_menu_versions(changes):
+    """Bump menu_version of every organization touched by ``changes``"""
+    organization_ids = {value for kind, value in changes if kind == "organization"}
+    item_ids = [value for kind, value in changes if kind == "menu_item"]
+    package_ids = [value for kind, value in changes if kind == "package"]
+    if item_ids:
+        organization_ids.update(
+            MenuItem.objects.filter(id__in=item_ids).values_list(
+                "organization_id", flat=True
+            )
+        )
+    if package_ids:
+        organization_ids.update(
+            MenuPackage.objects.filter(id__in=package_ids).values_list(
+                "organization_id", flat=True
+            )
+        )
+    if organization_ids:
+        Organization.objects.filter(id__in=organization_ids).update(
+            menu_version=F("menu_version") + 1
+        )
+
+
+def _owner(instance):
+    # Variants and package items only know their parent; the parent's
+    # organization is resolved in bulk when the batch is flushed.
+    if isinstance(instance, MenuItemVariant):
+        return ("menu_item", instance.menu_item_id)
+    if isinstance(instance, PackageMenuItem):
+        return ("package", instance.package_id)
+    return ("organization", instance.organization_id)
+
+
+def menu_changed(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    defer_until_commit(
+        "menu_version", [_owner(instance)], bump_menu_versions, unique=True
+    )
+
+
+for model in (MenuCategory, MenuItem, MenuItemVariant, MenuPackage, PackageMenuItem):
+    post_save.connect(
+        menu_changed, sender=model, dispatch_uid=f"menu_version_save_{model.__name__}"
+    )
+    post_delete.connect(
+        menu_changed, sender=model, dispatch_uid=f"menu_version_delete_{model.__name__}"
+    )
+
+
+def images_rendered(sender, names, **kwargs):
+    organization_ids = set()
+    for model in (MenuCategory, MenuItem, MenuPackage):
+        organization_ids.update(
+            model.objects.filter(image__in=names).values_list(
+                "organization_id", flat=True
+            )
+        )
+    if organization_ids:
+        bump_menu_versions([("organization", pk) for pk in organization_ids])
+
+
+variants_stored.connect(images_rendered, dispatch_uid="menu_version_images_rendered")
@@ -1,3 +1,472 @@
-from django.test import TestCase
+import importlib
+import json
+import shutil
+import tempfile
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.apps import apps
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from apps.core import media
+from apps.core.tests import LOCMEM_CACHE, create_organization, jpeg_upload
+from . import dietary, search
+from .models import (
+    MenuCategory,
+    MenuItem,
+    MenuItemVariant,
+    MenuPackage,
+    PackageMenuItem,
+)
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class MenuCategoryQueryBudgetTests(TestCase):
+    """The category endpoints must not issue a query per category"""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        owner = User.objects.create_user(username="owner", password="pass")
+        self.organization = create_organization(owner, name="Test Venue")
+
+    def add_categories(self, count):
+        start = MenuCategory.objects.count()
+        # Run the on-commit menu_version bump the test transaction would defer
+        with self.captureOnCommitCallbacks(execute=True):
+            for number in range(start, start + count):
+                category = MenuCategory.objects.create(
+                    organization=self.organization, name=f"Category {number}"
+                )
+                for position, is_available in enumerate([True, True, False]):
+                    MenuItem.objects.create(
+                        organization=self.organization,
+                        category=category,
+                        name=f"Item {number}-{position}",
+                        base_price=Decimal("100.00"),
+                        is_available=is_available,
+                    )
+
+    def assert_constant_queries(self, url, expected_queries):
+        for count in (2, 10):
+            self.add_categories(count)
+            with self.assertNumQueries(expected_queries):
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_marketplace_menu_query_budget(self):
+        # menu version, categories (snapshot rendered after each menu change)
+        response = self.assert_constant_queries(
+            f"/api/v1/marketplace/{self.organization.id}/menu/", 2
+        )
+        categories = json.loads(response.content)
+        self.assertEqual(len(categories), 12)
+        self.assertEqual({category["items_count"] for category in categories}, {2})
+
+    def test_marketplace_menu_snapshot_etag(self):
+        self.add_categories(2)
+        url = f"/api/v1/marketplace/{self.organization.id}/menu/"
+        first = self.client.get(url)
+        tag = first["ETag"]
+
+        # Unchanged menu: served from the snapshot, or 304 for a matching ETag
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get(url).content, first.content)
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=tag)
+        self.assertEqual(response.status_code, 304)
+
+        # Any menu write retires the snapshot
+        item = MenuItem.objects.filter(is_available=False).first()
+        item.is_available = True
+        with self.captureOnCommitCallbacks(execute=True):
+            item.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=tag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], tag)
+        self.assertEqual(
+            sorted(category["items_count"] for category in json.loads(response.content)),
+            [2, 3],
+        )
+
+    def test_rendered_image_variants_retire_the_snapshot(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        with override_settings(MEDIA_ROOT=media_root, IMAGE_PROCESSING_WORKERS=0):
+            # Variant rendering is deferred to after commit, so not run here
+            package = MenuPackage.objects.create(
+                organization=self.organization,
+                name="Wedding",
+                description="Deal",
+                base_price_per_person=Decimal("900.00"),
+                min_guests=10,
+                image=jpeg_upload(),
+            )
+            url = f"/api/v1/marketplace/{self.organization.id}/packages/"
+            first = self.client.get(url)
+            self.assertIsNone(json.loads(first.content)[0]["image_variants"])
+
+            self.assertEqual(media.process_images([package.image.name]), 1)
+            self.addCleanup(media._rendered.clear)
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("160w", json.loads(response.content)[0]["image_variants"])
+
+    def test_category_list_query_budget(self):
+        # pagination COUNT, categories
+        response = self.assert_constant_queries("/api/v1/menu/menu/categories/", 2)
+        self.assertEqual(response.data["count"], 12)
+        self.assertEqual(
+            {category["items_count"] for category in response.data["results"]}, {2}
+        )
+
+    def test_items_by_category_query_budget(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            other = MenuCategory.objects.create(
+                organization=self.organization, name="Empty", display_order=99
+            )
+        # categories, items (category joined, has_variants annotated)
+        response = self.assert_constant_queries(
+            f"/api/v1/menu/menu/items/by_category/?organization={self.organization.id}",
+            2,
+        )
+        self.assertEqual(len(response.data), 13)
+        self.assertEqual(response.data[-1]["category"]["id"], other.id)
+        self.assertEqual(response.data[-1]["items"], [])
+        self.assertEqual({len(group["items"]) for group in response.data[:-1]}, {2})
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class MenuDietaryFlagTests(TestCase):
+    def setUp(self):
+        owner = User.objects.create_user(username="owner", password="pass")
+        self.organization = create_organization(owner)
+        self.category = MenuCategory.objects.create(
+            organization=self.organization, name="Mains"
+        )
+        for name, dietary_type, allergens in (
+            ("Daal", "vegan", ""),
+            ("Paneer", "vegetarian", "Cheese, ghee"),
+            ("Halwa", "vegetarian", "Almonds"),
+            ("Karahi", "halal", ""),
+            ("Kheer", "vegetarian", "Saffron"),
+        ):
+            MenuItem.objects.create(
+                organization=self.organization,
+                category=self.category,
+                name=name,
+                dietary_type=dietary_type,
+                allergens=allergens,
+                base_price=Decimal("100.00"),
+            )
+
+    def names(self, **filters):
+        queryset = dietary.filter_items(MenuItem.objects.all(), **filters)
+        return sorted(queryset.values_list("name", flat=True))
+
+    def test_flags_round_trip(self):
+        item = MenuItem.objects.get(name="Paneer")
+        self.assertEqual(item.dietary_flags, dietary.VEGETARIAN)
+        self.assertEqual(item.allergen_flags, dietary.ALLERGEN_BITS["dairy"])
+        self.assertEqual(
+            dietary.allergen_flags("Milk, peanut, saffron"),
+            dietary.ALLERGEN_BITS["dairy"]
+            | dietary.ALLERGEN_BITS["peanuts"]
+            | dietary.ALLERGEN_BITS["other"],
+        )
+
+        # Flags follow their source fields, including partial saves
+        item.dietary_type = "vegan"
+        item.allergens = ""
+        item.save(update_fields=["dietary_type", "allergens"])
+        item.refresh_from_db()
+        self.assertEqual(item.dietary_flags, dietary.VEGAN | dietary.VEGETARIAN)
+        self.assertEqual(item.allergen_flags, 0)
+
+    def test_filter_items(self):
+        self.assertEqual(
+            self.names(dietary=["vegetarian"]), ["Daal", "Halwa", "Kheer", "Paneer"]
+        )
+        self.assertEqual(self.names(dietary=["vegan"]), ["Daal"])
+        # Unrecognised allergens (saffron) are excluded conservatively
+        self.assertEqual(
+            self.names(dietary=["vegetarian"], exclude_allergens=["dairy"]),
+            ["Daal", "Halwa"],
+        )
+        self.assertEqual(
+            self.names(exclude_allergens=["nuts", "dairy"]), ["Daal", "Karahi"]
+        )
+        with self.assertRaisesMessage(ValueError, "Unknown code: keto"):
+            self.names(dietary=["keto"])
+
+    def test_migration_backfills_flags(self):
+        migration = importlib.import_module(
+            "apps.menu.migrations.0002_menu_item_dietary_allergen_flags"
+        )
+        MenuItem.objects.update(dietary_flags=0, allergen_flags=0)
+        migration.backfill_flags(apps, None)
+        self.assertEqual(
+            dict(MenuItem.objects.values_list("name", "allergen_flags")),
+            {
+                "Daal": 0,
+                "Paneer": dietary.ALLERGEN_BITS["dairy"],
+                "Halwa": dietary.ALLERGEN_BITS["nuts"],
+                "Karahi": 0,
+                "Kheer": dietary.ALLERGEN_BITS["other"],
+            },
+        )
+        self.assertEqual(
+            MenuItem.objects.get(name="Daal").dietary_flags,
+            dietary.VEGAN | dietary.VEGETARIAN,
+        )
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class MenuSearchTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        owner = User.objects.create_user(username="owner", password="pass")
+        self.organization, other = [
+            create_organization(owner, name=name) for name in ("Venue", "Other")
+        ]
+        rice = MenuCategory.objects.create(organization=self.organization, name="Rice")
+        curry = MenuCategory.objects.create(organization=self.organization, name="Curry")
+        for category, name, dietary_type, ingredients in (
+            (rice, "Chicken Biryani", "regular", "rice, chicken"),
+            (rice, "Vegetable Biryani", "vegetarian", "rice, peas"),
+            (curry, "Chicken Karahi", "regular", "chicken, tomato"),
+            (curry, "Daal", "vegan", "lentils, biryani masala"),
+        ):
+            MenuItem.objects.create(
+                organization=self.organization,
+                category=category,
+                name=name,
+                dietary_type=dietary_type,
+                ingredients=ingredients,
+                base_price=Decimal("100.00"),
+            )
+        other_rice = MenuCategory.objects.create(organization=other, name="Rice")
+        MenuItem.objects.create(
+            organization=other,
+            category=other_rice,
+            name="Mutton Biryani",
+            base_price=Decimal("100.00"),
+        )
+
+    def search(self, query, **params):
+        return self.client.get(
+            "/api/v1/menu/menu/items/search/",
+            {"q": query, "organization": self.organization.id, **params},
+        )
+
+    def test_ranked_prefix_search_with_facets(self):
+        # ranked ids, matching items
+        with self.assertNumQueries(2):
+            response = self.search("biry")
+        self.assertEqual(response.data["count"], 3)
+        names = [item["name"] for item in response.data["results"]]
+        # Name matches outrank ingredient matches
+        self.assertEqual(names[-1], "Daal")
+        self.assertEqual(
+            {facet["name"]: facet["count"] for facet in response.data["facets"]["categories"]},
+            {"Rice": 2, "Curry": 1},
+        )
+        self.assertEqual(
+            {facet["value"]: facet["count"] for facet in response.data["facets"]["dietary_types"]},
+            {"regular": 1, "vegetarian": 1, "vegan": 1},
+        )
+
+        # Facet selections narrow the results but not the facets
+        response = self.search("biry", dietary_type="vegetarian")
+        self.assertEqual(
+            [item["name"] for item in response.data["results"]], ["Vegetable Biryani"]
+        )
+        self.assertEqual(len(response.data["facets"]["dietary_types"]), 3)
+
+        response = self.search("chick biry")
+        self.assertEqual(
+            [item["name"] for item in response.data["results"]], ["Chicken Biryani"]
+        )
+
+    def test_index_follows_item_writes(self):
+        item = MenuItem.objects.get(name="Chicken Karahi")
+        item.name = "Chicken Tikka"
+        item.save()
+        self.assertEqual(self.search("kara").data["count"], 0)
+        self.assertEqual(self.search("tikk").data["count"], 1)
+
+        item.delete()
+        self.assertEqual(self.search("tikk").data["count"], 0)
+
+    def test_unavailable_items_do_not_take_up_the_limit(self):
+        best, second, _ = search.ranked_ids(
+            "biry", self.organization.id, available_only=False
+        )
+        MenuItem.objects.filter(id=best).update(is_available=False)
+        self.assertEqual(search.ranked_ids("biry", self.organization.id, limit=1), [second])
+
+    def test_index_refreshed_only_for_indexed_changes(self):
+        item = MenuItem.objects.get(name="Daal")
+        with mock.patch.object(search, "index_items") as index_items:
+            item.base_price = Decimal("120.00")
+            item.save()
+            item.ingredients = "lentils"
+            item.save(update_fields=["base_price"])
+            index_items.assert_not_called()
+
+            item.save(update_fields=["ingredients"])
+            index_items.assert_called_once_with([item.pk], using="default")
+
+    def test_list_search_param(self):
+        response = self.client.get("/api/v1/menu/menu/items/", {"search": "lentil"})
+        self.assertEqual([item["name"] for item in response.data["results"]], ["Daal"])
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class MenuTransferTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.owner = User.objects.create_user(username="owner", password="pass")
+        self.organization = create_organization(self.owner)
+        self.client.force_authenticate(self.owner)
+
+    def upload(self, name, content):
+        if isinstance(content, str):
+            content = content.encode()
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(
+                f"/api/v1/menu/menu/items/import/?organization={self.organization.id}",
+                {"file": SimpleUploadedFile(name, content)},
+            )
+
+    def csv_menu(self, count):
+        rows = ["category,name,base_price,dietary_type,allergens,variants"]
+        rows += [
+            f"Category {number % 3},Dish {number},{100 + number},vegan,Milk,Half=-20;Full=0"
+            for number in range(count)
+        ]
+        return "\n".join(rows)
+
+    def test_csv_import_queries_do_not_grow_with_rows(self):
+        # organization, then per kind an upsert and an id lookup, the items'
+        # current prices (for their history), the search index refresh and
+        # the menu_version bump
+        with self.assertNumQueries(13):
+            response = self.upload("menu.csv", self.csv_menu(5))
+        self.assertEqual(response.status_code, 200)
+        with self.assertNumQueries(13):
+            response = self.upload("menu.csv", self.csv_menu(60))
+        self.assertEqual(
+            response.data,
+            {
+                "categories": 3,
+                "items": 60,
+                "variants": 120,
+                "packages": 0,
+                "package_items": 0,
+            },
+        )
+        # Re-imported rows were updated in place
+        self.assertEqual(MenuItem.objects.count(), 60)
+        self.assertEqual(MenuItemVariant.objects.count(), 120)
+        item = MenuItem.objects.get(name="Dish 7")
+        self.assertEqual(item.base_price, Decimal("107.00"))
+        self.assertEqual(item.dietary_flags, dietary.VEGAN | dietary.VEGETARIAN)
+        self.assertEqual(item.allergen_flags, dietary.ALLERGEN_BITS["dairy"])
+        self.assertEqual(len(search.ranked_ids("dish", self.organization.id)), 60)
+        self.organization.refresh_from_db()
+        self.assertEqual(self.organization.menu_version, 2)
+
+    def test_invalid_rows_write_nothing(self):
+        response = self.upload(
+            "menu.csv", "category,name,base_price\nRice,Pulao,abc\n,Daal,10\n"
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([error["line"] for error in response.data["errors"]], [2, 3])
+        self.assertFalse(MenuCategory.objects.exists())
+
+    def test_malformed_files_are_row_errors(self):
+        response = self.upload(
+            "menu.csv", "category,name,base_price\nRice,Café,10\n".encode("cp1252")
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            response.data["errors"], [{"line": 0, "message": "file is not UTF-8 encoded"}]
+        )
+
+        item = {"type": "item", "category": "Rice", "base_price": "10"}
+        records = [
+            {**item, "name": "Pulao", "variants": ["Large"]},
+            {**item, "name": "Daal", "variants": "Large=10"},
+            {
+                "type": "package",
+                "name": "Wedding",
+                "description": "Deal",
+                "base_price_per_person": "900",
+                "min_guests": 50,
+                "items": [1],
+            },
+        ]
+        content = "\n".join(json.dumps(record) for record in records)
+        response = self.upload("menu.jsonl", content)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            response.data["errors"],
+            [
+                {"line": 1, "message": "variants: expected a list of objects"},
+                {"line": 2, "message": "variants: expected a list of objects"},
+                {"line": 3, "message": "items: expected a list of objects"},
+            ],
+        )
+
+    def test_jsonl_round_trip(self):
+        records = [
+            {"type": "category", "name": "Rice", "display_order": 2},
+            {
+                "type": "item",
+                "category": "Rice",
+                "name": "Biryani",
+                "base_price": "450.00",
+                "variants": [{"name": "Large", "price_modifier": "50"}],
+            },
+            {
+                "type": "package",
+                "name": "Wedding",
+                "description": "Deal",
+                "base_price_per_person": "900",
+                "min_guests": 50,
+                "items": [
+                    {"item": "Biryani", "quantity_per_person": "0.5"},
+                    {"item": "Biryani", "variant": "Large", "quantity_per_person": "1"},
+                ],
+            },
+        ]
+        content = "\n".join(json.dumps(record) for record in records)
+        self.assertEqual(self.upload("menu.jsonl", content).status_code, 200)
+        self.assertEqual(PackageMenuItem.objects.count(), 2)
+
+        response = self.client.get(
+            "/api/v1/menu/menu/items/export/",
+            {"organization": self.organization.id},
+        )
+        exported = b"".join(response.streaming_content).decode()
+        self.assertEqual(
+            [json.loads(line)["type"] for line in exported.splitlines()],
+            ["category", "item", "package"],
+        )
+
+        # Re-importing the export is a no-op
+        self.assertEqual(self.upload("menu.jsonl", exported).status_code, 200)
+        self.assertEqual(PackageMenuItem.objects.count(), 2)
+        self.assertEqual(MenuCategory.objects.get().display_order, 2)
+
+    def test_import_requires_menu_manager(self):
+        self.client.force_authenticate(User.objects.create_user(username="guest"))
+        response = self.upload("menu.csv", self.csv_menu(1))
+        self.assertEqual(response.status_code, 403)
@@ -0,0 +1,621 @@
+"""
+Bulk menu import and export
+
+Menus travel in two formats:
+
+- CSV: one row per menu item. The ``category`` column names the item's
+  category (created if missing) and an optional ``variants`` column lists
+  variants as ``name=price_modifier`` pairs separated by ``;``.
+- JSON Lines: one record per line with a ``type`` of ``category``, ``item``
+  (with an optional ``variants`` list) or ``package`` (with an ``items`` list
+  referencing menu items by name, plus ``category`` where a name is ambiguous).
+
+Imports parse the stream record by record, validate every value in memory
+against the model fields and then upsert the whole menu in one transaction:
+categories, items, variants and packages are each written with a single
+``bulk_create(update_conflicts=True)`` on their natural keys, so re-importing
+a file updates rows in place. A package's contents are replaced by the ones
+in the file. Missing fields take their model defaults; nothing absent from the
+file is deleted.
+
+bulk_create() skips save() and signals, so the import maintains what those
+would have: the dietary/allergen bitmasks, the search index, the
+organization's menu version and the PricingHistory of changed prices.
+
+Exports stream the same formats back, in chunks, so they can be re-imported.
+"""
+
+import csv
+import io
+import json
+from collections import defaultdict
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError
+from django.db import connections, models, transaction
+
+from apps.core.transactions import defer_until_commit
+from apps.pricing.history import record_changes
+from . import dietary, search
+from .models import (
+    MenuCategory,
+    MenuItem,
+    MenuItemVariant,
+    MenuPackage,
+    PackageMenuItem,
+)
+from .snapshots import bump_menu_versions
+
+FORMATS = ("csv", "jsonl")
+
+CATEGORY_FIELDS = ("name", "description", "display_order", "is_active")
+ITEM_FIELDS = (
+    "name",
+    "description",
+    "base_price",
+    "serving_type",
+    "dietary_type",
+    "is_available",
+    "is_featured",
+    "ingredients",
+    "allergens",
+    "preparation_time",
+    "spice_level",
+    "calories_per_serving",
+    "min_order_quantity",
+    "max_order_quantity",
+    "display_order",
+)
+VARIANT_FIELDS = (
+    "name",
+    "description",
+    "price_modifier",
+    "is_available",
+    "display_order",
+)
+PACKAGE_FIELDS = (
+    "name",
+    "description",
+    "package_type",
+    "base_price_per_person",
+    "min_guests",
+    "max_guests",
+    "is_active",
+    "is_featured",
+)
+PACKAGE_ITEM_FIELDS = ("quantity_per_person", "is_optional", "additional_cost")
+
+CSV_COLUMNS = ("category",) + ITEM_FIELDS + ("variants",)
+
+# Rows per bulk_create() statement and per export chunk
+BATCH_SIZE = 500
+
+# Validation errors reported before giving up on a file
+MAX_ERRORS = 50
+
+TRUE_VALUES = {"1", "true", "t", "yes", "y"}
+FALSE_VALUES = {"0", "false", "f", "no", "n"}
+
+
+class MenuImportError(ValueError):
+    """Raised with every (line, message) problem found in an import"""
+
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__(
+            "; ".join(f"line {line}: {message}" for line, message in errors[:5])
+        )
+
+
+# Parsing
+
+
+def clean_value(field, value):
+    """Convert a raw CSV/JSON value to the Python value ``field`` stores"""
+    if isinstance(value, str):
+        value = value.strip()
+        if isinstance(field, models.BooleanField) and value:
+            if value.lower() in TRUE_VALUES:
+                value = True
+            elif value.lower() in FALSE_VALUES:
+                value = False
+    if value is None or value == "":
+        if field.null:
+            return None
+        if field.has_default():
+            return field.get_default()
+        if not field.blank:
+            raise ValidationError("This field is required.")
+        value = ""
+    value = field.clean(value, None)
+    if isinstance(field, models.DecimalField):
+        # As stored, so unchanged amounts compare and print alike
+        value = value.quantize(Decimal(1).scaleb(-field.decimal_places))
+    return value
+
+
+def build(model, fields, record):
+    """An unsaved ``model`` instance from the ``fields`` of ``record``"""
+    values, errors = {}, []
+    for name in fields:
+        field = model._meta.get_field(name)
+        try:
+            values[name] = clean_value(field, record.get(name))
+        except ValidationError as e:
+            errors.append(f"{name}: {' '.join(e.messages)}")
+    if errors:
+        raise ValidationError(errors)
+    return model(**values)
+
+
+def nested_records(record, name):
+    """The list of objects under ``name`` in ``record`` (variants, items)"""
+    value = record.get(name) or []
+    if not isinstance(value, list) or not all(isinstance(entry, dict) for entry in value):
+        raise ValidationError(f"{name}: expected a list of objects")
+    return value
+
+
+def parse_variants(value):
+    """``Half=-100;Full=0`` -> variant records"""
+    variants = []
+    for entry in value.split(";"):
+        if not entry.strip():
+            continue
+        name, _, price_modifier = entry.partition("=")
+        variants.append({"name": name, "price_modifier": price_modifier or 0})
+    return variants
+
+
+def read_csv(stream):
+    """Yield (line, record) pairs from a CSV stream of menu items"""
+    reader = csv.DictReader(stream)
+    for row in reader:
+        record = {key.strip(): value for key, value in row.items() if key}
+        record["type"] = "item"
+        record["variants"] = parse_variants(record.get("variants") or "")
+        yield reader.line_num, record
+
+
+def read_jsonl(stream):
+    """Yield (line, record) pairs from a JSON Lines stream"""
+    for line, text in enumerate(stream, start=1):
+        if not text.strip():
+            continue
+        try:
+            record = json.loads(text)
+        except ValueError as e:
+            yield line, e
+            continue
+        yield line, record
+
+
+READERS = {"csv": read_csv, "jsonl": read_jsonl}
+
+
+class MenuImport:
+    """Validated contents of one import file for one organization"""
+
+    def __init__(self, organization):
+        self.organization = organization
+        # name -> MenuCategory; categories only named by items use defaults
+        self.categories = {}
+        self.described_categories = set()
+        # (category name, item name) -> MenuItem
+        self.items = {}
+        # (category name, item name) -> [MenuItemVariant]
+        self.variants = defaultdict(list)
+        # package name -> MenuPackage
+        self.packages = {}
+        # package name -> [(line, reference, PackageMenuItem)]
+        self.package_items = defaultdict(list)
+        self.errors = []
+
+    def error(self, line, message):
+        self.errors.append((line, message))
+        if len(self.errors) >= MAX_ERRORS:
+            raise MenuImportError(self.errors)
+
+    def read(self, stream, file_format):
+        try:
+            for line, record in READERS[file_format](stream):
+                self.read_record(line, record)
+        except UnicodeDecodeError:
+            # The stream decodes in chunks, so the offending line is unknown
+            self.error(0, "file is not UTF-8 encoded")
+        if self.errors:
+            raise MenuImportError(self.errors)
+        return self
+
+    def read_record(self, line, record):
+        if isinstance(record, Exception):
+            self.error(line, f"invalid JSON ({record})")
+            return
+        if not isinstance(record, dict):
+            self.error(line, "expected an object")
+            return
+        handler = getattr(self, f"add_{record.get('type')}", None)
+        if handler is None:
+            self.error(line, f"unknown record type {record.get('type')!r}")
+            return
+        try:
+            handler(line, record)
+        except ValidationError as e:
+            self.error(line, "; ".join(e.messages))
+
+    def category(self, name):
+        if name not in self.categories:
+            self.categories[name] = build(MenuCategory, CATEGORY_FIELDS, {"name": name})
+        return self.categories[name]
+
+    def add_category(self, line, record):
+        category = build(MenuCategory, CATEGORY_FIELDS, record)
+        self.categories[category.name] = category
+        self.described_categories.add(category.name)
+
+    def add_item(self, line, record):
+        category = str(record.get("category") or "").strip()
+        if not category:
+            raise ValidationError("category: This field is required.")
+        self.category(category)
+        item = build(MenuItem, ITEM_FIELDS, record)
+        item.dietary_flags = dietary.dietary_flags(item.dietary_type)
+        item.allergen_flags = dietary.allergen_flags(item.allergens)
+        key = (category, item.name)
+        self.items[key] = item
+        variants = {}
+        for variant in nested_records(record, "variants"):
+            variant = build(MenuItemVariant, VARIANT_FIELDS, variant)
+            variants[variant.name] = variant
+        self.variants[key] = list(variants.values())
+
+    def add_package(self, line, record):
+        package = build(MenuPackage, PACKAGE_FIELDS, record)
+        self.packages[package.name] = package
+        self.package_items[package.name] = [
+            (
+                line,
+                entry,
+                build(PackageMenuItem, PACKAGE_ITEM_FIELDS, entry),
+            )
+            for entry in nested_records(record, "items")
+        ]
+
+    # Writing
+
+    def save(self):
+        """Upsert everything read; returns the number of rows per kind"""
+        with transaction.atomic():
+            category_ids = self.save_categories()
+            item_ids = self.save_items(category_ids)
+            variant_count = self.save_variants(item_ids)
+            package_ids = self.save_packages()
+            package_item_count = self.save_package_items(package_ids)
+
+            search.index_items(item_ids.values())
+            defer_until_commit(
+                "menu_version",
+                [("organization", self.organization.id)],
+                bump_menu_versions,
+                unique=True,
+            )
+        return {
+            "categories": len(category_ids),
+            "items": len(item_ids),
+            "variants": variant_count,
+            "packages": len(package_ids),
+            "package_items": package_item_count,
+        }
+
+    def save_categories(self):
+        existing = set(
+            MenuCategory.objects.filter(
+                organization=self.organization, name__in=list(self.categories)
+            )
+            .order_by()
+            .values_list("name", flat=True)
+        )
+        # Categories only referenced by items keep their current settings
+        categories = [
+            category
+            for name, category in self.categories.items()
+            if name in self.described_categories or name not in existing
+        ]
+        for category in categories:
+            category.organization = self.organization
+        upsert(MenuCategory, categories, ["organization", "name"], CATEGORY_FIELDS)
+        return dict(
+            MenuCategory.objects.filter(
+                organization=self.organization, name__in=list(self.categories)
+            )
+            .order_by()
+            .values_list("name", "id")
+        )
+
+    def save_items(self, category_ids):
+        for (category, name), item in self.items.items():
+            item.organization = self.organization
+            item.category_id = category_ids[category]
+        prices = {
+            (category_id, name): (item_id, base_price)
+            for item_id, category_id, name, base_price in MenuItem.objects.filter(
+                organization=self.organization,
+                category_id__in=list(category_ids.values()),
+                name__in={name for category, name in self.items},
+            )
+            .order_by()
+            .values_list("id", "category_id", "name", "base_price")
+        }
+        upsert(
+            MenuItem,
+            list(self.items.values()),
+            ["organization", "category", "name"],
+            ITEM_FIELDS + ("dietary_flags", "allergen_flags"),
+        )
+        changes = []
+        for item in self.items.values():
+            if (item.category_id, item.name) in prices:
+                item_id, base_price = prices[item.category_id, item.name]
+                changes.append((item_id, "base_price", base_price, item.base_price))
+        record_changes(MenuItem, self.organization.id, changes)
+        return {
+            (category, name): item_id
+            for item_id, category, name in MenuItem.objects.filter(
+                organization=self.organization,
+                category_id__in=list(category_ids.values()),
+                name__in={name for category, name in self.items},
+            )
+            .order_by()
+            .values_list("id", "category__name", "name")
+            if (category, name) in self.items
+        }
+
+    def save_variants(self, item_ids):
+        variants = []
+        for key, item_variants in self.variants.items():
+            for variant in item_variants:
+                variant.menu_item_id = item_ids[key]
+                variants.append(variant)
+        upsert(MenuItemVariant, variants, ["menu_item", "name"], VARIANT_FIELDS)
+        return len(variants)
+
+    def save_packages(self):
+        packages = list(self.packages.values())
+        for package in packages:
+            package.organization = self.organization
+        prices = {
+            name: (package_id, price)
+            for package_id, name, price in MenuPackage.objects.filter(
+                organization=self.organization, name__in=list(self.packages)
+            )
+            .order_by()
+            .values_list("id", "name", "base_price_per_person")
+        }
+        upsert(MenuPackage, packages, ["organization", "name"], PACKAGE_FIELDS)
+        changes = []
+        for package in packages:
+            if package.name in prices:
+                package_id, price = prices[package.name]
+                changes.append(
+                    (package_id, "base_price_per_person", price, package.base_price_per_person)
+                )
+        record_changes(MenuPackage, self.organization.id, changes)
+        return dict(
+            MenuPackage.objects.filter(
+                organization=self.organization, name__in=list(self.packages)
+            )
+            .order_by()
+            .values_list("name", "id")
+        )
+
+    def save_package_items(self, package_ids):
+        references = [
+            reference
+            for entries in self.package_items.values()
+            for line, reference, package_item in entries
+        ]
+        if not references:
+            return 0
+
+        # Every item of the organization by name, and the variants of the
+        # referenced ones, in two queries
+        items_by_name = defaultdict(dict)
+        for item_id, category, name in (
+            MenuItem.objects.filter(
+                organization=self.organization,
+                name__in={
+                    str(reference.get("item", "")).strip() for reference in references
+                },
+            )
+            .order_by()
+            .values_list("id", "category__name", "name")
+        ):
+            items_by_name[name][category] = item_id
+        variant_ids = {
+            (menu_item_id, name): variant_id
+            for variant_id, menu_item_id, name in MenuItemVariant.objects.filter(
+                menu_item__organization=self.organization,
+                menu_item__name__in=list(items_by_name),
+            )
+            .order_by()
+            .values_list("id", "menu_item_id", "name")
+        }
+
+        package_items = {}
+        for package_name, entries in self.package_items.items():
+            for line, reference, package_item in entries:
+                package_item.package_id = package_ids[package_name]
+                try:
+                    package_item.menu_item_id = resolve_item(items_by_name, reference)
+                    variant = str(reference.get("variant") or "").strip()
+                    if variant:
+                        key = (package_item.menu_item_id, variant)
+                        if key not in variant_ids:
+                            raise ValidationError(f"unknown variant {variant!r}")
+                        package_item.variant_id = variant_ids[key]
+                except ValidationError as e:
+                    self.error(line, f"{package_name}: {' '.join(e.messages)}")
+                    continue
+                package_items[
+                    package_item.package_id,
+                    package_item.menu_item_id,
+                    package_item.variant_id,
+                ] = package_item
+        if self.errors:
+            raise MenuImportError(self.errors)
+
+        PackageMenuItem.objects.filter(
+            package_id__in=list(package_ids.values())
+        ).delete()
+        PackageMenuItem.objects.bulk_create(
+            list(package_items.values()), batch_size=BATCH_SIZE
+        )
+        return len(package_items)
+
+
+def resolve_item(items_by_name, reference):
+    name = str(reference.get("item", "")).strip()
+    by_category = items_by_name.get(name)
+    if not by_category:
+        raise ValidationError(f"unknown menu item {name!r}")
+    category = str(reference.get("category") or "").strip()
+    if category:
+        if category not in by_category:
+            raise ValidationError(f"unknown menu item {name!r} in {category!r}")
+        return by_category[category]
+    if len(by_category) > 1:
+        raise ValidationError(f"menu item {name!r} is ambiguous; add its category")
+    return next(iter(by_category.values()))
+
+
+def upsert(model, objects, unique_fields, update_fields):
+    if not objects:
+        return
+    features = connections[model.objects.db].features
+    update_fields = list(update_fields)
+    if any(field.name == "updated_at" for field in model._meta.fields):
+        update_fields.append("updated_at")
+    model.objects.bulk_create(
+        objects,
+        batch_size=BATCH_SIZE,
+        update_conflicts=True,
+        # MySQL infers the conflict target from the unique indexes
+        unique_fields=(
+            unique_fields if features.supports_update_conflicts_with_target else None
+        ),
+        update_fields=[field for field in update_fields if field not in unique_fields],
+    )
+
+
+def import_menu(organization, stream, file_format):
+    """
+    Import a menu from a text ``stream`` in ``file_format``; raises
+    MenuImportError (and writes nothing) if any record is invalid.
+    """
+    if file_format not in READERS:
+        raise MenuImportError([(0, f"unsupported format {file_format!r}")])
+    return MenuImport(organization).read(stream, file_format).save()
+
+
+# Export
+
+
+def _values(instance, fields):
+    return {name: getattr(instance, name) for name in fields}
+
+
+def _json(record):
+    return json.dumps(record, default=str) + "\n"
+
+
+def category_records(organization):
+    categories = MenuCategory.objects.filter(organization=organization).order_by(
+        "display_order", "name"
+    )
+    for category in categories.iterator(chunk_size=BATCH_SIZE):
+        yield {"type": "category", **_values(category, CATEGORY_FIELDS)}
+
+
+def item_records(organization):
+    items = (
+        MenuItem.objects.filter(organization=organization)
+        .select_related("category")
+        .prefetch_related("variants")
+        .order_by("category__display_order", "display_order", "name")
+    )
+    for item in items.iterator(chunk_size=BATCH_SIZE):
+        yield {
+            "type": "item",
+            "category": item.category.name,
+            **_values(item, ITEM_FIELDS),
+            "variants": [
+                _values(variant, VARIANT_FIELDS) for variant in item.variants.all()
+            ],
+        }
+
+
+def package_records(organization):
+    packages = (
+        MenuPackage.objects.filter(organization=organization)
+        .prefetch_related(
+            models.Prefetch(
+                "package_items",
+                queryset=PackageMenuItem.objects.select_related(
+                    "menu_item__category", "variant"
+                ),
+            )
+        )
+        .order_by("name")
+    )
+    for package in packages.iterator(chunk_size=BATCH_SIZE):
+        yield {
+            "type": "package",
+            **_values(package, PACKAGE_FIELDS),
+            "items": [
+                {
+                    "item": package_item.menu_item.name,
+                    "category": package_item.menu_item.category.name,
+                    "variant": (
+                        package_item.variant.name if package_item.variant else None
+                    ),
+                    **_values(package_item, PACKAGE_ITEM_FIELDS),
+                }
+                for package_item in package.package_items.all()
+            ],
+        }
+
+
+def export_jsonl(organization):
+    for records in (category_records, item_records, package_records):
+        for record in records(organization):
+            yield _json(record)
+
+
+def export_csv(organization):
+    """Yield the organization's menu items as CSV text chunks"""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=CSV_COLUMNS)
+    writer.writeheader()
+    count = 0
+    for record in item_records(organization):
+        record["variants"] = ";".join(
+            f"{variant['name']}={variant['price_modifier']}"
+            for variant in record["variants"]
+        )
+        del record["type"]
+        writer.writerow(record)
+        count += 1
+        if count % BATCH_SIZE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+EXPORTERS = {"csv": export_csv, "jsonl": export_jsonl}
+CONTENT_TYPES = {"csv": "text/csv", "jsonl": "application/x-ndjson"}
+
+
+def export_menu(organization, file_format):
+    """An iterator of text chunks of the organization's menu"""
+    return EXPORTERS[file_format](organization)
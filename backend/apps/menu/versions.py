@@ -0,0 +1,237 @@
+"""
+Point-in-time menu versions
+
+Publishing an organization's menu stores an immutable MenuVersion whose
+``content`` holds everything a booking needs to show what was ordered:
+
+    {
+        "format": 1,
+        "items": {"<id>": {"name", "category", "serving_type", "dietary_type",
+                           "price", "is_available"}},
+        "variants": {"<id>": {"item", "name", "price_modifier", "is_available"}},
+        "packages": {"<id>": {"name", "price_per_person",
+                              "items": [[item, variant, quantity, optional]]}},
+    }
+
+Versions are copy-on-write and published lazily: menu writes only bump
+``Organization.menu_version`` (see snapshots.py), a booking takes the latest
+version while it still matches that counter, and only the first booking after
+a change publishes. A new version is only written when the menu content
+actually changed since, which is detected by checksum, and replaces the
+previous versions no booking points to. Booking detail pages read item and
+variant details from the booking's version instead of the live menu rows, so
+later renames, price changes and deletions never alter historical bookings.
+"""
+
+import hashlib
+import json
+
+from django.db import transaction
+
+from apps.core.models import Organization
+from .models import MenuItem, MenuItemVariant, MenuPackage, MenuVersion, PackageMenuItem
+
+CONTENT_FORMAT = 1
+
+SERVING_TYPE_LABELS = dict(MenuItem.SERVING_TYPES)
+
+
+def build_content(organization_id):
+    """The organization's current menu in MenuVersion.content layout"""
+    items = {
+        str(item_id): {
+            "name": name,
+            "category": category,
+            "serving_type": serving_type,
+            "dietary_type": dietary_type,
+            "price": str(price),
+            "is_available": is_available,
+        }
+        for item_id, name, category, serving_type, dietary_type, price, is_available in (
+            MenuItem.objects.filter(organization_id=organization_id)
+            .order_by()
+            .values_list(
+                "id",
+                "name",
+                "category__name",
+                "serving_type",
+                "dietary_type",
+                "base_price",
+                "is_available",
+            )
+        )
+    }
+    variants = {
+        str(variant_id): {
+            "item": item_id,
+            "name": name,
+            "price_modifier": str(price_modifier),
+            "is_available": is_available,
+        }
+        for variant_id, item_id, name, price_modifier, is_available in (
+            MenuItemVariant.objects.filter(menu_item__organization_id=organization_id)
+            .order_by()
+            .values_list("id", "menu_item_id", "name", "price_modifier", "is_available")
+        )
+    }
+    packages = {
+        str(package_id): {"name": name, "price_per_person": str(price), "items": []}
+        for package_id, name, price in (
+            MenuPackage.objects.filter(organization_id=organization_id)
+            .order_by()
+            .values_list("id", "name", "base_price_per_person")
+        )
+    }
+    for package_id, item_id, variant_id, quantity, is_optional in (
+        PackageMenuItem.objects.filter(package__organization_id=organization_id)
+        .order_by("id")
+        .values_list(
+            "package_id",
+            "menu_item_id",
+            "variant_id",
+            "quantity_per_person",
+            "is_optional",
+        )
+    ):
+        packages[str(package_id)]["items"].append(
+            [item_id, variant_id, str(quantity), is_optional]
+        )
+    return {
+        "format": CONTENT_FORMAT,
+        "items": items,
+        "variants": variants,
+        "packages": packages,
+    }
+
+
+def checksum(content):
+    encoded = json.dumps(content, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(encoded.encode()).hexdigest()
+
+
+def publish(organization_id, user=None):
+    """
+    Snapshot the organization's menu; returns ``(version, created)``. An
+    unchanged menu returns the latest version instead of writing a new one;
+    a new version prunes the older ones no booking references.
+    """
+    with transaction.atomic():
+        # Serializes publishes per organization so version numbers stay dense
+        menu_version = (
+            Organization.objects.select_for_update()
+            .filter(pk=organization_id)
+            .values_list("menu_version", flat=True)
+            .get()
+        )
+        latest = (
+            MenuVersion.objects.filter(organization_id=organization_id)
+            .order_by("-number")
+            .first()
+        )
+        content = build_content(organization_id)
+        digest = checksum(content)
+        if latest is not None and latest.checksum == digest:
+            if latest.source_version != menu_version:
+                latest.source_version = menu_version
+                latest.save(update_fields=["source_version"])
+            return latest, False
+
+        version = MenuVersion.objects.create(
+            organization_id=organization_id,
+            number=latest.number + 1 if latest else 1,
+            source_version=menu_version,
+            checksum=digest,
+            content=content,
+            published_by=user,
+        )
+        prune(organization_id, before=version.number)
+        return version, True
+
+
+def prune(organization_id, before=None):
+    """
+    Delete the organization's versions that no booking references, except
+    the latest (or all of those numbered below ``before``); returns how many
+    """
+    stale = MenuVersion.objects.filter(
+        organization_id=organization_id, bookings__isnull=True
+    )
+    if before is None:
+        latest = (
+            MenuVersion.objects.filter(organization_id=organization_id)
+            .order_by("-number")
+            .values_list("number", flat=True)
+            .first()
+        )
+        if latest is None:
+            return 0
+        before = latest
+    return stale.filter(number__lt=before).delete()[0]
+
+
+def current_version(organization_id):
+    """
+    The version matching the organization's menu right now, publishing one
+    first if the menu changed since the latest version
+    """
+    latest = (
+        MenuVersion.objects.filter(organization_id=organization_id)
+        .select_related("organization")
+        .only(
+            "id", "number", "source_version", "checksum", "organization__menu_version"
+        )
+        .order_by("-number")
+        .first()
+    )
+    if latest is not None and latest.source_version == latest.organization.menu_version:
+        return latest
+    return publish(organization_id)[0]
+
+
+# Reading booked items back in the live serializers' shapes
+
+
+def item_data(content, item_id):
+    """MenuItemListSerializer-shaped data for ``item_id`` as published"""
+    item = content["items"].get(str(item_id))
+    if item is None:
+        return None
+    return {
+        "id": item_id,
+        "name": item["name"],
+        "category_name": item["category"],
+        "base_price": item["price"],
+        "serving_type_display": SERVING_TYPE_LABELS.get(
+            item["serving_type"], item["serving_type"]
+        ),
+        "is_vegetarian": item["dietary_type"] in ("vegetarian", "vegan"),
+        "is_available": item["is_available"],
+        "has_variants": any(
+            variant["item"] == item_id for variant in content["variants"].values()
+        ),
+    }
+
+
+def variant_data(content, variant_id):
+    """MenuItemVariantSerializer-shaped data for ``variant_id`` as published"""
+    if variant_id is None:
+        return None
+    variant = content["variants"].get(str(variant_id))
+    if variant is None:
+        return None
+    item = content["items"].get(str(variant["item"]))
+    final_price = None
+    if item is not None:
+        final_price = str(
+            MenuItemVariant(
+                menu_item=MenuItem(base_price=item["price"]),
+                price_modifier=variant["price_modifier"],
+            ).final_price
+        )
+    return {
+        "id": variant_id,
+        "name": variant["name"],
+        "price_modifier": variant["price_modifier"],
+        "final_price": final_price,
+        "is_available": variant["is_available"],
+    }
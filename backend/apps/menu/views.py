@@ -1,7 +1,16 @@
 from rest_framework import viewsets, status, permissions
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from django.db.models import Q
+from rest_framework.exceptions import ValidationError
+from collections import defaultdict
+import io
+from django.db.models import Count, Exists, F, OuterRef, Q
+from django.http import StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from apps.core.models import Organization
+from apps.organizations.permissions import CanManageOrganization
+from . import dietary, transfer, versions
+from . import search as menu_search
 from .models import MenuCategory, MenuItem, MenuItemVariant, MenuPackage, PackageMenuItem
 from .serializers import (
     MenuCategorySerializer, MenuCategoryWithItemsSerializer,
@@ -19,7 +28,9 @@ class MenuCategoryViewSet(viewsets.ModelViewSet):
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
     
     def get_queryset(self):
-        queryset = MenuCategory.objects.all()
+        queryset = MenuCategory.objects.annotate(
+            items_count=Count('items', filter=Q(items__is_available=True))
+        )
         
         # Filter by active status
         is_active = self.request.query_params.get('is_active')
@@ -64,10 +75,28 @@ class MenuItemViewSet(viewsets.ModelViewSet):
         if is_available is not None:
             queryset = queryset.filter(is_available=is_available.lower() == 'true')
         
-        # Filter by vegetarian
+        # Filter by vegetarian (vegan items count as vegetarian)
         is_vegetarian = self.request.query_params.get('is_vegetarian')
         if is_vegetarian is not None:
-            queryset = queryset.filter(is_vegetarian=is_vegetarian.lower() == 'true')
+            if is_vegetarian.lower() == 'true':
+                queryset = dietary.filter_items(queryset, dietary=['vegetarian'])
+            else:
+                queryset = queryset.alias(
+                    vegetarian=F('dietary_flags').bitand(dietary.VEGETARIAN)
+                ).filter(vegetarian=0)
+
+        # Filter by dietary requirements and excluded allergens, e.g.
+        # ?dietary=vegetarian,halal&exclude_allergens=nuts,dairy
+        try:
+            queryset = dietary.filter_items(
+                queryset,
+                dietary=dietary.parse_codes(self.request.query_params.get('dietary', '')),
+                exclude_allergens=dietary.parse_codes(
+                    self.request.query_params.get('exclude_allergens', '')
+                ),
+            )
+        except ValueError as e:
+            raise ValidationError({'error': str(e)})
         
         # Filter by serving type
         serving_type = self.request.query_params.get('serving_type')
@@ -82,14 +111,10 @@ class MenuItemViewSet(viewsets.ModelViewSet):
         if max_price:
             queryset = queryset.filter(base_price__lte=max_price)
         
-        # Search by name, description, or ingredients
-        search = self.request.query_params.get('search')
-        if search:
-            queryset = queryset.filter(
-                Q(name__icontains=search) | 
-                Q(description__icontains=search) | 
-                Q(ingredients__icontains=search)
-            )
+        # Search name, ingredients, description and allergens (prefix match)
+        query = self.request.query_params.get('search')
+        if query:
+            queryset = menu_search.filter_queryset(queryset, query)
         
         return queryset.order_by('category__display_order', 'display_order', 'name')
     
@@ -103,22 +128,47 @@ class MenuItemViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'])
     def vegetarian(self, request):
         """Get only vegetarian items"""
-        items = self.get_queryset().filter(is_vegetarian=True, is_available=True)
+        items = dietary.filter_items(
+            self.get_queryset().filter(is_available=True), dietary=['vegetarian']
+        )
         serializer = MenuItemListSerializer(items, many=True)
         return Response(serializer.data)
     
     @action(detail=False, methods=['get'])
     def by_category(self, request):
-        """Get items grouped by category"""
-        categories = MenuCategory.objects.filter(is_active=True).order_by('display_order')
+        """Get an organization's available items grouped by category"""
+        organization_id = request.query_params.get('organization')
+        if not organization_id:
+            return Response(
+                {'error': 'organization parameter required'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if not organization_id.isdigit():
+            return Response(
+                {'error': 'organization must be an integer'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        categories = MenuCategory.objects.filter(
+            organization_id=organization_id, is_active=True
+        ).order_by('display_order', 'name')
+
+        # All available items in one query, grouped in Python
+        items = MenuItem.objects.filter(
+            organization_id=organization_id,
+            category__is_active=True,
+            is_available=True
+        ).select_related('category').annotate(
+            has_variants=Exists(MenuItemVariant.objects.filter(menu_item=OuterRef('pk')))
+        ).order_by('display_order', 'name')
+
+        items_by_category = defaultdict(list)
+        for item in items:
+            items_by_category[item.category_id].append(item)
+
         result = []
-        
         for category in categories:
-            items = self.get_queryset().filter(
-                category=category, 
-                is_available=True
-            )
-            serializer = MenuItemListSerializer(items, many=True)
+            serializer = MenuItemListSerializer(items_by_category[category.id], many=True)
             result.append({
                 'category': {
                     'id': category.id,
@@ -130,6 +180,167 @@ class MenuItemViewSet(viewsets.ModelViewSet):
         
         return Response(result)
     
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        """
+        Ranked full-text search of an organization's available items, with
+        counts by category and dietary type over the matches.
+        ?category= and ?dietary_type= narrow the results, not the facets.
+        """
+        query = request.query_params.get('q', '').strip()
+        organization_id = request.query_params.get('organization')
+        if not query or not organization_id:
+            return Response(
+                {'error': 'q and organization parameters required'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if not organization_id.isdigit():
+            return Response(
+                {'error': 'organization must be an integer'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            limit = min(int(request.query_params.get('limit', 20)), menu_search.SEARCH_LIMIT)
+        except ValueError:
+            return Response(
+                {'error': 'limit must be an integer'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        ranked = menu_search.ranked_ids(query, organization_id=int(organization_id))
+        items = MenuItem.objects.filter(
+            id__in=ranked, is_available=True
+        ).select_related('category').annotate(
+            has_variants=Exists(MenuItemVariant.objects.filter(menu_item=OuterRef('pk')))
+        )
+        try:
+            items = dietary.filter_items(
+                items,
+                dietary=dietary.parse_codes(request.query_params.get('dietary', '')),
+                exclude_allergens=dietary.parse_codes(
+                    request.query_params.get('exclude_allergens', '')
+                ),
+            )
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        position = {item_id: rank for rank, item_id in enumerate(ranked)}
+        items = sorted(items, key=lambda item: position[item.id])
+
+        categories = {}
+        dietary_types = defaultdict(int)
+        for item in items:
+            facet = categories.setdefault(
+                item.category_id,
+                {'id': item.category_id, 'name': item.category.name, 'count': 0}
+            )
+            facet['count'] += 1
+            dietary_types[item.dietary_type] += 1
+
+        category = request.query_params.get('category')
+        if category:
+            items = [item for item in items if str(item.category_id) == category]
+        dietary_type = request.query_params.get('dietary_type')
+        if dietary_type:
+            items = [item for item in items if item.dietary_type == dietary_type]
+
+        labels = dict(MenuItem.DIETARY_TYPES)
+        return Response({
+            'query': query,
+            'count': len(items),
+            'results': MenuItemListSerializer(items[:limit], many=True).data,
+            'facets': {
+                'categories': sorted(
+                    categories.values(), key=lambda facet: (-facet['count'], facet['name'])
+                ),
+                'dietary_types': [
+                    {'value': value, 'label': labels.get(value, value), 'count': count}
+                    for value, count in sorted(
+                        dietary_types.items(), key=lambda entry: (-entry[1], entry[0])
+                    )
+                ],
+            },
+        })
+
+    def get_managed_organization(self, request):
+        """The ?organization= the user may manage, or raise 404/403"""
+        organization_id = request.query_params.get('organization', '')
+        if not organization_id.isdigit():
+            raise ValidationError({'error': 'organization parameter required'})
+        organization = get_object_or_404(Organization, pk=organization_id)
+        if not CanManageOrganization().has_object_permission(request, self, organization):
+            self.permission_denied(request)
+        return organization
+
+    @action(detail=False, methods=['post'], url_path='import',
+            permission_classes=[permissions.IsAuthenticated])
+    def import_menu(self, request):
+        """
+        Upsert an organization's menu from an uploaded CSV or JSON Lines
+        ``file`` (see apps/menu/transfer.py for the record layout)
+        """
+        organization = self.get_managed_organization(request)
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({'error': 'file is required'}, status=status.HTTP_400_BAD_REQUEST)
+        file_format = request.data.get('file_format') or upload.name.rsplit('.', 1)[-1].lower()
+        if file_format not in transfer.FORMATS:
+            return Response(
+                {'error': f"file_format must be one of {', '.join(transfer.FORMATS)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        stream = io.TextIOWrapper(upload.file, encoding='utf-8-sig', newline='')
+        try:
+            counts = transfer.import_menu(organization, stream, file_format)
+        except transfer.MenuImportError as e:
+            return Response(
+                {
+                    'error': 'Import failed; nothing was written',
+                    'errors': [{'line': line, 'message': message} for line, message in e.errors],
+                },
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return Response(counts)
+
+    @action(detail=False, methods=['get'], url_path='export',
+            permission_classes=[permissions.IsAuthenticated])
+    def export_menu(self, request):
+        """Stream an organization's menu as CSV (?file_format=csv) or JSON Lines"""
+        organization = self.get_managed_organization(request)
+        file_format = request.query_params.get('file_format', 'jsonl')
+        if file_format not in transfer.FORMATS:
+            return Response(
+                {'error': f"file_format must be one of {', '.join(transfer.FORMATS)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        response = StreamingHttpResponse(
+            transfer.export_menu(organization, file_format),
+            content_type=transfer.CONTENT_TYPES[file_format]
+        )
+        response['Content-Disposition'] = (
+            f'attachment; filename="menu-{organization.id}.{file_format}"'
+        )
+        return response
+
+    @action(detail=False, methods=['post'], permission_classes=[permissions.IsAuthenticated])
+    def publish(self, request):
+        """
+        Publish an immutable version of an organization's menu for new
+        bookings to point to; an unchanged menu returns the latest version
+        """
+        organization = self.get_managed_organization(request)
+        version, created = versions.publish(organization.id, user=request.user)
+        return Response(
+            {
+                'number': version.number,
+                'checksum': version.checksum,
+                'published_at': version.published_at,
+                'created': created,
+            },
+            status=status.HTTP_201_CREATED if created else status.HTTP_200_OK
+        )
+
     @action(detail=True, methods=['get'])
     def variants(self, request, pk=None):
         """Get variants for a specific menu item"""
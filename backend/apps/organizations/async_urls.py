@@ -0,0 +1,34 @@
+from django.urls import path
+
+from . import async_views
+
+# Async (ASGI) counterparts of the marketplace read endpoints; named
+# "marketplace-..." so API metering attributes them to the organization
+urlpatterns = [
+    path("", async_views.organization_list, name="marketplace-async-list"),
+    path(
+        "<int:pk>/",
+        async_views.organization_detail,
+        name="marketplace-async-detail",
+    ),
+    path(
+        "<int:pk>/halls/",
+        async_views.organization_halls,
+        name="marketplace-async-halls",
+    ),
+    path(
+        "<int:pk>/menu/",
+        async_views.organization_menu,
+        name="marketplace-async-menu",
+    ),
+    path(
+        "<int:pk>/packages/",
+        async_views.organization_packages,
+        name="marketplace-async-packages",
+    ),
+    path(
+        "<int:pk>/availability/",
+        async_views.organization_availability,
+        name="marketplace-async-availability",
+    ),
+]
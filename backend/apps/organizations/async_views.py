@@ -0,0 +1,239 @@
+"""
+Async (ASGI) read path for the public marketplace endpoints
+
+Mounted at /api/v1/async/marketplace/ beside the DRF viewset and answering
+with the same bodies, filters, pagination and cache validators:
+MarketplaceViewSet still builds the querysets, version stamps and
+serializers, these views only await them. Under an ASGI server (``uvicorn
+marquee_system.asgi:application``) a worker goes on serving other requests
+while one waits for the database, instead of holding a thread per request.
+Queries a response needs independently of each other (a page and its count,
+an organization and its halls) are awaited together.
+
+Django's async ORM still runs each query in a thread, one per request, so
+the gathered queries of a request overlap other requests rather than each
+other. Requests are not authenticated (every endpoint is public) and are
+throttled per IP address. ``manage.py benchmark_marketplace`` compares this
+path with the WSGI one.
+"""
+
+import asyncio
+import math
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.http import parse_etags
+from django.views.decorators.http import require_safe
+from rest_framework.exceptions import ValidationError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from apps.core import conditional, metering
+from apps.core.models import Hall, Organization
+from apps.core.throttling import ApiRateThrottle
+from . import availability
+from .serializers import AvailabilityQuerySerializer
+from .views import MarketplaceViewSet
+
+
+def _json(data, status=200):
+    return HttpResponse(
+        JSONRenderer().render(data), content_type="application/json", status=status
+    )
+
+
+def _not_found(detail="Not found."):
+    return _json({"detail": detail}, status=404)
+
+
+def _throttled(request):
+    """A 429 response once the client's IP address is out of tokens"""
+    wait = metering.limiter.take(f"ip:{ApiRateThrottle().get_ident(request)}")
+    if not wait:
+        return None
+    response = _json(
+        {
+            "detail": "Request was throttled. Expected available in "
+            f"{math.ceil(wait)} seconds."
+        },
+        status=429,
+    )
+    response["Retry-After"] = str(math.ceil(wait))
+    return response
+
+
+def _viewset(request, action, kwargs):
+    """A MarketplaceViewSet set up for ``action`` as its dispatch() would"""
+    view = MarketplaceViewSet(
+        action_map={"get": action, "head": action},
+        args=(),
+        kwargs=kwargs,
+        format_kwarg=None,
+    )
+    view.request = view.initialize_request(request, **kwargs)
+    return view
+
+
+def marketplace_endpoint(action):
+    """
+    Throttling, conditional GET (through the viewset's ``<action>_version``)
+    and validation errors around an async ``handler(request, view, **kwargs)``
+    """
+
+    def decorator(handler):
+        @wraps(handler)
+        async def endpoint(request, **kwargs):
+            response = _throttled(request)
+            if response is not None:
+                return response
+            view = _viewset(request, action, kwargs)
+
+            validators = None
+            get_version = getattr(view, f"{action}_version", None)
+            if get_version is not None:
+                version = await sync_to_async(get_version)()
+                if version is not None:
+                    validators = conditional.validators(
+                        action, request.get_full_path(), version
+                    )
+                    response = conditional.not_modified(request, validators)
+            if response is None:
+                try:
+                    response = await handler(request, view, **kwargs)
+                except ValidationError as exc:
+                    response = _json(exc.detail, status=400)
+            return conditional.set_validators(response, validators)
+
+        return require_safe(endpoint)
+
+    return decorator
+
+
+async def _page(request, view, queryset):
+    """DRF PageNumberPagination's response body, count and rows gathered"""
+    paginator = view.paginator
+    page_size = paginator.page_size
+    try:
+        number = int(request.GET.get(paginator.page_query_param, 1))
+        if number < 1:
+            raise ValueError
+    except ValueError:
+        return None
+    offset = (number - 1) * page_size
+
+    async def rows():
+        return [row async for row in queryset[offset : offset + page_size]]
+
+    count, objects = await asyncio.gather(queryset.acount(), rows())
+    if number > 1 and not objects:
+        return None
+
+    url = request.build_absolute_uri()
+    if offset + page_size < count:
+        next_link = replace_query_param(url, paginator.page_query_param, number + 1)
+    else:
+        next_link = None
+    if number == 1:
+        previous_link = None
+    elif number == 2:
+        previous_link = remove_query_param(url, paginator.page_query_param)
+    else:
+        previous_link = replace_query_param(url, paginator.page_query_param, number - 1)
+    return {
+        "count": count,
+        "next": next_link,
+        "previous": previous_link,
+        "results": view.get_serializer(objects, many=True).data,
+    }
+
+
+@marketplace_endpoint("list")
+async def organization_list(request, view):
+    """Active organizations, filtered, searched, ordered and paginated"""
+    body = await _page(request, view, view.filter_queryset(view.get_queryset()))
+    if body is None:
+        return _not_found("Invalid page.")
+    return _json(body)
+
+
+@marketplace_endpoint("retrieve")
+async def organization_detail(request, view, pk):
+    organization = await view.get_queryset().filter(pk=pk).afirst()
+    if organization is None:
+        return _not_found("No Organization matches the given query.")
+    return _json(view.get_serializer(organization).data)
+
+
+@marketplace_endpoint("halls")
+async def organization_halls(request, view, pk):
+    from apps.core.serializers import MarketplaceHallSerializer
+
+    async def halls():
+        queryset = Hall.objects.filter(
+            organization_id=pk, is_active=True
+        ).select_related("rating_summary")
+        return [hall async for hall in queryset]
+
+    active, halls = await asyncio.gather(
+        Organization.objects.filter(pk=pk, status="active").aexists(), halls()
+    )
+    if not active:
+        return _not_found("No Organization matches the given query.")
+    return _json(MarketplaceHallSerializer(halls, many=True).data)
+
+
+async def _menu_snapshot(request, pk, kind):
+    """MarketplaceViewSet.menu_snapshot_response, awaiting the version and snapshot"""
+    from apps.menu.snapshots import etag, get_snapshot
+
+    version = await (
+        Organization.objects.filter(pk=pk, status="active")
+        .values_list("menu_version", flat=True)
+        .afirst()
+    )
+    if version is None:
+        return _not_found("No Organization matches the given query.")
+
+    tag = etag(pk, version, kind)
+    client_tags = parse_etags(request.headers.get("If-None-Match", ""))
+    if tag in client_tags or "*" in client_tags:
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(
+            await sync_to_async(get_snapshot)(pk, version, kind),
+            content_type="application/json",
+        )
+    response["ETag"] = tag
+    conditional.patch_public_cache(response)
+    return response
+
+
+@marketplace_endpoint("menu")
+async def organization_menu(request, view, pk):
+    return await _menu_snapshot(request, pk, "menu")
+
+
+@marketplace_endpoint("packages")
+async def organization_packages(request, view, pk):
+    return await _menu_snapshot(request, pk, "packages")
+
+
+@marketplace_endpoint("availability")
+async def organization_availability(request, view, pk):
+    serializer = AvailabilityQuerySerializer(data=request.GET)
+    serializer.is_valid(raise_exception=True)
+    date_from = serializer.validated_data["date_from"]
+    date_to = serializer.validated_data["date_to"]
+
+    async def rows(queryset):
+        return [row async for row in queryset]
+
+    active, halls, booked = await asyncio.gather(
+        Organization.objects.filter(pk=pk, status="active").aexists(),
+        rows(availability.halls(pk)),
+        rows(availability.booked_days(pk, date_from, date_to)),
+    )
+    if not active:
+        return _not_found("No Organization matches the given query.")
+    return _json(availability.payload(halls, booked, date_from, date_to))
@@ -0,0 +1,68 @@
+"""
+Marketplace hall availability
+
+A hall is booked on a day when it has a pending or confirmed booking then
+(ranking.HOLDING, as for recommendations). The halls and the booked days are
+two independent queries, so the async read path (async_views.py) awaits them
+together; both paths build the response with payload().
+"""
+
+from datetime import timedelta
+
+from apps.bookings.models import Booking
+from apps.core.models import Hall
+from apps.core.ranking import HOLDING
+
+
+def halls(organization_id):
+    """The organization's active marketplace halls, as (id, name) pairs"""
+    return (
+        Hall.objects.filter(
+            organization_id=organization_id,
+            organization__status="active",
+            is_active=True,
+        )
+        .order_by("name", "id")
+        .values_list("id", "name")
+    )
+
+
+def booked_days(organization_id, date_from, date_to):
+    """(hall id, date) pairs of the days in the window its halls are held"""
+    return (
+        Booking.objects.filter(
+            organization_id=organization_id,
+            hall__isnull=False,
+            event_date__range=(date_from, date_to),
+            status__in=HOLDING,
+        )
+        .order_by()
+        .values_list("hall_id", "event_date")
+        .distinct()
+    )
+
+
+def payload(halls, booked, date_from, date_to):
+    """The response body for evaluated halls() and booked_days() rows"""
+    days = [
+        date_from + timedelta(days=offset)
+        for offset in range((date_to - date_from).days + 1)
+    ]
+    by_hall = {}
+    for hall_id, day in booked:
+        by_hall.setdefault(hall_id, set()).add(day)
+    return {
+        "date_from": date_from,
+        "date_to": date_to,
+        "halls": [
+            {
+                "id": hall_id,
+                "name": name,
+                "booked_dates": sorted(by_hall.get(hall_id, ())),
+                "available_dates": [
+                    day for day in days if day not in by_hall.get(hall_id, ())
+                ],
+            }
+            for hall_id, name in halls
+        ],
+    }
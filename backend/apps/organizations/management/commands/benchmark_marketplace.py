@@ -0,0 +1,222 @@
+"""
+Compare one WSGI worker with one ASGI worker on a marketplace read endpoint
+
+The WSGI run sends requests one at a time through Django's WSGIHandler, as a
+sync worker serves them; the ASGI run sends them ``--concurrency`` at a time
+through ASGIHandler on one event loop to the async views
+(apps/organizations/async_views.py). Both run in this process, against the
+configured database and cache, without a server or network in between.
+``--latency`` adds a pause to every query, standing in for the round trip to
+a database server that sqlite or a local PostgreSQL doesn't have; that wait
+is what the async path overlaps, so with none the two are on par.
+"""
+
+import asyncio
+import io
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand, CommandError
+from django.core.wsgi import get_wsgi_application
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.test import override_settings
+from django.utils import timezone
+
+from apps.core import metering
+from apps.core.models import Organization
+
+SYNC_PREFIX = "/api/v1/marketplace/"
+ASYNC_PREFIX = "/api/v1/async/marketplace/"
+
+ENDPOINTS = {
+    "list": "",
+    "detail": "{pk}/",
+    "halls": "{pk}/halls/",
+    "menu": "{pk}/menu/",
+    "packages": "{pk}/packages/",
+    "availability": "{pk}/availability/",
+}
+
+
+def _host():
+    return next(
+        (host for host in settings.ALLOWED_HOSTS if host and "*" not in host),
+        "localhost",
+    )
+
+
+def _percentile(timings, share):
+    return sorted(timings)[int(share * (len(timings) - 1))] * 1000
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark a marketplace read endpoint on one WSGI worker (serial) "
+        "against one ASGI worker (concurrent async views)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--endpoint", choices=ENDPOINTS, default="list")
+        parser.add_argument(
+            "--organization", type=int, help="Defaults to the first active one"
+        )
+        parser.add_argument("--requests", type=int, default=200)
+        parser.add_argument("--concurrency", type=int, default=20)
+        parser.add_argument(
+            "--latency",
+            type=float,
+            default=5.0,
+            help="Milliseconds added to every query",
+        )
+
+    def handle(self, *args, **options):
+        pk = options["organization"]
+        if pk is None:
+            pk = (
+                Organization.objects.filter(status="active")
+                .order_by("pk")
+                .values_list("pk", flat=True)
+                .first()
+            )
+        if pk is None:
+            raise CommandError("No active organization to request")
+
+        path = ENDPOINTS[options["endpoint"]].format(pk=pk)
+        query = ""
+        if options["endpoint"] == "availability":
+            today = timezone.localdate()
+            query = f"date_from={today}&date_to={today + timedelta(days=30)}"
+        count = options["requests"]
+
+        # No rate limit and no flushes (which reload it) while benchmarking
+        limiter = metering.limiter
+        metering.limiter = metering.TokenBuckets(10**9)
+        delay = options["latency"] / 1000
+
+        def slow_query(execute, sql, params, many, context):
+            time.sleep(delay)
+            return execute(sql, params, many, context)
+
+        def add_latency(sender, connection, **kwargs):
+            # A thread's connection object outlives its database sessions
+            if slow_query not in connection.execute_wrappers:
+                connection.execute_wrappers.append(slow_query)
+
+        for connection in connections.all(initialized_only=True):
+            add_latency(None, connection)
+        connection_created.connect(add_latency)
+        try:
+            with override_settings(API_METERING_FLUSH_INTERVAL=0):
+                wsgi = self.run_wsgi(SYNC_PREFIX + path, query, count)
+                asgi = asyncio.run(
+                    self.run_asgi(
+                        ASYNC_PREFIX + path, query, count, options["concurrency"]
+                    )
+                )
+        finally:
+            connection_created.disconnect(add_latency)
+            for connection in connections.all(initialized_only=True):
+                if slow_query in connection.execute_wrappers:
+                    connection.execute_wrappers.remove(slow_query)
+            metering.limiter = limiter
+
+        self.report("WSGI, one request at a time", *wsgi)
+        self.report(f"ASGI, {options['concurrency']} concurrent", *asgi)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"ASGI throughput: {wsgi[0] / asgi[0]:.1f}x that of WSGI "
+                f"({options['latency']:g} ms per query)"
+            )
+        )
+
+    def report(self, label, elapsed, timings):
+        self.stdout.write(
+            f"{label}: {len(timings)} requests in {elapsed:.2f}s "
+            f"({len(timings) / elapsed:.1f}/s), "
+            f"p50 {_percentile(timings, 0.5):.1f} ms, "
+            f"p95 {_percentile(timings, 0.95):.1f} ms"
+        )
+
+    def check_status(self, status, path):
+        if status != 200:
+            raise CommandError(f"{path} answered {status}")
+
+    def run_wsgi(self, path, query, count):
+        application = get_wsgi_application()
+        statuses = []
+
+        def start_response(status, headers, exc_info=None):
+            statuses.append(int(status.split()[0]))
+
+        timings = []
+        started = time.perf_counter()
+        for _ in range(count):
+            begin = time.perf_counter()
+            response = application(
+                {
+                    "REQUEST_METHOD": "GET",
+                    "PATH_INFO": path,
+                    "QUERY_STRING": query,
+                    "SERVER_NAME": _host(),
+                    "SERVER_PORT": "80",
+                    "HTTP_HOST": _host(),
+                    "REMOTE_ADDR": "127.0.0.1",
+                    "wsgi.url_scheme": "http",
+                    "wsgi.input": io.BytesIO(),
+                    "wsgi.errors": io.StringIO(),
+                },
+                start_response,
+            )
+            b"".join(response)
+            response.close()
+            timings.append(time.perf_counter() - begin)
+            self.check_status(statuses.pop(), path)
+        return time.perf_counter() - started, timings
+
+    async def run_asgi(self, path, query, count, concurrency):
+        application = get_asgi_application()
+        slots = asyncio.Semaphore(concurrency)
+        timings = []
+
+        async def request():
+            scope = {
+                "type": "http",
+                "asgi": {"version": "3.0"},
+                "http_version": "1.1",
+                "method": "GET",
+                "scheme": "http",
+                "path": path,
+                "raw_path": path.encode(),
+                "query_string": query.encode(),
+                "root_path": "",
+                "headers": [(b"host", _host().encode())],
+                "client": ("127.0.0.1", 0),
+                "server": (_host(), 80),
+            }
+            received = asyncio.Event()
+            status = None
+
+            async def receive():
+                if received.is_set():
+                    # Nobody disconnects; wait to be cancelled
+                    await asyncio.Future()
+                received.set()
+                return {"type": "http.request", "body": b"", "more_body": False}
+
+            async def send(message):
+                nonlocal status
+                if message["type"] == "http.response.start":
+                    status = message["status"]
+
+            async with slots:
+                begin = time.perf_counter()
+                await application(scope, receive, send)
+                timings.append(time.perf_counter() - begin)
+            self.check_status(status, path)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(request() for _ in range(count)))
+        return time.perf_counter() - started, timings
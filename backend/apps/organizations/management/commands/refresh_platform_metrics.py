@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from apps.organizations.metrics import refresh
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the platform admin dashboard snapshot and record today's "
+        "counters for the trend charts; schedule it (e.g. hourly from cron)"
+    )
+
+    def handle(self, *args, **options):
+        snapshot = refresh()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Platform metrics refreshed for {snapshot['today']['date']}: "
+                f"{snapshot['users']['total']} users, "
+                f"{snapshot['organizations']['total']} organizations"
+            )
+        )
@@ -0,0 +1,204 @@
+"""
+Platform admin dashboard metrics
+
+The admin home page used to run a count() per figure, a members annotation
+over every organization and a profile lookup per recent user on every load.
+Now all user counters come from one conditional aggregate over users (joined
+to their profiles), all organization counters from one over organizations,
+and the page reads the assembled snapshot from the cache, so its cost does
+not depend on table sizes:
+
+- A snapshot older than FRESH_FOR is still served, while one background
+  thread (guarded by a cache lock) recomputes it; only a cold cache makes a
+  request wait for compute_snapshot().
+- Every refresh also records today's counters in PlatformDailyMetrics, the
+  history behind the trend charts. Schedule ``manage.py
+  refresh_platform_metrics`` (e.g. from cron) so a day gets its row even
+  when no admin opens the dashboard. Refreshes also roll the API usage
+  counters up into ApiUsageDaily (apps/core/metering.py).
+"""
+
+import logging
+import threading
+import time
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import close_old_connections
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from apps.core import metering
+from apps.core.models import Organization, PlatformDailyMetrics
+
+logger = logging.getLogger(__name__)
+
+# Bump when the snapshot changes shape so stale snapshots are never served
+SNAPSHOT_FORMAT = 1
+
+SNAPSHOT_KEY = f"platform_metrics:{SNAPSHOT_FORMAT}"
+REFRESH_LOCK_KEY = f"platform_metrics:{SNAPSHOT_FORMAT}:refreshing"
+
+# Seconds a snapshot is served without triggering a refresh
+FRESH_FOR = 60
+# Stale snapshots are served for at most this long
+SNAPSHOT_TIMEOUT = 60 * 60 * 24
+# Upper bound on one refresh, after which another may start
+REFRESH_LOCK_TIMEOUT = 5 * 60
+
+RECENT_DAYS = 7
+HISTORY_DAYS = 30
+
+
+def compute_snapshot(now=None):
+    """The dashboard figures, recomputed from the database"""
+    now = now or timezone.now()
+    recent = now - timedelta(days=RECENT_DAYS)
+    today = timezone.localtime(now).replace(hour=0, minute=0, second=0, microsecond=0)
+
+    users = User.objects.aggregate(
+        total=Count("id"),
+        active=Count("id", filter=Q(is_active=True)),
+        platform_admins=Count("id", filter=Q(userprofile__user_type="platform_admin")),
+        venue_owners=Count("id", filter=Q(userprofile__user_type="venue_owner")),
+        customers=Count("id", filter=Q(userprofile__user_type="customer")),
+        recent=Count("id", filter=Q(date_joined__gte=recent)),
+        today=Count("id", filter=Q(date_joined__gte=today)),
+    )
+    organizations = Organization.objects.aggregate(
+        total=Count("id"),
+        active=Count("id", filter=Q(status="active")),
+        pending=Count("id", filter=Q(status="pending")),
+        suspended=Count("id", filter=Q(status="suspended")),
+        today=Count("id", filter=Q(created_at__gte=today)),
+    )
+
+    top_organizations = (
+        Organization.objects.values("id", "name", "status", "subscription_plan")
+        .annotate(user_count=Count("members"))
+        .order_by("-user_count", "id")[:10]
+    )
+    recent_users = (
+        User.objects.filter(date_joined__gte=recent)
+        .order_by("-date_joined")
+        .values("id", "username", "email", "userprofile__user_type", "date_joined")[:5]
+    )
+    recent_organizations = (
+        Organization.objects.filter(created_at__gte=recent)
+        .order_by("-created_at")
+        .values("id", "name", "status", "created_at")[:5]
+    )
+
+    return {
+        "users": {
+            "total": users["total"],
+            "active": users["active"],
+            "platform_admins": users["platform_admins"],
+            "venue_owners": users["venue_owners"],
+            "customers": users["customers"],
+        },
+        "organizations": {
+            "total": organizations["total"],
+            "active": organizations["active"],
+            "pending": organizations["pending"],
+            "suspended": organizations["suspended"],
+        },
+        "system_health": {
+            "recent_registrations": users["recent"],
+            "api_calls_today": metering.calls_today(),
+        },
+        "top_organizations": list(top_organizations),
+        "recent_activities": {
+            "users": [
+                {
+                    "id": user["id"],
+                    "username": user["username"],
+                    "email": user["email"],
+                    "user_type": user["userprofile__user_type"] or "unknown",
+                    "created_at": user["date_joined"],
+                }
+                for user in recent_users
+            ],
+            "organizations": list(recent_organizations),
+        },
+        "today": {
+            "date": today.date(),
+            "new_users": users["today"],
+            "new_organizations": organizations["today"],
+        },
+        "generated_at": now,
+    }
+
+
+def record_day(snapshot):
+    """Store the snapshot's counters as its day's PlatformDailyMetrics row"""
+    PlatformDailyMetrics.objects.update_or_create(
+        date=snapshot["today"]["date"],
+        defaults={
+            "total_users": snapshot["users"]["total"],
+            "active_users": snapshot["users"]["active"],
+            "new_users": snapshot["today"]["new_users"],
+            "total_organizations": snapshot["organizations"]["total"],
+            "active_organizations": snapshot["organizations"]["active"],
+            "pending_organizations": snapshot["organizations"]["pending"],
+            "new_organizations": snapshot["today"]["new_organizations"],
+        },
+    )
+
+
+def history(days=HISTORY_DAYS):
+    """The last ``days`` daily rows, oldest first"""
+    rows = PlatformDailyMetrics.objects.order_by("-date").values(
+        "date",
+        "total_users",
+        "active_users",
+        "new_users",
+        "total_organizations",
+        "active_organizations",
+        "pending_organizations",
+        "new_organizations",
+    )[:days]
+    return list(reversed(rows))
+
+
+def refresh():
+    """
+    Roll up API usage, recompute the snapshot, record today's row and cache
+    both
+    """
+    metering.rollup()
+    snapshot = compute_snapshot()
+    record_day(snapshot)
+    snapshot["history"] = history()
+    cache.set(
+        SNAPSHOT_KEY,
+        {"computed_at": time.time(), "snapshot": snapshot},
+        SNAPSHOT_TIMEOUT,
+    )
+    return snapshot
+
+
+def _refresh_in_background():
+    try:
+        refresh()
+    except Exception:
+        logger.exception("Could not refresh platform metrics")
+    finally:
+        cache.delete(REFRESH_LOCK_KEY)
+        # This thread's connection is not closed at the end of any request
+        close_old_connections()
+
+
+def get_snapshot():
+    """The cached snapshot, refreshed in the background once stale"""
+    entry = cache.get(SNAPSHOT_KEY)
+    if entry is None:
+        return refresh()
+    if time.time() - entry["computed_at"] > FRESH_FOR and cache.add(
+        REFRESH_LOCK_KEY, True, REFRESH_LOCK_TIMEOUT
+    ):
+        threading.Thread(
+            target=_refresh_in_background, name="platform-metrics", daemon=True
+        ).start()
+    return entry["snapshot"]
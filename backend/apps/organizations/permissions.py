@@ -1,5 +1,6 @@
 from rest_framework.permissions import BasePermission
 from apps.core.models import Organization, OrganizationMember
+from .scope import get_scope
 
 
 class IsOrganizationOwner(BasePermission):
@@ -9,11 +10,11 @@ class IsOrganizationOwner(BasePermission):
 
     def has_object_permission(self, request, view, obj):
         if isinstance(obj, Organization):
-            return obj.owner == request.user
+            return obj.owner_id == request.user.id
 
         # If obj has organization attribute (like Hall, MenuItem, etc.)
         if hasattr(obj, "organization"):
-            return obj.organization.owner == request.user
+            return obj.organization.owner_id == request.user.id
 
         return False
 
@@ -28,13 +29,11 @@ class IsOrganizationMember(BasePermission):
             return False
 
         if isinstance(obj, Organization):
-            return obj.members.filter(user=request.user, is_active=True).exists()
+            return get_scope(request).member_role(obj.id) is not None
 
         # If obj has organization attribute
         if hasattr(obj, "organization"):
-            return obj.organization.members.filter(
-                user=request.user, is_active=True
-            ).exists()
+            return get_scope(request).member_role(obj.organization_id) is not None
 
         return False
 
@@ -57,15 +56,11 @@ class IsOrganizationAdminOrManager(BasePermission):
             return False
 
         # Check if user is owner
-        if organization.owner == request.user:
+        if organization.owner_id == request.user.id:
             return True
 
         # Check if user is admin or manager
-        member = organization.members.filter(user=request.user, is_active=True).first()
-        if member:
-            return member.role in ["admin", "manager"]
-
-        return False
+        return get_scope(request).member_role(organization.id) in ["admin", "manager"]
 
 
 class IsPlatformAdmin(BasePermission):
@@ -78,11 +73,7 @@ class IsPlatformAdmin(BasePermission):
             return False
 
         # Check if user has platform admin profile
-        try:
-            profile = request.user.userprofile
-            return profile.is_platform_admin
-        except:
-            return False
+        return get_scope(request).is_platform_admin
 
     def has_object_permission(self, request, view, obj):
         return self.has_permission(request, view)
@@ -97,11 +88,8 @@ class IsVenueOwner(BasePermission):
         if not request.user.is_authenticated:
             return False
 
-        try:
-            profile = request.user.userprofile
-            return profile.is_venue_owner and request.user.owned_organizations.exists()
-        except:
-            return False
+        scope = get_scope(request)
+        return scope.user_type == "venue_owner" and bool(scope.owned_ids)
 
 
 class CanManageOrganization(BasePermission):
@@ -115,11 +103,8 @@ class CanManageOrganization(BasePermission):
             return False
 
         # Platform admin can manage all organizations
-        try:
-            if request.user.userprofile.is_platform_admin:
-                return True
-        except:
-            pass
+        if get_scope(request).is_platform_admin:
+            return True
 
         organization = None
         if isinstance(obj, Organization):
@@ -130,12 +115,11 @@ class CanManageOrganization(BasePermission):
             return False
 
         # Organization owner can manage
-        if organization.owner == request.user:
+        if organization.owner_id == request.user.id:
             return True
 
         # Admin/Manager members can manage
-        member = organization.members.filter(user=request.user, is_active=True).first()
-        if member and member.role in ["admin", "manager"]:
+        if get_scope(request).member_role(organization.id) in ["admin", "manager"]:
             return True
 
         return False
@@ -156,11 +140,8 @@ class CanViewOrganization(BasePermission):
             return False
 
         # Platform admin can view all
-        try:
-            if request.user.userprofile.is_platform_admin:
-                return True
-        except:
-            pass
+        if get_scope(request).is_platform_admin:
+            return True
 
         organization = None
         if isinstance(obj, Organization):
@@ -172,8 +153,8 @@ class CanViewOrganization(BasePermission):
 
         # Organization members can view
         if (
-            organization.owner == request.user
-            or organization.members.filter(user=request.user, is_active=True).exists()
+            organization.owner_id == request.user.id
+            or get_scope(request).member_role(organization.id) is not None
         ):
             return True
 
@@ -206,11 +187,8 @@ class CanManageBookings(BasePermission):
             return False
 
         # Platform admin can manage all bookings
-        try:
-            if request.user.userprofile.is_platform_admin:
-                return True
-        except:
-            pass
+        if get_scope(request).is_platform_admin:
+            return True
 
         # Customers can manage their own bookings
         if hasattr(obj, "customer") and obj.customer == request.user:
@@ -221,14 +199,12 @@ class CanManageBookings(BasePermission):
             organization = obj.organization
 
             # Owner can manage
-            if organization.owner == request.user:
+            if organization.owner_id == request.user.id:
                 return True
 
             # Active members with appropriate roles can manage
-            member = organization.members.filter(
-                user=request.user, is_active=True
-            ).first()
-            if member and member.role in ["admin", "manager", "staff"]:
+            role = get_scope(request).member_role(organization.id)
+            if role in ["admin", "manager", "staff"]:
                 return True
 
         return False
@@ -257,11 +233,8 @@ class CanAccessAnalytics(BasePermission):
             return False
 
         # Platform admin can access all analytics
-        try:
-            if request.user.userprofile.is_platform_admin:
-                return True
-        except:
-            pass
+        if get_scope(request).is_platform_admin:
+            return True
 
         organization = None
         if isinstance(obj, Organization):
@@ -272,11 +245,10 @@ class CanAccessAnalytics(BasePermission):
             return False
 
         # Organization owner and admin/manager members can access analytics
-        if organization.owner == request.user:
+        if organization.owner_id == request.user.id:
             return True
 
-        member = organization.members.filter(user=request.user, is_active=True).first()
-        if member and member.role in ["admin", "manager"]:
+        if get_scope(request).member_role(organization.id) in ["admin", "manager"]:
             return True
 
         return False
@@ -319,11 +291,10 @@ class CanInviteMembers(BasePermission):
             return False
 
         # Only owner and admin can invite members
-        if organization.owner == request.user:
+        if organization.owner_id == request.user.id:
             return True
 
-        member = organization.members.filter(user=request.user, is_active=True).first()
-        if member and member.role == "admin":
+        if get_scope(request).member_role(organization.id) == "admin":
             return True
 
         return False
@@ -349,19 +320,15 @@ class CanManageMembers(BasePermission):
             return False
 
         # Platform admin can manage all members
-        try:
-            if request.user.userprofile.is_platform_admin:
-                return True
-        except:
-            pass
+        if get_scope(request).is_platform_admin:
+            return True
 
         # Owner can manage all members
-        if organization.owner == request.user:
+        if organization.owner_id == request.user.id:
             return True
 
         # Admin members can manage other members (except owner)
-        member = organization.members.filter(user=request.user, is_active=True).first()
-        if member and member.role == "admin":
+        if get_scope(request).member_role(organization.id) == "admin":
             # Cannot manage the owner
             if isinstance(obj, OrganizationMember) and obj.user == organization.owner:
                 return False
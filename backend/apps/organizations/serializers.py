@@ -1,6 +1,13 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User
+from django.db.models import Count, Prefetch, Q
+from apps.bookings.models import Booking
+from apps.core import ranking, venue_search
+from apps.core.media import variant_urls
+from apps.core.serializers import ImageVariantsField
+from apps.core.stats import with_stats
 from apps.core.models import (
+    Hall,
     Organization,
     OrganizationMember,
     UserProfile,
@@ -28,6 +35,13 @@ class OrganizationSerializer(serializers.ModelSerializer):
     avg_rating = serializers.DecimalField(
         max_digits=3, decimal_places=2, read_only=True
     )
+    review_count = serializers.IntegerField(read_only=True)
+    min_price = serializers.DecimalField(
+        max_digits=10, decimal_places=2, read_only=True
+    )
+    max_capacity = serializers.IntegerField(read_only=True)
+    logo_variants = ImageVariantsField(source="logo")
+    cover_image_variants = ImageVariantsField(source="cover_image")
 
     class Meta:
         model = Organization
@@ -44,12 +58,17 @@ class OrganizationSerializer(serializers.ModelSerializer):
             "website",
             "logo",
             "cover_image",
+            "logo_variants",
+            "cover_image_variants",
             "subscription_plan",
             "status",
             "owner",
             "total_halls",
             "total_bookings",
             "avg_rating",
+            "review_count",
+            "min_price",
+            "max_capacity",
             "created_at",
         ]
         read_only_fields = ["id", "slug", "owner", "status", "created_at"]
@@ -63,6 +82,8 @@ class OrganizationDetailSerializer(serializers.ModelSerializer):
     total_bookings = serializers.IntegerField(read_only=True)
     member_count = serializers.SerializerMethodField()
     recent_bookings = serializers.SerializerMethodField()
+    logo_variants = ImageVariantsField(source="logo")
+    cover_image_variants = ImageVariantsField(source="cover_image")
 
     class Meta:
         model = Organization
@@ -83,6 +104,8 @@ class OrganizationDetailSerializer(serializers.ModelSerializer):
             "website",
             "logo",
             "cover_image",
+            "logo_variants",
+            "cover_image_variants",
             "subscription_plan",
             "status",
             "commission_rate",
@@ -110,15 +133,44 @@ class OrganizationDetailSerializer(serializers.ModelSerializer):
             "approved_at",
         ]
 
+    RECENT_BOOKINGS = 5
+
+    @staticmethod
+    def setup_eager_loading(queryset):
+        """
+        Annotate member counts and prefetch the recent bookings (with their
+        customers) of every organization in ``queryset``, one query in all
+        """
+        return queryset.annotate(
+            member_count=Count("members", filter=Q(members__is_active=True))
+        ).prefetch_related(
+            Prefetch(
+                "bookings",
+                # Sliced prefetches are limited per organization (ROW_NUMBER)
+                queryset=Booking.objects.select_related("customer").order_by(
+                    "-created_at"
+                )[: OrganizationDetailSerializer.RECENT_BOOKINGS],
+                to_attr="recent_booking_list",
+            )
+        )
+
     def get_member_count(self, obj):
+        if hasattr(obj, "member_count"):
+            return obj.member_count
         return obj.members.filter(is_active=True).count()
 
     def get_recent_bookings(self, obj):
-        recent_bookings = obj.bookings.order_by("-created_at")[:5]
+        recent_bookings = getattr(obj, "recent_booking_list", None)
+        if recent_bookings is None:
+            recent_bookings = obj.bookings.select_related("customer").order_by(
+                "-created_at"
+            )[: self.RECENT_BOOKINGS]
         return [
             {
                 "booking_id": booking.booking_id,
-                "customer_name": booking.customer.get_full_name(),
+                "customer_name": booking.customer.get_full_name()
+                if booking.customer
+                else "",
                 "event_date": booking.event_date,
                 "status": booking.status,
                 "total_amount": booking.total_amount,
@@ -270,6 +322,8 @@ class MarketplaceOrganizationSerializer(serializers.ModelSerializer):
         max_digits=3, decimal_places=2, read_only=True
     )
     featured_halls = serializers.SerializerMethodField()
+    logo_variants = ImageVariantsField(source="logo")
+    cover_image_variants = ImageVariantsField(source="cover_image")
 
     class Meta:
         model = Organization
@@ -284,13 +338,38 @@ class MarketplaceOrganizationSerializer(serializers.ModelSerializer):
             "website",
             "logo",
             "cover_image",
+            "logo_variants",
+            "cover_image_variants",
             "total_halls",
             "avg_rating",
             "featured_halls",
         ]
 
+    FEATURED_HALLS = 3
+
+    @staticmethod
+    def setup_eager_loading(queryset):
+        """
+        Annotate the listing stats and prefetch the featured halls of every
+        organization in ``queryset``, one query in all
+        """
+        return with_stats(queryset).prefetch_related(
+            Prefetch(
+                "halls",
+                # Sliced prefetches are limited per organization (ROW_NUMBER)
+                queryset=Hall.objects.filter(is_active=True).order_by("-id")[
+                    : MarketplaceOrganizationSerializer.FEATURED_HALLS
+                ],
+                to_attr="featured_hall_list",
+            )
+        )
+
     def get_featured_halls(self, obj):
-        featured_halls = obj.halls.filter(is_active=True).order_by("-id")[:3]
+        featured_halls = getattr(obj, "featured_hall_list", None)
+        if featured_halls is None:
+            featured_halls = obj.halls.filter(is_active=True).order_by("-id")[
+                : self.FEATURED_HALLS
+            ]
         return [
             {
                 "id": hall.id,
@@ -300,6 +379,9 @@ class MarketplaceOrganizationSerializer(serializers.ModelSerializer):
                 "featured_image": hall.featured_image.url
                 if hall.featured_image
                 else None,
+                "featured_image_variants": variant_urls(hall.featured_image.name)
+                if hall.featured_image
+                else None,
             }
             for hall in featured_halls
         ]
@@ -346,6 +428,83 @@ class OrganizationSearchSerializer(serializers.Serializer):
     has_parking = serializers.BooleanField(required=False)
     has_ac = serializers.BooleanField(required=False)
     has_kitchen = serializers.BooleanField(required=False)
+    ordering = serializers.ChoiceField(
+        choices=list(venue_search.ORDERINGS), required=False, default="price"
+    )
+    page = serializers.IntegerField(required=False, min_value=1, default=1)
+    page_size = serializers.IntegerField(
+        required=False, min_value=1, max_value=venue_search.MAX_PAGE_SIZE, default=20
+    )
+
+    def to_internal_value(self, data):
+        # Accept ?amenities=parking,ac as well as repeated ?amenities= params
+        if hasattr(data, "getlist"):
+            amenities = [
+                name.strip()
+                for value in data.getlist("amenities")
+                for name in value.split(",")
+                if name.strip()
+            ]
+            data = data.dict()
+            data["amenities"] = amenities
+        return super().to_internal_value(data)
+
+    def validate(self, attrs):
+        for low, high in (("min_capacity", "max_capacity"), ("min_price", "max_price")):
+            if attrs.get(low) is not None and attrs.get(high) is not None:
+                if attrs[low] > attrs[high]:
+                    raise serializers.ValidationError(
+                        {low: f"Must not exceed {high}"}
+                    )
+        return attrs
+
+
+class VenueRecommendationSerializer(OrganizationSearchSerializer):
+    """Search filters plus an optional event date window for recommendations"""
+
+    ordering = None
+    page = None
+    page_size = None
+    date_from = serializers.DateField(required=False)
+    date_to = serializers.DateField(required=False)
+    limit = serializers.IntegerField(
+        required=False, min_value=1, max_value=ranking.MAX_RECOMMENDATIONS, default=10
+    )
+
+    def validate(self, attrs):
+        attrs = super().validate(attrs)
+        if attrs.get("date_to") and not attrs.get("date_from"):
+            raise serializers.ValidationError({"date_from": "Required with date_to"})
+        if attrs.get("date_from"):
+            attrs.setdefault("date_to", attrs["date_from"])
+            days = (attrs["date_to"] - attrs["date_from"]).days + 1
+            if not 1 <= days <= ranking.MAX_WINDOW_DAYS:
+                raise serializers.ValidationError(
+                    {
+                        "date_to": "Must be on or after date_from and within "
+                        f"{ranking.MAX_WINDOW_DAYS} days of it"
+                    }
+                )
+        return attrs
+
+
+class AvailabilityQuerySerializer(serializers.Serializer):
+    """The date window of a marketplace availability request"""
+
+    date_from = serializers.DateField()
+    date_to = serializers.DateField(required=False)
+
+    def validate(self, attrs):
+        attrs.setdefault("date_to", attrs["date_from"])
+        days = (attrs["date_to"] - attrs["date_from"]).days + 1
+        if not 1 <= days <= ranking.MAX_WINDOW_DAYS:
+            raise serializers.ValidationError(
+                {
+                    "date_to": "Must be on or after date_from and within "
+                    f"{ranking.MAX_WINDOW_DAYS} days of it"
+                }
+            )
+        return attrs
 
 
 class OrganizationContactSerializer(serializers.Serializer):
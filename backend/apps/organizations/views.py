@@ -3,13 +3,17 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.views import APIView
-from django.db.models import Q, Count, Sum, Avg
+from django.db.models import Q, Count, Sum, Avg, Max
 from django.utils import timezone
+from django.http import Http404, HttpResponse, HttpResponseNotModified
+from django.utils.http import parse_etags
 from datetime import datetime, timedelta
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import filters
 
-from apps.core.models import Organization, OrganizationMember, PlatformSettings
+from apps.core.conditional import ConditionalGetMixin, latest, patch_public_cache
+from apps.core.models import Hall, Organization, OrganizationMember, PlatformSettings
+from apps.core.stats import with_stats
 from apps.bookings.models import Booking
 from .serializers import (
     OrganizationSerializer,
@@ -20,6 +24,7 @@ from .serializers import (
     PlatformSettingsSerializer,
 )
 from .permissions import IsOrganizationOwner, IsPlatformAdmin, IsOrganizationMember
+from .scope import get_scope
 
 
 class OrganizationViewSet(viewsets.ModelViewSet):
@@ -46,37 +51,15 @@ class OrganizationViewSet(viewsets.ModelViewSet):
         """
         Return different querysets based on user permissions
         """
-        user = self.request.user
-
-        if not user.is_authenticated:
-            # Anonymous users see only active organizations
-            return Organization.objects.filter(status="active").annotate(
-                total_bookings=Count("bookings"),
-                total_halls=Count("halls", filter=Q(halls__is_active=True)),
-            )
-
-        if hasattr(user, "userprofile") and user.userprofile.is_platform_admin:
-            # Platform admins see all organizations
-            return Organization.objects.all().annotate(
-                total_bookings=Count("bookings"),
-                total_halls=Count("halls", filter=Q(halls__is_active=True)),
-            )
-
-        # Regular users see active organizations + their own organizations
-        owned_orgs = user.owned_organizations.all()
-        member_orgs = Organization.objects.filter(
-            members__user=user, members__is_active=True
-        )
-        active_orgs = Organization.objects.filter(status="active")
-
-        return (
-            (owned_orgs.union(member_orgs).union(active_orgs))
-            .annotate(
-                total_bookings=Count("bookings"),
-                total_halls=Count("halls", filter=Q(halls__is_active=True)),
-            )
-            .distinct()
+        # Active organizations, plus the user's own (all for platform admins)
+        queryset = with_stats(
+            Organization.objects.filter(
+                get_scope(self.request).visible_organizations()
+            ).select_related("owner")
         )
+        if self.get_serializer_class() is OrganizationDetailSerializer:
+            queryset = OrganizationDetailSerializer.setup_eager_loading(queryset)
+        return queryset
 
     def get_serializer_class(self):
         """Return appropriate serializer based on action"""
@@ -130,10 +113,11 @@ class OrganizationViewSet(viewsets.ModelViewSet):
         organization = self.get_object()
 
         # Check permissions
+        scope = get_scope(request)
         if not (
-            request.user == organization.owner
-            or request.user.userprofile.is_platform_admin
-            or organization.members.filter(user=request.user, is_active=True).exists()
+            scope.is_platform_admin
+            or scope.owns(organization.id)
+            or scope.member_role(organization.id)
         ):
             return Response(
                 {"error": "You do not have permission to view these statistics"},
@@ -385,105 +369,10 @@ class PlatformAdminViewSet(APIView):
 
     def get(self, request):
         """Get platform-wide statistics for software developer platform"""
+        from .metrics import get_snapshot
 
-        from django.contrib.auth import get_user_model
-        User = get_user_model()
-
-        # User/Developer statistics
-        total_users = User.objects.count()
-        active_users = User.objects.filter(is_active=True).count()
-        platform_admins = User.objects.filter(
-            userprofile__user_type="platform_admin"
-        ).count()
-        venue_owners = User.objects.filter(
-            userprofile__user_type="venue_owner"
-        ).count()
-        customers = User.objects.filter(
-            userprofile__user_type="customer"
-        ).count()
-
-        # Organization statistics (now represents developer projects/companies)
-        total_organizations = Organization.objects.count()
-        active_organizations = Organization.objects.filter(status="active").count()
-        pending_organizations = Organization.objects.filter(status="pending").count()
-        suspended_organizations = Organization.objects.filter(
-            status="suspended"
-        ).count()
+        return Response(get_snapshot())
 
-        # System health metrics
-        recent_registrations = User.objects.filter(
-            date_joined__gte=timezone.now() - timedelta(days=7)
-        ).count()
-
-        # API usage (simplified - would need actual API logging)
-        api_calls_today = 0  # Placeholder - would need API logging system
-
-        # Top organizations by user count (representing most active projects)
-        top_organizations = Organization.objects.annotate(
-            user_count=Count("members")
-        ).order_by("-user_count")[:10]
-
-        # Recent activities
-        recent_users = User.objects.filter(
-            date_joined__gte=timezone.now() - timedelta(days=7)
-        ).order_by("-date_joined")[:5]
-
-        recent_organizations = Organization.objects.filter(
-            created_at__gte=timezone.now() - timedelta(days=7)
-        ).order_by("-created_at")[:5]
-
-        stats = {
-            "users": {
-                "total": total_users,
-                "active": active_users,
-                "platform_admins": platform_admins,
-                "venue_owners": venue_owners,
-                "customers": customers,
-            },
-            "organizations": {
-                "total": total_organizations,
-                "active": active_organizations,
-                "pending": pending_organizations,
-                "suspended": suspended_organizations,
-            },
-            "system_health": {
-                "recent_registrations": recent_registrations,
-                "api_calls_today": api_calls_today,
-            },
-            "top_organizations": [
-                {
-                    "id": org.id,
-                    "name": org.name,
-                    "user_count": org.user_count,
-                    "status": org.status,
-                    "subscription_plan": org.subscription_plan,
-                }
-                for org in top_organizations
-            ],
-            "recent_activities": {
-                "users": [
-                    {
-                        "id": user.id,
-                        "username": user.username,
-                        "email": user.email,
-                        "user_type": getattr(user.userprofile, 'user_type', 'unknown'),
-                        "created_at": user.date_joined,
-                    }
-                    for user in recent_users
-                ],
-                "organizations": [
-                    {
-                        "id": org.id,
-                        "name": org.name,
-                        "status": org.status,
-                        "created_at": org.created_at,
-                    }
-                    for org in recent_organizations
-                ],
-            },
-        }
-
-        return Response(stats)
 
 class PlatformSettingsView(APIView):
     """
@@ -514,9 +403,9 @@ class PlatformSettingsView(APIView):
     def pending_approvals(self, request):
         """Get organizations pending approval"""
 
-        pending_orgs = Organization.objects.filter(status="pending").order_by(
-            "created_at"
-        )
+        pending_orgs = with_stats(
+            Organization.objects.filter(status="pending").select_related("owner")
+        ).order_by("created_at")
         serializer = OrganizationSerializer(pending_orgs, many=True)
         return Response(serializer.data)
 
@@ -574,9 +463,12 @@ class PlatformSettingsView(APIView):
 
 
 # Marketplace public endpoints
-class MarketplaceViewSet(viewsets.ReadOnlyModelViewSet):
+class MarketplaceViewSet(ConditionalGetMixin, viewsets.ReadOnlyModelViewSet):
     """
     Public marketplace endpoints for customers to browse organizations and venues
+
+    List, detail and halls responses carry validators (apps/core/conditional.py)
+    so repeat requests are answered with 304 before any serialization.
     """
 
     serializer_class = OrganizationSerializer
@@ -588,60 +480,220 @@ class MarketplaceViewSet(viewsets.ReadOnlyModelViewSet):
     ]
     filterset_fields = ["city", "subscription_plan"]
     search_fields = ["name", "description", "city"]
-    ordering_fields = ["name", "total_bookings", "created_at"]
+    ordering_fields = [
+        "name",
+        "total_bookings",
+        "avg_rating",
+        "min_price",
+        "max_capacity",
+        "ranking_score",
+        "created_at",
+    ]
     ordering = ["name"]
 
     def get_queryset(self):
-        """Return only active organizations with their halls and stats"""
+        """Return only active organizations with their precomputed stats"""
+        return with_stats(
+            Organization.objects.filter(status="active").select_related("owner")
+        )
+
+    # Version stamps: (last modified, token) of what each response shows
+
+    def list_version(self):
+        stamp = Organization.objects.filter(status="active").aggregate(
+            count=Count("id"),
+            organizations=Max("updated_at"),
+            stats=Max("stats__updated_at"),
+        )
+        return latest(stamp["organizations"], stamp["stats"]), stamp["count"]
+
+    def retrieve_version(self):
+        row = (
+            Organization.objects.filter(pk=self.kwargs["pk"], status="active")
+            .values_list("updated_at", "stats__updated_at")
+            .first()
+        )
+        return None if row is None else (latest(*row), "")
+
+    def halls_version(self):
+        stamp = Hall.objects.filter(
+            organization_id=self.kwargs["pk"], organization__status="active"
+        ).aggregate(
+            count=Count("id"),
+            halls=Max("updated_at"),
+            ratings=Max("rating_summary__updated_at"),
+            organization=Max("organization__updated_at"),
+        )
+        if not stamp["count"]:
+            return None
         return (
-            Organization.objects.filter(status="active")
-            .annotate(
-                total_bookings=Count("bookings"),
-                total_halls=Count("halls", filter=Q(halls__is_active=True)),
-                avg_rating=Avg(
-                    "halls__reviews__rating", filter=Q(halls__reviews__is_approved=True)
-                ),
-            )
-            .prefetch_related("halls")
+            latest(stamp["halls"], stamp["ratings"], stamp["organization"]),
+            stamp["count"],
         )
 
     @action(detail=True, methods=["get"])
     def halls(self, request, pk=None):
         """Get active halls for an organization"""
         organization = self.get_object()
-        halls = organization.halls.filter(is_active=True).annotate(
-            rating=Avg("reviews__rating", filter=Q(reviews__is_approved=True)),
-            review_count=Count("reviews", filter=Q(reviews__is_approved=True)),
+        halls = organization.halls.filter(is_active=True).select_related(
+            "rating_summary"
         )
 
-        from apps.core.serializers import HallSerializer
+        from apps.core.serializers import MarketplaceHallSerializer
 
-        serializer = HallSerializer(halls, many=True)
+        serializer = MarketplaceHallSerializer(halls, many=True)
         return Response(serializer.data)
 
     @action(detail=True, methods=["get"])
-    def menu(self, request, pk=None):
-        """Get menu categories and items for an organization"""
-        organization = self.get_object()
-        categories = organization.menu_categories.filter(
-            is_active=True
-        ).prefetch_related("items__variants")
+    def reviews(self, request, pk=None):
+        """Approved reviews, newest first, with the rating summary (?hall= narrows)"""
+        from apps.core import reviews
+
+        try:
+            hall_id = request.query_params.get("hall")
+            hall_id = int(hall_id) if hall_id else None
+            page_size = min(
+                int(request.query_params.get("page_size", 20)), reviews.MAX_PAGE_SIZE
+            )
+            if page_size < 1:
+                raise ValueError
+        except ValueError:
+            return Response(
+                {"error": "hall and page_size must be positive integers"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
 
-        from apps.menu.serializers import MenuCategorySerializer
+        if hall_id is None:
+            subject = (
+                Organization.objects.filter(pk=pk, status="active")
+                .select_related("stats")
+                .first()
+            )
+            related = "stats"
+        else:
+            subject = (
+                Hall.objects.filter(
+                    pk=hall_id,
+                    organization_id=pk,
+                    organization__status="active",
+                    is_active=True,
+                )
+                .select_related("rating_summary")
+                .first()
+            )
+            related = "rating_summary"
+        if subject is None:
+            raise Http404
 
-        serializer = MenuCategorySerializer(categories, many=True)
-        return Response(serializer.data)
+        try:
+            results, next_cursor = reviews.review_page(
+                int(pk), hall_id, request.query_params.get("cursor"), page_size
+            )
+        except ValueError as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(
+            {
+                "rating": reviews.rating_summary(getattr(subject, related, None)),
+                "results": results,
+                "next": next_cursor,
+            }
+        )
+
+    @action(detail=False, methods=["get"])
+    def search(self, request):
+        """Faceted venue search: a page of matching halls plus facet counts"""
+        from apps.core import venue_search
+        from .serializers import OrganizationSearchSerializer
+
+        serializer = OrganizationSearchSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        params = dict(serializer.validated_data)
+        page, page_size = params.pop("page"), params.pop("page_size")
+        try:
+            result = venue_search.search(
+                params, params.pop("ordering"), page, page_size
+            )
+        except ValueError as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({"page": page, "page_size": page_size, **result})
+
+    @action(detail=False, methods=["get"])
+    def recommended(self, request):
+        """
+        Recommended venues for the search filters, ranked by precomputed
+        scores and the user's profile preferences
+        """
+        from apps.core import ranking
+        from .serializers import VenueRecommendationSerializer
+
+        serializer = VenueRecommendationSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        params = dict(serializer.validated_data)
+        limit = params.pop("limit")
+        date_from, date_to = params.pop("date_from", None), params.pop("date_to", None)
+        try:
+            results = ranking.recommend(
+                params, request.user, date_from, date_to, limit
+            )
+        except ValueError as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({"results": results})
 
     @action(detail=True, methods=["get"])
-    def packages(self, request, pk=None):
-        """Get menu packages for an organization"""
+    def availability(self, request, pk=None):
+        """Booked and free days of the organization's halls in a date window"""
+        from . import availability
+        from .serializers import AvailabilityQuerySerializer
+
         organization = self.get_object()
-        packages = organization.menu_packages.filter(is_active=True)
+        serializer = AvailabilityQuerySerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        date_from = serializer.validated_data["date_from"]
+        date_to = serializer.validated_data["date_to"]
+        return Response(
+            availability.payload(
+                availability.halls(organization.pk),
+                availability.booked_days(organization.pk, date_from, date_to),
+                date_from,
+                date_to,
+            )
+        )
 
-        from apps.menu.serializers import MenuPackageSerializer
+    def menu_snapshot_response(self, request, kind):
+        """Serve a pre-rendered menu snapshot, or 304 if the client has it"""
+        version = (
+            Organization.objects.filter(pk=self.kwargs["pk"], status="active")
+            .values_list("menu_version", flat=True)
+            .first()
+        )
+        if version is None:
+            raise Http404
 
-        serializer = MenuPackageSerializer(packages, many=True)
-        return Response(serializer.data)
+        from apps.menu.snapshots import etag, get_snapshot
+
+        organization_id = int(self.kwargs["pk"])
+        tag = etag(organization_id, version, kind)
+        client_tags = parse_etags(request.headers.get("If-None-Match", ""))
+        if tag in client_tags or "*" in client_tags:
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(
+                get_snapshot(organization_id, version, kind),
+                content_type="application/json",
+            )
+        response["ETag"] = tag
+        patch_public_cache(response)
+        return response
+
+    @action(detail=True, methods=["get"])
+    def menu(self, request, pk=None):
+        """Get menu categories and items for an organization"""
+        return self.menu_snapshot_response(request, "menu")
+
+    @action(detail=True, methods=["get"])
+    def packages(self, request, pk=None):
+        """Get menu packages for an organization"""
+        return self.menu_snapshot_response(request, "packages")
 
     @action(detail=True, methods=["get"])
     def bookings(self, request, pk=None):
@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class PricingConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.pricing'
+
+    def ready(self):
+        # Register the PricingHistory change-capture and PriceCalculation
+        # maintenance signals
+        import apps.pricing.history  # noqa: F401
+        import apps.pricing.maintenance  # noqa: F401
@@ -0,0 +1,94 @@
+"""
+Pricing engine
+
+Pure calculation helpers that fill in PriceCalculation rows from a booking's
+pricing inputs. Nothing in here touches the database, so the same code serves
+single recalculations and the batched maintenance worker.
+
+Sums of two-place DecimalField values are exact, so components are added as
+Decimals; the one step that has to round (the per-person split) goes through
+integer minor units with an explicit rounding mode (see money.py).
+"""
+
+from .money import Money, divide, from_minor, to_minor
+
+# Booking fields that feed the price calculation; changes to anything else
+# (status, notes, contact details, ...) never trigger a recalculation.
+BOOKING_PRICING_INPUTS = (
+    "hall_id",
+    "guest_count",
+    "event_date",
+    "event_type",
+    "selected_package_id",
+    "menu_subtotal",
+    "package_price",
+)
+
+
+def apply_booking_inputs(calculation, booking, hall_base_price):
+    """Copy the booking's pricing inputs onto ``calculation``"""
+    calculation.booking = booking
+    calculation.hall_base_price = hall_base_price
+    calculation.menu_subtotal = booking.menu_subtotal
+    calculation.package_subtotal = booking.package_price
+    calculation.subtotal_before_discount = (
+        hall_base_price + booking.menu_subtotal + booking.package_price
+    )
+
+
+def apply_guest_discount(calculation, tier):
+    """Apply the organization's guest-count discount tier (or none)"""
+    calculation.guest_discount_tier = tier
+    if tier is None:
+        calculation.guest_discount_amount = from_minor(0)
+    else:
+        calculation.guest_discount_amount = (
+            Money.from_decimal(calculation.subtotal_before_discount)
+            .percent(tier.discount_percentage)
+            .to_decimal()
+        )
+
+
+def apply_totals(calculation):
+    """Derive discount, subtotal and grand total fields from the components"""
+    calculation.total_discounts = (
+        calculation.guest_discount_amount
+        + calculation.early_booking_discount
+        + calculation.lastminute_discount
+        + calculation.promotional_discount
+    )
+
+    calculation.subtotal_after_discount = (
+        calculation.subtotal_before_discount - calculation.total_discounts
+    )
+
+    calculation.total_before_tax = (
+        calculation.subtotal_after_discount
+        + calculation.seasonal_surcharge
+        + calculation.demand_surcharge
+        + calculation.weekend_surcharge
+        + calculation.service_charge_amount
+    )
+
+    calculation.grand_total = calculation.total_before_tax + calculation.tax_amount
+
+    guest_count = calculation.booking.guest_count
+    if guest_count > 0:
+        calculation.price_per_person = from_minor(
+            divide(to_minor(calculation.grand_total), guest_count)
+        )
+    else:
+        calculation.price_per_person = from_minor(0)
+
+
+def calculate(calculation, booking, hall_base_price, discount_tier=None):
+    """
+    Refresh ``calculation`` in memory for ``booking``; the caller saves it.
+
+    ``discount_tier`` is the booking's guest-count tier, as resolved by
+    apps.core.tiers.
+    """
+    apply_booking_inputs(calculation, booking, hall_base_price)
+    apply_guest_discount(calculation, discount_tier)
+    apply_totals(calculation)
+    return calculation
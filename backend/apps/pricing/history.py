@@ -0,0 +1,164 @@
+"""
+Field-level change capture for PricingHistory
+
+Tracked fields are snapshotted from the instance's loaded values when it is
+initialised (no extra query), diffed on save, and the resulting PricingHistory
+rows are buffered per transaction and written with a single bulk_create once
+the transaction commits. A bulk edit in the admin therefore produces one
+INSERT for the whole batch, and rolled-back changes are never recorded.
+
+Bulk writes (queryset.update(), bulk_create()) send no signals; code that
+changes tracked fields that way reports the changes with record_changes(),
+as the menu import does.
+"""
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db.models.signals import post_init, post_save
+
+from apps.core.models import DiscountTier, Hall
+from apps.core.transactions import defer_until_commit
+from apps.menu.models import MenuItem, MenuPackage
+from .models import PricingHistory, PricingRule
+
+# model -> (PricingHistory.entity_type, tracked field names)
+TRACKED_MODELS = {
+    Hall: ("hall", ("base_price",)),
+    MenuItem: ("menu_item", ("base_price",)),
+    MenuPackage: ("package", ("base_price_per_person",)),
+    DiscountTier: (
+        "discount_tier",
+        ("min_guests", "max_guests", "discount_percentage", "is_active"),
+    ),
+    PricingRule: (
+        "pricing_rule",
+        (
+            "rule_type",
+            "applies_to",
+            "percentage",
+            "fixed_amount",
+            "min_guests",
+            "max_guests",
+            "min_amount",
+            "max_amount",
+            "applicable_days",
+            "valid_from",
+            "valid_until",
+            "priority",
+            "is_active",
+            "is_cumulative",
+        ),
+    ),
+}
+
+SNAPSHOT_ATTR = "_pricing_snapshot"
+
+# Set by PricingHistoryMiddleware for the duration of a request
+current_request = ContextVar("pricing_history_request", default=None)
+# Explicit attribution for changes made outside a request (scripts, commands)
+current_context = ContextVar("pricing_history_context", default=None)
+
+
+@contextmanager
+def change_context(user=None, reason=""):
+    """Attribute pricing changes made inside the block to ``user``/``reason``"""
+    token = current_context.set((user, reason))
+    try:
+        yield
+    finally:
+        current_context.reset(token)
+
+
+def _acting_user_and_reason():
+    context = current_context.get()
+    if context is not None:
+        return context
+
+    request = current_request.get()
+    user = getattr(request, "user", None)
+    if user is not None and user.is_authenticated and user.pk:
+        return user, ""
+    return None, ""
+
+
+def take_snapshot(instance, fields):
+    # Deferred fields are absent from __dict__ and are simply not tracked
+    # for this instance, so snapshotting never triggers a query.
+    values = instance.__dict__
+    setattr(
+        instance,
+        SNAPSHOT_ATTR,
+        {name: values[name] for name in fields if name in values},
+    )
+
+
+def _format(value):
+    return "" if value is None else str(value)
+
+
+def _write_entries(entries):
+    PricingHistory.objects.bulk_create(entries)
+
+
+def enqueue(entries):
+    """Buffer PricingHistory rows until the surrounding transaction commits"""
+    defer_until_commit(
+        "pricing_history", entries, _write_entries, using=PricingHistory.objects.db
+    )
+
+
+def record_changes(model, organization_id, changes):
+    """
+    History for tracked fields of ``model`` written without save(), from
+    (entity id, field name, old value, new value) tuples
+    """
+    entity_type = TRACKED_MODELS[model][0]
+    user, reason = _acting_user_and_reason()
+    entries = [
+        PricingHistory(
+            organization_id=organization_id,
+            entity_type=entity_type,
+            entity_id=entity_id,
+            field_name=name,
+            old_value=_format(old_value),
+            new_value=_format(new_value),
+            change_reason=reason,
+            changed_by=user,
+        )
+        for entity_id, name, old_value, new_value in changes
+        if new_value != old_value
+    ]
+    if entries:
+        enqueue(entries)
+
+
+def capture_snapshot(sender, instance, **kwargs):
+    take_snapshot(instance, TRACKED_MODELS[sender][1])
+
+
+def capture_changes(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    fields = TRACKED_MODELS[sender][1]
+    snapshot = getattr(instance, SNAPSHOT_ATTR, {})
+
+    if not created and not raw:
+        record_changes(
+            sender,
+            instance.organization_id,
+            [
+                (instance.pk, name, old_value, getattr(instance, name))
+                for name, old_value in snapshot.items()
+                if update_fields is None or name in update_fields
+            ],
+        )
+
+    take_snapshot(instance, fields)
+
+
+for model in TRACKED_MODELS:
+    post_init.connect(
+        capture_snapshot, sender=model, dispatch_uid=f"pricing_history_init_{model.__name__}"
+    )
+    post_save.connect(
+        capture_changes, sender=model, dispatch_uid=f"pricing_history_save_{model.__name__}"
+    )
@@ -0,0 +1,161 @@
+"""
+Deferred, batched PriceCalculation maintenance
+
+Booking saves only enqueue work when a pricing input actually changed (see
+engine.BOOKING_PRICING_INPUTS). Bookings touched inside one transaction are
+coalesced and written to the PendingPriceCalculation queue once, after commit.
+The queue is drained in batches by ``manage.py recalculate_prices``, which
+loads each batch with its halls in one query, resolves guest discount tiers
+from the in-memory tier indexes and writes the calculations with
+bulk_create/bulk_update. A booking whose hall was removed has nothing to
+price, so its calculation is deleted instead.
+"""
+
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.signals import post_init, post_save
+from django.utils import timezone
+
+from apps.bookings.models import Booking
+from apps.core.tiers import get_indexes
+from apps.core.transactions import defer_until_commit
+from .engine import BOOKING_PRICING_INPUTS, calculate
+from .models import PendingPriceCalculation, PriceCalculation
+
+DEFAULT_BATCH_SIZE = 500
+
+SNAPSHOT_ATTR = "_pricing_inputs"
+
+# Fields written when an existing PriceCalculation is refreshed
+CALCULATED_FIELDS = [
+    "hall_base_price",
+    "menu_subtotal",
+    "package_subtotal",
+    "subtotal_before_discount",
+    "guest_discount_tier",
+    "guest_discount_amount",
+    "total_discounts",
+    "subtotal_after_discount",
+    "total_before_tax",
+    "grand_total",
+    "price_per_person",
+]
+
+
+def _pricing_inputs(instance):
+    values = instance.__dict__
+    return {name: values[name] for name in BOOKING_PRICING_INPUTS if name in values}
+
+
+def enqueue(booking_ids):
+    """Queue bookings for recalculation (re-queueing refreshes ``queued_at``)"""
+    now = timezone.now()
+    PendingPriceCalculation.objects.bulk_create(
+        [
+            PendingPriceCalculation(booking_id=booking_id, queued_at=now)
+            for booking_id in booking_ids
+        ],
+        update_conflicts=True,
+        unique_fields=["booking"],
+        update_fields=["queued_at"],
+    )
+
+
+def snapshot_booking_inputs(sender, instance, **kwargs):
+    setattr(instance, SNAPSHOT_ATTR, _pricing_inputs(instance))
+
+
+def queue_price_calculation(sender, instance, created, raw=False, **kwargs):
+    previous = getattr(instance, SNAPSHOT_ATTR, {})
+    current = _pricing_inputs(instance)
+    setattr(instance, SNAPSHOT_ATTR, current)
+
+    if raw or (created and instance.hall_id is None):
+        return
+    if created or any(
+        previous.get(name) != value for name, value in current.items()
+    ):
+        defer_until_commit(
+            "price_calculation_queue", [instance.pk], enqueue, unique=True
+        )
+
+
+post_init.connect(
+    snapshot_booking_inputs, sender=Booking, dispatch_uid="pricing_booking_inputs"
+)
+post_save.connect(
+    queue_price_calculation, sender=Booking, dispatch_uid="pricing_queue_calculation"
+)
+
+
+def recalculate_bookings(booking_ids):
+    """
+    Build or refresh PriceCalculation rows for the given bookings, and delete
+    those of bookings without a hall
+    """
+    bookings = list(
+        Booking.objects.filter(id__in=booking_ids, hall__isnull=False)
+        .select_related("hall")
+        .only(
+            "id",
+            "organization_id",
+            "guest_count",
+            "menu_subtotal",
+            "package_price",
+            "hall__id",
+            "hall__base_price",
+        )
+    )
+    existing = {
+        calculation.booking_id: calculation
+        for calculation in PriceCalculation.objects.filter(
+            booking_id__in=[booking.id for booking in bookings]
+        )
+    }
+
+    tier_indexes = get_indexes({booking.organization_id for booking in bookings})
+
+    created, updated = [], []
+    for booking in bookings:
+        calculation = existing.get(booking.id)
+        if calculation is None:
+            calculation = PriceCalculation()
+            created.append(calculation)
+        else:
+            updated.append(calculation)
+        tier = tier_indexes[booking.organization_id].lookup(booking.guest_count)
+        calculate(calculation, booking, booking.hall.base_price, tier)
+
+    with transaction.atomic():
+        unpriced = set(booking_ids) - {booking.id for booking in bookings}
+        if unpriced:
+            PriceCalculation.objects.filter(booking_id__in=unpriced).delete()
+        PriceCalculation.objects.bulk_create(created)
+        PriceCalculation.objects.bulk_update(updated, CALCULATED_FIELDS)
+    return len(bookings)
+
+
+def process_pending(batch_size=DEFAULT_BATCH_SIZE):
+    """Drain one batch from the queue; returns the number of queue entries handled"""
+    batch = list(
+        PendingPriceCalculation.objects.order_by("queued_at").values_list(
+            "booking_id", "queued_at"
+        )[:batch_size]
+    )
+    if not batch:
+        return 0
+
+    recalculate_bookings([booking_id for booking_id, _queued_at in batch])
+
+    # Only drop entries that were not re-queued while the batch was processed.
+    # Entries queued together share a timestamp, so this stays a short OR.
+    by_timestamp = defaultdict(list)
+    for booking_id, queued_at in batch:
+        by_timestamp[queued_at].append(booking_id)
+    processed = Q()
+    for queued_at, booking_ids in by_timestamp.items():
+        processed |= Q(queued_at=queued_at, booking_id__in=booking_ids)
+    PendingPriceCalculation.objects.filter(processed).delete()
+    return len(batch)
@@ -0,0 +1,94 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from apps.bookings.models import Booking
+from apps.pricing.maintenance import (
+    DEFAULT_BATCH_SIZE,
+    process_pending,
+    recalculate_bookings,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Maintain PriceCalculation rows: drain the pending recalculation queue "
+        "or bulk-recalculate bookings after pricing rule changes"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--pending",
+            action="store_true",
+            help="Process bookings queued by booking saves",
+        )
+        parser.add_argument(
+            "--watch",
+            action="store_true",
+            help="With --pending, keep running and poll the queue",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=5.0,
+            help="Seconds to sleep between polls when the queue is empty",
+        )
+        parser.add_argument(
+            "--organization",
+            dest="organization_ids",
+            type=int,
+            action="append",
+            help="Recalculate every booking of this organization (repeatable)",
+        )
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Recalculate every booking with a hall assigned",
+        )
+        parser.add_argument(
+            "--upcoming",
+            action="store_true",
+            help="With --organization/--all, limit to events from today onwards",
+        )
+        parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        if options["pending"]:
+            self.drain_queue(options)
+        elif options["organization_ids"] or options["all"]:
+            self.recalculate(options)
+        else:
+            raise CommandError("Specify --pending, --organization or --all")
+
+    def drain_queue(self, options):
+        total = 0
+        while True:
+            processed = process_pending(options["batch_size"])
+            total += processed
+            if processed:
+                continue
+            if not options["watch"]:
+                break
+            time.sleep(options["interval"])
+        self.stdout.write(self.style.SUCCESS(f"Processed {total} queued bookings"))
+
+    def recalculate(self, options):
+        bookings = Booking.objects.filter(hall__isnull=False)
+        if options["organization_ids"]:
+            bookings = bookings.filter(organization_id__in=options["organization_ids"])
+        if options["upcoming"]:
+            bookings = bookings.filter(event_date__gte=timezone.now().date())
+
+        total = 0
+        batch = []
+        for booking_id in bookings.order_by("id").values_list("id", flat=True).iterator(
+            chunk_size=options["batch_size"]
+        ):
+            batch.append(booking_id)
+            if len(batch) >= options["batch_size"]:
+                total += recalculate_bookings(batch)
+                batch = []
+        if batch:
+            total += recalculate_bookings(batch)
+        self.stdout.write(self.style.SUCCESS(f"Recalculated {total} bookings"))
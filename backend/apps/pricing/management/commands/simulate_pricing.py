@@ -0,0 +1,118 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.core.models import Organization
+from apps.pricing.models import PricingHistory, PricingRule
+from apps.pricing.simulation import (
+    DEFAULT_CHUNK_SIZE,
+    SimulationRule,
+    simulate,
+    summarize,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Replay candidate pricing rules against historical bookings and report "
+        "revenue deltas and affected-booking counts"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--rule",
+            dest="rule_ids",
+            type=int,
+            action="append",
+            required=True,
+            help="PricingRule id to simulate (repeatable). Inactive rules are allowed.",
+        )
+        parser.add_argument(
+            "--organization",
+            dest="organization_ids",
+            type=int,
+            action="append",
+            help="Organization id to simulate (repeatable). Defaults to the rules' organizations.",
+        )
+        parser.add_argument("--start", type=date.fromisoformat, help="YYYY-MM-DD")
+        parser.add_argument("--end", type=date.fromisoformat, help="YYYY-MM-DD")
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=1,
+            help="Number of worker processes to spread organizations across",
+        )
+        parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+        parser.add_argument(
+            "--record-impact",
+            action="store_true",
+            help="Store each rule's affected-booking count on its latest PricingHistory entry",
+        )
+
+    def handle(self, *args, **options):
+        rules = list(PricingRule.objects.filter(id__in=options["rule_ids"]))
+        missing = set(options["rule_ids"]) - {rule.id for rule in rules}
+        if missing:
+            raise CommandError(f"Unknown pricing rule ids: {sorted(missing)}")
+
+        organization_ids = options["organization_ids"] or sorted(
+            {rule.organization_id for rule in rules}
+        )
+        # Each organization is simulated with its own rules only
+        foreign = sorted(
+            rule.id for rule in rules if rule.organization_id not in organization_ids
+        )
+        if foreign:
+            raise CommandError(
+                f"Pricing rules {foreign} belong to none of the given organizations"
+            )
+        names = dict(
+            Organization.objects.filter(id__in=organization_ids).values_list("id", "name")
+        )
+
+        results = simulate(
+            organization_ids,
+            [SimulationRule.from_rule(rule) for rule in rules],
+            start_date=options["start"],
+            end_date=options["end"],
+            workers=options["workers"],
+            chunk_size=options["chunk_size"],
+        )
+
+        for result in results:
+            self.stdout.write(
+                f"{names.get(result.organization_id, result.organization_id)}: "
+                f"{result.bookings_scanned} bookings, "
+                f"{result.affected_bookings} affected, "
+                f"revenue {result.baseline_revenue} -> {result.simulated_revenue} "
+                f"({result.revenue_delta:+} / {result.revenue_delta_percentage:+}%)"
+            )
+
+        total = summarize(results)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Total: {total.bookings_scanned} bookings, "
+                f"{total.affected_bookings} affected, "
+                f"revenue delta {total.revenue_delta:+}"
+            )
+        )
+
+        if options["record_impact"]:
+            self.record_impact(rules, total)
+
+    def record_impact(self, rules, total):
+        for rule, affected in zip(rules, total.affected_by_rule):
+            entry = (
+                PricingHistory.objects.filter(
+                    entity_type="pricing_rule", entity_id=rule.id
+                )
+                .order_by("-changed_at")
+                .first()
+            )
+            if entry is None:
+                self.stdout.write(
+                    self.style.WARNING(f"No pricing history for rule {rule.id}, skipped")
+                )
+                continue
+            entry.affected_bookings_count = affected
+            entry.save(update_fields=["affected_bookings_count"])
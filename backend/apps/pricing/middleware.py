@@ -0,0 +1,38 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from .history import current_request
+
+
+class PricingHistoryMiddleware:
+    """
+    Expose the current request to the pricing change-capture signals so that
+    PricingHistory rows are attributed to the user who made the change.
+
+    The request object is stored rather than the user because DRF resolves
+    token authentication inside the view, after middleware has run. The
+    context variable follows async views into their sync_to_async calls.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = current_request.set(request)
+        try:
+            return self.get_response(request)
+        finally:
+            current_request.reset(token)
+
+    async def __acall__(self, request):
+        token = current_request.set(request)
+        try:
+            return await self.get_response(request)
+        finally:
+            current_request.reset(token)
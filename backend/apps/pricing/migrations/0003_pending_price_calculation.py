@@ -0,0 +1,25 @@
+# Generated by Django 5.2.7 on 2026-10-19 01:43
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0001_multi_tenant_bookings'),
+        ('pricing', '0002_pricing_history_changed_by_optional'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PendingPriceCalculation',
+            fields=[
+                ('booking', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='pending_price_calculation', serialize=False, to='bookings.booking')),
+                ('queued_at', models.DateTimeField(db_index=True)),
+            ],
+            options={
+                'ordering': ['queued_at'],
+            },
+        ),
+    ]
@@ -326,32 +326,9 @@ class PriceCalculation(models.Model):
 
     def recalculate(self):
         """Recalculate all pricing based on current rules"""
-        # This method would contain the comprehensive pricing logic
-        # For now, just ensure basic calculations
-        self.total_discounts = (
-            self.guest_discount_amount
-            + self.early_booking_discount
-            + self.lastminute_discount
-            + self.promotional_discount
-        )
-
-        self.subtotal_after_discount = (
-            self.subtotal_before_discount - self.total_discounts
-        )
-
-        self.total_before_tax = (
-            self.subtotal_after_discount
-            + self.seasonal_surcharge
-            + self.demand_surcharge
-            + self.weekend_surcharge
-            + self.service_charge_amount
-        )
-
-        self.grand_total = self.total_before_tax + self.tax_amount
-
-        if self.booking.guest_count > 0:
-            self.price_per_person = self.grand_total / self.booking.guest_count
+        from .engine import apply_totals
 
+        apply_totals(self)
         self.save()
 
     @property
@@ -369,6 +346,24 @@ class PriceCalculation(models.Model):
         return 0
 
 
+class PendingPriceCalculation(models.Model):
+    """Queue of bookings whose PriceCalculation needs to be (re)built"""
+
+    booking = models.OneToOneField(
+        Booking,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="pending_price_calculation",
+    )
+    queued_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        ordering = ["queued_at"]
+
+    def __str__(self):
+        return f"Pending price calculation for booking {self.booking_id}"
+
+
 class BudgetSuggestion(models.Model):
     """Store budget-based menu suggestions"""
 
@@ -529,7 +524,9 @@ class PricingHistory(models.Model):
     change_reason = models.TextField(blank=True)
 
     # Metadata
-    changed_by = models.ForeignKey("auth.User", on_delete=models.CASCADE)
+    changed_by = models.ForeignKey(
+        "auth.User", on_delete=models.CASCADE, null=True, blank=True
+    )
     changed_at = models.DateTimeField(auto_now_add=True)
 
     # Impact tracking
@@ -546,44 +543,6 @@ class PricingHistory(models.Model):
         return f"{self.organization.name} - {self.entity_type} {self.entity_id}: {self.field_name} changed"
 
 
-# Signals for automatic calculations
-from django.db.models.signals import post_save, pre_save
-from django.dispatch import receiver
-
-
-@receiver(post_save, sender=Booking)
-def create_price_calculation(sender, instance, created, **kwargs):
-    if created and instance.hall:
-        # Create initial price calculation only if hall is assigned
-        PriceCalculation.objects.get_or_create(
-            booking=instance,
-            defaults={
-                "hall_base_price": instance.hall.base_price,
-                "subtotal_before_discount": instance.hall.base_price,
-                "subtotal_after_discount": instance.hall.base_price,
-                "total_before_tax": instance.hall.base_price,
-                "grand_total": instance.hall.base_price,
-                "price_per_person": instance.hall.base_price / instance.guest_count,
-            },
-        )
-    elif not created and instance.hall:
-        # If hall was assigned to an existing booking, create price calculation
-        PriceCalculation.objects.get_or_create(
-            booking=instance,
-            defaults={
-                "hall_base_price": instance.hall.base_price,
-                "subtotal_before_discount": instance.hall.base_price,
-                "subtotal_after_discount": instance.hall.base_price,
-                "total_before_tax": instance.hall.base_price,
-                "grand_total": instance.hall.base_price,
-                "price_per_person": instance.hall.base_price / instance.guest_count,
-            },
-        )
-
-
-@receiver(post_save, sender=PricingRule)
-def track_pricing_rule_changes(sender, instance, created, **kwargs):
-    if not created:
-        # Track changes for analytics
-        # Implementation would compare old vs new values
-        pass
+# Signals for automatic calculations:
+# - PriceCalculation rows are maintained in batches by apps/pricing/maintenance.py
+# - Field-level change tracking for PricingHistory lives in apps/pricing/history.py
@@ -0,0 +1,213 @@
+"""
+Integer minor-unit money type
+
+All amounts in the pricing models are stored as DecimalField(decimal_places=2).
+Wherever an amount has to be rounded (rates, per-person splits, fractional
+quantities) or is processed in bulk (the pricing simulation), it is carried as
+a plain integer count of minor units (paisa/cents) instead. Integer addition
+and comparison are cheap, and every operation that can produce a fraction of a
+minor unit takes an explicit rounding mode, so results are deterministic and
+independent of the active decimal context.
+
+Convert at the boundaries only: ``Money.from_decimal(field_value)`` when
+reading a model field and ``money.to_decimal()`` when writing one back. Column
+code that works on plain ints uses ``to_minor``/``from_minor`` and
+``divide``/``divide_all`` directly.
+"""
+
+from decimal import (
+    ROUND_CEILING,
+    ROUND_DOWN,
+    ROUND_FLOOR,
+    ROUND_HALF_DOWN,
+    ROUND_HALF_EVEN,
+    ROUND_HALF_UP,
+    ROUND_UP,
+    Decimal,
+)
+
+# Minor units per major unit, matching decimal_places=2 on the model fields
+MINOR_UNITS = 100
+DECIMAL_PLACES = 2
+
+# Commercial rounding (half away from zero) unless a caller asks otherwise
+DEFAULT_ROUNDING = ROUND_HALF_UP
+
+
+def ratio(value):
+    """Return ``value`` as an exact (numerator, denominator) pair of ints"""
+    if isinstance(value, int):
+        return value, 1
+    if not isinstance(value, Decimal):
+        # Floats and strings go through str() so 0.1 means 1/10, not its binary
+        # approximation
+        value = Decimal(str(value))
+    return value.as_integer_ratio()
+
+
+def divide(numerator, denominator, rounding=DEFAULT_ROUNDING):
+    """Integer division of ``numerator / denominator`` using ``rounding``"""
+    if denominator < 0:
+        numerator, denominator = -numerator, -denominator
+    quotient, remainder = divmod(numerator, denominator)
+    if not remainder:
+        return quotient
+
+    # divmod floors, so quotient is the lower candidate and quotient + 1 the
+    # upper one; pick between them according to the rounding mode.
+    negative = numerator < 0
+    if rounding == ROUND_FLOOR:
+        return quotient
+    if rounding == ROUND_CEILING:
+        return quotient + 1
+    if rounding == ROUND_DOWN:
+        return quotient + 1 if negative else quotient
+    if rounding == ROUND_UP:
+        return quotient if negative else quotient + 1
+
+    twice = remainder * 2
+    if twice < denominator:
+        return quotient
+    if twice > denominator:
+        return quotient + 1
+    if rounding == ROUND_HALF_UP:
+        return quotient if negative else quotient + 1
+    if rounding == ROUND_HALF_DOWN:
+        return quotient + 1 if negative else quotient
+    if rounding == ROUND_HALF_EVEN:
+        return quotient + (quotient & 1)
+    raise ValueError(f"Unsupported rounding mode: {rounding}")
+
+
+def to_minor(value, rounding=DEFAULT_ROUNDING):
+    """Convert a DecimalField value (or int/str/float) to minor units"""
+    if value is None:
+        return 0
+    if isinstance(value, int):
+        return value * MINOR_UNITS
+    if isinstance(value, Decimal):
+        # Fast path for values already at (or below) two decimal places,
+        # which is every DecimalField amount in the pricing models
+        scaled = value.scaleb(DECIMAL_PLACES)
+        minor = int(scaled)
+        if minor == scaled:
+            return minor
+    numerator, denominator = ratio(value)
+    return divide(numerator * MINOR_UNITS, denominator, rounding)
+
+
+def from_minor(minor):
+    """Convert minor units back to a two-place Decimal"""
+    return Decimal(minor).scaleb(-DECIMAL_PLACES)
+
+
+def divide_all(values, numerator, denominator, rounding=DEFAULT_ROUNDING):
+    """``divide(value * numerator, denominator)`` for every value in one pass"""
+    if rounding == ROUND_HALF_UP and numerator >= 0 and denominator > 0:
+        # Half-up on a non-negative quotient is a single floor division
+        twice = denominator * 2
+        return [
+            (value * numerator * 2 + denominator) // twice
+            if value >= 0
+            else divide(value * numerator, denominator, rounding)
+            for value in values
+        ]
+    return [divide(value * numerator, denominator, rounding) for value in values]
+
+
+class Money:
+    """An amount held as an integer number of minor units"""
+
+    __slots__ = ("minor",)
+
+    def __init__(self, minor=0):
+        self.minor = minor
+
+    @classmethod
+    def from_decimal(cls, value, rounding=DEFAULT_ROUNDING):
+        """Build from a DecimalField value (or int/str/float); ``None`` is zero"""
+        return cls(to_minor(value, rounding))
+
+    @classmethod
+    def sum(cls, values):
+        return cls(sum(value.minor for value in values))
+
+    def to_decimal(self):
+        """Convert back to a two-place Decimal for a model or serializer field"""
+        return from_minor(self.minor)
+
+    def times(self, factor, rounding=DEFAULT_ROUNDING):
+        """Multiply by a (possibly fractional) factor, e.g. a quantity"""
+        if isinstance(factor, int):
+            return Money(self.minor * factor)
+        numerator, denominator = ratio(factor)
+        return Money(divide(self.minor * numerator, denominator, rounding))
+
+    def percent(self, rate, rounding=DEFAULT_ROUNDING):
+        """``rate`` percent of this amount, e.g. a tax or commission"""
+        numerator, denominator = ratio(rate)
+        return Money(divide(self.minor * numerator, denominator * 100, rounding))
+
+    def split(self, parts, rounding=DEFAULT_ROUNDING):
+        """This amount divided into ``parts`` equal shares (one share returned)"""
+        return Money(divide(self.minor, parts, rounding))
+
+    def __add__(self, other):
+        if isinstance(other, Money):
+            return Money(self.minor + other.minor)
+        return NotImplemented
+
+    def __sub__(self, other):
+        if isinstance(other, Money):
+            return Money(self.minor - other.minor)
+        return NotImplemented
+
+    def __neg__(self):
+        return Money(-self.minor)
+
+    def __mul__(self, other):
+        if isinstance(other, int):
+            return Money(self.minor * other)
+        return NotImplemented
+
+    __rmul__ = __mul__
+
+    def __eq__(self, other):
+        if isinstance(other, Money):
+            return self.minor == other.minor
+        return NotImplemented
+
+    def __lt__(self, other):
+        if isinstance(other, Money):
+            return self.minor < other.minor
+        return NotImplemented
+
+    def __le__(self, other):
+        if isinstance(other, Money):
+            return self.minor <= other.minor
+        return NotImplemented
+
+    def __gt__(self, other):
+        if isinstance(other, Money):
+            return self.minor > other.minor
+        return NotImplemented
+
+    def __ge__(self, other):
+        if isinstance(other, Money):
+            return self.minor >= other.minor
+        return NotImplemented
+
+    def __hash__(self):
+        return hash(self.minor)
+
+    def __bool__(self):
+        return self.minor != 0
+
+    def __repr__(self):
+        return f"Money({self.to_decimal()})"
+
+    def __str__(self):
+        return str(self.to_decimal())
+
+
+ZERO = Money(0)
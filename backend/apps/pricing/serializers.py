@@ -2,6 +2,7 @@ from rest_framework import serializers
 from decimal import Decimal
 from .models import PricingRule, PriceCalculation, BudgetSuggestion, SuggestedMenuItem
 from apps.core.serializers import HallListSerializer, DiscountTierSerializer
+from apps.menu import dietary
 from apps.menu.serializers import MenuItemListSerializer
 from apps.bookings.serializers import BookingListSerializer
 
@@ -115,15 +116,24 @@ class PriceCalculationResponseSerializer(serializers.Serializer):
     breakdown = serializers.DictField()
 
 
+class MenuPreferencesSerializer(serializers.Serializer):
+    """Dietary preferences of a budget suggestion, applied via the item bitmasks"""
+    vegetarian_only = serializers.BooleanField(default=False)
+    exclude_allergens = serializers.ListField(
+        child=serializers.ChoiceField(choices=sorted(dietary.ALLERGEN_BITS)), default=list
+    )
+    dietary = serializers.ListField(
+        child=serializers.ChoiceField(choices=sorted(dietary.DIETARY_BITS)), default=list
+    )
+    exclude_categories = serializers.ListField(child=serializers.IntegerField(), default=list)
+
+
 class BudgetSuggestionRequestSerializer(serializers.Serializer):
     """Serializer for budget suggestion requests"""
     target_budget = serializers.DecimalField(max_digits=12, decimal_places=2, min_value=0)
     guest_count = serializers.IntegerField(min_value=1)
     hall_id = serializers.IntegerField(required=False)
-    preferences = serializers.DictField(
-        required=False,
-        help_text="Optional preferences like vegetarian_only, exclude_categories, etc."
-    )
+    preferences = MenuPreferencesSerializer(required=False)
     
     def validate_target_budget(self, value):
         if value <= 0:
@@ -169,4 +179,60 @@ class MenuPricingResponseSerializer(serializers.Serializer):
     final_unit_price = serializers.DecimalField(max_digits=10, decimal_places=2)
     quantity = serializers.IntegerField()
     line_total = serializers.DecimalField(max_digits=12, decimal_places=2)
-    applicable_discounts = serializers.ListField(child=serializers.DictField())
\ No newline at end of file
+    applicable_discounts = serializers.ListField(child=serializers.DictField())
+
+
+class SimulationRuleSerializer(serializers.Serializer):
+    """Candidate pricing rule supplied inline for a simulation"""
+    name = serializers.CharField(max_length=100, required=False)
+    rule_type = serializers.ChoiceField(choices=PricingRule.RULE_TYPES)
+    applies_to = serializers.ChoiceField(choices=PricingRule.APPLICABILITY, default='total')
+    percentage = serializers.DecimalField(max_digits=8, decimal_places=4, required=False,
+                                          allow_null=True, min_value=0, max_value=100)
+    fixed_amount = serializers.DecimalField(max_digits=12, decimal_places=2, required=False,
+                                            allow_null=True, min_value=0)
+    min_guests = serializers.IntegerField(required=False, allow_null=True, min_value=1)
+    max_guests = serializers.IntegerField(required=False, allow_null=True, min_value=1)
+    min_amount = serializers.DecimalField(max_digits=12, decimal_places=2, required=False, allow_null=True)
+    max_amount = serializers.DecimalField(max_digits=12, decimal_places=2, required=False, allow_null=True)
+    applicable_event_types = serializers.ListField(child=serializers.CharField(), required=False)
+    applicable_days = serializers.RegexField(r'^[1-7]*$', max_length=7, required=False, allow_blank=True)
+    valid_from = serializers.DateField(required=False, allow_null=True)
+    valid_until = serializers.DateField(required=False, allow_null=True)
+    priority = serializers.IntegerField(default=0)
+    is_cumulative = serializers.BooleanField(default=True)
+
+    def validate(self, data):
+        if not data.get('percentage') and not data.get('fixed_amount'):
+            raise serializers.ValidationError("Either percentage or fixed amount must be specified")
+        if data.get('percentage') and data.get('fixed_amount'):
+            raise serializers.ValidationError("Specify either percentage or fixed amount, not both")
+        return data
+
+
+class PricingSimulationRequestSerializer(serializers.Serializer):
+    """Serializer for pricing simulation (backtest) requests"""
+    organization = serializers.IntegerField()
+    rule_ids = serializers.ListField(child=serializers.IntegerField(), required=False)
+    rules = SimulationRuleSerializer(many=True, required=False)
+    start_date = serializers.DateField(required=False)
+    end_date = serializers.DateField(required=False)
+
+    def validate(self, data):
+        if not data.get('rule_ids') and not data.get('rules'):
+            raise serializers.ValidationError("Provide rule_ids and/or inline rules to simulate")
+        if data.get('start_date') and data.get('end_date') and data['start_date'] > data['end_date']:
+            raise serializers.ValidationError("start_date must be before end_date")
+        return data
+
+
+class PricingSimulationResponseSerializer(serializers.Serializer):
+    """Serializer for pricing simulation results"""
+    organization_id = serializers.IntegerField()
+    bookings_scanned = serializers.IntegerField()
+    affected_bookings = serializers.IntegerField()
+    baseline_revenue = serializers.DecimalField(max_digits=14, decimal_places=2)
+    simulated_revenue = serializers.DecimalField(max_digits=14, decimal_places=2)
+    revenue_delta = serializers.DecimalField(max_digits=14, decimal_places=2)
+    revenue_delta_percentage = serializers.DecimalField(max_digits=8, decimal_places=2)
+    affected_by_rule = serializers.ListField(child=serializers.IntegerField())
@@ -0,0 +1,470 @@
+"""
+Historical pricing simulation (backtesting)
+
+Replays a candidate set of pricing rules against an organization's historical
+bookings and reports what revenue would have looked like had the rules been in
+place. Bookings are streamed from the database in chunks and every chunk is
+evaluated column-wise: each rule builds a match mask over the whole chunk and
+then applies its adjustment to the masked rows in a single pass, rather than
+evaluating rule-by-booking in nested Python loops. Amount columns are held as
+integer minor units (see money.py), so the per-row arithmetic is plain integer
+math with explicit rounding; Decimals only appear in the final result.
+"""
+
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, timedelta
+from decimal import Decimal
+from itertools import compress, islice
+
+from django.db import connections
+from django.db.models import BigIntegerField, F
+from django.db.models.functions import Cast, Round
+from django.utils import timezone
+
+from apps.bookings.models import Booking
+from .money import MINOR_UNITS, divide, divide_all, from_minor, ratio, to_minor
+
+# Bookings that actually produced (or will produce) revenue
+REVENUE_STATUSES = ("confirmed", "completed")
+
+DISCOUNT_RULE_TYPES = ("percentage_discount", "fixed_discount")
+
+AMOUNT_COLUMNS = ("hall_base_price", "menu_subtotal", "package_price", "total_amount")
+
+# Columns pulled from the bookings table, in values_list() order; amounts are
+# fetched as minor units
+BOOKING_COLUMNS = (
+    "event_date",
+    "event_type",
+    "guest_count",
+    *(f"{column}_minor" for column in AMOUNT_COLUMNS),
+)
+
+# Which amount column each PricingRule.applies_to value is calculated on
+APPLIES_TO_COLUMNS = {
+    "hall": "hall_base_price",
+    "menu": "menu_subtotal",
+    "package": "package_price",
+    "total": "total_amount",
+}
+
+DEFAULT_CHUNK_SIZE = 5000
+
+ZERO = Decimal("0.00")
+
+
+def _minor(value):
+    return None if value is None else to_minor(value)
+
+
+class SimulationRule:
+    """Flattened, picklable view of a PricingRule used by the simulator"""
+
+    __slots__ = (
+        "rule_id",
+        "organization_id",
+        "name",
+        "rule_type",
+        "applies_to",
+        "percentage",
+        "fixed_amount",
+        "min_guests",
+        "max_guests",
+        "min_amount",
+        "max_amount",
+        "event_types",
+        "days",
+        "valid_from",
+        "valid_until",
+        "priority",
+        "is_cumulative",
+    )
+
+    def __init__(
+        self,
+        rule_type,
+        applies_to="total",
+        percentage=None,
+        fixed_amount=None,
+        min_guests=None,
+        max_guests=None,
+        min_amount=None,
+        max_amount=None,
+        event_types=(),
+        days="",
+        valid_from=None,
+        valid_until=None,
+        priority=0,
+        is_cumulative=True,
+        rule_id=None,
+        organization_id=None,
+        name="",
+    ):
+        self.rule_id = rule_id
+        # Saved rules only apply to their own organization's bookings
+        self.organization_id = organization_id
+        self.name = name
+        self.rule_type = rule_type
+        self.applies_to = applies_to
+        # Percentages are kept as an exact ratio and amounts in minor units
+        self.percentage = ratio(percentage) if percentage else None
+        self.fixed_amount = _minor(fixed_amount) or 0
+        self.min_guests = min_guests
+        self.max_guests = max_guests
+        self.min_amount = _minor(min_amount)
+        self.max_amount = _minor(max_amount)
+        self.event_types = frozenset(event_types)
+        # ISO weekdays (1 = Monday ... 7 = Sunday), matching applicable_days
+        self.days = frozenset(int(day) for day in days if day.isdigit())
+        self.valid_from = valid_from
+        self.valid_until = valid_until
+        self.priority = priority
+        self.is_cumulative = is_cumulative
+
+    @classmethod
+    def from_rule(cls, rule):
+        """Build a simulation rule from a saved PricingRule"""
+        return cls(
+            rule_id=rule.id,
+            organization_id=rule.organization_id,
+            name=rule.name,
+            rule_type=rule.rule_type,
+            applies_to=rule.applies_to,
+            percentage=rule.percentage,
+            fixed_amount=rule.fixed_amount,
+            min_guests=rule.min_guests,
+            max_guests=rule.max_guests,
+            min_amount=rule.min_amount,
+            max_amount=rule.max_amount,
+            event_types=rule.applicable_event_types_list,
+            days=rule.applicable_days,
+            valid_from=rule.valid_from,
+            valid_until=rule.valid_until,
+            priority=rule.priority,
+            is_cumulative=rule.is_cumulative,
+        )
+
+    @classmethod
+    def from_data(cls, data):
+        """Build a simulation rule from validated SimulationRuleSerializer data"""
+        return cls(
+            name=data.get("name", ""),
+            rule_type=data["rule_type"],
+            applies_to=data.get("applies_to", "total"),
+            percentage=data.get("percentage"),
+            fixed_amount=data.get("fixed_amount"),
+            min_guests=data.get("min_guests"),
+            max_guests=data.get("max_guests"),
+            min_amount=data.get("min_amount"),
+            max_amount=data.get("max_amount"),
+            event_types=data.get("applicable_event_types", []),
+            days=data.get("applicable_days", ""),
+            valid_from=data.get("valid_from"),
+            valid_until=data.get("valid_until"),
+            priority=data.get("priority", 0),
+            is_cumulative=data.get("is_cumulative", True),
+        )
+
+    @property
+    def is_discount(self):
+        return self.rule_type in DISCOUNT_RULE_TYPES
+
+    def applies_to_organization(self, organization_id):
+        return self.organization_id is None or self.organization_id == organization_id
+
+    def match_mask(self, chunk):
+        """Return a row mask (see ``row_flags``) of the chunk rows this rule applies to"""
+        # Every condition is a C-level comparison mapped over a whole column;
+        # the per-condition masks are combined with a single integer AND.
+        mask = chunk.all_rows
+        conditions = []
+        if self.min_guests is not None:
+            conditions.append((self.min_guests.__le__, chunk.guest_count))
+        if self.max_guests is not None:
+            conditions.append((self.max_guests.__ge__, chunk.guest_count))
+        if self.valid_from is not None:
+            conditions.append((self.valid_from.toordinal().__le__, chunk.event_day))
+        if self.valid_until is not None:
+            conditions.append((self.valid_until.toordinal().__ge__, chunk.event_day))
+        if self.days:
+            conditions.append((self.days.__contains__, chunk.weekday))
+        if self.event_types:
+            conditions.append((self.event_types.__contains__, chunk.event_type))
+
+        base = chunk.column(self.applies_to)
+        if self.min_amount is not None:
+            conditions.append((self.min_amount.__le__, base))
+        if self.max_amount is not None:
+            conditions.append((self.max_amount.__ge__, base))
+
+        for predicate, column in conditions:
+            mask &= row_flags(map(predicate, column))
+            if not mask:
+                break
+        return mask
+
+    def adjustment(self, base):
+        """Total (unsigned) adjustment, in minor units, over the given base amounts"""
+        if self.percentage:
+            numerator, denominator = self.percentage
+            amounts = divide_all(base, numerator, denominator * 100)
+        else:
+            amounts = [self.fixed_amount] * len(base)
+
+        if self.is_discount:
+            # A discount can never take a line below zero
+            amounts = map(min, amounts, base)
+        return sum(amounts)
+
+
+def row_flags(flags):
+    """
+    Pack per-row booleans into an int holding one byte (0 or 1) per row.
+
+    Masks in this form combine with ``&``/``|``, count with ``bit_count()``
+    and turn back into compress() selectors with ``to_bytes()``.
+    """
+    return int.from_bytes(bytes(flags), "little")
+
+
+class BookingChunk:
+    """Columnar view over a chunk of booking rows"""
+
+    __slots__ = (
+        "all_rows",
+        "event_day",
+        "weekday",
+        "event_type",
+        "guest_count",
+        "hall_base_price",
+        "menu_subtotal",
+        "package_price",
+        "total_amount",
+    )
+
+    def __init__(self, rows):
+        (
+            event_dates,
+            event_types,
+            guest_counts,
+            hall_prices,
+            menu_subtotals,
+            package_prices,
+            totals,
+        ) = zip(*rows)
+        self.event_day = array("l", map(date.toordinal, event_dates))
+        self.weekday = array("b", map(date.isoweekday, event_dates))
+        self.event_type = event_types
+        self.guest_count = array("l", guest_counts)
+        self.hall_base_price = array("q", hall_prices)
+        self.menu_subtotal = array("q", menu_subtotals)
+        self.package_price = array("q", package_prices)
+        self.total_amount = array("q", totals)
+        self.all_rows = row_flags(b"\x01" * len(self.guest_count))
+
+    def __len__(self):
+        return len(self.guest_count)
+
+    def column(self, applies_to):
+        return getattr(self, APPLIES_TO_COLUMNS.get(applies_to, "total_amount"))
+
+
+class SimulationResult:
+    """Aggregated outcome of replaying a rule set against one organization"""
+
+    def __init__(self, organization_id, rule_count=0):
+        self.organization_id = organization_id
+        self.bookings_scanned = 0
+        self.affected_bookings = 0
+        # Revenue totals in minor units
+        self.baseline_minor = 0
+        self.simulated_minor = 0
+        self.affected_by_rule = [0] * rule_count
+
+    @property
+    def baseline_revenue(self):
+        return from_minor(self.baseline_minor)
+
+    @property
+    def simulated_revenue(self):
+        return from_minor(self.simulated_minor)
+
+    @property
+    def revenue_delta(self):
+        return from_minor(self.simulated_minor - self.baseline_minor)
+
+    @property
+    def revenue_delta_percentage(self):
+        if self.baseline_minor:
+            # Percentage to two places, rounded like every other amount
+            basis_points = divide(
+                (self.simulated_minor - self.baseline_minor) * 10000, self.baseline_minor
+            )
+            return Decimal(basis_points).scaleb(-2)
+        return ZERO
+
+    def as_dict(self):
+        return {
+            "organization_id": self.organization_id,
+            "bookings_scanned": self.bookings_scanned,
+            "affected_bookings": self.affected_bookings,
+            "baseline_revenue": self.baseline_revenue,
+            "simulated_revenue": self.simulated_revenue,
+            "revenue_delta": self.revenue_delta,
+            "revenue_delta_percentage": self.revenue_delta_percentage,
+            "affected_by_rule": self.affected_by_rule,
+        }
+
+
+def evaluate_chunk(chunk, rules, result):
+    """Apply every rule to a chunk and fold the outcome into ``result``"""
+    size = len(chunk)
+    delta = 0
+    affected = 0
+    # Rows claimed by a non-cumulative rule stop accepting further rules
+    closed = 0
+
+    for position, rule in rules:
+        mask = rule.match_mask(chunk) & ~closed
+        if not mask:
+            continue
+
+        base = list(compress(chunk.column(rule.applies_to), mask.to_bytes(size, "little")))
+        adjustment = rule.adjustment(base)
+        delta += -adjustment if rule.is_discount else adjustment
+        affected |= mask
+        result.affected_by_rule[position] += mask.bit_count()
+        if not rule.is_cumulative:
+            closed |= mask
+
+    baseline = sum(chunk.total_amount)
+    result.bookings_scanned += size
+    result.affected_bookings += affected.bit_count()
+    result.baseline_minor += baseline
+    result.simulated_minor += baseline + delta
+
+
+def booking_rows(organization_id, start_date, end_date, chunk_size):
+    """Stream historical booking rows for an organization in chunks"""
+    # Amount columns are converted to integer minor units by the database, so
+    # no Decimal objects are built for them on the Python side
+    rows = (
+        Booking.objects.filter(
+            organization_id=organization_id,
+            status__in=REVENUE_STATUSES,
+            event_date__gte=start_date,
+            event_date__lte=end_date,
+        )
+        .order_by()
+        .annotate(
+            **{
+                f"{column}_minor": Cast(
+                    Round(F(column) * MINOR_UNITS), BigIntegerField()
+                )
+                for column in AMOUNT_COLUMNS
+            }
+        )
+        .values_list(*BOOKING_COLUMNS)
+        .iterator(chunk_size=chunk_size)
+    )
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def simulate_organization(
+    organization_id, rules, start_date, end_date, chunk_size=DEFAULT_CHUNK_SIZE
+):
+    """
+    Replay ``rules`` against one organization's bookings
+
+    Saved rules of other organizations are skipped; ``affected_by_rule`` still
+    has one (zero) count for each of them, so results of several
+    organizations line up rule by rule.
+    """
+    result = SimulationResult(organization_id, rule_count=len(rules))
+    # Higher priority rules are applied first, like the live pricing engine
+    ordered = sorted(
+        (
+            (position, rule)
+            for position, rule in enumerate(rules)
+            if rule.applies_to_organization(organization_id)
+        ),
+        key=lambda item: -item[1].priority,
+    )
+    for rows in booking_rows(organization_id, start_date, end_date, chunk_size):
+        evaluate_chunk(BookingChunk(rows), ordered, result)
+    return result
+
+
+def _simulate_organization_task(args):
+    # Runs inside a worker process; each worker opens its own DB connection
+    return simulate_organization(*args)
+
+
+def _init_worker():
+    import django
+    from django.apps import apps
+
+    if not apps.ready:
+        django.setup()
+    # Never reuse a connection inherited from the parent process
+    connections.close_all()
+
+
+def default_date_range():
+    """The last 365 days, inclusive of today"""
+    end_date = timezone.now().date()
+    return end_date - timedelta(days=365), end_date
+
+
+def simulate(
+    organization_ids,
+    rules,
+    start_date=None,
+    end_date=None,
+    workers=1,
+    chunk_size=DEFAULT_CHUNK_SIZE,
+):
+    """
+    Replay ``rules`` against the bookings of each organization.
+
+    Each organization gets its own saved rules and every inline rule.
+    With ``workers`` > 1 organizations are spread across a process pool; the
+    per-organization results are returned in the order of ``organization_ids``.
+    """
+    default_start, default_end = default_date_range()
+    start_date = start_date or default_start
+    end_date = end_date or default_end
+    tasks = [
+        (organization_id, rules, start_date, end_date, chunk_size)
+        for organization_id in organization_ids
+    ]
+
+    if workers <= 1 or len(tasks) <= 1:
+        return [_simulate_organization_task(task) for task in tasks]
+
+    # Connections must not be shared with forked children
+    connections.close_all()
+    with ProcessPoolExecutor(
+        max_workers=min(workers, len(tasks)), initializer=_init_worker
+    ) as executor:
+        return list(executor.map(_simulate_organization_task, tasks))
+
+
+def summarize(results):
+    """Combine per-organization results into a platform-wide summary"""
+    total = SimulationResult(None, rule_count=len(results[0].affected_by_rule) if results else 0)
+    for result in results:
+        total.bookings_scanned += result.bookings_scanned
+        total.affected_bookings += result.affected_bookings
+        total.baseline_minor += result.baseline_minor
+        total.simulated_minor += result.simulated_minor
+        total.affected_by_rule = [
+            count + other
+            for count, other in zip(total.affected_by_rule, result.affected_by_rule)
+        ]
+    return total
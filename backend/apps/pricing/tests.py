@@ -1,3 +1,443 @@
-from django.test import TestCase
+import datetime
+import io
+from decimal import (
+    ROUND_CEILING,
+    ROUND_DOWN,
+    ROUND_FLOOR,
+    ROUND_HALF_DOWN,
+    ROUND_HALF_EVEN,
+    ROUND_HALF_UP,
+    ROUND_UP,
+    Decimal,
+)
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, transaction
+from django.test import SimpleTestCase, TestCase, override_settings
+from rest_framework.test import APIClient
+
+from apps.bookings.models import Booking
+from apps.core.models import Hall, OrganizationMember
+from apps.core.tests import LOCMEM_CACHE, create_organization
+from apps.menu import transfer
+from apps.menu.models import MenuCategory, MenuItem
+from . import history, maintenance, money
+from .models import (
+    PendingPriceCalculation,
+    PriceCalculation,
+    PricingHistory,
+    PricingRule,
+)
+from .money import Money
+from .simulation import SimulationRule, simulate
+
+EVENT_DAY = datetime.date(2025, 6, 7)
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class PricingSimulationTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(username="owner", password="pass")
+        self.venue = create_organization(self.owner)
+        self.other = create_organization(self.owner, name="Other")
+        for organization, guest_counts in (
+            (self.venue, (100, 300)),
+            (self.other, (100, 100, 100)),
+        ):
+            hall = Hall.objects.create(
+                organization=organization,
+                name="Main",
+                capacity=500,
+                base_price=Decimal("1000.00"),
+            )
+            for guest_count, total in zip(guest_counts, ("333.35", "100.05", "50.00")):
+                Booking.objects.create(
+                    organization=organization,
+                    hall=hall,
+                    customer=self.owner,
+                    event_date=EVENT_DAY,
+                    event_time=datetime.time(19, 0),
+                    guest_count=guest_count,
+                    contact_phone="0300",
+                    contact_email="guest@example.com",
+                    status="confirmed",
+                    total_amount=Decimal(total),
+                )
+
+    def create_rule(self, organization, **fields):
+        return PricingRule.objects.create(
+            organization=organization,
+            name="Ten off",
+            rule_type="percentage_discount",
+            percentage=Decimal("10"),
+            **fields,
+        )
+
+    def test_replay_rounds_each_booking_in_minor_units(self):
+        rules = [
+            SimulationRule(rule_type="percentage_discount", percentage=Decimal("10")),
+            SimulationRule(
+                rule_type="fixed_surcharge",
+                fixed_amount=Decimal("0.01"),
+                min_guests=200,
+            ),
+        ]
+        (result,) = simulate(
+            [self.venue.id], rules, start_date=EVENT_DAY, end_date=EVENT_DAY
+        )
+        # 33.335 and 10.005 round half up to 33.34 and 10.01
+        self.assertEqual(result.baseline_revenue, Decimal("433.40"))
+        self.assertEqual(result.simulated_revenue, Decimal("390.06"))
+        self.assertEqual(result.revenue_delta, Decimal("-43.34"))
+        self.assertEqual(result.revenue_delta_percentage, Decimal("-10.00"))
+        self.assertEqual(result.affected_by_rule, [2, 1])
+
+    def test_command_applies_each_organization_its_own_rules(self):
+        venue_rule = self.create_rule(self.venue)
+        other_rule = self.create_rule(self.other, min_guests=50)
+        # Record impact on the rules' latest history entries
+        with self.captureOnCommitCallbacks(execute=True):
+            for rule in (venue_rule, other_rule):
+                rule.priority = 1
+                rule.save()
+
+        output = io.StringIO()
+        call_command(
+            "simulate_pricing",
+            "--rule",
+            str(venue_rule.id),
+            "--rule",
+            str(other_rule.id),
+            "--start",
+            str(EVENT_DAY),
+            "--end",
+            str(EVENT_DAY),
+            "--record-impact",
+            stdout=output,
+        )
+        self.assertIn("Venue: 2 bookings, 2 affected", output.getvalue())
+        self.assertIn("Other: 3 bookings, 3 affected", output.getvalue())
+        self.assertEqual(
+            dict(
+                PricingHistory.objects.filter(entity_type="pricing_rule").values_list(
+                    "entity_id", "affected_bookings_count"
+                )
+            ),
+            {venue_rule.id: 2, other_rule.id: 3},
+        )
+
+        with self.assertRaisesMessage(CommandError, str([other_rule.id])):
+            call_command(
+                "simulate_pricing",
+                "--rule",
+                str(other_rule.id),
+                "--organization",
+                str(self.venue.id),
+                stdout=io.StringIO(),
+            )
+
+    def test_api_requires_analytics_access_and_own_rules(self):
+        other_rule = self.create_rule(self.other)
+        request = {
+            "organization": self.venue.id,
+            "rules": [{"rule_type": "percentage_discount", "percentage": "10"}],
+            "start_date": str(EVENT_DAY),
+            "end_date": str(EVENT_DAY),
+        }
+        client = APIClient()
+        staff = User.objects.create_user(username="staff")
+        membership = OrganizationMember.objects.create(
+            organization=self.venue, user=staff, role="staff"
+        )
+        client.force_authenticate(staff)
+        response = client.post("/api/v1/pricing/simulate/", request, format="json")
+        self.assertEqual(response.status_code, 403)
+
+        membership.role = "manager"
+        membership.save()
+        response = client.post("/api/v1/pricing/simulate/", request, format="json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["revenue_delta"], "-43.35")
+
+        request["rule_ids"] = [other_rule.id]
+        response = client.post("/api/v1/pricing/simulate/", request, format="json")
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class BudgetSuggestionTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        owner = User.objects.create_user(username="owner", password="pass")
+        self.client.force_authenticate(owner)
+        self.organization = create_organization(owner)
+        category = MenuCategory.objects.create(organization=self.organization, name="Mains")
+        for name, dietary_type, allergens in (
+            ("Daal", "vegan", ""),
+            ("Paneer", "vegetarian", "Cheese"),
+            ("Karahi", "halal", ""),
+        ):
+            MenuItem.objects.create(
+                organization=self.organization,
+                category=category,
+                name=name,
+                dietary_type=dietary_type,
+                allergens=allergens,
+                base_price=Decimal("100.00"),
+            )
+
+    def suggest(self, preferences):
+        return self.client.post(
+            "/api/v1/pricing/suggest/",
+            {
+                "organization": self.organization.id,
+                "target_budget": "50000",
+                "guest_count": 100,
+                "preferences": preferences,
+            },
+            format="json",
+        )
+
+    def test_preferences_filter_suggestions(self):
+        response = self.suggest({"vegetarian_only": True, "exclude_allergens": ["dairy"]})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [item["name"] for item in response.data["suggested_items"]], ["Daal"]
+        )
+        response = self.suggest({"dietary": ["halal"]})
+        self.assertEqual(
+            [item["name"] for item in response.data["suggested_items"]], ["Karahi"]
+        )
+
+    def test_invalid_preferences(self):
+        for preferences in (["vegan"], "vegan", {"dietary": "vegan"}, {"dietary": ["keto"]}):
+            with self.subTest(preferences=preferences):
+                response = self.suggest(preferences)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn("preferences", response.data)
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class PricingHistoryTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(username="owner", password="pass")
+        self.organization = create_organization(self.owner)
+        self.hall = Hall.objects.create(
+            organization=self.organization,
+            name="Main",
+            capacity=500,
+            base_price=Decimal("1000.00"),
+        )
+        self.item = MenuItem.objects.create(
+            organization=self.organization,
+            category=MenuCategory.objects.create(
+                organization=self.organization, name="Rice"
+            ),
+            name="Biryani",
+            base_price=Decimal("450.00"),
+        )
+
+    def changes(self):
+        return list(
+            PricingHistory.objects.order_by("id").values_list(
+                "entity_type", "field_name", "old_value", "new_value", "changed_by"
+            )
+        )
+
+    def test_changes_are_written_once_per_commit(self):
+        with mock.patch.object(
+            history, "_write_entries", wraps=history._write_entries
+        ) as write, self.captureOnCommitCallbacks(execute=True):
+            self.hall.base_price = Decimal("1200.00")
+            self.hall.save()
+            self.hall.name = "Renamed"
+            self.hall.save()
+            with self.assertRaises(IntegrityError), transaction.atomic():
+                self.item.base_price = Decimal("500.00")
+                self.item.save()
+                raise IntegrityError
+            item = MenuItem.objects.get(pk=self.item.pk)
+            item.base_price = Decimal("475.00")
+            item.save()
+        self.assertEqual(write.call_count, 1)
+        # The rolled-back price never shows
+        self.assertEqual(
+            self.changes(),
+            [
+                ("hall", "base_price", "1000.00", "1200.00", None),
+                ("menu_item", "base_price", "450.00", "475.00", None),
+            ],
+        )
+
+    def test_changes_are_attributed(self):
+        client = APIClient()
+        client.force_authenticate(self.owner)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = client.patch(
+                f"/api/v1/menu/menu/items/{self.item.id}/",
+                {"base_price": "480.00"},
+                format="json",
+            )
+        self.assertEqual(response.status_code, 200)
+
+        # Imports write with bulk_create() and record their changes themselves
+        with self.captureOnCommitCallbacks(execute=True), history.change_context(
+            self.owner, "price list"
+        ):
+            transfer.import_menu(
+                self.organization,
+                io.StringIO("category,name,base_price\nRice,Biryani,520\n"),
+                "csv",
+            )
+        self.assertEqual(
+            self.changes(),
+            [
+                ("menu_item", "base_price", "450.00", "480.00", self.owner.id),
+                ("menu_item", "base_price", "480.00", "520.00", self.owner.id),
+            ],
+        )
+        self.assertEqual(
+            PricingHistory.objects.latest("id").change_reason, "price list"
+        )
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class PriceMaintenanceTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(username="owner", password="pass")
+        self.organization = create_organization(self.owner)
+        self.hall = Hall.objects.create(
+            organization=self.organization,
+            name="Main",
+            capacity=500,
+            base_price=Decimal("1000.00"),
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            self.booking = Booking.objects.create(
+                organization=self.organization,
+                hall=self.hall,
+                customer=self.owner,
+                event_date=EVENT_DAY,
+                event_time=datetime.time(19, 0),
+                guest_count=100,
+                contact_phone="0300",
+                contact_email="guest@example.com",
+            )
+
+    def save_booking(self, **fields):
+        with self.captureOnCommitCallbacks(execute=True):
+            for name, value in fields.items():
+                setattr(self.booking, name, value)
+                self.booking.save()
+
+    def test_pricing_changes_are_queued_and_drained(self):
+        queued_at = PendingPriceCalculation.objects.get().queued_at
+        # Saves without a pricing input change queue nothing
+        self.save_booking(special_requirements="Stage")
+        self.assertEqual(PendingPriceCalculation.objects.get().queued_at, queued_at)
+        # Several changes in one transaction are queued once
+        with mock.patch.object(
+            maintenance, "enqueue", wraps=maintenance.enqueue
+        ) as enqueue:
+            self.save_booking(guest_count=150, menu_subtotal=Decimal("5000.00"))
+        enqueue.assert_called_once_with({self.booking.id})
+        self.assertEqual(PendingPriceCalculation.objects.count(), 1)
+
+        output = io.StringIO()
+        call_command("recalculate_prices", "--pending", stdout=output)
+        self.assertIn("Processed 1 queued bookings", output.getvalue())
+        self.assertFalse(PendingPriceCalculation.objects.exists())
+        calculation = PriceCalculation.objects.get(booking=self.booking)
+        self.assertEqual(calculation.hall_base_price, Decimal("1000.00"))
+        self.assertEqual(calculation.menu_subtotal, Decimal("5000.00"))
+
+        # A booking without a hall has nothing to price
+        self.save_booking(hall=None)
+        self.assertEqual(maintenance.process_pending(), 1)
+        self.assertFalse(PriceCalculation.objects.exists())
+
+    def test_command_recalculates_organizations(self):
+        maintenance.process_pending()
+        # Bulk updates send no signals
+        Hall.objects.update(base_price=Decimal("1500.00"))
+        call_command(
+            "recalculate_prices",
+            "--organization",
+            str(self.organization.id),
+            stdout=io.StringIO(),
+        )
+        self.assertEqual(
+            PriceCalculation.objects.get(booking=self.booking).hall_base_price,
+            Decimal("1500.00"),
+        )
+        with self.assertRaises(CommandError):
+            call_command("recalculate_prices")
+
+
+class MoneyTests(SimpleTestCase):
+    ROUNDINGS = (
+        ROUND_CEILING,
+        ROUND_DOWN,
+        ROUND_FLOOR,
+        ROUND_HALF_DOWN,
+        ROUND_HALF_EVEN,
+        ROUND_HALF_UP,
+        ROUND_UP,
+    )
+
+    def test_divide_rounds_like_decimal(self):
+        for numerator in range(-30, 31):
+            for denominator in (4, -4, 6, 10):
+                for rounding in self.ROUNDINGS:
+                    expected = (Decimal(numerator) / Decimal(denominator)).quantize(
+                        Decimal(1), rounding=rounding
+                    )
+                    self.assertEqual(
+                        money.divide(numerator, denominator, rounding),
+                        int(expected),
+                        (numerator, denominator, rounding),
+                    )
+
+    def test_divide_all_matches_divide(self):
+        values = [-1005, -1000, -5, 0, 5, 15, 25, 1005, 33335]
+        for numerator, denominator in ((1, 10), (3, 7), (125, 1000)):
+            for rounding in self.ROUNDINGS:
+                self.assertEqual(
+                    money.divide_all(values, numerator, denominator, rounding),
+                    [
+                        money.divide(value * numerator, denominator, rounding)
+                        for value in values
+                    ],
+                )
+        # Every share is rounded on its own, so shares need not sum to the
+        # rounded total
+        self.assertEqual(money.divide_all([5, 5, 5], 1, 10), [1, 1, 1])
+
+    def test_conversions_and_arithmetic(self):
+        self.assertEqual(money.to_minor(Decimal("12.345")), 1235)
+        self.assertEqual(money.to_minor(Decimal("-12.345")), -1235)
+        self.assertEqual(money.to_minor(0.1), 10)
+        self.assertEqual(money.from_minor(-1235), Decimal("-12.35"))
+
+        price = Money.from_decimal(Decimal("333.35"))
+        self.assertEqual(price.percent(Decimal("10")).to_decimal(), Decimal("33.34"))
+        tie = Money.from_decimal(Decimal("333.25")).percent(Decimal("10"))
+        self.assertEqual(tie.to_decimal(), Decimal("33.33"))
+        self.assertEqual(
+            Money(33325).percent(Decimal("10"), ROUND_HALF_EVEN).to_decimal(),
+            Decimal("33.32"),
+        )
+        self.assertEqual(price.times(Decimal("0.5")).to_decimal(), Decimal("166.68"))
+        self.assertEqual(price.split(3).to_decimal(), Decimal("111.12"))
+        self.assertEqual(Money.sum([price, -price, price]), price)
+        self.assertLess(price - Money(1), price)
+
+    def test_comparisons_with_other_types(self):
+        price = Money(100)
+        self.assertNotEqual(price, 100)
+        with self.assertRaises(TypeError):
+            price < 100
+        with self.assertRaises(TypeError):
+            price + 1
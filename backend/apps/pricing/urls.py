@@ -1,6 +1,6 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import PricingRuleViewSet, calculate_price, suggest_menu_by_budget
+from .views import PricingRuleViewSet, calculate_price, suggest_menu_by_budget, simulate_pricing
 
 router = DefaultRouter()
 router.register(r'rules', PricingRuleViewSet)
@@ -10,4 +10,5 @@ urlpatterns = [
     path('', include(router.urls)),
     path('calculate/', calculate_price, name='calculate_price'),
     path('suggest/', suggest_menu_by_budget, name='suggest_menu'),
+    path('simulate/', simulate_pricing, name='simulate_pricing'),
 ]
\ No newline at end of file
@@ -6,9 +6,16 @@ from .models import PricingRule, PriceCalculation, BudgetSuggestion
 from .serializers import (
     PricingRuleSerializer, PriceCalculationSerializer, BudgetSuggestionSerializer,
     PriceCalculationRequestSerializer, PriceCalculationResponseSerializer,
-    BudgetSuggestionRequestSerializer, BudgetSuggestionResponseSerializer
+    BudgetSuggestionRequestSerializer, BudgetSuggestionResponseSerializer, MenuPreferencesSerializer,
+    PricingSimulationRequestSerializer, PricingSimulationResponseSerializer
 )
-from apps.core.models import Hall, DiscountTier
+from .money import Money
+from .simulation import SimulationRule, simulate
+from apps.core.models import Hall, DiscountTier, Organization
+from apps.core.serializers import DiscountTierSerializer
+from apps.core.tiers import find_tier
+from apps.organizations.permissions import CanAccessAnalytics
+from apps.menu import dietary
 from apps.menu.models import MenuItem
 
 
@@ -40,14 +47,20 @@ def calculate_price(request):
         hall = Hall.objects.get(id=data.get('hall_id'), is_active=True)
         guest_count = int(data.get('guest_count', 0))
         
-        # Simple calculation
-        total = hall.base_price
+        # The organization's guest-count discount tier, from the in-memory
+        # tier index (see apps/core/tiers.py)
+        tier = find_tier(hall.organization_id, guest_count)
+        base_price = Money.from_decimal(hall.base_price)
+        discount = base_price.percent(tier.discount_percentage) if tier else Money()
+        total = base_price - discount
         
         return Response({
             'hall_base_price': hall.base_price,
             'guest_count': guest_count,
-            'estimated_total': total,
-            'price_per_person': total / guest_count if guest_count > 0 else 0
+            'discount_tier': DiscountTierSerializer(tier).data if tier else None,
+            'guest_discount_amount': discount.to_decimal(),
+            'estimated_total': total.to_decimal(),
+            'price_per_person': total.split(guest_count).to_decimal() if guest_count > 0 else 0
         })
     except (Hall.DoesNotExist, ValueError, TypeError) as e:
         return Response(
@@ -64,9 +77,30 @@ def suggest_menu_by_budget(request):
     data = request.data
     target_budget = data.get('target_budget', 0)
     guest_count = data.get('guest_count', 0)
-    
+    preferences = MenuPreferencesSerializer(data=data.get('preferences') or {})
+    if not preferences.is_valid():
+        return Response({'preferences': preferences.errors}, status=status.HTTP_400_BAD_REQUEST)
+    preferences = preferences.validated_data
+
+    menu_items = MenuItem.objects.filter(is_available=True)
+    if data.get('organization'):
+        menu_items = menu_items.filter(organization_id=data['organization'])
+
+    # Dietary preferences are applied in the database via the item bitmasks,
+    # e.g. {"vegetarian_only": true, "exclude_allergens": ["nuts", "dairy"]}
+    required = preferences['dietary']
+    if preferences['vegetarian_only']:
+        required.append('vegetarian')
+    menu_items = dietary.filter_items(
+        menu_items,
+        dietary=required,
+        exclude_allergens=preferences['exclude_allergens'],
+    )
+    if preferences['exclude_categories']:
+        menu_items = menu_items.exclude(category_id__in=preferences['exclude_categories'])
+
     # Simple suggestion
-    menu_items = MenuItem.objects.filter(is_available=True)[:5]
+    menu_items = menu_items[:5]
     
     return Response({
         'target_budget': target_budget,
@@ -77,3 +111,49 @@ def suggest_menu_by_budget(request):
             'price': item.base_price
         } for item in menu_items]
     })
+
+
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+def simulate_pricing(request):
+    """Replay candidate pricing rules against the organization's historical bookings"""
+    serializer = PricingSimulationRequestSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    data = serializer.validated_data
+
+    try:
+        organization = Organization.objects.get(id=data['organization'])
+    except Organization.DoesNotExist:
+        return Response(
+            {'error': 'Organization not found'},
+            status=status.HTTP_404_NOT_FOUND
+        )
+
+    if not CanAccessAnalytics().has_object_permission(request, None, organization):
+        return Response(
+            {'error': 'You do not have permission to run simulations for this organization'},
+            status=status.HTTP_403_FORBIDDEN
+        )
+
+    rule_ids = data.get('rule_ids', [])
+    rules = [
+        SimulationRule.from_rule(rule)
+        for rule in PricingRule.objects.filter(organization=organization, id__in=rule_ids)
+    ]
+    missing = set(rule_ids) - {rule.rule_id for rule in rules}
+    if missing:
+        return Response(
+            {'error': f'Unknown pricing rules for this organization: {sorted(missing)}'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    rules += [SimulationRule.from_data(rule) for rule in data.get('rules', [])]
+
+    result, = simulate(
+        [organization.id],
+        rules,
+        start_date=data.get('start_date'),
+        end_date=data.get('end_date'),
+    )
+    response = PricingSimulationResponseSerializer(result.as_dict()).data
+    response['rules'] = [{'id': rule.rule_id, 'name': rule.name} for rule in rules]
+    return Response(response)
@@ -70,6 +70,8 @@ MIDDLEWARE = [
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "apps.pricing.middleware.PricingHistoryMiddleware",
+    "apps.core.middleware.ApiMeteringMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
@@ -189,7 +191,9 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 # Django REST Framework
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": [
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        # JWTAuthentication trusting token claims (apps/core/token_claims.py);
+        # it checks token versions in the cache and fails closed (500) without it
+        "apps.core.authentication.ClaimsJWTAuthentication",
         "rest_framework.authentication.SessionAuthentication",
     ],
     "DEFAULT_PERMISSION_CLASSES": [
@@ -198,10 +202,21 @@ REST_FRAMEWORK = {
     "DEFAULT_RENDERER_CLASSES": [
         "rest_framework.renderers.JSONRenderer",
     ],
+    # PlatformSettings.api_rate_limit (see apps/core/metering.py)
+    "DEFAULT_THROTTLE_CLASSES": [
+        "apps.core.throttling.ApiRateThrottle",
+    ],
     "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.PageNumberPagination",
     "PAGE_SIZE": 20,
 }
 
+# Reverse proxies in front of the app. Anonymous (marketplace) requests are
+# rate limited per client IP, which DRF takes from X-Forwarded-For: set this
+# to the number of proxies so the address the outermost one saw is used.
+# Unset, the whole header counts (and clients can vary it); 0 ignores it.
+if config("NUM_PROXIES", default=None):
+    REST_FRAMEWORK["NUM_PROXIES"] = config("NUM_PROXIES", cast=int)
+
 # JWT Settings
 from datetime import timedelta
 
@@ -226,18 +241,42 @@ STATIC_ROOT = BASE_DIR / "staticfiles"
 MEDIA_URL = "/media/"
 MEDIA_ROOT = BASE_DIR / "media"
 
-# Redis Cache (for future use)
-CACHES = {
-    "default": {
-        "BACKEND": "django.core.cache.backends.redis.RedisCache",
-        "LOCATION": f"redis://{config('REDIS_HOST', default='localhost')}:{config('REDIS_PORT', default=6379)}/{config('REDIS_DB', default=0)}",
-        "OPTIONS": {
-            "CLIENT_CLASS": "django_redis.client.DefaultClient",
-        },
-        "KEY_PREFIX": "marquee_system",
-    }
+# Uploads are stored under their content hash (see apps/core/media.py)
+STORAGES = {
+    "default": {"BACKEND": "apps.core.media.HashedFileSystemStorage"},
+    "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
 }
 
+# Processes resizing uploaded images after commit (0 resizes inline)
+IMAGE_PROCESSING_WORKERS = config("IMAGE_PROCESSING_WORKERS", default=2, cast=int)
+
+# Seconds between flushes of the in-process API usage counters to the cache
+# (0 pauses the flush thread, e.g. in tests that flush explicitly)
+API_METERING_FLUSH_INTERVAL = config("API_METERING_FLUSH_INTERVAL", default=10, cast=int)
+
+# Cache (Redis by default; CACHE_BACKEND=locmem for single-process development)
+cache_backend = config("CACHE_BACKEND", default="redis")
+
+if cache_backend == "locmem":
+    # Single-process development without Redis
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "KEY_PREFIX": "marquee_system",
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django_redis.cache.RedisCache",
+            "LOCATION": f"redis://{config('REDIS_HOST', default='localhost')}:{config('REDIS_PORT', default=6379)}/{config('REDIS_DB', default=0)}",
+            "OPTIONS": {
+                "CLIENT_CLASS": "django_redis.client.DefaultClient",
+            },
+            "KEY_PREFIX": "marquee_system",
+        }
+    }
+
 # Stripe Payment Settings
 STRIPE_PUBLIC_KEY = config("STRIPE_PUBLIC_KEY", default="")
 STRIPE_SECRET_KEY = config("STRIPE_SECRET_KEY", default="")
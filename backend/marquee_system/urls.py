@@ -21,11 +21,11 @@ from django.conf import settings
 from django.conf.urls.static import static
 from rest_framework.routers import DefaultRouter
 from rest_framework.documentation import include_docs_urls
-from rest_framework_simplejwt.views import TokenRefreshView
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 from apps.core.auth_views import (
     CustomTokenObtainPairView,
+    CustomTokenRefreshView,
     current_user,
     register,
     logout,
@@ -67,7 +67,11 @@ urlpatterns = [
     path(
         "api/v1/auth/login", CustomTokenObtainPairView.as_view(), name="token_obtain_pair"
     ),
-    path("api/v1/auth/token/refresh", TokenRefreshView.as_view(), name="token_refresh"),
+    path(
+        "api/v1/auth/token/refresh",
+        CustomTokenRefreshView.as_view(),
+        name="token_refresh",
+    ),
     path("api/v1/auth/user", current_user, name="current_user"),
     path("api/v1/auth/register", register, name="register"),
     path("api/v1/auth/logout", logout, name="logout"),
@@ -80,6 +84,8 @@ urlpatterns = [
     path("api/v1/organizations/", include("apps.organizations.urls")),
     # Direct marketplace endpoint for frontend compatibility
     path("api/v1/marketplace/", include("apps.organizations.marketplace_urls")),
+    # The same read endpoints as async views, for ASGI servers
+    path("api/v1/async/marketplace/", include("apps.organizations.async_urls")),
     # DRF auth endpoints
     path("api-auth/", include("rest_framework.urls")),
 ]
@@ -168,7 +168,7 @@ export default function PlatformAdminSettings() {
 
               <div className="grid grid-cols-1 md:grid-cols-2 gap-4">
                 <div className="space-y-2">
-                  <Label htmlFor="api_rate_limit">API Rate Limit</Label>
+                  <Label htmlFor="api_rate_limit">API Rate Limit (requests per hour)</Label>
                   <Input
                     id="api_rate_limit"
                     type="number"
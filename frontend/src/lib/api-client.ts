@@ -1,4 +1,10 @@
-import axios, { AxiosInstance, AxiosRequestConfig, AxiosResponse } from "axios";
+import axios, {
+  AxiosInstance,
+  AxiosRequestConfig,
+  AxiosResponse,
+  InternalAxiosRequestConfig,
+} from "axios";
+import { API_ENDPOINTS } from "@/constants";
 
 class ApiClient {
   private client: AxiosInstance;
@@ -29,7 +35,33 @@ class ApiClient {
     // Response interceptor to handle auth errors
     this.client.interceptors.response.use(
       (response) => response,
-      (error) => {
+      async (error) => {
+        const original = error.config as
+          | (InternalAxiosRequestConfig & { _retried?: boolean })
+          | undefined;
+        const refreshToken = this.getRefreshToken();
+        // Expired access tokens, and tokens whose role claims went stale
+        // (e.g. a membership changed), are refreshed once and retried
+        if (
+          error.response?.status === 401 &&
+          error.response.data?.code === "token_not_valid" &&
+          original &&
+          !original._retried &&
+          refreshToken
+        ) {
+          original._retried = true;
+          try {
+            const { data } = await axios.post<{
+              access: string;
+              refresh?: string;
+            }>(API_ENDPOINTS.AUTH_REFRESH, { refresh: refreshToken });
+            this.setTokens(data.access, data.refresh);
+            original.headers.Authorization = `Bearer ${data.access}`;
+            return this.client(original);
+          } catch {
+            // Fall through to signing out
+          }
+        }
         if (error.response?.status === 401) {
           this.clearAuthToken();
           // Redirect to login if running in browser
@@ -22,6 +22,11 @@ import {
   PlatformStats,
   PlatformSettings,
   BulkActionResponse,
+  VenueSearchParams,
+  VenueSearchResponse,
+  VenueRecommendation,
+  VenueRecommendationParams,
+  MarketplaceReviewPage,
 } from '@/types';
 
 class ApiClient {
@@ -193,11 +198,90 @@ class ApiClient {
     return this.get(`${API_ENDPOINTS.MENU_ITEMS}/vegetarian/`);
   }
 
-  async getMenuItemsByCategory(): Promise<{
+  async getMenuItemsByCategory(organizationId: number): Promise<{
     category: MenuCategory;
     items: MenuItemListItem[];
   }[]> {
-    return this.get(`${API_ENDPOINTS.MENU_ITEMS}/by_category/`);
+    return this.get(`${API_ENDPOINTS.MENU_ITEMS}/by_category/`, {
+      params: { organization: organizationId }
+    });
+  }
+
+  async importMenu(organizationId: number, file: File): Promise<{
+    categories: number;
+    items: number;
+    variants: number;
+    packages: number;
+    package_items: number;
+  }> {
+    const data = new FormData();
+    data.append('file', file);
+    return this.post(`${API_ENDPOINTS.MENU_ITEMS}/import/`, data, {
+      params: { organization: organizationId }
+    });
+  }
+
+  async exportMenu(organizationId: number, fileFormat: 'csv' | 'jsonl' = 'jsonl'): Promise<Blob> {
+    return this.get(`${API_ENDPOINTS.MENU_ITEMS}/export/`, {
+      params: { organization: organizationId, file_format: fileFormat },
+      responseType: 'blob'
+    });
+  }
+
+  async publishMenu(organizationId: number): Promise<{
+    number: number;
+    checksum: string;
+    published_at: string;
+    created: boolean;
+  }> {
+    return this.post(`${API_ENDPOINTS.MENU_ITEMS}/publish/`, undefined, {
+      params: { organization: organizationId }
+    });
+  }
+
+  async searchMenuItems(organizationId: number, query: string, params?: {
+    category?: number;
+    dietary_type?: string;
+    dietary?: string;
+    exclude_allergens?: string;
+    limit?: number;
+  }): Promise<{
+    query: string;
+    count: number;
+    results: MenuItemListItem[];
+    facets: {
+      categories: { id: number; name: string; count: number }[];
+      dietary_types: { value: string; label: string; count: number }[];
+    };
+  }> {
+    return this.get(`${API_ENDPOINTS.MENU_ITEMS}/search/`, {
+      params: { organization: organizationId, q: query, ...params }
+    });
+  }
+
+  // Marketplace API
+  async searchVenues(params: VenueSearchParams): Promise<VenueSearchResponse> {
+    const { amenities, ...rest } = params;
+    return this.get(`${API_ENDPOINTS.MARKETPLACE}search/`, {
+      params: { ...rest, amenities: amenities?.join(',') || undefined }
+    });
+  }
+
+  async getRecommendedVenues(
+    params: VenueRecommendationParams = {}
+  ): Promise<{ results: VenueRecommendation[] }> {
+    const { amenities, ...rest } = params;
+    return this.get(`${API_ENDPOINTS.MARKETPLACE}recommended/`, {
+      params: { ...rest, amenities: amenities?.join(',') || undefined }
+    });
+  }
+
+  async getMarketplaceReviews(organizationId: number, params?: {
+    hall?: number;
+    cursor?: string;
+    page_size?: number;
+  }): Promise<MarketplaceReviewPage> {
+    return this.get(`${API_ENDPOINTS.MARKETPLACE}${organizationId}/reviews/`, { params });
   }
 
   // Bookings API
@@ -222,6 +306,28 @@ class ApiClient {
     return this.get(`${API_ENDPOINTS.BOOKINGS}/upcoming/`);
   }
 
+  async getProductionPlan(organizationId: number, start: string, end?: string): Promise<{
+    organization: number;
+    start: string;
+    end: string;
+    days: {
+      date: string;
+      items: {
+        menu_item: number;
+        name: string;
+        category: string;
+        variant: number | null;
+        variant_name: string | null;
+        serving_type: string;
+        quantity: string;
+      }[];
+    }[];
+  }> {
+    return this.get(`${API_ENDPOINTS.BOOKINGS}/production_plan`, {
+      params: { organization: organizationId, start, end }
+    });
+  }
+
   async createBooking(data: BookingFormData): Promise<Booking> {
     return this.post<Booking>(API_ENDPOINTS.BOOKINGS, data);
   }
@@ -243,12 +349,12 @@ class ApiClient {
     return this.get<ApiResponse<DiscountTier>>(API_ENDPOINTS.DISCOUNT_TIERS);
   }
 
-  async getDiscountTierForGuestCount(guestCount: number): Promise<{
+  async getDiscountTierForGuestCount(organizationId: number, guestCount: number): Promise<{
     guest_count: number;
     applicable_tier: DiscountTier | null;
   }> {
     return this.get(`${API_ENDPOINTS.DISCOUNT_TIERS}/for_guest_count/`, {
-      params: { guest_count: guestCount }
+      params: { organization: organizationId, guest_count: guestCount }
     });
   }
 
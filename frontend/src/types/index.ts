@@ -6,6 +6,9 @@ export interface ApiResponse<T> {
   results: T[];
 }
 
+// Responsive image variants keyed by width ("160w", "480w", "960w")
+export type ImageVariants = Record<string, { webp: string; jpeg?: string; png?: string }>;
+
 // Organization Types
 export interface Organization {
   id: number;
@@ -20,12 +23,17 @@ export interface Organization {
   website?: string;
   logo?: string;
   cover_image?: string;
+  logo_variants?: ImageVariants | null;
+  cover_image_variants?: ImageVariants | null;
   subscription_plan: string;
   status: 'active' | 'inactive' | 'suspended';
   owner: User;
   total_halls: number;
   total_bookings: number;
   avg_rating?: number;
+  review_count?: number;
+  min_price?: string | null;
+  max_capacity?: number | null;
   created_at: string;
 }
 
@@ -68,6 +76,8 @@ export interface Hall {
   base_price: string;
   is_active: boolean;
   image?: string;
+  avg_rating?: string | null;
+  review_count?: number;
   created_at: string;
   updated_at: string;
 }
@@ -111,6 +121,7 @@ export interface MenuItem {
   is_vegetarian: boolean;
   is_available: boolean;
   image?: string;
+  image_variants?: ImageVariants | null;
   ingredients: string;
   preparation_time: number;
   display_order: number;
@@ -328,6 +339,96 @@ export interface Cart {
   subtotal: number;
 }
 
+// Marketplace Search Types
+export interface VenueSearchParams {
+  q?: string;
+  city?: string;
+  state?: string;
+  country?: string;
+  subscription_plan?: string;
+  min_capacity?: number;
+  max_capacity?: number;
+  min_price?: number;
+  max_price?: number;
+  event_type?: string;
+  amenities?: string[];
+  has_parking?: boolean;
+  has_ac?: boolean;
+  has_kitchen?: boolean;
+  ordering?: 'price' | '-price' | 'capacity' | '-capacity' | 'rating' | 'score';
+  page?: number;
+  page_size?: number;
+}
+
+export interface VenueSearchResult {
+  id: number;
+  name: string;
+  slug: string;
+  hall_type: string;
+  capacity: number;
+  base_price: string;
+  amenities: string[];
+  featured_image: string | null;
+  organization: {
+    id: number;
+    name: string;
+    slug: string;
+    city: string;
+    logo: string | null;
+    avg_rating: string | null;
+    review_count: number;
+  };
+}
+
+export interface VenueSearchResponse {
+  page: number;
+  page_size: number;
+  count: number;
+  results: VenueSearchResult[];
+  facets: {
+    cities: { city: string; label: string; count: number }[];
+    price_buckets: { min: number; max: number | null; count: number }[];
+    amenities: { amenity: string; count: number }[];
+  };
+}
+
+export interface VenueRecommendationParams
+  extends Omit<VenueSearchParams, 'ordering' | 'page' | 'page_size'> {
+  date_from?: string;
+  date_to?: string;
+  limit?: number;
+}
+
+export interface VenueRecommendation extends VenueSearchResult {
+  score: number;
+}
+
+// Review Types
+export interface RatingSummary {
+  count: number;
+  average: string | null;
+  histogram: Record<'1' | '2' | '3' | '4' | '5', number>;
+}
+
+export interface MarketplaceReview {
+  id: number;
+  type: 'hall' | 'booking' | 'menu_item';
+  rating: number;
+  title: string;
+  review: string;
+  customer_name: string;
+  created_at: string;
+  hall: { id: number; name: string } | null;
+  menu_item: { id: number; name: string } | null;
+  venue_response?: string | null;
+}
+
+export interface MarketplaceReviewPage {
+  rating: RatingSummary;
+  results: MarketplaceReview[];
+  next: string | null;
+}
+
 // Platform Admin Types
 export interface PlatformStats {
   users: {
@@ -369,6 +470,24 @@ export interface PlatformStats {
       created_at: string;
     }[];
   };
+  today: {
+    date: string;
+    new_users: number;
+    new_organizations: number;
+  };
+  history: PlatformDailyMetrics[];
+  generated_at: string;
+}
+
+export interface PlatformDailyMetrics {
+  date: string;
+  total_users: number;
+  active_users: number;
+  new_users: number;
+  total_organizations: number;
+  active_organizations: number;
+  pending_organizations: number;
+  new_organizations: number;
 }
 
 export interface PlatformSettings {